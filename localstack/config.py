@@ -50,6 +50,45 @@ LAMBDA_REMOTE_DOCKER = os.environ.get('LAMBDA_REMOTE_DOCKER', '').lower().strip(
 # network that the docker lambda container will be joining
 LAMBDA_DOCKER_NETWORK = os.environ.get('LAMBDA_DOCKER_NETWORK', '').strip()
 
+# whether the docker-reuse Lambda executor keeps the runtime and handler loaded in the containers across invocations
+LAMBDA_STAY_OPEN_MODE = os.environ.get('LAMBDA_STAY_OPEN_MODE', '').lower().strip() in TRUE_VALUES
+
+# max. number of containers per function used by the docker-reuse Lambda executor to run concurrent invocations
+LAMBDA_MAX_CONTAINERS = int(os.environ.get('LAMBDA_MAX_CONTAINERS', '').strip() or 1)
+
+# number of idle (pre-warmed) containers kept per runtime by the docker-reuse Lambda executor (0 = disabled)
+LAMBDA_WARM_CONTAINERS = int(os.environ.get('LAMBDA_WARM_CONTAINERS', '').strip() or 0)
+
+# comma-separated list of runtimes for which warm containers are started on startup (see LAMBDA_WARM_CONTAINERS)
+LAMBDA_WARM_RUNTIMES = os.environ.get('LAMBDA_WARM_RUNTIMES', '').strip()
+
+# number of worker processes running Python functions in parallel in the local Lambda executor (0 = disabled)
+LAMBDA_LOCAL_WORKERS = int(os.environ.get('LAMBDA_LOCAL_WORKERS', '').strip() or 0)
+
+# max. number of threads running asynchronous (InvocationType=Event) Lambda invocations
+LAMBDA_ASYNC_WORKERS = int(os.environ.get('LAMBDA_ASYNC_WORKERS', '').strip() or 20)
+
+# max. number of queued asynchronous invocations per Lambda function (further invocations are rejected)
+LAMBDA_ASYNC_QUEUE_SIZE = int(os.environ.get('LAMBDA_ASYNC_QUEUE_SIZE', '').strip() or 1000)
+
+# number of retries of failed asynchronous Lambda invocations, before sending them to the dead-letter queue
+LAMBDA_ASYNC_RETRIES = int(os.environ.get('LAMBDA_ASYNC_RETRIES', '').strip() or 2)
+
+# delay (in secs) before the first retry of a failed asynchronous Lambda invocation, doubled for each further retry
+LAMBDA_ASYNC_RETRY_DELAY = float(os.environ.get('LAMBDA_ASYNC_RETRY_DELAY', '').strip() or 1)
+
+# max. number of threads polling the queue of an SQS event source mapping in parallel (started on demand)
+LAMBDA_SQS_MAX_POLLERS = int(os.environ.get('LAMBDA_SQS_MAX_POLLERS', '').strip() or 5)
+
+# max. number of Lambda log events buffered for shipping to CloudWatch Logs
+LAMBDA_LOGS_BUFFER_SIZE = int(os.environ.get('LAMBDA_LOGS_BUFFER_SIZE', '').strip() or 100000)
+
+# max. time (in secs) Lambda log events are buffered, before they are shipped to CloudWatch Logs
+LAMBDA_LOGS_FLUSH_INTERVAL = float(os.environ.get('LAMBDA_LOGS_FLUSH_INTERVAL', '').strip() or 0.5)
+
+# policy for Lambda log events while the buffer is full ("drop" them, or "block" the invocation until there is space)
+LAMBDA_LOGS_BUFFER_POLICY = os.environ.get('LAMBDA_LOGS_BUFFER_POLICY', '').strip() or 'drop'
+
 # folder for temporary files and data
 TMP_FOLDER = os.path.join(tempfile.gettempdir(), 'localstack')
 # fix for Mac OS, to be able to mount /var/folders in Docker
@@ -80,9 +119,53 @@ DOCKER_CMD = os.environ.get('DOCKER_CMD', '').strip() or 'docker'
 # port of Web UI
 PORT_WEB_UI = int(os.environ.get('PORT_WEB_UI', '').strip() or DEFAULT_PORT_WEB_UI)
 
+# number of processes serving the service proxies, sharing their ports via SO_REUSEPORT (1 = single process)
+PROXY_PROCESSES = int(os.environ.get('PROXY_PROCESSES', '').strip() or 1)
+
+# port of the edge router, serving the APIs of all services on a single port (0 = disabled)
+EDGE_PORT = int(os.environ.get('EDGE_PORT', '').strip() or 0)
+
 # IP of the docker bridge used to enable access between containers
 DOCKER_BRIDGE_IP = os.environ.get('DOCKER_BRIDGE_IP', '').strip()
 
+# engine used to serve the service proxies ("threaded" or "asyncio", the latter requires Python 3)
+PROXY_ENGINE = os.environ.get('PROXY_ENGINE', '').strip().lower() or 'threaded'
+
+# max. number of threads per proxy used to run (synchronous) listeners under PROXY_ENGINE=asyncio
+PROXY_ASYNCIO_WORKERS = int(os.environ.get('PROXY_ASYNCIO_WORKERS', '').strip() or 32)
+
+# max. number of pooled keep-alive connections per proxy backend (set to 0 to disable connection pooling)
+PROXY_POOL_SIZE = int(os.environ.get('PROXY_POOL_SIZE', '').strip() or 20)
+
+# time (in secs) after which idle pooled backend connections are closed
+PROXY_POOL_IDLE_TIMEOUT = float(os.environ.get('PROXY_POOL_IDLE_TIMEOUT', '').strip() or 30)
+
+# max. time (in secs) a request waits for a free pooled backend connection, before failing with a 502 error
+PROXY_POOL_TIMEOUT = float(os.environ.get('PROXY_POOL_TIMEOUT', '').strip() or 30)
+
+# time (in secs) after which idle keep-alive client connections are closed by the proxies (0 = disable keep-alive,
+# unless explicitly requested by the client)
+PROXY_KEEP_ALIVE_TIMEOUT = float(os.environ.get('PROXY_KEEP_ALIVE_TIMEOUT', '').strip() or 60)
+
+# time (in secs) for which responses to read-only control plane calls (e.g., DescribeTable) are cached (0 = disabled)
+PROXY_CACHE_TTL = float(os.environ.get('PROXY_CACHE_TTL', '').strip() or 0)
+
+# max. number of responses held in the response cache of the proxies (see PROXY_CACHE_TTL)
+PROXY_CACHE_SIZE = int(os.environ.get('PROXY_CACHE_SIZE', '').strip() or 1000)
+
+# comma-separated list of services whose responses are compressed by the proxies, if accepted by the client
+# (e.g., "s3,dynamodb", or "*" for all services; empty = disabled)
+PROXY_COMPRESSION = os.environ.get('PROXY_COMPRESSION', '').strip()
+
+# min. size (in bytes) of response bodies compressed by the proxies (see PROXY_COMPRESSION)
+PROXY_COMPRESSION_MIN_SIZE = int(os.environ.get('PROXY_COMPRESSION_MIN_SIZE', '').strip() or 1024)
+
+# max. number of worker threads per proxy serving client connections under PROXY_ENGINE=threaded (0 = unbounded)
+PROXY_MAX_WORKERS = int(os.environ.get('PROXY_MAX_WORKERS', '').strip() or 0)
+
+# max. number of requests per proxy waiting for a worker, before responding with throttling errors (0 = unbounded)
+PROXY_MAX_QUEUE_SIZE = int(os.environ.get('PROXY_MAX_QUEUE_SIZE', '').strip() or 0)
+
 # CORS settings
 EXTRA_CORS_ALLOWED_HEADERS = os.environ.get('EXTRA_CORS_ALLOWED_HEADERS', '').strip()
 EXTRA_CORS_EXPOSE_HEADERS = os.environ.get('EXTRA_CORS_EXPOSE_HEADERS', '').strip()
@@ -123,12 +206,19 @@ LAMBDA_FALLBACK_URL = os.environ.get('LAMBDA_FALLBACK_URL', '').strip()
 # Make sure to keep this in sync with the above!
 # Note: do *not* include DATA_DIR in this list, as it is treated separately
 CONFIG_ENV_VARS = ['SERVICES', 'HOSTNAME', 'HOSTNAME_EXTERNAL', 'LOCALSTACK_HOSTNAME', 'LAMBDA_FALLBACK_URL',
-                   'LAMBDA_EXECUTOR', 'LAMBDA_REMOTE_DOCKER', 'LAMBDA_DOCKER_NETWORK', 'USE_SSL', 'LOCALSTACK_API_KEY',
-                   'DEBUG',
+                   'LAMBDA_EXECUTOR', 'LAMBDA_REMOTE_DOCKER', 'LAMBDA_DOCKER_NETWORK', 'LAMBDA_STAY_OPEN_MODE',
+                   'LAMBDA_MAX_CONTAINERS', 'LAMBDA_WARM_CONTAINERS', 'LAMBDA_WARM_RUNTIMES', 'LAMBDA_LOCAL_WORKERS',
+                   'LAMBDA_ASYNC_WORKERS', 'LAMBDA_ASYNC_QUEUE_SIZE', 'LAMBDA_ASYNC_RETRIES',
+                   'LAMBDA_ASYNC_RETRY_DELAY', 'LAMBDA_SQS_MAX_POLLERS', 'LAMBDA_LOGS_BUFFER_SIZE',
+                   'LAMBDA_LOGS_FLUSH_INTERVAL', 'LAMBDA_LOGS_BUFFER_POLICY', 'USE_SSL', 'LOCALSTACK_API_KEY', 'DEBUG',
                    'KINESIS_ERROR_PROBABILITY', 'DYNAMODB_ERROR_PROBABILITY', 'PORT_WEB_UI', 'START_WEB',
                    'DOCKER_BRIDGE_IP',
                    'DEFAULT_REGION',
-                   'LAMBDA_JAVA_OPTS']
+                   'LAMBDA_JAVA_OPTS', 'PROXY_ENGINE', 'PROXY_ASYNCIO_WORKERS',
+                   'PROXY_POOL_SIZE', 'PROXY_POOL_IDLE_TIMEOUT', 'PROXY_POOL_TIMEOUT', 'PROXY_KEEP_ALIVE_TIMEOUT',
+                   'PROXY_CACHE_TTL', 'PROXY_CACHE_SIZE', 'PROXY_COMPRESSION', 'PROXY_COMPRESSION_MIN_SIZE',
+                   'PROXY_MAX_WORKERS', 'PROXY_MAX_QUEUE_SIZE',
+                   'PROXY_PROCESSES', 'EDGE_PORT']
 
 for key, value in six.iteritems(DEFAULT_SERVICE_PORTS):
     clean_key = key.upper().replace('-', '_')
@@ -59,6 +59,13 @@ DOCKER_IMAGE_NAME = 'localstack/localstack'
 # backdoor API path used to retrieve or update config variables
 CONFIG_UPDATE_PATH = '/?_config_'
 
+# backdoor API path used to retrieve the connection pool and worker pool statistics of the proxies
+POOL_STATS_PATH = '/?_pool_stats_'
+
+# path for the request metrics of the service proxies (in Prometheus text format, or as JSON with "?format=json").
+# Note: bucket names cannot start with an underscore, hence this path does not collide with S3 requests
+METRICS_PATH = '/_localstack/metrics'
+
 # environment variable name to tag local test runs
 ENV_INTERNAL_TEST_RUN = 'LOCALSTACK_INTERNAL_TEST_RUN'
 
@@ -63,6 +63,16 @@ def set_status():
     return jsonify(result)
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Get request metrics of the service proxies
+        ---
+        operationId: 'getMetrics'
+    """
+    result = infra.get_request_metrics()
+    return jsonify(result)
+
+
 @app.route('/kinesis/<streamName>/<shardId>/events/latest', methods=['POST'])
 def get_kinesis_events(streamName, shardId):
     """ Get latest events from Kinesis.
@@ -5,10 +5,13 @@ import logging
 import socket
 import tempfile
 from six import iteritems
+from localstack import config
 from localstack.config import DEFAULT_REGION
+from localstack.constants import METRICS_PATH
 from localstack.utils.aws import aws_stack
 from localstack.utils.common import (short_uid, parallelize, is_port_open, new_tmp_file,
-    to_str, rm_rf, unzip, download, clean_cache, mktime, load_file, mkdir, run, md5)
+    to_str, rm_rf, unzip, download, clean_cache, mktime, load_file, mkdir, run, md5,
+    get_service_protocol, safe_requests)
 from localstack.utils.aws.aws_models import (ElasticSearch, S3Notification,
     EventSource, DynamoDB, DynamoDBStream, FirehoseStream, S3Bucket, SqsQueue,
     KinesisShard, KinesisStream, LambdaFunction)
@@ -498,3 +501,20 @@ def get_graph(name_filter='.*', env=None):
                 result['edges'].append({'source': src_uid, 'target': tgt_uid})
 
     return result
+
+
+def get_request_metrics():
+    """ Return the request metrics of the service proxies, keyed by service, action, and phase. """
+    # all proxies of a LocalStack instance serve the same (process-wide) metrics
+    for service, port in sorted(config.parse_service_ports().items()):
+        if not is_port_open(port):
+            continue
+        url = '%s://localhost:%s%s?format=json' % (get_service_protocol(), port, METRICS_PATH)
+        try:
+            response = safe_requests.get(url, verify=False)
+            result = json.loads(to_str(response.content)) if response.status_code == 200 else None
+        except Exception:
+            continue
+        if isinstance(result, dict):
+            return result
+    return {}
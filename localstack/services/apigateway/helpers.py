@@ -6,6 +6,7 @@ from localstack.utils import common
 from localstack.config import DEFAULT_REGION
 from localstack.constants import TEST_AWS_ACCOUNT_ID, APPLICATION_JSON
 from localstack.utils.aws import aws_stack
+from localstack.utils.server.proxy_processes import SharedDict
 
 # regex path patterns
 PATH_REGEX_MAIN = r'^/restapis/([A-Za-z0-9_\-]+)/[a-z]+(\?.*)?'
@@ -15,7 +16,7 @@ PATH_REGEX_SUB = r'^/restapis/([A-Za-z0-9_\-]+)/[a-z]+/([A-Za-z0-9_\-]+)/.*'
 APIGATEWAY_SQS_DATA_INBOUND_TEMPLATE = "Action=SendMessage&MessageBody=$util.base64Encode($input.json('$'))"
 
 # maps API ids to authorizers
-AUTHORIZERS = {}
+AUTHORIZERS = SharedDict('apigateway.authorizers')
 
 
 def _create_response_object(content, code, headers):
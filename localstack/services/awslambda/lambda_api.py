@@ -1,6 +1,5 @@
 import re
 import os
-import imp
 import sys
 import json
 import uuid
@@ -17,9 +16,9 @@ from six.moves import cStringIO as StringIO
 from six.moves.urllib.parse import urlparse
 from flask import Flask, Response, jsonify, request
 from localstack import config
-from localstack.constants import TEST_AWS_ACCOUNT_ID
 from localstack.services import generic_proxy
-from localstack.services.awslambda import lambda_executors
+from localstack.services.awslambda import (
+    lambda_async, lambda_executors, lambda_mappings, lambda_pollers, lambda_workers)
 from localstack.services.awslambda.lambda_executors import (
     LAMBDA_RUNTIME_PYTHON27,
     LAMBDA_RUNTIME_PYTHON36,
@@ -35,16 +34,16 @@ from localstack.services.awslambda.lambda_executors import (
     LAMBDA_RUNTIME_CUSTOM_RUNTIME)
 from localstack.utils.common import (to_str, load_file, save_file, TMP_FILES, ensure_readable,
     mkdir, unzip, is_zip_file, run, short_uid, is_jar_archive, timestamp, TIMESTAMP_FORMAT_MILLIS,
-    md5, new_tmp_file, parse_chunked_data, is_number, now_utc, safe_requests, isoformat_milliseconds)
+    new_tmp_file, parse_chunked_data, is_number, now_utc, safe_requests, isoformat_milliseconds)
 from localstack.utils.aws import aws_stack, aws_responses
 from localstack.utils.analytics import event_publisher
 from localstack.utils.cloudwatch.cloudwatch_util import cloudwatched
 from localstack.utils.aws.aws_models import LambdaFunction
+from localstack.utils.server.proxy_processes import run_in_primary
 
 APP_NAME = 'lambda_api'
 PATH_ROOT = '/2015-03-31'
 ARCHIVE_FILE_PATTERN = '%s/lambda.handler.*.jar' % config.TMP_FOLDER
-LAMBDA_SCRIPT_PATTERN = '%s/lambda_script_*.py' % config.TMP_FOLDER
 
 # List of Lambda runtime names. Keep them in this list, mainly to silence the linter
 LAMBDA_RUNTIMES = [LAMBDA_RUNTIME_PYTHON27, LAMBDA_RUNTIME_PYTHON36,
@@ -66,15 +65,12 @@ app = Flask(APP_NAME)
 # map ARN strings to lambda function objects
 arn_to_lambda = {}
 
-# list of event source mappings for the API
-event_source_mappings = []
+# registry of event source mappings for the API
+event_source_mappings = lambda_mappings.EventSourceMappingRegistry()
 
 # logger
 LOG = logging.getLogger(__name__)
 
-# mutex for access to CWD and ENV
-exec_mutex = threading.Semaphore(1)
-
 # whether to use Docker for execution
 DO_USE_DOCKER = None
 
@@ -114,9 +110,10 @@ class LambdaContext(object):
 
 
 def cleanup():
-    global event_source_mappings, arn_to_lambda
+    global arn_to_lambda
     arn_to_lambda = {}
-    event_source_mappings = []
+    event_source_mappings.clear()
+    lambda_pollers.update_pollers(event_source_mappings.all())
     LAMBDA_EXECUTOR.cleanup()
 
 
@@ -130,39 +127,47 @@ def add_function_mapping(lambda_name, lambda_handler, lambda_cwd=None):
     arn_to_lambda[arn].cwd = lambda_cwd
 
 
-def add_event_source(function_name, source_arn, enabled):
+def add_event_source(function_name, source_arn, enabled, batch_size=None, starting_position=None,
+        starting_position_timestamp=None):
+    if not batch_size:
+        batch_size = lambda_pollers.SQS_MAX_BATCH_SIZE if lambda_pollers.is_sqs_mapping(
+            {'EventSourceArn': source_arn}) else 100
     mapping = {
         'UUID': str(uuid.uuid4()),
         'StateTransitionReason': 'User action',
         'LastModified': float(time.mktime(datetime.utcnow().timetuple())),
-        'BatchSize': 100,
+        'BatchSize': batch_size,
         'State': 'Enabled' if enabled is True or enabled is None else 'Disabled',
         'FunctionArn': func_arn(function_name),
         'EventSourceArn': source_arn,
         'LastProcessingResult': 'OK',
-        'StartingPosition': LAMBDA_DEFAULT_STARTING_POSITION
+        'StartingPosition': starting_position or LAMBDA_DEFAULT_STARTING_POSITION
     }
-    event_source_mappings.append(mapping)
+    if starting_position_timestamp:
+        mapping['StartingPositionTimestamp'] = starting_position_timestamp
+    event_source_mappings.add(mapping)
+    lambda_pollers.update_pollers(event_source_mappings.all())
     return mapping
 
 
 def update_event_source(uuid_value, function_name, enabled, batch_size):
-    for m in event_source_mappings:
-        if uuid_value == m['UUID']:
-            if function_name:
-                m['FunctionArn'] = func_arn(function_name)
-            m['BatchSize'] = batch_size
-            m['State'] = 'Enabled' if enabled is True else 'Disabled'
-            m['LastModified'] = float(time.mktime(datetime.utcnow().timetuple()))
-            return m
-    return {}
+    attributes = {
+        'State': 'Enabled' if enabled is True else 'Disabled',
+        'LastModified': float(time.mktime(datetime.utcnow().timetuple()))
+    }
+    if function_name:
+        attributes['FunctionArn'] = func_arn(function_name)
+    if batch_size:
+        attributes['BatchSize'] = batch_size
+    return event_source_mappings.update(uuid_value, **attributes) or {}
 
 
 def delete_event_source(uuid_value):
-    for i, m in enumerate(event_source_mappings):
-        if uuid_value == m['UUID']:
-            return event_source_mappings.pop(i)
-    return {}
+    mapping = event_source_mappings.remove(uuid_value)
+    if mapping is None:
+        return {}
+    lambda_pollers.update_pollers(event_source_mappings.all())
+    return mapping
 
 
 def use_docker():
@@ -178,6 +183,7 @@ def use_docker():
     return DO_USE_DOCKER
 
 
+@run_in_primary
 def process_apigateway_invocation(func_arn, path, payload, headers={},
         resource_path=None, method=None, path_params={},
         query_string_params={}, request_context={}):
@@ -200,6 +206,7 @@ def process_apigateway_invocation(func_arn, path, payload, headers={},
         LOG.warning('Unable to run Lambda function on API Gateway message: %s %s' % (e, traceback.format_exc()))
 
 
+@run_in_primary
 def process_sns_notification(func_arn, topic_arn, subscriptionArn, message, message_attributes, subject='',):
     try:
         event = {
@@ -222,66 +229,21 @@ def process_sns_notification(func_arn, topic_arn, subscriptionArn, message, mess
         LOG.warning('Unable to run Lambda function on SNS message: %s %s' % (e, traceback.format_exc()))
 
 
+@run_in_primary
 def process_kinesis_records(records, stream_name):
-    # feed records into listening lambdas
+    # feed records into listening lambdas (in order per shard, without waiting for the invocations)
     try:
         stream_arn = aws_stack.kinesis_stream_arn(stream_name)
         sources = get_event_sources(source_arn=stream_arn)
-        for source in sources:
-            arn = source['FunctionArn']
-            event = {
-                'Records': []
-            }
-            for rec in records:
-                event['Records'].append({
-                    'eventID': 'shardId-000000000000:{0}'.format(rec['sequenceNumber']),
-                    'eventSourceARN': stream_arn,
-                    'kinesis': rec
-                })
-            run_lambda(event=event, context={}, func_arn=arn)
+        if sources:
+            lambda_pollers.dispatch_kinesis_records(stream_arn, records, sources)
     except Exception as e:
         LOG.warning('Unable to run Lambda function on Kinesis records: %s %s' % (e, traceback.format_exc()))
 
 
-def process_sqs_message(message_body, message_attributes, queue_name, region_name=None):
-    # feed message into the first listening lambda (message should only get processed once)
-    try:
-        queue_arn = aws_stack.sqs_queue_arn(queue_name, region_name=region_name)
-        sources = get_event_sources(source_arn=queue_arn)
-        LOG.debug('Found %s source mappings for event from SQS queue %s' % (len(sources), queue_arn))
-        source = next(iter(sources), None)
-        if source:
-            arn = source['FunctionArn']
-            event = {'Records': [{
-                'body': message_body,
-                'receiptHandle': 'MessageReceiptHandle',
-                'md5OfBody': md5(message_body),
-                'eventSourceARN': queue_arn,
-                'eventSource': 'aws:sqs',
-                'awsRegion': region_name,
-                'messageId': str(uuid.uuid4()),
-                'attributes': {
-                    'ApproximateFirstReceiveTimestamp': '{}000'.format(int(time.time())),
-                    'SenderId': TEST_AWS_ACCOUNT_ID,
-                    'ApproximateReceiveCount': '1',
-                    'SentTimestamp': '{}000'.format(int(time.time()))
-                },
-                'messageAttributes': message_attributes,
-                'sqs': True,
-            }]}
-            run_lambda(event=event, context={}, func_arn=arn)
-            return True
-    except Exception as e:
-        LOG.warning('Unable to run Lambda function on SQS messages: %s %s' % (e, traceback.format_exc()))
-
-
 def get_event_sources(func_name=None, source_arn=None):
-    result = []
-    for m in event_source_mappings:
-        if not func_name or (m['FunctionArn'] in [func_name, func_arn(func_name)]):
-            if not source_arn or (m['EventSourceArn'].startswith(source_arn)):
-                result.append(m)
-    return result
+    function_arns = [func_name, func_arn(func_name)] if func_name else None
+    return event_source_mappings.find(function_arns=function_arns, source_arn=source_arn)
 
 
 def get_function_version(arn, version):
@@ -336,6 +298,8 @@ def run_lambda(event, context, func_arn, version=None, suppress_output=False, as
             context = LambdaContext(func_details, version)
         result, log_output = LAMBDA_EXECUTOR.execute(func_arn, func_details,
             event, context=context, version=version, asynchronous=asynchronous)
+    except lambda_async.InvocationQueueFullError as e:
+        return error_response(str(e), 429, error_type='TooManyRequestsException')
     except Exception as e:
         return error_response('Error executing Lambda function %s: %s %s' % (func_arn, e, traceback.format_exc()))
     finally:
@@ -345,38 +309,37 @@ def run_lambda(event, context, func_arn, version=None, suppress_output=False, as
     return result
 
 
-def exec_lambda_code(script, handler_function='handler', lambda_cwd=None, lambda_env=None):
-    if lambda_cwd or lambda_env:
-        exec_mutex.acquire()
-        if lambda_cwd:
-            previous_cwd = os.getcwd()
-            os.chdir(lambda_cwd)
-            sys.path = [lambda_cwd] + sys.path
-        if lambda_env:
-            previous_env = dict(os.environ)
-            os.environ.update(lambda_env)
-    # generate lambda file name
-    lambda_id = 'l_%s' % short_uid()
-    lambda_file = LAMBDA_SCRIPT_PATTERN.replace('*', lambda_id)
-    save_file(lambda_file, script)
-    # delete temporary .py and .pyc files on exit
-    TMP_FILES.append(lambda_file)
-    TMP_FILES.append('%sc' % lambda_file)
+def exec_lambda_code(script, handler_function='handler', lambda_cwd=None, lambda_file=None):
+    """ Load the given handler script as a new module, and return the handler function. The compiled code is
+        cached by content hash, and the module is loaded without changing the CWD, environment, or sys.path of
+        this process (modules in the working directory are imported via `lambda_workers.FunctionModuleFinder`). """
+    lambda_file = lambda_file or '<lambda_script>'
     try:
-        handler_module = imp.load_source(lambda_id, lambda_file)
-        module_vars = handler_module.__dict__
+        code = lambda_workers.get_compiled_code(script, lambda_file)
+        handler_module, local_modules = lambda_workers.load_handler_module(code, 'l_%s' % short_uid(),
+            lambda_file, lambda_cwd)
     except Exception as e:
         LOG.error('Unable to exec: %s %s' % (script, traceback.format_exc()))
         raise e
-    finally:
-        if lambda_cwd or lambda_env:
-            if lambda_cwd:
-                os.chdir(previous_cwd)
-                sys.path.pop(0)
-            if lambda_env:
-                os.environ = previous_env
-            exec_mutex.release()
-    return module_vars[handler_function]
+    return handler_module.__dict__[handler_function]
+
+
+def get_lazy_handler(script, handler_function='handler', lambda_cwd=None, lambda_file=None):
+    """ Return a handler which loads the handler module on its first invocation, i.e., in the working directory
+        and environment of the function applied by the executor (module-level code may read environment variables
+        or relative files). The script is compiled right away, to fail early on syntax errors. """
+    lambda_workers.get_compiled_code(script, lambda_file or '<lambda_script>')
+    lock = threading.Lock()
+    loaded = []
+
+    def handler(event, context):
+        if not loaded:
+            with lock:
+                if not loaded:
+                    loaded.append(exec_lambda_code(script, handler_function, lambda_cwd, lambda_file))
+        return loaded[0](event, context)
+
+    return handler
 
 
 def get_handler_file_from_name(handler_name, runtime=LAMBDA_DEFAULT_RUNTIME):
@@ -508,7 +471,6 @@ def set_function_code(code, lambda_name, lambda_cwd=None):
     arn = func_arn(lambda_name)
     lambda_details = arn_to_lambda[arn]
     runtime = lambda_details.runtime
-    lambda_environment = lambda_details.envvars
     handler_name = lambda_details.handler or LAMBDA_DEFAULT_HANDLER
     code_passed = code
     code = code or lambda_details.code
@@ -573,11 +535,11 @@ def set_function_code(code, lambda_name, lambda_cwd=None):
                 ensure_readable(main_file)
                 zip_file_content = load_file(main_file, mode='rb')
                 # extract handler
-                lambda_handler = exec_lambda_code(
+                lambda_handler = get_lazy_handler(
                     zip_file_content,
                     handler_function=handler_function,
                     lambda_cwd=lambda_cwd,
-                    lambda_env=lambda_environment)
+                    lambda_file=main_file)
             except Exception as e:
                 raise ClientError('Unable to get handler function from lambda code.', e)
 
@@ -620,6 +582,8 @@ def format_func_details(func_details, version=None, always_add_version=False):
         result['Environment'] = {
             'Variables': func_details.envvars
         }
+    if func_details.dead_letter_config:
+        result['DeadLetterConfig'] = func_details.dead_letter_config
     if (always_add_version or version != '$LATEST') and len(result['FunctionArn'].split(':')) <= 7:
         result['FunctionArn'] += ':%s' % (version)
     return result
@@ -698,6 +662,7 @@ def create_function():
         func_details.timeout = data.get('Timeout', LAMBDA_DEFAULT_TIMEOUT)
         func_details.role = data['Role']
         func_details.memory_size = data.get('MemorySize')
+        func_details.dead_letter_config = data.get('DeadLetterConfig')
         func_details.code = data['Code']
         result = set_function_code(func_details.code, lambda_name)
         if isinstance(result, Response):
@@ -705,6 +670,8 @@ def create_function():
             return result
         # remove content from code attribute, if present
         func_details.code.pop('ZipFile', None)
+        # prepare the execution of the function (e.g., start warm containers for its runtime)
+        LAMBDA_EXECUTOR.prepare_function(func_details)
         # prepare result
         result.update(format_func_details(func_details))
         if data.get('Publish', False):
@@ -780,13 +747,8 @@ def delete_function(function):
 
     event_publisher.fire_event(event_publisher.EVENT_LAMBDA_DELETE_FUNC,
         payload={'n': event_publisher.get_hash(function)})
-    i = 0
-    while i < len(event_source_mappings):
-        mapping = event_source_mappings[i]
-        if mapping['FunctionArn'] == arn:
-            del event_source_mappings[i]
-            i -= 1
-        i += 1
+    event_source_mappings.remove_function(arn)
+    lambda_pollers.update_pollers(event_source_mappings.all())
     result = {}
     return jsonify(result)
 
@@ -865,6 +827,8 @@ def update_function_configuration(function):
         lambda_details.envvars = env_vars
     if data.get('Timeout'):
         lambda_details.timeout = data['Timeout']
+    if data.get('DeadLetterConfig') is not None:
+        lambda_details.dead_letter_config = data['DeadLetterConfig']
     result = {}
     return jsonify(result)
 
@@ -954,7 +918,10 @@ def invoke_function(function):
         result = run_lambda(asynchronous=False, func_arn=arn, event=data, context={}, version=qualifier)
         return _create_response(result)
     elif invocation_type == 'Event':
-        run_lambda(asynchronous=True, func_arn=arn, event=data, context={}, version=qualifier)
+        result = run_lambda(asynchronous=True, func_arn=arn, event=data, context={}, version=qualifier)
+        if isinstance(result, Response):
+            # the invocation has been rejected (e.g., as the queue of asynchronous invocations is full)
+            return result
         return _create_response('', status_code=202)
     elif invocation_type == 'DryRun':
         # Assume the dry run always passes.
@@ -972,12 +939,10 @@ def list_event_source_mappings():
     event_source_arn = request.args.get('EventSourceArn')
     function_name = request.args.get('FunctionName')
 
-    mappings = event_source_mappings
+    function_arns = [func_arn(function_name)] if function_name else None
+    mappings = event_source_mappings.find(function_arns=function_arns, source_arn=event_source_arn)
     if event_source_arn:
         mappings = [m for m in mappings if event_source_arn == m.get('EventSourceArn')]
-    if function_name:
-        function_arn = func_arn(function_name)
-        mappings = [m for m in mappings if function_arn == m.get('FunctionArn')]
 
     response = {
         'EventSourceMappings': mappings
@@ -994,12 +959,10 @@ def get_event_source_mapping(mapping_uuid):
             - name: 'request'
               in: body
     """
-    mappings = event_source_mappings
-    mappings = [m for m in mappings if mapping_uuid == m.get('UUID')]
-
-    if len(mappings) == 0:
+    mapping = event_source_mappings.get(mapping_uuid)
+    if not mapping:
         return not_found_error()
-    return jsonify(mappings[0])
+    return jsonify(mapping)
 
 
 @app.route('%s/event-source-mappings/' % PATH_ROOT, methods=['POST'])
@@ -1012,7 +975,9 @@ def create_event_source_mapping():
               in: body
     """
     data = json.loads(to_str(request.data))
-    mapping = add_event_source(data['FunctionName'], data['EventSourceArn'], data.get('Enabled'))
+    mapping = add_event_source(data['FunctionName'], data['EventSourceArn'], data.get('Enabled'),
+        batch_size=data.get('BatchSize'), starting_position=data.get('StartingPosition'),
+        starting_position_timestamp=data.get('StartingPositionTimestamp'))
     return jsonify(mapping)
 
 
@@ -1030,7 +995,7 @@ def update_event_source_mapping(mapping_uuid):
         return jsonify({})
     function_name = data.get('FunctionName') or ''
     enabled = data.get('Enabled', True)
-    batch_size = data.get('BatchSize') or 100
+    batch_size = data.get('BatchSize')
     mapping = update_event_source(mapping_uuid, function_name, enabled, batch_size)
     return jsonify(mapping)
 
@@ -0,0 +1,248 @@
+import json
+import time
+import uuid
+import heapq
+import logging
+import threading
+from collections import OrderedDict, deque
+from localstack import config
+from localstack.utils.aws import aws_stack
+from localstack.utils.common import to_str, json_safe
+from localstack.utils.server import metrics
+
+# logger
+LOG = logging.getLogger(__name__)
+
+
+class InvocationQueueFullError(Exception):
+    """ Raised if an asynchronous invocation is rejected, as the queue of the function is full. """
+    pass
+
+
+class AsyncInvocation(object):
+
+    def __init__(self, func_arn, func_details, event, execute):
+        self.func_arn = func_arn
+        self.func_details = func_details
+        self.event = event
+        # function which runs the invocation, raising an exception if it fails
+        self.execute = execute
+        self.request_id = str(uuid.uuid4())
+        self.enqueued = time.time()
+        self.attempts = 0
+
+
+class AsyncInvocationQueue(object):
+    """ Queue of asynchronous (InvocationType=Event) invocations, run by a bounded pool of (lazily started)
+        worker threads. Each function has a bounded queue, and the number of concurrently running invocations
+        of a function is limited by its reserved concurrency. Failed invocations are retried with exponential
+        backoff, and sent to the dead-letter queue of the function (if configured) once all retries have failed. """
+
+    def __init__(self, max_workers, max_queue_size, max_retries, retry_delay):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.condition = threading.Condition()
+        # maps function ARNs to their queued invocations, in the order in which functions take turns
+        self.queues = OrderedDict()
+        # maps function ARNs to the number of their running invocations
+        self.running = {}
+        # heap of (due time, sequence number, invocation) tuples of failed invocations waiting to be retried
+        self.retries = []
+        self.sequence = 0
+        self.workers = []
+        self.idle_workers = 0
+        self.stats = {}
+        self.stopped = False
+
+    def submit(self, invocation):
+        func_arn = invocation.func_arn
+        with self.condition:
+            queue = self.queues.get(func_arn)
+            if queue is None:
+                queue = self.queues[func_arn] = deque()
+            if len(queue) >= self.max_queue_size or get_concurrency_limit(invocation.func_details) == 0:
+                self._increment(func_arn, 'rejected')
+                raise InvocationQueueFullError('Rate exceeded for asynchronous invocations of %s' % func_arn)
+            queue.append(invocation)
+            self._increment(func_arn, 'accepted')
+            if not self.idle_workers and len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._run_worker)
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+            self.condition.notify()
+
+    def shutdown(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """ Return the statistics of the queue, keyed by function ARN. """
+        now = time.time()
+        with self.condition:
+            result = dict((func_arn, dict(counters)) for func_arn, counters in self.stats.items())
+            for func_arn, queue in self.queues.items():
+                stats = result.setdefault(func_arn, new_counters())
+                stats['queue_depth'] = len(queue)
+                stats['oldest_age_secs'] = now - min(i.enqueued for i in queue) if queue else 0
+            for func_arn, count in self.running.items():
+                result.setdefault(func_arn, new_counters())['running'] = count
+            for due, sequence, invocation in self.retries:
+                result.setdefault(invocation.func_arn, new_counters())['pending_retries'] += 1
+        return result
+
+    def _next(self, now):
+        """ Return a tuple (invocation, wait_time) with the next invocation that can run, or the time to wait
+            for the next retry to become due (None if there is none). Must be called with the lock held. """
+        while self.retries and self.retries[0][0] <= now:
+            invocation = heapq.heappop(self.retries)[2]
+            queue = self.queues.get(invocation.func_arn)
+            if queue is None:
+                queue = self.queues[invocation.func_arn] = deque()
+            queue.appendleft(invocation)
+        for func_arn in list(self.queues):
+            queue = self.queues[func_arn]
+            if not queue:
+                del self.queues[func_arn]
+                continue
+            if self.running.get(func_arn, 0) >= get_concurrency_limit(queue[0].func_details, self.max_workers):
+                continue
+            invocation = queue.popleft()
+            # move the function to the end, to take turns between functions with queued invocations
+            del self.queues[func_arn]
+            if queue:
+                self.queues[func_arn] = queue
+            return invocation, None
+        return None, (max(self.retries[0][0] - now, 0) if self.retries else None)
+
+    def _run_worker(self):
+        while True:
+            with self.condition:
+                invocation, wait_time = self._next(time.time())
+                while invocation is None:
+                    if self.stopped:
+                        return
+                    self.idle_workers += 1
+                    self.condition.wait(wait_time)
+                    self.idle_workers -= 1
+                    invocation, wait_time = self._next(time.time())
+                func_arn = invocation.func_arn
+                self.running[func_arn] = self.running.get(func_arn, 0) + 1
+            try:
+                self._run(invocation)
+            finally:
+                with self.condition:
+                    self.running[func_arn] -= 1
+                    if not self.running[func_arn]:
+                        del self.running[func_arn]
+                    if self.queues.get(func_arn):
+                        # wake up a worker which may have been waiting for a free slot of this function
+                        self.condition.notify()
+
+    def _run(self, invocation):
+        func_arn = invocation.func_arn
+        invocation.attempts += 1
+        if invocation.attempts == 1:
+            metrics.observe('lambda', 'AsyncInvoke', 'queued', time.time() - invocation.enqueued)
+        try:
+            invocation.execute()
+            self._increment(func_arn, 'succeeded')
+            return
+        except Exception as e:
+            error = e
+        if invocation.attempts <= self.max_retries:
+            delay = self.retry_delay * 2 ** (invocation.attempts - 1)
+            LOG.info('Asynchronous invocation of %s failed, retrying in %s secs: %s' % (func_arn, delay, error))
+            with self.condition:
+                self.sequence += 1
+                heapq.heappush(self.retries, (time.time() + delay, self.sequence, invocation))
+                self._increment(func_arn, 'retries')
+                self.condition.notify()
+            return
+        self._increment(func_arn, 'failed')
+        LOG.warning('Asynchronous invocation of %s failed after %s attempts: %s' %
+            (func_arn, invocation.attempts, error))
+        try:
+            if send_to_dead_letter_queue(invocation, error):
+                self._increment(func_arn, 'dead_lettered')
+        except Exception as e:
+            LOG.warning('Unable to send failed invocation of %s to dead-letter queue: %s' % (func_arn, e))
+
+    def _increment(self, func_arn, counter, value=1):
+        with self.condition:
+            counters = self.stats.get(func_arn)
+            if counters is None:
+                counters = self.stats[func_arn] = new_counters()
+            counters[counter] += value
+
+
+def new_counters():
+    return {'accepted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'dead_lettered': 0,
+        'queue_depth': 0, 'oldest_age_secs': 0, 'running': 0, 'pending_retries': 0}
+
+
+def get_concurrency_limit(func_details, default=None):
+    reserved = (getattr(func_details, 'concurrency', None) or {}).get('ReservedConcurrentExecutions')
+    return default if reserved is None else int(reserved)
+
+
+def send_to_dead_letter_queue(invocation, error):
+    """ Send the event of a failed invocation to the SQS queue or SNS topic configured in the DeadLetterConfig
+        of the function, with the same message attributes as in AWS. Returns False if there is none. """
+    target_arn = (getattr(invocation.func_details, 'dead_letter_config', None) or {}).get('TargetArn')
+    if not target_arn:
+        return False
+    event = invocation.event
+    message = to_str(event) if isinstance(event, bytes) else json.dumps(json_safe(event))
+    attributes = {
+        'RequestID': {'DataType': 'String', 'StringValue': invocation.request_id},
+        'ErrorCode': {'DataType': 'Number', 'StringValue': '200'},
+        'ErrorMessage': {'DataType': 'String', 'StringValue': str(error)[:1000] or 'Error'}
+    }
+    region_name = aws_stack.extract_region_from_arn(target_arn)
+    if ':sqs:' in target_arn:
+        client = aws_stack.connect_to_service('sqs', region_name=region_name)
+        client.send_message(QueueUrl=aws_stack.get_sqs_queue_url(target_arn), MessageBody=message,
+            MessageAttributes=attributes)
+    elif ':sns:' in target_arn:
+        client = aws_stack.connect_to_service('sns', region_name=region_name)
+        client.publish(TopicArn=target_arn, Message=message, MessageAttributes=attributes)
+    else:
+        LOG.warning('Unsupported dead-letter target for Lambda function %s: %s' % (invocation.func_arn, target_arn))
+        return False
+    return True
+
+
+# the queue of asynchronous invocations (created lazily, see get_queue)
+QUEUE = {}
+
+# mutex for creating the queue
+QUEUE_LOCK = threading.Lock()
+
+
+def get_queue():
+    invocation_queue = QUEUE.get('queue')
+    if invocation_queue is None:
+        with QUEUE_LOCK:
+            invocation_queue = QUEUE.get('queue')
+            if invocation_queue is None:
+                invocation_queue = QUEUE['queue'] = AsyncInvocationQueue(config.LAMBDA_ASYNC_WORKERS,
+                    config.LAMBDA_ASYNC_QUEUE_SIZE, config.LAMBDA_ASYNC_RETRIES, config.LAMBDA_ASYNC_RETRY_DELAY)
+    return invocation_queue
+
+
+def submit(func_arn, func_details, event, execute):
+    """ Queue an asynchronous invocation, which is run by calling `execute()`. Raises an
+        InvocationQueueFullError if the invocation is rejected, as the queue of the function is full. """
+    get_queue().submit(AsyncInvocation(func_arn, func_details, event, execute))
+
+
+def get_queue_stats():
+    invocation_queue = QUEUE.get('queue')
+    return invocation_queue.get_stats() if invocation_queue else {}
+
+
+metrics.register_stats('lambda_async_invocations', 'function', get_queue_stats)
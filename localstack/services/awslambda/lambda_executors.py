@@ -2,9 +2,12 @@ import os
 import re
 import json
 import time
+import base64
 import logging
 import threading
 import subprocess
+import requests
+import six
 from localstack.utils.common import (
     get_free_tcp_port)
 from multiprocessing import Process, Queue
@@ -16,7 +19,10 @@ except ImportError:
 from localstack import config
 from localstack.utils.aws import aws_stack
 from localstack.utils.common import (
-    CaptureOutput, FuncThread, TMP_FILES, short_uid, save_file, to_str, run, cp_r, json_safe)
+    CaptureOutput, FuncThread, TMP_FILES, short_uid, save_file, to_str, run, cp_r, json_safe, retry,
+    wait_for_port_open)
+from localstack.utils.server import metrics
+from localstack.services.awslambda import lambda_async, lambda_logs, lambda_workers
 from localstack.services.install import INSTALL_PATH_LOCALSTACK_FAT_JAR
 
 # constants
@@ -43,6 +49,12 @@ LAMBDA_EVENT_FILE = 'event_file.json'
 LAMBDA_SERVER_UNIQUE_PORTS = 500
 LAMBDA_SERVER_PORT_OFFSET = 5000
 
+# port of the Lambda API served by lambci/lambda containers in stay-open mode (see LAMBDA_STAY_OPEN_MODE)
+LAMBDA_API_PORT_STAY_OPEN = 9001
+
+# environment variables which differ between invocations, and are not passed to stay-open containers
+PER_INVOCATION_ENV_VARS = ('AWS_LAMBDA_EVENT_BODY', '_LAMBDA_SERVER_PORT')
+
 # logger
 LOG = logging.getLogger(__name__)
 
@@ -77,7 +89,7 @@ class LambdaExecutor(object):
         if asynchronous:
             LOG.debug('Lambda executed in Event (asynchronous) mode, no response from this '
                       'function will be returned to caller')
-            FuncThread(do_execute).start()
+            lambda_async.submit(func_arn, func_details, event, do_execute)
             return None, 'Lambda executed asynchronously.'
 
         return do_execute()
@@ -89,46 +101,18 @@ class LambdaExecutor(object):
     def startup(self):
         pass
 
+    def prepare_function(self, func_details):
+        """ Called after a function has been created, to prepare its execution ahead of the first invocation. """
+        pass
+
     def cleanup(self, arn=None):
         pass
 
     def _store_logs(self, func_details, log_output, invocation_time):
         if not aws_stack.is_service_enabled('logs'):
             return
-        logs_client = aws_stack.connect_to_service('logs')
-        log_group_name = '/aws/lambda/%s' % func_details.name()
-        time_str = time.strftime('%Y/%m/%d', time.gmtime(invocation_time))
-        log_stream_name = '%s/[$LATEST]%s' % (time_str, short_uid())
-
-        # make sure that the log group exists
-        log_groups = logs_client.describe_log_groups()['logGroups']
-        log_groups = [lg['logGroupName'] for lg in log_groups]
-        if log_group_name not in log_groups:
-            logs_client.create_log_group(logGroupName=log_group_name)
-
-        # create a new log stream for this lambda invocation
-        logs_client.create_log_stream(logGroupName=log_group_name, logStreamName=log_stream_name)
-
-        # store new log events under the log stream
-        invocation_time = invocation_time
-        finish_time = int(time.time() * 1000)
-        log_lines = log_output.split('\n')
-        time_diff_per_line = float(finish_time - invocation_time) / float(len(log_lines))
-        log_events = []
-        for i, line in enumerate(log_lines):
-            if not line:
-                continue
-            # simple heuristic: assume log lines were emitted in regular intervals
-            log_time = invocation_time + float(i) * time_diff_per_line
-            event = {'timestamp': int(log_time), 'message': line}
-            log_events.append(event)
-        if not log_events:
-            return
-        logs_client.put_log_events(
-            logGroupName=log_group_name,
-            logStreamName=log_stream_name,
-            logEvents=log_events
-        )
+        # the logs are shipped to CloudWatch Logs in the background, batched across invocations
+        lambda_logs.store_logs(func_details, log_output, invocation_time)
 
     def run_lambda_executor(self, cmd, event=None, env_vars={}):
         process = run(cmd, asynchronous=True, stderr=subprocess.PIPE, outfile=subprocess.PIPE, env_vars=env_vars,
@@ -160,12 +144,42 @@ class ContainerInfo:
         self.entry_point = entry_point
 
 
+class RuntimeServer(object):
+    """
+    Lambda API of a container started in stay-open mode, which keeps the runtime process and the
+    handler module loaded across invocations (see LAMBDA_STAY_OPEN_MODE).
+    """
+    def __init__(self, container_name, url, env_vars):
+        self.container_name = container_name
+        self.url = url
+        # the environment variables of the container, which are fixed when the container is started
+        self.env_vars = env_vars
+        self.session = requests.Session()
+
+    def invoke(self, event_body):
+        response = self.session.post(self.url, data=event_body, headers={'X-Amz-Log-Type': 'Tail'})
+        result = to_str(response.content or '').strip()
+        log_output = to_str(base64.b64decode(response.headers.get('X-Amz-Log-Result') or '')).strip()
+        if response.status_code >= 400 or response.headers.get('X-Amz-Function-Error'):
+            raise Exception('Lambda process returned error status code: %s. Result: %s. Output:\n%s' %
+                (response.status_code, result, log_output))
+        return result, log_output
+
+    def close(self):
+        self.session.close()
+
+
 class LambdaExecutorContainers(LambdaExecutor):
     """ Abstract executor class for executing Lambda functions in Docker containers """
 
     def prepare_execution(self, func_arn, env_vars, runtime, command, handler, lambda_cwd):
         raise Exception('Not implemented')
 
+    def invoke_runtime_server(self, func_arn, env_vars, runtime, handler, lambda_cwd, event_body):
+        """ Invoke the function via a runtime server running in a container, if supported by the executor.
+            Returns a tuple (result, log_output), or None if the function should be run by a command instead. """
+        return None
+
     def _docker_cmd(self):
         """ Return the string to be used for running Docker commands. """
         return config.DOCKER_CMD
@@ -221,6 +235,11 @@ class LambdaExecutorContainers(LambdaExecutor):
             command = ("bash -c 'cd %s; java %s -cp \".:`ls *.jar | tr \"\\n\" \":\"`\" \"%s\" \"%s\" \"%s\"'" %
                 (taskdir, java_opts, LAMBDA_EXECUTOR_CLASS, handler, LAMBDA_EVENT_FILE))
 
+        if not command:
+            result = self.invoke_runtime_server(func_arn, environment, runtime, handler, lambda_cwd, event_body)
+            if result is not None:
+                return result
+
         # determine the command to be executed (implemented by subclasses)
         cmd = self.prepare_execution(func_arn, environment, runtime, command, handler, lambda_cwd)
 
@@ -237,8 +256,10 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
 
     def __init__(self):
         super(LambdaExecutorReuseContainers, self).__init__()
-        # locking thread for creation/destruction of docker containers.
+        # locking thread for reserving docker containers (and ports), as well as for removing all containers
         self.docker_container_lock = threading.RLock()
+        # maps container names to the locks for creating/destroying the individual containers
+        self.container_locks = {}
 
         # On each invocation we try to construct a port unlikely to conflict
         # with a previously invoked lambda function. This is a problem with at
@@ -248,19 +269,58 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
         self.max_port = LAMBDA_SERVER_UNIQUE_PORTS
         self.port_offset = LAMBDA_SERVER_PORT_OFFSET
 
-    def prepare_execution(self, func_arn, env_vars, runtime, command, handler, lambda_cwd):
+        # maps runtimes to the names of idle containers without function code (see LAMBDA_WARM_CONTAINERS)
+        self.warm_containers = {}
+        # maps runtimes to the number of warm containers currently being started
+        self.warm_containers_pending = {}
+        # locking thread for the pool of warm containers (separate from the container lock, to not block invocations)
+        self.warm_pool_lock = threading.RLock()
+        # maps runtimes to the entry points of their images
+        self.entry_points = {}
+
+        # maps function ARNs to dicts of container index -> number of invocations in flight (see LAMBDA_MAX_CONTAINERS)
+        self.function_containers = {}
+        # maps (function ARN, container index) tuples to the last time (in ms) an invocation finished in the container
+        self.container_release_times = {}
+        # locking thread for assigning invocations to containers
+        self.function_containers_lock = threading.RLock()
+        # names of the containers which have been primed and are known to be running
+        self.running_containers = set()
+        # holds the index of the container assigned to the invocation running in the current thread
+        self.invocation = threading.local()
+        # maps container names to the runtime servers of containers started in stay-open mode
+        self.runtime_servers = {}
 
-        # check whether the Lambda has been invoked before
-        has_been_invoked_before = func_arn in self.function_invoke_times
+    def _execute(self, func_arn, func_details, event, context=None, version=None):
+        index = self.acquire_container(func_arn, func_details)
+        self.invocation.container_index = index
+        try:
+            return super(LambdaExecutorReuseContainers, self)._execute(func_arn, func_details, event, context, version)
+        except Exception:
+            # the container may have been removed in the meantime, verify its status on the next invocation
+            self.running_containers.discard(self.get_container_name(func_arn, index))
+            raise
+        finally:
+            self.invocation.container_index = None
+            self.release_container(func_arn, index)
+
+    def prepare_execution(self, func_arn, env_vars, runtime, command, handler, lambda_cwd):
 
         # Choose a port for this invocation
         with self.docker_container_lock:
             env_vars['_LAMBDA_SERVER_PORT'] = str(self.next_port + self.port_offset)
             self.next_port = (self.next_port + 1) % self.max_port
 
-        # create/verify the docker container is running.
-        LOG.debug('Priming docker container with runtime "%s" and arn "%s".', runtime, func_arn)
-        container_info = self.prime_docker_container(runtime, func_arn, env_vars.items(), lambda_cwd)
+        index = getattr(self.invocation, 'container_index', None) or 0
+        container_name = self.get_container_name(func_arn, index)
+        if container_name in self.running_containers:
+            # avoid the (serialized) status checks for containers which are known to be running
+            container_info = ContainerInfo(container_name, self.get_entry_point(runtime))
+            metrics.observe('lambda', 'ContainerStart', 'hot', 0)
+        else:
+            # create/verify the docker container is running.
+            LOG.debug('Priming docker container with runtime "%s" and arn "%s".', runtime, func_arn)
+            container_info = self.prime_docker_container(runtime, func_arn, env_vars.items(), lambda_cwd, index)
 
         # Note: currently "docker exec" does not support --env-file, i.e., environment variables can only be
         # passed directly on the command line, using "-e" below. TODO: Update this code once --env-file is
@@ -270,15 +330,12 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
         if not command:
             command = '%s %s' % (container_info.entry_point, handler)
 
-        # determine files to be copied into the container
+        # determine files to be copied into the container (the code is copied when priming the container)
         copy_command = ''
         docker_cmd = self._docker_cmd()
         event_file = os.path.join(lambda_cwd, LAMBDA_EVENT_FILE)
-        if not has_been_invoked_before:
-            # if this is the first invocation: copy the entire folder into the container
-            copy_command = '%s cp "%s/." "%s:/var/task";' % (docker_cmd, lambda_cwd, container_info.name)
-        elif os.path.exists(event_file):
-            # otherwise, copy only the event file if it exists
+        if os.path.exists(event_file):
+            # copy only the event file if it exists
             copy_command = '%s cp "%s" "%s:/var/task";' % (docker_cmd, event_file, container_info.name)
 
         cmd = (
@@ -292,110 +349,354 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
 
         return cmd
 
+    def invoke_runtime_server(self, func_arn, env_vars, runtime, handler, lambda_cwd, event_body):
+        if not config.LAMBDA_STAY_OPEN_MODE:
+            return None
+        env_vars = dict((k, v) for k, v in env_vars.items() if k not in PER_INVOCATION_ENV_VARS)
+        index = getattr(self.invocation, 'container_index', None) or 0
+        container_name = self.get_container_name(func_arn, index)
+
+        server = self.runtime_servers.get(container_name)
+        if server is None or server.env_vars != env_vars:
+            with self.get_container_lock(container_name):
+                server = self.runtime_servers.get(container_name)
+                if server is None or server.env_vars != env_vars:
+                    # (re-)start the container, as the environment is fixed once the runtime has started
+                    self.destroy_docker_container(func_arn, index)
+                    self.prime_docker_container(runtime, func_arn, env_vars.items(), lambda_cwd, index,
+                        handler=handler)
+                    server = self.runtime_servers[container_name]
+        else:
+            metrics.observe('lambda', 'ContainerStart', 'hot', 0)
+
+        LOG.debug('Invoking runtime server of container "%s" for arn "%s"' % (container_name, func_arn))
+        try:
+            return server.invoke(event_body)
+        except requests.exceptions.ConnectionError:
+            # the container has been stopped in the meantime, restart it on the next invocation
+            if self.runtime_servers.get(container_name) is server:
+                self.runtime_servers.pop(container_name, None)
+            raise
+
+    def start_runtime_server(self, container_name, env_vars):
+        """
+        Waits until the Lambda API of a container started in stay-open mode is available, and registers it.
+        :param container_name: The name of the container.
+        :param env_vars: The environment variables the container has been started with.
+        :return: None
+        """
+        cmd = (
+            '%s inspect %s'
+            ' --format "{{ range .NetworkSettings.Networks }}{{ .IPAddress }} {{ end }}"'
+        ) % (self._docker_cmd(), container_name)
+        LOG.debug(cmd)
+        addresses = run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE).split()
+        if not addresses:
+            raise Exception('Unable to determine IP address of container "%s"' % container_name)
+        url = 'http://%s:%s' % (addresses[0], LAMBDA_API_PORT_STAY_OPEN)
+        wait_for_port_open(url, retries=100, sleep_time=0.1)
+        self.runtime_servers[container_name] = RuntimeServer(container_name,
+            '%s/2015-03-31/functions/function/invocations' % url, dict(env_vars))
+
     def startup(self):
         self.cleanup()
         # start a process to remove idle containers
         self.start_idle_container_destroyer_interval()
+        for runtime in config.LAMBDA_WARM_RUNTIMES.split(','):
+            if runtime.strip():
+                self.fill_warm_pool(runtime.strip())
+
+    def prepare_function(self, func_details):
+        if func_details.runtime:
+            self.fill_warm_pool(func_details.runtime)
 
     def cleanup(self, arn=None):
         if arn:
             self.function_invoke_times.pop(arn, None)
-            return self.destroy_docker_container(arn)
+            with self.function_containers_lock:
+                indexes = set(self.function_containers.pop(arn, {})) | set([0])
+                for index in indexes:
+                    self.container_release_times.pop((arn, index), None)
+            for index in indexes:
+                self.destroy_docker_container(arn, index)
+            return
         self.function_invoke_times = {}
+        self.running_containers.clear()
+        self.runtime_servers.clear()
+        with self.function_containers_lock:
+            self.function_containers = {}
+            self.container_release_times = {}
+        with self.warm_pool_lock:
+            self.warm_containers = {}
         return self.destroy_existing_docker_containers()
 
-    def prime_docker_container(self, runtime, func_arn, env_vars, lambda_cwd):
+    def get_max_containers(self, func_details):
+        """
+        Returns the max. number of containers for a function, i.e., LAMBDA_MAX_CONTAINERS or the reserved
+        concurrency of the function (whichever is smaller).
+        :param func_details: The details of the lambda function.
+        :return: The max. number of containers (at least 1).
+        """
+        result = config.LAMBDA_MAX_CONTAINERS
+        reserved = (getattr(func_details, 'concurrency', None) or {}).get('ReservedConcurrentExecutions')
+        if reserved is not None:
+            result = min(result, int(reserved))
+        return max(result, 1)
+
+    def acquire_container(self, func_arn, func_details):
+        """
+        Assigns an invocation to a container of the function. Idle containers are preferred (the most recently
+        used one, such that surplus containers become idle and are removed), then new containers are added up
+        to the max. number of containers, otherwise the invocation shares the least busy container.
+        :param func_arn: The ARN of the lambda function.
+        :param func_details: The details of the lambda function.
+        :return: The index of the container (see get_container_name).
+        """
+        max_containers = self.get_max_containers(func_details)
+        with self.function_containers_lock:
+            containers = self.function_containers.setdefault(func_arn, {})
+            idle = [index for index, in_flight in containers.items() if not in_flight]
+            if idle:
+                index = max(idle, key=lambda i: self.container_release_times.get((func_arn, i), 0))
+            elif len(containers) < max_containers:
+                index = min(set(range(len(containers) + 1)) - set(containers))
+            else:
+                index = min(containers, key=lambda i: containers[i])
+            containers[index] = containers.get(index, 0) + 1
+            return index
+
+    def release_container(self, func_arn, index):
+        with self.function_containers_lock:
+            containers = self.function_containers.get(func_arn)
+            if containers and index in containers:
+                containers[index] -= 1
+                self.container_release_times[(func_arn, index)] = int(time.time() * 1000)
+
+    def get_container_lock(self, container_name):
+        """
+        Returns the lock for creating/destroying the given container, such that containers of different
+        functions (or different containers of the same function) can be started concurrently.
+        :param container_name: The name of the container.
+        :return: The lock of the container.
+        """
+        with self.docker_container_lock:
+            return self.container_locks.setdefault(container_name, threading.RLock())
+
+    def prime_docker_container(self, runtime, func_arn, env_vars, lambda_cwd, index=0, handler=None):
         """
         Prepares a persistent docker container for a specific function.
         :param runtime: Lamda runtime environment. python2.7, nodejs6.10, etc.
         :param func_arn: The ARN of the lambda function.
         :param env_vars: The environment variables for the lambda.
         :param lambda_cwd: The local directory containing the code for the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
+        :param handler: The handler of the function, to start the container in stay-open mode.
         :return: ContainerInfo class containing the container name and default entry point.
         """
-        with self.docker_container_lock:
-            # Get the container name and id.
-            container_name = self.get_container_name(func_arn)
-            docker_cmd = self._docker_cmd()
-
-            status = self.get_docker_container_status(func_arn)
+        # Get the container name and id.
+        container_name = self.get_container_name(func_arn, index)
+        with self.get_container_lock(container_name):
+            start_time = time.time()
+            status = self.get_docker_container_status(func_arn, index)
             LOG.debug('Priming docker container (status "%s"): %s' % (status, container_name))
 
+            start_type = 'hot'
             # Container is not running or doesn't exist.
             if status < 1:
                 # Make sure the container does not exist in any form/state.
-                self.destroy_docker_container(func_arn)
+                self.destroy_docker_container(func_arn, index)
+
+                if handler:
+                    # the runtime is started with the container, hence warm containers cannot be used
+                    start_type = 'cold'
+                    env_vars = list(env_vars)
+                    self.create_docker_container(container_name, runtime, env_vars, handler=handler)
+                    self.copy_function_code(container_name, lambda_cwd)
+                    self.start_docker_container(container_name)
+                    self.start_runtime_server(container_name, env_vars)
+                elif self.claim_warm_container(runtime, container_name):
+                    start_type = 'warm'
+                    self.copy_function_code(container_name, lambda_cwd)
+                else:
+                    start_type = 'cold'
+                    # Create and start the container
+                    self.create_docker_container(container_name, runtime, env_vars)
+                    self.copy_function_code(container_name, lambda_cwd)
+                    self.start_docker_container(container_name)
+                    self.wait_for_docker_container(func_arn, index)
+                if not handler:
+                    # replace the claimed warm container (or start the pool, if the runtime has not been used before)
+                    self.fill_warm_pool(runtime)
+
+            entry_point = self.get_entry_point(runtime)
+
+            container_network = self.get_docker_container_network(func_arn, index)
+            self.running_containers.add(container_name)
+
+            duration = time.time() - start_time
+            metrics.observe('lambda', 'ContainerStart', start_type, duration)
+            if start_type != 'hot':
+                LOG.debug('Started %s container "%s" in %.3f secs' % (start_type, container_name, duration))
 
-                env_vars_str = ' '.join(['-e {}={}'.format(k, cmd_quote(v)) for (k, v) in env_vars])
+            LOG.debug('Using entrypoint "%s" for container "%s" on network "%s".'
+                % (entry_point, container_name, container_network))
 
-                network = config.LAMBDA_DOCKER_NETWORK
-                network_str = ' --network="%s" ' % network if network else ''
+            return ContainerInfo(container_name, entry_point)
 
-                # Create and start the container
-                LOG.debug('Creating container: %s' % container_name)
-                cmd = (
-                    '%s create'
-                    ' --rm'
-                    ' --name "%s"'
-                    ' --entrypoint /bin/bash'  # Load bash when it starts.
-                    ' --interactive'  # Keeps the container running bash.
-                    ' -e AWS_LAMBDA_EVENT_BODY="$AWS_LAMBDA_EVENT_BODY"'
-                    ' -e HOSTNAME="$HOSTNAME"'
-                    ' -e LOCALSTACK_HOSTNAME="$LOCALSTACK_HOSTNAME"'
-                    '  %s'  # env_vars
-                    '  %s'  # network
-                    ' lambci/lambda:%s'
-                ) % (docker_cmd, container_name, env_vars_str, network_str, runtime)
-                LOG.debug(cmd)
-                run(cmd)
+    def create_docker_container(self, container_name, runtime, env_vars=(), handler=None):
+        docker_cmd = self._docker_cmd()
+        env_vars_str = ' '.join(['-e {}={}'.format(k, cmd_quote(v)) for (k, v) in env_vars])
 
-                LOG.debug('Copying files to container "%s" from "%s".' % (container_name, lambda_cwd))
-                cmd = (
-                    '%s cp'
-                    ' "%s/." "%s:/var/task"'
-                ) % (docker_cmd, lambda_cwd, container_name)
-                LOG.debug(cmd)
-                run(cmd)
+        network = config.LAMBDA_DOCKER_NETWORK
+        network_str = ' --network="%s" ' % network if network else ''
 
-                LOG.debug('Starting container: %s' % container_name)
-                cmd = '%s start %s' % (docker_cmd, container_name)
-                LOG.debug(cmd)
-                run(cmd)
-                # give the container some time to start up
-                time.sleep(1)
+        if handler:
+            # run the runtime of the image, serving invocations via the Lambda API until the container is stopped
+            entrypoint_str = ' -e DOCKER_LAMBDA_STAY_OPEN=1'
+            command_str = ' %s' % cmd_quote(handler)
+        else:
+            # Load bash when it starts, and keep the container running bash.
+            entrypoint_str = ' --entrypoint /bin/bash --interactive'
+            command_str = ''
+
+        LOG.debug('Creating container: %s' % container_name)
+        cmd = (
+            '%s create'
+            ' --rm'
+            ' --name "%s"'
+            '%s'  # entrypoint
+            ' -e AWS_LAMBDA_EVENT_BODY="$AWS_LAMBDA_EVENT_BODY"'
+            ' -e HOSTNAME="$HOSTNAME"'
+            ' -e LOCALSTACK_HOSTNAME="$LOCALSTACK_HOSTNAME"'
+            '  %s'  # env_vars
+            '  %s'  # network
+            ' lambci/lambda:%s%s'
+        ) % (docker_cmd, container_name, entrypoint_str, env_vars_str, network_str, runtime, command_str)
+        LOG.debug(cmd)
+        run(cmd)
+
+    def copy_function_code(self, container_name, lambda_cwd):
+        LOG.debug('Copying files to container "%s" from "%s".' % (container_name, lambda_cwd))
+        cmd = (
+            '%s cp'
+            ' "%s/." "%s:/var/task"'
+        ) % (self._docker_cmd(), lambda_cwd, container_name)
+        LOG.debug(cmd)
+        run(cmd)
+
+    def start_docker_container(self, container_name):
+        LOG.debug('Starting container: %s' % container_name)
+        cmd = '%s start %s' % (self._docker_cmd(), container_name)
+        LOG.debug(cmd)
+        run(cmd)
+
+    def wait_for_docker_container(self, func_arn, index=0, retries=50, sleep=0.1):
+        """
+        Waits until a docker container which has been started is up and running.
+        :param func_arn: The ARN of the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
+        :param retries: The max. number of status checks after the first one.
+        :param sleep: The time (in secs) between the status checks.
+        :return: None
+        """
+        def check_running():
+            if self.get_docker_container_status(func_arn, index) != 1:
+                raise Exception('Container "%s" is not running' % self.get_container_name(func_arn, index))
+
+        retry(check_running, retries=retries, sleep=sleep)
 
-            # Get the entry point for the image.
+    def get_entry_point(self, runtime):
+        """
+        Returns the entry point of the image for the given runtime (cached, as images do not change at runtime).
+        :param runtime: Lamda runtime environment. python2.7, nodejs6.10, etc.
+        :return: The entry point of the lambci/lambda image for the runtime.
+        """
+        entry_point = self.entry_points.get(runtime)
+        if entry_point is None:
             LOG.debug('Getting the entrypoint for image: lambci/lambda:%s' % runtime)
             cmd = (
                 '%s image inspect'
                 ' --format="{{ .ContainerConfig.Entrypoint }}"'
                 ' lambci/lambda:%s'
-            ) % (docker_cmd, runtime)
+            ) % (self._docker_cmd(), runtime)
 
             LOG.debug(cmd)
             run_result = run(cmd)
 
-            entry_point = run_result.strip('[]\n\r ')
-
-            container_network = self.get_docker_container_network(func_arn)
+            entry_point = self.entry_points[runtime] = run_result.strip('[]\n\r ')
+        return entry_point
 
-            LOG.debug('Using entrypoint "%s" for container "%s" on network "%s".'
-                % (entry_point, container_name, container_network))
+    def claim_warm_container(self, runtime, container_name):
+        """
+        Takes an idle container of the given runtime from the warm pool, and renames it to the given name.
+        :param runtime: Lamda runtime environment. python2.7, nodejs6.10, etc.
+        :param container_name: The name of the container for the function.
+        :return: True if a warm container has been claimed, False otherwise.
+        """
+        while True:
+            with self.warm_pool_lock:
+                containers = self.warm_containers.get(runtime)
+                if not containers:
+                    return False
+                warm_container_name = containers.pop(0)
+            LOG.debug('Claiming warm container "%s" as "%s"' % (warm_container_name, container_name))
+            cmd = '%s rename %s %s' % (self._docker_cmd(), warm_container_name, container_name)
+            try:
+                run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE)
+                return True
+            except Exception as e:
+                # the container may have been removed in the meantime, try the next one
+                LOG.debug('Unable to claim warm container "%s": %s' % (warm_container_name, e))
 
-            return ContainerInfo(container_name, entry_point)
+    def fill_warm_pool(self, runtime):
+        """
+        Starts idle containers for the given runtime in the background, until LAMBDA_WARM_CONTAINERS
+        containers are available in the warm pool.
+        :param runtime: Lamda runtime environment. python2.7, nodejs6.10, etc.
+        :return: None
+        """
+        if config.LAMBDA_WARM_CONTAINERS <= 0 or config.LAMBDA_STAY_OPEN_MODE:
+            return
+        with self.warm_pool_lock:
+            pending = self.warm_containers_pending.get(runtime, 0)
+            missing = config.LAMBDA_WARM_CONTAINERS - len(self.warm_containers.get(runtime, [])) - pending
+            if missing <= 0:
+                return
+            self.warm_containers_pending[runtime] = pending + missing
+        FuncThread(self.start_warm_containers, (runtime, missing)).start()
+
+    def start_warm_containers(self, params):
+        runtime, count = params
+        for i in range(count):
+            container_name = 'localstack_lambda_warm_%s_%s' % (re.sub(r'[^a-zA-Z0-9_.-]', '_', runtime), short_uid())
+            try:
+                self.create_docker_container(container_name, runtime)
+                self.start_docker_container(container_name)
+                with self.warm_pool_lock:
+                    self.warm_containers.setdefault(runtime, []).append(container_name)
+            except Exception as e:
+                LOG.warning('Unable to start warm container for runtime "%s": %s' % (runtime, e))
+            finally:
+                with self.warm_pool_lock:
+                    self.warm_containers_pending[runtime] -= 1
 
-    def destroy_docker_container(self, func_arn):
+    def destroy_docker_container(self, func_arn, index=0):
         """
         Stops and/or removes a docker container for a specific lambda function ARN.
         :param func_arn: The ARN of the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
         :return: None
         """
-        with self.docker_container_lock:
-            status = self.get_docker_container_status(func_arn)
+        # Get the container name and id.
+        container_name = self.get_container_name(func_arn, index)
+        with self.get_container_lock(container_name):
+            status = self.get_docker_container_status(func_arn, index)
             docker_cmd = self._docker_cmd()
 
-            # Get the container name and id.
-            container_name = self.get_container_name(func_arn)
+            self.running_containers.discard(container_name)
+            server = self.runtime_servers.pop(container_name, None)
+            if server:
+                server.close()
 
             if status == 1:
                 LOG.debug('Stopping container: %s' % container_name)
@@ -406,7 +707,7 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
                 LOG.debug(cmd)
                 run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE)
 
-                status = self.get_docker_container_status(func_arn)
+                status = self.get_docker_container_status(func_arn, index)
 
             if status == -1:
                 LOG.debug('Removing container: %s' % container_name)
@@ -449,70 +750,72 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
                 LOG.debug(cmd)
                 run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE)
 
-    def get_docker_container_status(self, func_arn):
+    def get_docker_container_status(self, func_arn, index=0):
         """
         Determine the status of a docker container.
         :param func_arn: The ARN of the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
         :return: 1 If the container is running,
         -1 if the container exists but is not running
         0 if the container does not exist.
         """
-        with self.docker_container_lock:
-            # Get the container name and id.
-            container_name = self.get_container_name(func_arn)
-
-            # Check if the container is already running
-            # Note: filtering by *exact* name using regex filter '^...$' seems unstable on some
-            # systems. Therefore, we use a combination of filter and grep to get the results.
-            cmd = ("docker ps -a --filter name='%s' "
-                   '--format "{{ .Status }} - {{ .Names }}" '
-                   '| grep -w "%s" | cat') % (container_name, container_name)
-            LOG.debug('Getting status for container "%s": %s' % (container_name, cmd))
-            cmd_result = run(cmd)
-
-            # If the container doesn't exist. Create and start it.
-            container_status = cmd_result.strip()
-
-            if len(container_status) == 0:
-                return 0
-
-            if container_status.lower().startswith('up '):
-                return 1
-
-            return -1
-
-    def get_docker_container_network(self, func_arn):
+        # Get the container name and id.
+        container_name = self.get_container_name(func_arn, index)
+
+        # Check if the container is already running
+        # Note: filtering by *exact* name using regex filter '^...$' seems unstable on some
+        # systems. Therefore, we filter by name and match the exact name in the results
+        # (the names of the other containers of the function contain this name as a prefix).
+        cmd = ("docker ps -a --filter name='%s' "
+               '--format "{{ .Status }} - {{ .Names }}"') % container_name
+        LOG.debug('Getting status for container "%s": %s' % (container_name, cmd))
+        cmd_result = run(cmd)
+
+        # If the container doesn't exist. Create and start it.
+        container_status = ''
+        for line in cmd_result.strip().split('\n'):
+            status, _, name = line.rpartition(' - ')
+            if name.strip() == container_name:
+                container_status = status.strip()
+
+        if len(container_status) == 0:
+            return 0
+
+        if container_status.lower().startswith('up '):
+            return 1
+
+        return -1
+
+    def get_docker_container_network(self, func_arn, index=0):
         """
         Determine the network of a docker container.
         :param func_arn: The ARN of the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
         :return: name of the container network
         """
+        status = self.get_docker_container_status(func_arn, index)
 
-        with self.docker_container_lock:
-
-            status = self.get_docker_container_status(func_arn)
-
-            # container does not exist
-            if status == 0:
-                return ''
+        # container does not exist
+        if status == 0:
+            return ''
 
-            # Get the container name.
-            container_name = self.get_container_name(func_arn)
-            docker_cmd = self._docker_cmd()
+        # Get the container name.
+        container_name = self.get_container_name(func_arn, index)
+        docker_cmd = self._docker_cmd()
 
-            # Get the container network
-            LOG.debug('Getting container network: %s' % container_name)
-            cmd = (
-                '%s inspect %s'
-                ' --format "{{ .HostConfig.NetworkMode }}"'
-            ) % (docker_cmd, container_name)
+        # Get the container network
+        LOG.debug('Getting container network: %s' % container_name)
+        cmd = (
+            '%s inspect %s'
+            ' --format "{{ .HostConfig.NetworkMode }}"'
+        ) % (docker_cmd, container_name)
 
-            LOG.debug(cmd)
-            cmd_result = run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE)
+        LOG.debug(cmd)
+        cmd_result = run(cmd, asynchronous=False, stderr=subprocess.PIPE, outfile=subprocess.PIPE)
 
-            container_network = cmd_result.strip()
+        container_network = cmd_result.strip()
 
-            return container_network
+        return container_network
 
     def idle_container_destroyer(self):
         """
@@ -522,15 +825,24 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
         """
         LOG.info('Checking if there are idle containers.')
         current_time = int(time.time() * 1000)
-        for func_arn, last_run_time in dict(self.function_invoke_times).items():
-            duration = current_time - last_run_time
-
-            # not enough idle time has passed
-            if duration < MAX_CONTAINER_IDLE_TIME_MS:
-                continue
-
+        idle_containers = []
+        with self.function_containers_lock:
+            for (func_arn, index), last_run_time in list(self.container_release_times.items()):
+                duration = current_time - last_run_time
+                containers = self.function_containers.get(func_arn, {})
+
+                # not enough idle time has passed, or invocations are in progress
+                if duration < MAX_CONTAINER_IDLE_TIME_MS or containers.get(index):
+                    continue
+
+                # remove the container from the function, so that no further invocations are assigned to it
+                containers.pop(index, None)
+                del self.container_release_times[(func_arn, index)]
+                idle_containers.append((func_arn, index))
+
+        for func_arn, index in idle_containers:
             # container has been idle, destroy it.
-            self.destroy_docker_container(func_arn)
+            self.destroy_docker_container(func_arn, index)
 
     def start_idle_container_destroyer_interval(self):
         """
@@ -541,13 +853,16 @@ class LambdaExecutorReuseContainers(LambdaExecutorContainers):
         self.idle_container_destroyer()
         threading.Timer(60.0, self.start_idle_container_destroyer_interval).start()
 
-    def get_container_name(self, func_arn):
+    def get_container_name(self, func_arn, index=0):
         """
         Given a function ARN, returns a valid docker container name.
         :param func_arn: The ARN of the lambda function.
+        :param index: The index of the container, if the function runs in multiple containers.
         :return: A docker compatible name for the arn.
         """
-        return 'localstack_lambda_' + re.sub(r'[^a-zA-Z0-9_.-]', '_', func_arn)
+        name = 'localstack_lambda_' + re.sub(r'[^a-zA-Z0-9_.-]', '_', func_arn)
+        # note: function names cannot contain dots, hence the names cannot clash with other functions
+        return '%s.%s' % (name, index) if index else name
 
 
 class LambdaExecutorSeparateContainers(LambdaExecutorContainers):
@@ -605,7 +920,63 @@ class LambdaExecutorSeparateContainers(LambdaExecutorContainers):
 
 class LambdaExecutorLocal(LambdaExecutor):
 
+    def __init__(self):
+        super(LambdaExecutorLocal, self).__init__()
+        # pool of worker processes running Python handlers (see LAMBDA_LOCAL_WORKERS), created lazily
+        self.worker_pool = None
+        self.worker_pool_lock = threading.RLock()
+
+    def startup(self):
+        if config.LAMBDA_LOCAL_WORKERS > 0:
+            self.get_worker_pool().start()
+
+    def cleanup(self, arn=None):
+        # workers reload the code of updated functions based on the code hash, hence only a full cleanup stops them
+        if arn is None:
+            with self.worker_pool_lock:
+                pool, self.worker_pool = self.worker_pool, None
+            if pool:
+                pool.shutdown()
+
+    def get_worker_pool(self):
+        with self.worker_pool_lock:
+            if self.worker_pool is None:
+                self.worker_pool = lambda_workers.LambdaWorkerPool(config.LAMBDA_LOCAL_WORKERS)
+            return self.worker_pool
+
+    def get_worker_request(self, func_arn, func_details, event, context=None, version=None):
+        """ Return the request to run the invocation in a worker process, or None if the function
+            cannot be run by the workers (e.g., for non-Python runtimes, or outdated function versions). """
+        runtime = func_details.runtime or ''
+        if config.LAMBDA_LOCAL_WORKERS <= 0 or not runtime.startswith('python') or not func_details.cwd:
+            return None
+        code_sha = func_details.get_version(func_details.get_qualifier_version(version)).get('CodeSha256')
+        if code_sha != func_details.get_version('$LATEST').get('CodeSha256'):
+            # the working directory only contains the latest code of the function
+            return None
+        handler = func_details.handler or 'handler.handler'
+        main_file = '%s/%s.py' % (func_details.cwd, handler.split('.')[0])
+        if not os.path.isfile(main_file):
+            return None
+        handler_function = handler.split('.')[-1]
+        context_attrs = dict((k, v) for k, v in (context.__dict__ if context else {}).items()
+            if isinstance(v, (six.string_types, six.integer_types, float, bool)) and not k.startswith('_'))
+        return {
+            'key': lambda_workers.get_handler_key(func_arn, code_sha, main_file, handler_function),
+            'main_file': main_file,
+            'handler_function': handler_function,
+            'cwd': func_details.cwd,
+            'env': func_details.envvars,
+            'event': event,
+            'context': context_attrs,
+            'timeout': func_details.timeout or 60
+        }
+
     def _execute(self, func_arn, func_details, event, context=None, version=None):
+        request = self.get_worker_request(func_arn, func_details, event, context, version)
+        if request:
+            return self.get_worker_pool().invoke(request)
+
         lambda_cwd = func_details.cwd
         environment = func_details.envvars.copy()
 
@@ -0,0 +1,264 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from localstack import config
+from localstack.utils.aws import aws_stack
+from localstack.utils.common import short_uid
+from localstack.utils.server import metrics
+
+# limits of a single PutLogEvents request (the size of an event is the UTF-8 size of its message plus 26 bytes)
+MAX_BATCH_EVENTS = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD_BYTES = 26
+
+# policies for log events submitted while the buffer is full (see LAMBDA_LOGS_BUFFER_POLICY)
+POLICY_DROP = 'drop'
+POLICY_BLOCK = 'block'
+
+# logger
+LOG = logging.getLogger(__name__)
+
+
+class LogShipper(object):
+    """ Ships the log output of Lambda invocations to CloudWatch Logs in a background thread, such that the
+        latency of invocations does not depend on the logs backend. Events are buffered and shipped in batches
+        across invocations, once a full PutLogEvents request has been buffered or once the oldest buffered event
+        has waited for the flush interval. Log groups and streams are created on first use, and cached. If the
+        buffer is full, further events are dropped, or the invocations wait for space (depending on the policy). """
+
+    def __init__(self, buffer_size, flush_interval, policy=POLICY_DROP):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.condition = threading.Condition()
+        # (log group name, events, size, enqueued time) tuples of the buffered invocations
+        self.buffer = deque()
+        self.buffered_events = 0
+        self.buffered_bytes = 0
+        self.shipping = False
+        self.flush_requested = False
+        # maps (log group name, day) tuples to the log stream names of the shipper
+        self.log_streams = {}
+        self.known_groups = set()
+        self.known_streams = set()
+        self.stats = {}
+        self.thread = None
+        self.stopped = False
+
+    def submit(self, log_group_name, events):
+        """ Buffer the log events of an invocation for shipping, and return whether they have been accepted. """
+        if not events:
+            return True
+        size = sum(get_event_size(event) for event in events)
+        with self.condition:
+            while self.buffered_events and self.buffered_events + len(events) > self.buffer_size:
+                if self.policy != POLICY_BLOCK or self.stopped:
+                    if not self.stats.get(log_group_name, {}).get('dropped'):
+                        LOG.warning('Buffer of Lambda log events is full, dropping events of log group %s' %
+                            log_group_name)
+                    self._increment(log_group_name, 'dropped', len(events))
+                    return False
+                self.condition.wait()
+            self.buffer.append((log_group_name, events, size, time.time()))
+            self.buffered_events += len(events)
+            self.buffered_bytes += size
+            self._increment(log_group_name, 'submitted', len(events))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+            if (len(self.buffer) == 1 or self.buffered_events >= MAX_BATCH_EVENTS or
+                    self.buffered_bytes >= MAX_BATCH_BYTES):
+                # wake up the shipper, to wait for the flush interval of the first event, or to ship a full batch
+                self.condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """ Ship all buffered events, and wait until they have been shipped (or until the timeout has passed). """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            while self.buffer or self.shipping:
+                remaining = None if deadline is None else deadline - time.time()
+                if (remaining is not None and remaining <= 0) or self.thread is None:
+                    break
+                self.condition.wait(remaining)
+            self.flush_requested = False
+            return not (self.buffer or self.shipping)
+
+    def shutdown(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def get_client(self):
+        return aws_stack.connect_to_service('logs')
+
+    def get_stats(self):
+        """ Return the statistics of the shipper, keyed by log group name. """
+        with self.condition:
+            return dict((log_group_name, dict(counters)) for log_group_name, counters in self.stats.items())
+
+    def get_log_stream_name(self, log_group_name, timestamp):
+        """ Return the log stream of the shipper for events of the given log group and day (similar to the
+            streams of the execution environments of functions in AWS, which are used for many invocations). """
+        time_str = time.strftime('%Y/%m/%d', time.gmtime(timestamp / 1000.0))
+        key = (log_group_name, time_str)
+        log_stream_name = self.log_streams.get(key)
+        if not log_stream_name:
+            log_stream_name = self.log_streams[key] = '%s/[$LATEST]%s' % (time_str, short_uid())
+        return log_stream_name
+
+    def ship(self, entries):
+        """ Ship the given buffered entries, with one or more PutLogEvents requests per log group and stream. """
+        groups = OrderedDict()
+        for log_group_name, events, size, enqueued in entries:
+            groups.setdefault(log_group_name, []).extend(events)
+        client = self.get_client()
+        for log_group_name, events in groups.items():
+            try:
+                self.put_log_events(client, log_group_name, events)
+                self._increment(log_group_name, 'shipped', len(events))
+            except Exception as e:
+                self._increment(log_group_name, 'failed', len(events))
+                LOG.info('Unable to ship %s Lambda log events to log group %s: %s' % (len(events), log_group_name, e))
+
+    def put_log_events(self, client, log_group_name, events):
+        streams = OrderedDict()
+        for event in sorted(events, key=lambda e: e['timestamp']):
+            log_stream_name = self.get_log_stream_name(log_group_name, event['timestamp'])
+            streams.setdefault(log_stream_name, []).append(event)
+        for log_stream_name, stream_events in streams.items():
+            for batch in get_batches(stream_events):
+                try:
+                    self.ensure_log_stream(client, log_group_name, log_stream_name)
+                    client.put_log_events(logGroupName=log_group_name, logStreamName=log_stream_name,
+                        logEvents=batch)
+                except client.exceptions.ResourceNotFoundException:
+                    # the log group or stream has been deleted in the meantime, create it again
+                    self.known_groups.discard(log_group_name)
+                    self.known_streams.discard((log_group_name, log_stream_name))
+                    self.ensure_log_stream(client, log_group_name, log_stream_name)
+                    client.put_log_events(logGroupName=log_group_name, logStreamName=log_stream_name,
+                        logEvents=batch)
+                self._increment(log_group_name, 'batches')
+
+    def ensure_log_stream(self, client, log_group_name, log_stream_name):
+        """ Create the log group and stream, unless they are known to exist. """
+        if log_group_name not in self.known_groups:
+            try:
+                client.create_log_group(logGroupName=log_group_name)
+            except client.exceptions.ResourceAlreadyExistsException:
+                pass
+            self.known_groups.add(log_group_name)
+        if (log_group_name, log_stream_name) not in self.known_streams:
+            try:
+                client.create_log_stream(logGroupName=log_group_name, logStreamName=log_stream_name)
+            except client.exceptions.ResourceAlreadyExistsException:
+                pass
+            self.known_streams.add((log_group_name, log_stream_name))
+
+    def _is_ready(self, now):
+        """ Return whether the buffered events should be shipped now. Must be called with the lock held. """
+        if not self.buffer:
+            return False
+        return (self.flush_requested or self.stopped or self.buffered_events >= MAX_BATCH_EVENTS or
+            self.buffered_bytes >= MAX_BATCH_BYTES or now >= self.buffer[0][3] + self.flush_interval)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._is_ready(time.time()):
+                    if self.stopped and not self.buffer:
+                        return
+                    self.condition.wait(self.buffer[0][3] + self.flush_interval - time.time() if self.buffer else None)
+                entries = list(self.buffer)
+                self.buffer.clear()
+                self.buffered_events = self.buffered_bytes = 0
+                self.shipping = True
+                # wake up invocations waiting for space in the buffer
+                self.condition.notify_all()
+            try:
+                self.ship(entries)
+            except Exception as e:
+                LOG.info('Unable to ship Lambda log events to CloudWatch Logs: %s' % e)
+            finally:
+                with self.condition:
+                    self.shipping = False
+                    self.condition.notify_all()
+
+    def _increment(self, log_group_name, counter, value=1):
+        with self.condition:
+            counters = self.stats.get(log_group_name)
+            if counters is None:
+                counters = self.stats[log_group_name] = {'submitted': 0, 'shipped': 0, 'dropped': 0, 'failed': 0,
+                    'batches': 0}
+            counters[counter] += value
+
+
+def get_event_size(event):
+    return len(event['message'].encode('utf-8')) + EVENT_OVERHEAD_BYTES
+
+
+def get_batches(events):
+    """ Split the given events into batches within the limits of PutLogEvents. """
+    batch = []
+    batch_bytes = 0
+    for event in events:
+        size = get_event_size(event)
+        if batch and (len(batch) >= MAX_BATCH_EVENTS or batch_bytes + size > MAX_BATCH_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(event)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def get_log_events(log_output, start_time, end_time):
+    """ Return the log events of the output of an invocation, with the timestamps (in millis) spread evenly
+        across the duration of the invocation, as the actual times of the log lines are unknown. """
+    log_lines = log_output.split('\n')
+    time_diff_per_line = float(end_time - start_time) / float(len(log_lines))
+    result = []
+    for i, line in enumerate(log_lines):
+        if not line:
+            continue
+        result.append({'timestamp': int(start_time + float(i) * time_diff_per_line), 'message': line})
+    return result
+
+
+# the log shipper (created lazily, see get_shipper)
+SHIPPER = {}
+
+# mutex for creating the shipper
+SHIPPER_LOCK = threading.Lock()
+
+
+def get_shipper():
+    shipper = SHIPPER.get('shipper')
+    if shipper is None:
+        with SHIPPER_LOCK:
+            shipper = SHIPPER.get('shipper')
+            if shipper is None:
+                shipper = SHIPPER['shipper'] = LogShipper(config.LAMBDA_LOGS_BUFFER_SIZE,
+                    config.LAMBDA_LOGS_FLUSH_INTERVAL, config.LAMBDA_LOGS_BUFFER_POLICY)
+    return shipper
+
+
+def store_logs(func_details, log_output, start_time):
+    """ Submit the log output of an invocation (started at the given time in millis) for shipping to the log
+        group of the function, and return without waiting for CloudWatch Logs. """
+    events = get_log_events(log_output or '', start_time, int(time.time() * 1000))
+    return get_shipper().submit('/aws/lambda/%s' % func_details.name(), events)
+
+
+def get_shipper_stats():
+    shipper = SHIPPER.get('shipper')
+    return shipper.get_stats() if shipper else {}
+
+
+metrics.register_stats('lambda_logs', 'log_group', get_shipper_stats)
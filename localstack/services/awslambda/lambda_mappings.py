@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+
+class EventSourceMappingRegistry(object):
+    """ Registry of event source mappings, indexed by UUID, by event source and by function ARN, such that the
+        mappings of an event source (looked up for each batch of records or messages) are found without scanning
+        all mappings. Mappings are plain dicts, which are returned as is by the API. """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # maps UUIDs to mappings, in the order in which they have been created
+        self.mappings = OrderedDict()
+        # maps source keys (see get_source_key) and function ARNs to dicts of the corresponding mappings by UUID
+        self.by_source = {}
+        self.by_function = {}
+
+    def add(self, mapping):
+        with self.lock:
+            self.remove(mapping['UUID'])
+            self.mappings[mapping['UUID']] = mapping
+            self._index(mapping)
+        return mapping
+
+    def remove(self, mapping_uuid):
+        """ Remove the mapping with the given UUID, and return it (or None if there is none). """
+        with self.lock:
+            mapping = self.mappings.pop(mapping_uuid, None)
+            if mapping is not None:
+                self._unindex(mapping)
+            return mapping
+
+    def remove_function(self, function_arn):
+        """ Remove and return the mappings of the given function. """
+        with self.lock:
+            result = list(self.by_function.get(function_arn, {}).values())
+            for mapping in result:
+                self.remove(mapping['UUID'])
+            return result
+
+    def update(self, mapping_uuid, **attributes):
+        """ Update the attributes of the mapping with the given UUID (re-indexing it, if its function or event
+            source changes), and return it (or None if there is none). """
+        with self.lock:
+            mapping = self.mappings.get(mapping_uuid)
+            if mapping is None:
+                return None
+            self._unindex(mapping)
+            mapping.update(attributes)
+            self._index(mapping)
+            return mapping
+
+    def get(self, mapping_uuid):
+        return self.mappings.get(mapping_uuid)
+
+    def find(self, function_arns=None, source_arn=None):
+        """ Return the mappings of any of the given function ARNs (if any), whose event source ARN starts with the
+            given ARN (if any). The ARN of a DynamoDB table matches the ARNs of the streams of the table. """
+        with self.lock:
+            if function_arns:
+                candidates = []
+                for function_arn in OrderedDict.fromkeys(function_arns):
+                    candidates.extend(self.by_function.get(function_arn, {}).values())
+                if source_arn:
+                    candidates = [m for m in candidates if (m.get('EventSourceArn') or '').startswith(source_arn)]
+            elif source_arn:
+                candidates = self.by_source.get(get_source_key(source_arn), {}).values()
+                candidates = [m for m in candidates if (m.get('EventSourceArn') or '').startswith(source_arn)]
+            else:
+                candidates = list(self.mappings.values())
+            return candidates
+
+    def all(self):
+        with self.lock:
+            return list(self.mappings.values())
+
+    def clear(self):
+        with self.lock:
+            self.mappings.clear()
+            self.by_source.clear()
+            self.by_function.clear()
+
+    def __len__(self):
+        return len(self.mappings)
+
+    def _index(self, mapping):
+        for index, key in ((self.by_source, get_source_key(mapping.get('EventSourceArn'))),
+                (self.by_function, mapping.get('FunctionArn'))):
+            entries = index.get(key)
+            if entries is None:
+                entries = index[key] = OrderedDict()
+            entries[mapping['UUID']] = mapping
+
+    def _unindex(self, mapping):
+        mapping_uuid = mapping['UUID']
+        for index, key in ((self.by_source, get_source_key(mapping.get('EventSourceArn'))),
+                (self.by_function, mapping.get('FunctionArn'))):
+            entries = index.get(key)
+            if entries is not None:
+                entries.pop(mapping_uuid, None)
+                if not entries:
+                    del index[key]
+
+
+def get_source_key(source_arn):
+    """ Return the key of an event source ARN in the registry. DynamoDB stream ARNs (".../table/<name>/stream/
+        <label>") are keyed by the ARN of their table, as the records of table updates refer to the table ARN. """
+    return (source_arn or '').split('/stream/')[0]
@@ -0,0 +1,436 @@
+import time
+import base64
+import logging
+import threading
+from collections import OrderedDict, deque
+from botocore.config import Config
+from localstack import config
+from localstack.utils.aws import aws_stack
+from localstack.utils.common import md5, to_str
+
+# max. number of messages per batch of SQS event sources (limit of the ReceiveMessage API)
+SQS_MAX_BATCH_SIZE = 10
+
+# wait time (in secs) of the long polling ReceiveMessage requests
+SQS_POLL_WAIT_TIME = 20
+
+# visibility timeout (in secs) set for the messages of failed invocations, after which they are received again
+SQS_RETRY_VISIBILITY_TIMEOUT = 1
+
+# time (in secs) to wait before polling again after an error, or while the event source mapping is disabled
+POLL_ERROR_DELAY = 1
+
+# client config for the long polling requests of the pollers, which may run in parallel
+SQS_CLIENT_CONFIG = Config(max_pool_connections=50, read_timeout=SQS_POLL_WAIT_TIME + 10)
+
+# maps the UUIDs of SQS event source mappings to their pollers (see update_pollers)
+SQS_POLLERS = {}
+
+# starting positions of Kinesis event source mappings which start reading from the stream
+KINESIS_READ_POSITIONS = ('TRIM_HORIZON', 'AT_TIMESTAMP')
+
+# max. number of records buffered per shard and event source mapping, before records are read from the stream
+KINESIS_MAX_BUFFERED_RECORDS = 10000
+
+# number of retries of a failed invocation with a batch of Kinesis records, before the batch is skipped
+KINESIS_MAX_RETRIES = 3
+
+# initial delay (in secs) before retrying a failed invocation with a batch of Kinesis records
+KINESIS_RETRY_DELAY = 0.5
+
+# maps (mapping UUID, shard ID) tuples to the processors of Kinesis event source mappings
+KINESIS_PROCESSORS = {}
+
+# UUIDs of the Kinesis event source mappings for which processors have been started (see update_pollers)
+KINESIS_MAPPINGS = set()
+
+# mutex for starting and stopping pollers
+POLLERS_LOCK = threading.RLock()
+
+# logger
+LOG = logging.getLogger(__name__)
+
+
+class SQSEventSourcePoller(object):
+    """ Polls the SQS queue of an event source mapping, and invokes the function with batches of up to
+        `BatchSize` messages. Messages are deleted once the invocation has succeeded, and become visible again
+        shortly after a failed invocation. While the queue returns full batches, additional polling threads are
+        started (up to LAMBDA_SQS_MAX_POLLERS), which stop again once the queue has been drained. """
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.queue_arn = mapping['EventSourceArn']
+        self.region_name = aws_stack.extract_region_from_arn(self.queue_arn)
+        self.queue_url = None
+        self.lock = threading.Lock()
+        self.threads = 0
+        self.stopped = False
+
+    def start(self):
+        self._add_thread()
+
+    def stop(self):
+        self.stopped = True
+
+    def get_client(self):
+        return aws_stack.connect_to_service('sqs', region_name=self.region_name, config=SQS_CLIENT_CONFIG)
+
+    def get_queue_url(self):
+        if not self.queue_url:
+            self.queue_url = aws_stack.get_sqs_queue_url(self.queue_arn)
+        return self.queue_url
+
+    def get_batch_size(self):
+        return min(max(int(self.mapping.get('BatchSize') or SQS_MAX_BATCH_SIZE), 1), SQS_MAX_BATCH_SIZE)
+
+    def poll(self):
+        """ Receive and process a single batch of messages, and return the number of messages received. """
+        client = self.get_client()
+        queue_url = self.get_queue_url()
+        response = client.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=self.get_batch_size(),
+            WaitTimeSeconds=SQS_POLL_WAIT_TIME, AttributeNames=['All'], MessageAttributeNames=['All'])
+        messages = response.get('Messages') or []
+        if not messages:
+            return 0
+        entries = [{'Id': str(i), 'ReceiptHandle': m['ReceiptHandle']} for i, m in enumerate(messages)]
+        if self.stopped:
+            # the mapping has been deleted while polling, make the messages visible again right away
+            self._change_visibility(client, queue_url, entries, 0)
+            return len(messages)
+
+        event = {'Records': [self.to_record(message) for message in messages]}
+        if invoke_function(self.mapping['FunctionArn'], event):
+            client.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+            self.mapping['LastProcessingResult'] = 'OK'
+        else:
+            self._change_visibility(client, queue_url, entries, SQS_RETRY_VISIBILITY_TIMEOUT)
+            self.mapping['LastProcessingResult'] = 'PROBLEM: Function call failed'
+        return len(messages)
+
+    def to_record(self, message):
+        body = message.get('Body') or ''
+        return {
+            'messageId': message['MessageId'],
+            'receiptHandle': message['ReceiptHandle'],
+            'body': body,
+            'attributes': message.get('Attributes') or {},
+            'messageAttributes': format_message_attributes(message.get('MessageAttributes') or {}),
+            'md5OfBody': message.get('MD5OfBody') or md5(body),
+            'eventSource': 'aws:sqs',
+            'eventSourceARN': self.queue_arn,
+            'awsRegion': self.region_name
+        }
+
+    def _change_visibility(self, client, queue_url, entries, timeout):
+        entries = [dict(entry, VisibilityTimeout=timeout) for entry in entries]
+        client.change_message_visibility_batch(QueueUrl=queue_url, Entries=entries)
+
+    def _add_thread(self):
+        with self.lock:
+            if self.stopped or self.threads >= max(config.LAMBDA_SQS_MAX_POLLERS, 1):
+                return
+            self.threads += 1
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while True:
+            count = None
+            if self.mapping.get('State') == 'Enabled':
+                try:
+                    count = self.poll()
+                except Exception as e:
+                    LOG.info('Unable to poll SQS queue %s for Lambda function %s: %s' %
+                        (self.queue_arn, self.mapping.get('FunctionArn'), e))
+                    # the queue may have been deleted and re-created
+                    self.queue_url = None
+            with self.lock:
+                if self.stopped or (not count and self.threads > 1):
+                    self.threads -= 1
+                    return
+            if count is None:
+                time.sleep(POLL_ERROR_DELAY)
+            elif count >= self.get_batch_size():
+                self._add_thread()
+
+
+class KinesisShardProcessor(object):
+    """ Invokes the function of a Kinesis event source mapping with the records of a single shard, in order, in
+        batches of up to `BatchSize` records. Records put into the stream are buffered, hence producers do not wait
+        for the function, and each shard of each mapping is processed by its own thread. The sequence number of the
+        last processed record is checkpointed. If the buffer overflows, or if the mapping starts at TRIM_HORIZON or
+        AT_TIMESTAMP, records are read from the stream (after the checkpoint) until the processor has caught up. """
+
+    def __init__(self, mapping, stream_arn, shard_id, position=None):
+        self.mapping = mapping
+        self.stream_arn = stream_arn
+        self.shard_id = shard_id
+        self.region_name = aws_stack.extract_region_from_arn(stream_arn)
+        self.records = deque()
+        self.lock = threading.Lock()
+        # sequence number of the last processed record
+        self.checkpoint = None
+        # (iterator type, params) of the position to read records from the stream at, before the buffered records
+        self.position = position
+        self.shard_iterator = None
+        self.running = False
+        self.stopped = False
+
+    def add(self, records):
+        with self.lock:
+            if self.stopped:
+                return
+            self.records.extend(records)
+            if len(self.records) > KINESIS_MAX_BUFFERED_RECORDS:
+                LOG.info('Buffer of Kinesis records of shard %s for Lambda function %s is full, reading from stream' %
+                    (self.shard_id, self.mapping.get('FunctionArn')))
+                if not self.position:
+                    # continue after the checkpoint, or at the first buffered record if there is none yet
+                    self._set_position(('AT_SEQUENCE_NUMBER',
+                        {'StartingSequenceNumber': self.records[0]['sequenceNumber']}))
+                self.records.clear()
+            self._start()
+
+    def start(self):
+        with self.lock:
+            self._start()
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.records.clear()
+
+    def get_client(self):
+        return get_kinesis_client(self.region_name)
+
+    def get_batch_size(self):
+        return max(int(self.mapping.get('BatchSize') or 100), 1)
+
+    def process(self, records):
+        """ Invoke the function with a batch of records, retrying failed invocations with exponential backoff
+            (which only blocks this shard), and checkpoint the batch once it has succeeded or has been skipped. """
+        event = {'Records': [self.to_record(record) for record in records]}
+        func_arn = self.mapping['FunctionArn']
+        for attempt in range(KINESIS_MAX_RETRIES + 1):
+            if self.stopped:
+                return
+            if attempt:
+                time.sleep(KINESIS_RETRY_DELAY * 2 ** (attempt - 1))
+            if invoke_function(func_arn, event):
+                self.mapping['LastProcessingResult'] = 'OK'
+                break
+            self.mapping['LastProcessingResult'] = 'PROBLEM: Function call failed'
+        else:
+            LOG.warning('Skipping %s Kinesis records of shard %s, as Lambda function %s failed %s times' %
+                (len(records), self.shard_id, func_arn, KINESIS_MAX_RETRIES + 1))
+        self.checkpoint = int(records[-1]['sequenceNumber'])
+
+    def read(self, position):
+        """ Read the next batch of records from the stream, starting at the given position (or right after the
+            checkpoint, if any records have been processed already). """
+        client = self.get_client()
+        if not self.shard_iterator:
+            iterator_type, params = position
+            if self.checkpoint is not None:
+                iterator_type, params = 'AFTER_SEQUENCE_NUMBER', {'StartingSequenceNumber': str(self.checkpoint)}
+            self.shard_iterator = client.get_shard_iterator(StreamName=self.stream_arn.split('/')[-1],
+                ShardId=self.shard_id, ShardIteratorType=iterator_type, **params)['ShardIterator']
+        response = client.get_records(ShardIterator=self.shard_iterator, Limit=self.get_batch_size())
+        self.shard_iterator = response.get('NextShardIterator')
+        records = []
+        for record in response.get('Records') or []:
+            timestamp = record.get('ApproximateArrivalTimestamp')
+            records.append({
+                'data': to_str(base64.b64encode(record['Data'])),
+                'partitionKey': record['PartitionKey'],
+                'sequenceNumber': record['SequenceNumber'],
+                'approximateArrivalTimestamp': time.mktime(timestamp.timetuple()) if timestamp else None
+            })
+        return records
+
+    def to_record(self, record):
+        return {
+            'eventID': '%s:%s' % (self.shard_id, record['sequenceNumber']),
+            'eventSource': 'aws:kinesis',
+            'eventVersion': '1.0',
+            'eventName': 'aws:kinesis:record',
+            'eventSourceARN': self.stream_arn,
+            'awsRegion': self.region_name,
+            'kinesis': {
+                'kinesisSchemaVersion': '1.0',
+                'data': record['data'],
+                'partitionKey': record['partitionKey'],
+                'sequenceNumber': record['sequenceNumber'],
+                'approximateArrivalTimestamp': record.get('approximateArrivalTimestamp')
+            }
+        }
+
+    def _set_position(self, position):
+        self.position = position
+        self.shard_iterator = None
+
+    def _next_batch(self):
+        """ Return the next batch of buffered records, skipping records up to the checkpoint (which have already
+            been read from the stream). Must be called with the lock held. """
+        batch = []
+        batch_size = self.get_batch_size()
+        while self.records and len(batch) < batch_size:
+            record = self.records.popleft()
+            if self.checkpoint is None or int(record['sequenceNumber']) > self.checkpoint:
+                batch.append(record)
+        return batch
+
+    def _start(self):
+        if self.running or self.stopped:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        errors = 0
+        while True:
+            with self.lock:
+                position = self.position
+                batch = None if position else self._next_batch()
+                if self.stopped or not (position or batch):
+                    self.running = False
+                    return
+            if position:
+                try:
+                    batch = self.read(position)
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    LOG.info('Unable to read records of Kinesis shard %s for Lambda function %s: %s' %
+                        (self.shard_id, self.mapping.get('FunctionArn'), e))
+                    self.shard_iterator = None
+                    if errors <= KINESIS_MAX_RETRIES:
+                        time.sleep(POLL_ERROR_DELAY)
+                        continue
+                if not batch:
+                    # caught up with the stream (or unable to read it), continue with the buffered records
+                    with self.lock:
+                        if self.position is position:
+                            self._set_position(None)
+                    continue
+            self.process(batch)
+
+
+def format_message_attributes(attributes):
+    """ Convert the message attributes returned by ReceiveMessage, e.g., {"a1": {"DataType": "String",
+        "StringValue": "v1"}}, to the structure of Lambda events, e.g., {"a1": {"dataType": "String",
+        "stringValue": "v1", "stringListValues": [], "binaryListValues": []}}. """
+    result = {}
+    for name, attribute in attributes.items():
+        value = {'stringListValues': [], 'binaryListValues': []}
+        for key, attr_value in attribute.items():
+            if isinstance(attr_value, bytes):
+                attr_value = to_str(base64.b64encode(attr_value))
+            value[key[0].lower() + key[1:]] = attr_value
+        result[name] = value
+    return result
+
+
+def invoke_function(func_arn, event):
+    """ Synchronously invoke the given function, and return whether the invocation has succeeded. """
+    # import here to avoid circular imports, as the Lambda API starts and stops the pollers
+    from localstack.services.awslambda import lambda_api
+    result = lambda_api.run_lambda(event=event, context={}, func_arn=func_arn)
+    return getattr(result, 'status_code', 200) < 400
+
+
+def get_kinesis_client(region_name):
+    return aws_stack.connect_to_service('kinesis', region_name=region_name)
+
+
+def is_sqs_mapping(mapping):
+    return ':sqs:' in (mapping.get('EventSourceArn') or '')
+
+
+def is_kinesis_mapping(mapping):
+    return ':kinesis:' in (mapping.get('EventSourceArn') or '')
+
+
+def get_start_position(mapping):
+    """ Return the (iterator type, params) position at which a new Kinesis event source mapping starts reading
+        the existing records of the stream, or None if it only receives the records put from now on (LATEST). """
+    starting_position = mapping.get('StartingPosition')
+    if starting_position not in KINESIS_READ_POSITIONS:
+        return None
+    params = {}
+    if starting_position == 'AT_TIMESTAMP':
+        params['Timestamp'] = mapping.get('StartingPositionTimestamp') or mapping.get('LastModified')
+    return starting_position, params
+
+
+def dispatch_kinesis_records(stream_arn, records, mappings):
+    """ Pass the records put into a stream (with their `shardId`) to the shard processors of the given event
+        source mappings, without waiting for the functions to be invoked. """
+    shards = OrderedDict()
+    now = time.time()
+    for record in records:
+        record = dict(record)
+        record.setdefault('approximateArrivalTimestamp', now)
+        shard_id = record.pop('shardId', None) or 'shardId-000000000000'
+        shards.setdefault(shard_id, []).append(record)
+    with POLLERS_LOCK:
+        for mapping in mappings:
+            if mapping.get('State') != 'Enabled':
+                continue
+            for shard_id, shard_records in shards.items():
+                key = (mapping['UUID'], shard_id)
+                processor = KINESIS_PROCESSORS.get(key)
+                if processor is None or processor.mapping is not mapping:
+                    if processor:
+                        processor.stop()
+                    processor = KINESIS_PROCESSORS[key] = KinesisShardProcessor(mapping, stream_arn, shard_id)
+                processor.add(shard_records)
+
+
+def start_kinesis_processors(mapping):
+    """ Start processors for the existing shards of a new mapping which reads the existing records of the stream. """
+    position = get_start_position(mapping)
+    if not position:
+        return
+    stream_arn = mapping['EventSourceArn']
+    try:
+        client = get_kinesis_client(aws_stack.extract_region_from_arn(stream_arn))
+        shards = client.describe_stream(StreamName=stream_arn.split('/')[-1])['StreamDescription']['Shards']
+    except Exception as e:
+        LOG.info('Unable to read shards of Kinesis stream %s for Lambda function %s: %s' %
+            (stream_arn, mapping.get('FunctionArn'), e))
+        return
+    for shard in shards:
+        processor = KinesisShardProcessor(mapping, stream_arn, shard['ShardId'], position=position)
+        KINESIS_PROCESSORS[(mapping['UUID'], shard['ShardId'])] = processor
+        processor.start()
+
+
+def update_pollers(mappings):
+    """ Start pollers for new SQS event source mappings, and stop the pollers of deleted mappings. Processors of
+        Kinesis mappings are started for new mappings reading the existing records of the stream (others are
+        started once records are put into their shards), and stopped for deleted mappings. """
+    with POLLERS_LOCK:
+        current = dict((m['UUID'], m) for m in mappings if is_sqs_mapping(m))
+        for mapping_uuid, poller in list(SQS_POLLERS.items()):
+            if current.get(mapping_uuid) is not poller.mapping:
+                poller.stop()
+                del SQS_POLLERS[mapping_uuid]
+        for mapping_uuid, mapping in current.items():
+            if mapping_uuid not in SQS_POLLERS:
+                poller = SQS_POLLERS[mapping_uuid] = SQSEventSourcePoller(mapping)
+                poller.start()
+
+        current = dict((m['UUID'], m) for m in mappings if is_kinesis_mapping(m))
+        for key, processor in list(KINESIS_PROCESSORS.items()):
+            if current.get(key[0]) is not processor.mapping:
+                processor.stop()
+                del KINESIS_PROCESSORS[key]
+        KINESIS_MAPPINGS.intersection_update(current)
+        for mapping_uuid, mapping in current.items():
+            if mapping_uuid not in KINESIS_MAPPINGS:
+                KINESIS_MAPPINGS.add(mapping_uuid)
+                start_kinesis_processors(mapping)
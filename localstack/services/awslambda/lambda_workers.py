@@ -0,0 +1,377 @@
+import os
+import sys
+import six
+import time
+import types
+import signal
+import hashlib
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing import Process, Pipe
+from localstack.utils.common import to_bytes
+from localstack.utils.server import metrics
+
+try:
+    from importlib.machinery import PathFinder
+except ImportError:
+    # Python 2 (the working directories of functions are added to sys.path instead, see FunctionModuleFinder)
+    PathFinder = None
+
+# max. number of compiled handler modules kept in the code cache
+CODE_CACHE_SIZE = 100
+
+# maps (source hash, file name) tuples to compiled handler modules, in LRU order (see get_compiled_code)
+CODE_CACHE = OrderedDict()
+
+# mutex for accessing the code cache
+CODE_CACHE_LOCK = threading.Lock()
+
+# maps names of modules in the working directories of functions to the locks held while loading handler modules
+# which may import them (see load_handler_module)
+MODULE_NAME_LOCKS = {}
+
+# mutex for creating module name locks
+MODULE_NAME_LOCKS_LOCK = threading.Lock()
+
+# logger
+LOG = logging.getLogger(__name__)
+
+
+class LogStream(object):
+    """ Replaces stdout/stderr in worker processes, capturing the output of the current invocation. Log handlers
+        which have been bound to the stream when a module was loaded keep writing to the current invocation. """
+
+    def __init__(self):
+        self.buffer = six.StringIO()
+
+    def write(self, s):
+        if isinstance(s, six.binary_type):
+            s = s.decode('utf-8', 'replace')
+        self.buffer.write(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def reset(self):
+        """ Return the output captured since the last call, and start capturing the next invocation. """
+        result = self.buffer.getvalue()
+        self.buffer = six.StringIO()
+        return result
+
+
+class FunctionModuleFinder(object):
+    """ Meta path finder which resolves top-level imports from the working directory of the function whose handler
+        is run by the current thread, without adding the directory to the (global) sys.path. """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.installed = False
+
+    def set_cwd(self, cwd):
+        """ Set the working directory for imports of the current thread, and return the previous one. """
+        self.install()
+        previous = getattr(self.local, 'cwd', None)
+        self.local.cwd = cwd
+        if PathFinder is None:
+            if previous in sys.path:
+                sys.path.remove(previous)
+            if cwd:
+                sys.path.insert(0, cwd)
+        return previous
+
+    def find_spec(self, fullname, path=None, target=None):
+        cwd = getattr(self.local, 'cwd', None)
+        if not cwd or path is not None:
+            return None
+        return PathFinder.find_spec(fullname, [cwd])
+
+    def install(self):
+        if self.installed or PathFinder is None:
+            return
+        with self.lock:
+            if not self.installed:
+                # resolve modules of functions after built-in modules, but before the modules on sys.path
+                index = sys.meta_path.index(PathFinder) if PathFinder in sys.meta_path else len(sys.meta_path)
+                sys.meta_path.insert(index, self)
+                self.installed = True
+
+
+MODULE_FINDER = FunctionModuleFinder()
+
+
+class WorkerContext(object):
+    """ Lambda context passed to handlers in worker processes, with the attributes of the invocation context. """
+
+    def __init__(self, attributes, deadline):
+        self.__dict__.update(attributes)
+        self._deadline = deadline
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.time()) * 1000), 0)
+
+
+class LambdaWorker(object):
+    """ Handle of a forked worker process, which runs one invocation at a time. """
+
+    def __init__(self):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=run_worker, args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        # keys of the handler modules loaded in the worker (as reported by the last invocation)
+        self.handlers = set()
+
+    def invoke(self, request):
+        self.conn.send(request)
+        response = self.conn.recv()
+        self.handlers = response['handlers']
+        return response
+
+    def terminate(self):
+        try:
+            self.conn.close()
+            self.process.terminate()
+            self.process.join()
+        except Exception:
+            pass
+
+
+class LambdaWorkerPool(object):
+    """ Pool of pre-forked worker processes running Python Lambda handlers. Each worker keeps the modules of the
+        handlers it has run loaded, hence invocations are dispatched to an idle worker which has already loaded
+        the handler, if any. Invocations run in parallel, up to the number of workers. """
+
+    def __init__(self, size):
+        self.size = size
+        self.workers = []
+        self.idle = []
+        self.condition = threading.Condition()
+
+    def start(self):
+        with self.condition:
+            while len(self.workers) < self.size:
+                self._add_worker()
+
+    def invoke(self, request):
+        worker = self.acquire(request['key'])
+        try:
+            response = worker.invoke(request)
+        except (EOFError, IOError, OSError) as e:
+            LOG.warning('Lambda worker process exited unexpectedly, replacing it: %s' % e)
+            self.replace(worker)
+            raise Exception('Lambda worker process exited unexpectedly: %s' % e)
+        self.release(worker)
+        if response['error']:
+            raise Exception('%s\n%s' % (response['error'], response['log']))
+        metrics.observe('lambda', 'HandlerLoad', 'cold' if response['loaded'] else 'hot', response['load_time'])
+        return response['result'], response['log']
+
+    def acquire(self, key):
+        with self.condition:
+            while not self.idle and len(self.workers) >= self.size:
+                self.condition.wait()
+            if not self.idle:
+                self._add_worker()
+            worker = ([w for w in self.idle if key in w.handlers] or self.idle)[0]
+            self.idle.remove(worker)
+            return worker
+
+    def release(self, worker):
+        with self.condition:
+            self.idle.append(worker)
+            self.condition.notify()
+
+    def replace(self, worker):
+        worker.terminate()
+        with self.condition:
+            self.workers.remove(worker)
+            self.condition.notify()
+
+    def shutdown(self):
+        with self.condition:
+            workers, self.workers, self.idle = self.workers, [], []
+            self.condition.notify_all()
+        for worker in workers:
+            worker.terminate()
+
+    def _add_worker(self):
+        # flush buffered output, to avoid printing it again in the child process
+        sys.stdout.flush()
+        sys.stderr.flush()
+        worker = LambdaWorker()
+        self.workers.append(worker)
+        self.idle.append(worker)
+
+
+def run_worker(conn):
+    """ Entry point of a worker process, running invocations received via the given pipe. """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stream = LogStream()
+    sys.stdout = sys.stderr = stream
+    # maps handler keys to the loaded handler modules (see get_handler_key)
+    modules = {}
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, IOError, OSError, KeyboardInterrupt):
+            break
+        response = invoke_handler(request, modules, stream)
+        response['handlers'] = set(modules)
+        try:
+            conn.send(response)
+        except Exception as e:
+            response.update({'result': None, 'error': 'Unable to return result of Lambda function: %s' % e})
+            conn.send(response)
+
+
+def invoke_handler(request, modules, stream):
+    """ Run an invocation in the working directory and environment of the function, loading the handler module
+        unless it has been loaded before, and return a response dict with the result and the captured log output. """
+    key = request['key']
+    response = {'result': None, 'error': None, 'loaded': False, 'load_time': 0}
+    previous_cwd = os.getcwd()
+    previous_env = dict(os.environ)
+    cwd = request['cwd']
+    module_name = 'l_%s' % hash_key(key)
+    modules_before = set(sys.modules)
+    local_modules = {}
+    MODULE_FINDER.set_cwd(cwd)
+    try:
+        os.chdir(cwd)
+        os.environ.update(request['env'])
+        loaded = modules.get(key)
+        if loaded is None:
+            start_time = time.time()
+            # drop previously loaded code of the function
+            for other_key in [k for k in modules if k[0] == key[0]]:
+                sys.modules.pop(modules.pop(other_key)[0].__name__, None)
+            loaded = modules[key] = load_module(request['main_file'], module_name, cwd)
+            response['loaded'] = True
+            response['load_time'] = time.time() - start_time
+        module, local_modules = loaded
+        # modules imported from the working directory are only visible to the function while it is running
+        sys.modules.update(local_modules)
+        handler = getattr(module, request['handler_function'])
+        context = WorkerContext(request['context'], time.time() + request['timeout'])
+        response['result'] = handler(request['event'], context)
+    except Exception as e:
+        traceback.print_exc()
+        response['error'] = 'Error running Lambda handler: %s' % e
+    finally:
+        MODULE_FINDER.set_cwd(None)
+        for name in local_modules:
+            sys.modules.pop(name, None)
+        # modules lazily imported by the handler are kept for its next invocations as well
+        local_modules.update(unload_local_modules(cwd, modules_before, keep=module_name))
+        os.chdir(previous_cwd)
+        os.environ.clear()
+        os.environ.update(previous_env)
+        response['log'] = stream.reset()
+    return response
+
+
+def load_module(main_file, module_name, cwd=None):
+    with open(main_file, 'rb') as f:
+        source = f.read()
+    return load_handler_module(get_compiled_code(source, main_file), module_name, main_file, cwd)
+
+
+def load_handler_module(code, module_name, filename, cwd=None):
+    """ Run the given handler code in a new module, and return a tuple (module, local modules). Top-level imports
+        are resolved from the given working directory, and the modules imported from it (the local modules) are
+        removed from sys.modules afterwards, such that other functions import their own (equally named) modules,
+        e.g., "utils". Loads of functions with equally named modules wait for each other, while all other loads
+        (including loads of modules without a working directory) run concurrently. """
+    if not cwd:
+        return new_module(code, module_name, filename), {}
+    locks = get_module_name_locks(cwd)
+    for lock in locks:
+        lock.acquire()
+    try:
+        modules_before = set(sys.modules)
+        previous_cwd = MODULE_FINDER.set_cwd(cwd)
+        try:
+            module = new_module(code, module_name, filename)
+        finally:
+            MODULE_FINDER.set_cwd(previous_cwd)
+            local_modules = unload_local_modules(cwd, modules_before, keep=module_name)
+        return module, local_modules
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+def get_module_name_locks(cwd):
+    """ Return the locks of the names of the modules and packages in the given directory, in a global order. """
+    names = set()
+    for name in os.listdir(cwd):
+        base_name, extension = os.path.splitext(name)
+        if extension in ('.py', '.pyc', '.so') or (not extension and os.path.isdir(os.path.join(cwd, name))):
+            names.add(base_name.split('.')[0])
+    with MODULE_NAME_LOCKS_LOCK:
+        return [MODULE_NAME_LOCKS.setdefault(name, threading.RLock()) for name in sorted(names)]
+
+
+def unload_local_modules(cwd, modules_before, keep=None):
+    """ Remove the modules loaded from the given directory since the given snapshot of sys.modules, and return
+        them as a dict. """
+    cwd_prefix = os.path.join(os.path.abspath(cwd), '')
+    result = {}
+    for name in set(sys.modules) - modules_before:
+        module_file = getattr(sys.modules.get(name), '__file__', None)
+        if name != keep and module_file and os.path.abspath(module_file).startswith(cwd_prefix):
+            result[name] = sys.modules.pop(name, None)
+    return result
+
+
+def get_compiled_code(source, filename):
+    """ Return the compiled code of a handler module, cached by the hash of its source. The lock only guards
+        the cache itself, hence concurrent first-time loads of different functions are compiled in parallel. """
+    key = (hashlib.sha256(to_bytes(source)).hexdigest(), filename)
+    with CODE_CACHE_LOCK:
+        code = CODE_CACHE.pop(key, None)
+        if code is not None:
+            CODE_CACHE[key] = code
+            return code
+    code = compile(source, filename, 'exec')
+    with CODE_CACHE_LOCK:
+        CODE_CACHE[key] = code
+        while len(CODE_CACHE) > CODE_CACHE_SIZE:
+            CODE_CACHE.popitem(last=False)
+    return code
+
+
+def new_module(code, module_name, filename):
+    """ Run the given code in the namespace of a new module, without writing it to a (temporary) file. """
+    module = types.ModuleType(module_name)
+    module.__file__ = filename
+    # register the module, as some libraries look up the modules of their classes (e.g., dataclasses)
+    sys.modules[module_name] = module
+    try:
+        six.exec_(code, module.__dict__)
+    except Exception:
+        sys.modules.pop(module_name, None)
+        raise
+    return module
+
+
+def get_handler_key(func_arn, code_sha, main_file, handler_function):
+    """ Return the key of a handler module. Functions from local mounts have no code hash, hence their
+        code is identified by the modification time of the handler file. """
+    version = code_sha or os.path.getmtime(main_file)
+    return (func_arn, version, main_file, handler_function)
+
+
+def hash_key(key):
+    return hashlib.sha1(to_bytes(repr(key))).hexdigest()[:16]
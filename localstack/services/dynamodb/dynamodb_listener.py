@@ -2,19 +2,23 @@ import re
 import json
 import random
 import logging
-import threading
 from binascii import crc32
 from requests.models import Response
 from localstack import config
 from localstack.utils.aws import aws_stack
+from localstack.utils.aws.action_router import ActionRouter
+from localstack.utils.server.proxy_processes import SharedDict, run_in_primary
 from localstack.utils.common import to_bytes, to_str, clone
 from localstack.utils.analytics import event_publisher
 from localstack.services.awslambda import lambda_api
 from localstack.services.dynamodbstreams import dynamodbstreams_api
-from localstack.services.generic_proxy import ProxyListener
+from localstack.services.generic_proxy import ProxyListener, get_request_state
 
 # cache table definitions - used for testing
-TABLE_DEFINITIONS = {}
+TABLE_DEFINITIONS = SharedDict('dynamodb.table_definitions')
+
+# maps table names to their (mocked) TTL settings
+TABLE_TTL = SharedDict('dynamodb.table_ttl')
 
 # action header prefix
 ACTION_PREFIX = 'DynamoDB_20120810'
@@ -23,116 +27,124 @@ ACTION_PREFIX = 'DynamoDB_20120810'
 LOGGER = logging.getLogger(__name__)
 
 
-class ProxyListenerDynamoDB(ProxyListener):
-    thread_local = threading.local()
+def parse_request_data(method, path, data):
+    return json.loads(to_str(data))
 
-    def __init__(self):
-        self._table_ttl_map = {}
+
+class ProxyListenerDynamoDB(ProxyListener):
+    router = ActionRouter(parse_request_data)
 
     def forward_request(self, method, path, data, headers):
         if path.startswith('/shell'):
             return True
-        data = json.loads(to_str(data))
-        ddb_client = aws_stack.connect_to_service('dynamodb')
 
         if random.random() < config.DYNAMODB_ERROR_PROBABILITY:
             return error_response_throughput()
 
-        action = headers.get('X-Amz-Target')
-        if action == '%s.CreateTable' % ACTION_PREFIX:
-            # Check if table exists, to avoid error log output from DynamoDBLocal
-            table_names = ddb_client.list_tables()['TableNames']
-            if to_str(data['TableName']) in table_names:
-                return 200
-        elif action in ('%s.PutItem' % ACTION_PREFIX, '%s.UpdateItem' % ACTION_PREFIX, '%s.DeleteItem' % ACTION_PREFIX):
-            # find an existing item and store it in a thread-local, so we can access it in return_response,
-            # in order to determine whether an item already existed (MODIFY) or not (INSERT)
-            ProxyListenerDynamoDB.thread_local.existing_item = find_existing_item(data)
-        elif action == '%s.DescribeTable' % ACTION_PREFIX:
-            # Check if table exists, to avoid error log output from DynamoDBLocal
-            table_names = ddb_client.list_tables()['TableNames']
-            if to_str(data['TableName']) not in table_names:
-                response = error_response(message='Cannot do operations on a non-existent table',
-                                          error_type='ResourceNotFoundException')
-                fix_headers_for_updated_response(response)
-                return response
-        elif action == '%s.DeleteTable' % ACTION_PREFIX:
-            # Check if table exists, to avoid error log output from DynamoDBLocal
-            table_names = ddb_client.list_tables()['TableNames']
-            if to_str(data['TableName']) not in table_names:
-                response = error_response(message='Cannot do operations on a non-existent table',
-                                          error_type='ResourceNotFoundException')
-                fix_headers_for_updated_response(response)
-                return response
-        elif action == '%s.BatchWriteItem' % ACTION_PREFIX:
-            existing_items = []
-            for table_name in sorted(data['RequestItems'].keys()):
-                for request in data['RequestItems'][table_name]:
-                    for key in ['PutRequest', 'DeleteRequest']:
-                        inner_request = request.get(key)
-                        if inner_request:
-                            existing_items.append(find_existing_item(inner_request, table_name))
-            ProxyListenerDynamoDB.thread_local.existing_items = existing_items
-        elif action == '%s.TransactWriteItems' % ACTION_PREFIX:
-            existing_items = []
-            for item in data['TransactItems']:
-                for key in ['Put', 'Update', 'Delete']:
-                    inner_item = item.get(key)
-                    if inner_item:
-                        existing_items.append(find_existing_item(inner_item))
-            ProxyListenerDynamoDB.thread_local.existing_items = existing_items
-        elif action == '%s.UpdateTimeToLive' % ACTION_PREFIX:
-            # TODO: TTL status is maintained/mocked but no real expiry is happening for items
-            response = Response()
-            response.status_code = 200
-            self._table_ttl_map[data['TableName']] = {
-                'AttributeName': data['TimeToLiveSpecification']['AttributeName'],
-                'Status': data['TimeToLiveSpecification']['Enabled']
-            }
-            response._content = json.dumps({'TimeToLiveSpecification': data['TimeToLiveSpecification']})
-            fix_headers_for_updated_response(response)
-            return response
-        elif action == '%s.DescribeTimeToLive' % ACTION_PREFIX:
-            response = Response()
-            response.status_code = 200
-            if data['TableName'] in self._table_ttl_map:
-                if self._table_ttl_map[data['TableName']]['Status']:
-                    ttl_status = 'ENABLED'
-                else:
-                    ttl_status = 'DISABLED'
-                response._content = json.dumps({
-                    'TimeToLiveDescription': {
-                        'AttributeName': self._table_ttl_map[data['TableName']]['AttributeName'],
-                        'TimeToLiveStatus': ttl_status
-                    }
-                })
-            else:  # TTL for dynamodb table not set
-                response._content = json.dumps({'TimeToLiveDescription': {'TimeToLiveStatus': 'DISABLED'}})
-            fix_headers_for_updated_response(response)
-            return response
-        elif action == '%s.TagResource' % ACTION_PREFIX or action == '%s.UntagResource' % ACTION_PREFIX:
-            response = Response()
-            response.status_code = 200
-            response._content = ''  # returns an empty body on success.
-            fix_headers_for_updated_response(response)
-            return response
-        elif action == '%s.ListTagsOfResource' % ACTION_PREFIX:
-            response = Response()
-            response.status_code = 200
-            response._content = json.dumps({'Tags': []})  # TODO: mocked and returns an empty list of tags for now.
+        return self.router.forward_request(self, method, path, data, headers)
+
+    @router.forward('CreateTable')
+    def forward_create_table(self, request):
+        # Check if table exists, to avoid error log output from DynamoDBLocal
+        if table_exists(request.payload['TableName']):
+            return 200
+        return True
+
+    @router.forward('PutItem', 'UpdateItem', 'DeleteItem')
+    def forward_write_item(self, request):
+        # find an existing item and store it in the request state, so we can access it in return_response,
+        # in order to determine whether an item already existed (MODIFY) or not (INSERT)
+        get_request_state()['existing_item'] = find_existing_item(request.payload)
+        return True
+
+    @router.forward('DescribeTable', 'DeleteTable')
+    def forward_describe_or_delete_table(self, request):
+        # Check if table exists, to avoid error log output from DynamoDBLocal
+        if not table_exists(request.payload['TableName']):
+            response = error_response(message='Cannot do operations on a non-existent table',
+                                      error_type='ResourceNotFoundException')
             fix_headers_for_updated_response(response)
             return response
+        return True
+
+    @router.forward('BatchWriteItem')
+    def forward_batch_write_item(self, request):
+        data = request.payload
+        existing_items = []
+        for table_name in sorted(data['RequestItems'].keys()):
+            for item_request in data['RequestItems'][table_name]:
+                for key in ['PutRequest', 'DeleteRequest']:
+                    inner_request = item_request.get(key)
+                    if inner_request:
+                        existing_items.append(find_existing_item(inner_request, table_name))
+        get_request_state()['existing_items'] = existing_items
+        return True
 
+    @router.forward('TransactWriteItems')
+    def forward_transact_write_items(self, request):
+        existing_items = []
+        for item in request.payload['TransactItems']:
+            for key in ['Put', 'Update', 'Delete']:
+                inner_item = item.get(key)
+                if inner_item:
+                    existing_items.append(find_existing_item(inner_item))
+        get_request_state()['existing_items'] = existing_items
         return True
 
+    @router.forward('UpdateTimeToLive')
+    def forward_update_time_to_live(self, request):
+        # TODO: TTL status is maintained/mocked but no real expiry is happening for items
+        data = request.payload
+        response = Response()
+        response.status_code = 200
+        TABLE_TTL[data['TableName']] = {
+            'AttributeName': data['TimeToLiveSpecification']['AttributeName'],
+            'Status': data['TimeToLiveSpecification']['Enabled']
+        }
+        response._content = json.dumps({'TimeToLiveSpecification': data['TimeToLiveSpecification']})
+        fix_headers_for_updated_response(response)
+        return response
+
+    @router.forward('DescribeTimeToLive')
+    def forward_describe_time_to_live(self, request):
+        data = request.payload
+        response = Response()
+        response.status_code = 200
+        if data['TableName'] in TABLE_TTL:
+            if TABLE_TTL[data['TableName']]['Status']:
+                ttl_status = 'ENABLED'
+            else:
+                ttl_status = 'DISABLED'
+            response._content = json.dumps({
+                'TimeToLiveDescription': {
+                    'AttributeName': TABLE_TTL[data['TableName']]['AttributeName'],
+                    'TimeToLiveStatus': ttl_status
+                }
+            })
+        else:  # TTL for dynamodb table not set
+            response._content = json.dumps({'TimeToLiveDescription': {'TimeToLiveStatus': 'DISABLED'}})
+        fix_headers_for_updated_response(response)
+        return response
+
+    @router.forward('TagResource', 'UntagResource')
+    def forward_tag_resource(self, request):
+        response = Response()
+        response.status_code = 200
+        response._content = ''  # returns an empty body on success.
+        fix_headers_for_updated_response(response)
+        return response
+
+    @router.forward('ListTagsOfResource')
+    def forward_list_tags_of_resource(self, request):
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({'Tags': []})  # TODO: mocked and returns an empty list of tags for now.
+        fix_headers_for_updated_response(response)
+        return response
+
     def return_response(self, method, path, data, headers, response):
         if path.startswith('/shell'):
             return
-        data = json.loads(to_str(data))
-
-        # update table definitions
-        if data and 'TableName' in data and 'KeySchema' in data:
-            TABLE_DEFINITIONS[data['TableName']] = data
 
         if response._content:
             # fix the table and latest stream ARNs (DynamoDBLocal hardcodes "ddblocal" as the region)
@@ -143,85 +155,102 @@ class ProxyListenerDynamoDB(ProxyListener):
                 response._content = content_replaced
                 fix_headers_for_updated_response(response)
 
-        action = headers.get('X-Amz-Target')
-        if not action:
-            return
-
-        record = {
-            'eventID': '1',
-            'eventVersion': '1.0',
-            'dynamodb': {
-                'StreamViewType': 'NEW_AND_OLD_IMAGES',
-                'SizeBytes': -1
-            },
-            'awsRegion': config.DEFAULT_REGION,
-            'eventSource': 'aws:dynamodb'
-        }
-        records = [record]
+        return self.router.return_response(self, method, path, data, headers, response)
 
-        if action == '%s.UpdateItem' % ACTION_PREFIX:
-            if response.status_code == 200:
-                updated_item = find_existing_item(data)
-                if not updated_item:
-                    return
-                record['eventName'] = 'MODIFY'
-                record['dynamodb']['Keys'] = data['Key']
-                record['dynamodb']['OldImage'] = self._thread_local('existing_item')
-                record['dynamodb']['NewImage'] = updated_item
-                record['dynamodb']['SizeBytes'] = len(json.dumps(updated_item))
-        elif action == '%s.BatchWriteItem' % ACTION_PREFIX:
-            records = self.prepare_batch_write_item_records(record, data)
-        elif action == '%s.TransactWriteItems' % ACTION_PREFIX:
-            records = self.prepare_transact_write_item_records(record, data)
-        elif action == '%s.PutItem' % ACTION_PREFIX:
-            if response.status_code == 200:
-                existing_item = self._thread_local('existing_item')
-                record['eventName'] = 'INSERT' if not existing_item else 'MODIFY'
-                keys = dynamodb_extract_keys(item=data['Item'], table_name=data['TableName'])
-                if isinstance(keys, Response):
-                    return keys
-                record['dynamodb']['Keys'] = keys
-                record['dynamodb']['NewImage'] = data['Item']
-                record['dynamodb']['SizeBytes'] = len(json.dumps(data['Item']))
-                if existing_item:
-                    record['dynamodb']['OldImage'] = existing_item
-        elif action == '%s.GetItem' % ACTION_PREFIX:
-            if response.status_code == 200:
-                content = json.loads(to_str(response.content))
-                # make sure we append 'ConsumedCapacity', which is properly
-                # returned by dynalite, but not by AWS's DynamoDBLocal
-                if 'ConsumedCapacity' not in content and data.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
-                    content['ConsumedCapacity'] = {
-                        'CapacityUnits': 0.5,  # TODO hardcoded
-                        'TableName': data['TableName']
-                    }
-                    response._content = json.dumps(content)
-                    fix_headers_for_updated_response(response)
-        elif action == '%s.DeleteItem' % ACTION_PREFIX:
-            if response.status_code == 200:
-                old_item = self._thread_local('existing_item')
-                record['eventName'] = 'REMOVE'
-                record['dynamodb']['Keys'] = data['Key']
-                record['dynamodb']['OldImage'] = old_item
-        elif action == '%s.CreateTable' % ACTION_PREFIX:
-            if 'StreamSpecification' in data:
-                create_dynamodb_stream(data)
-            event_publisher.fire_event(event_publisher.EVENT_DYNAMODB_CREATE_TABLE,
-                payload={'n': event_publisher.get_hash(data['TableName'])})
+    @router.returns('UpdateItem')
+    def return_update_item(self, request, response):
+        if response.status_code != 200:
             return
-        elif action == '%s.DeleteTable' % ACTION_PREFIX:
-            event_publisher.fire_event(event_publisher.EVENT_DYNAMODB_DELETE_TABLE,
-                payload={'n': event_publisher.get_hash(data['TableName'])})
+        data = request.payload
+        updated_item = find_existing_item(data)
+        if not updated_item:
             return
-        elif action == '%s.UpdateTable' % ACTION_PREFIX:
-            if 'StreamSpecification' in data:
-                create_dynamodb_stream(data)
+        record = new_stream_record()
+        record['eventName'] = 'MODIFY'
+        record['dynamodb']['Keys'] = data['Key']
+        record['dynamodb']['OldImage'] = self._request_state('existing_item')
+        record['dynamodb']['NewImage'] = updated_item
+        record['dynamodb']['SizeBytes'] = len(json.dumps(updated_item))
+        self.forward_stream_records([record], data)
+
+    @router.returns('BatchWriteItem')
+    def return_batch_write_item(self, request, response):
+        data = request.payload
+        self.forward_stream_records(self.prepare_batch_write_item_records(new_stream_record(), data), data)
+
+    @router.returns('TransactWriteItems')
+    def return_transact_write_items(self, request, response):
+        data = request.payload
+        self.forward_stream_records(self.prepare_transact_write_item_records(new_stream_record(), data), data)
+
+    @router.returns('PutItem')
+    def return_put_item(self, request, response):
+        if response.status_code != 200:
             return
-        else:
-            # nothing to do
+        data = request.payload
+        existing_item = self._request_state('existing_item')
+        record = new_stream_record()
+        record['eventName'] = 'INSERT' if not existing_item else 'MODIFY'
+        keys = dynamodb_extract_keys(item=data['Item'], table_name=data['TableName'])
+        if isinstance(keys, Response):
+            return keys
+        record['dynamodb']['Keys'] = keys
+        record['dynamodb']['NewImage'] = data['Item']
+        record['dynamodb']['SizeBytes'] = len(json.dumps(data['Item']))
+        if existing_item:
+            record['dynamodb']['OldImage'] = existing_item
+        self.forward_stream_records([record], data)
+
+    @router.returns('GetItem')
+    def return_get_item(self, request, response):
+        if response.status_code != 200:
             return
+        data = request.payload
+        content = json.loads(to_str(response.content))
+        # make sure we append 'ConsumedCapacity', which is properly
+        # returned by dynalite, but not by AWS's DynamoDBLocal
+        if 'ConsumedCapacity' not in content and data.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            content['ConsumedCapacity'] = {
+                'CapacityUnits': 0.5,  # TODO hardcoded
+                'TableName': data['TableName']
+            }
+            response._content = json.dumps(content)
+            fix_headers_for_updated_response(response)
 
-        if len(records) > 0 and 'eventName' in records[0]:
+    @router.returns('DeleteItem')
+    def return_delete_item(self, request, response):
+        if response.status_code != 200:
+            return
+        data = request.payload
+        record = new_stream_record()
+        record['eventName'] = 'REMOVE'
+        record['dynamodb']['Keys'] = data['Key']
+        record['dynamodb']['OldImage'] = self._request_state('existing_item')
+        self.forward_stream_records([record], data)
+
+    @router.returns('CreateTable')
+    def return_create_table(self, request, response):
+        data = request.payload
+        # update table definitions
+        if 'KeySchema' in data:
+            TABLE_DEFINITIONS[data['TableName']] = data
+        if 'StreamSpecification' in data:
+            create_dynamodb_stream(data)
+        event_publisher.fire_event(event_publisher.EVENT_DYNAMODB_CREATE_TABLE,
+            payload={'n': event_publisher.get_hash(data['TableName'])})
+
+    @router.returns('DeleteTable')
+    def return_delete_table(self, request, response):
+        event_publisher.fire_event(event_publisher.EVENT_DYNAMODB_DELETE_TABLE,
+            payload={'n': event_publisher.get_hash(request.payload['TableName'])})
+
+    @router.returns('UpdateTable')
+    def return_update_table(self, request, response):
+        if 'StreamSpecification' in request.payload:
+            create_dynamodb_stream(request.payload)
+
+    def forward_stream_records(self, records, data):
+        if records and 'eventName' in records[0]:
             if 'TableName' in data:
                 records[0]['eventSourceARN'] = aws_stack.dynamodb_table_arn(data['TableName'])
             forward_to_lambda(records)
@@ -234,7 +263,7 @@ class ProxyListenerDynamoDB(ProxyListener):
             for request in data['RequestItems'][table_name]:
                 put_request = request.get('PutRequest')
                 if put_request:
-                    existing_item = self._thread_local('existing_items')[i]
+                    existing_item = self._request_state('existing_items')[i]
                     keys = dynamodb_extract_keys(item=put_request['Item'], table_name=table_name)
                     if isinstance(keys, Response):
                         return keys
@@ -254,7 +283,7 @@ class ProxyListenerDynamoDB(ProxyListener):
                     new_record = clone(record)
                     new_record['eventName'] = 'REMOVE'
                     new_record['dynamodb']['Keys'] = keys
-                    new_record['dynamodb']['OldImage'] = self._thread_local('existing_items')[i]
+                    new_record['dynamodb']['OldImage'] = self._request_state('existing_items')[i]
                     new_record['eventSourceARN'] = aws_stack.dynamodb_table_arn(table_name)
                     records.append(new_record)
                 i += 1
@@ -265,7 +294,7 @@ class ProxyListenerDynamoDB(ProxyListener):
         for i, request in enumerate(data['TransactItems']):
             put_request = request.get('Put')
             if put_request:
-                existing_item = self._thread_local('existing_items')[i]
+                existing_item = self._request_state('existing_items')[i]
                 table_name = put_request['TableName']
                 keys = dynamodb_extract_keys(item=put_request['Item'], table_name=table_name)
                 if isinstance(keys, Response):
@@ -290,7 +319,7 @@ class ProxyListenerDynamoDB(ProxyListener):
                 new_record = clone(record)
                 new_record['eventName'] = 'MODIFY'
                 new_record['dynamodb']['Keys'] = keys
-                new_record['dynamodb']['OldImage'] = self._thread_local('existing_items')[i]
+                new_record['dynamodb']['OldImage'] = self._request_state('existing_items')[i]
                 new_record['dynamodb']['NewImage'] = updated_item
                 new_record['eventSourceARN'] = aws_stack.dynamodb_table_arn(table_name)
                 records.append(new_record)
@@ -303,16 +332,13 @@ class ProxyListenerDynamoDB(ProxyListener):
                 new_record = clone(record)
                 new_record['eventName'] = 'REMOVE'
                 new_record['dynamodb']['Keys'] = keys
-                new_record['dynamodb']['OldImage'] = self._thread_local('existing_items')[i]
+                new_record['dynamodb']['OldImage'] = self._request_state('existing_items')[i]
                 new_record['eventSourceARN'] = aws_stack.dynamodb_table_arn(table_name)
                 records.append(new_record)
         return records
 
-    def _thread_local(self, name, default=None):
-        try:
-            return getattr(ProxyListenerDynamoDB.thread_local, name)
-        except AttributeError:
-            return default
+    def _request_state(self, name, default=None):
+        return get_request_state().get(name, default)
 
 
 # instantiate listener
@@ -351,6 +377,24 @@ def find_existing_item(put_item, table_name=None):
     return existing_item.get('Item')
 
 
+def new_stream_record():
+    return {
+        'eventID': '1',
+        'eventVersion': '1.0',
+        'dynamodb': {
+            'StreamViewType': 'NEW_AND_OLD_IMAGES',
+            'SizeBytes': -1
+        },
+        'awsRegion': config.DEFAULT_REGION,
+        'eventSource': 'aws:dynamodb'
+    }
+
+
+def table_exists(table_name):
+    ddb_client = aws_stack.connect_to_service('dynamodb')
+    return to_str(table_name) in ddb_client.list_tables()['TableNames']
+
+
 def fix_headers_for_updated_response(response):
     response.headers['content-length'] = len(to_bytes(response.content))
     response.headers['x-amz-crc32'] = calculate_crc32(response)
@@ -370,9 +414,17 @@ def create_dynamodb_stream(data):
             view_type=view_type, enabled=enabled)
 
 
+@run_in_primary
 def forward_to_lambda(records):
+    # look up the event sources once per table, as all records of a request usually refer to the same table
+    sources_by_arn = {}
     for record in records:
-        sources = lambda_api.get_event_sources(source_arn=record['eventSourceARN'])
+        source_arn = record['eventSourceARN']
+        sources = sources_by_arn.get(source_arn)
+        if sources is None:
+            sources = sources_by_arn[source_arn] = lambda_api.get_event_sources(source_arn=source_arn)
+        if not sources:
+            continue
         event = {
             'Records': [record]
         }
@@ -5,6 +5,7 @@ from flask import Flask, jsonify, request, make_response
 from localstack.services import generic_proxy
 from localstack.utils.aws import aws_stack
 from localstack.utils.common import to_str, to_bytes
+from localstack.utils.server.proxy_processes import run_in_primary
 
 APP_NAME = 'ddb_streams_api'
 
@@ -19,6 +20,7 @@ ACTION_HEADER_PREFIX = 'DynamoDBStreams_20120810'
 SEQUENCE_NUMBER_COUNTER = 1
 
 
+@run_in_primary
 def add_dynamodb_stream(table_name, view_type='NEW_AND_OLD_IMAGES', enabled=True):
     if enabled:
         # create kinesis stream as a backend
@@ -36,6 +38,7 @@ def add_dynamodb_stream(table_name, view_type='NEW_AND_OLD_IMAGES', enabled=True
         DDB_STREAMS[table_arn] = stream
 
 
+@run_in_primary
 def forward_events(records):
     global SEQUENCE_NUMBER_COUNTER
     kinesis = aws_stack.connect_to_service('kinesis')
@@ -0,0 +1,138 @@
+import re
+import json
+import logging
+import threading
+from requests.models import Response
+from localstack import config
+from localstack.constants import LOCALHOST
+from localstack.utils.common import get_service_protocol, to_bytes
+from localstack.services.generic_proxy import GenericProxy, ProxyListener
+
+# maps service names to the proxies serving their requests (see register_service_proxy)
+SERVICE_PROXIES = {}
+
+# mutex for creating the forwarding proxies of services without a registered proxy
+SERVICE_PROXIES_LOCK = threading.RLock()
+
+# maps prefixes of X-Amz-Target headers to service names (matched in this order, hence
+# more specific prefixes like "DynamoDBStreams_" must come before "DynamoDB_")
+TARGET_PREFIXES = (
+    ('DynamoDBStreams_', 'dynamodbstreams'),
+    ('DynamoDB_', 'dynamodb'),
+    ('Kinesis_', 'kinesis'),
+    ('Firehose_', 'firehose'),
+    ('Logs_', 'logs'),
+    ('AWSEvents', 'events'),
+    ('AWSStepFunctions', 'stepfunctions'),
+    ('AmazonSSM', 'ssm'),
+    ('secretsmanager', 'secretsmanager'),
+    ('GraniteServiceVersion', 'cloudwatch')
+)
+
+# maps the service names in the credential scope of signed requests to service names
+SIGNING_NAMES = {
+    'monitoring': 'cloudwatch',
+    'email': 'ses',
+    'states': 'stepfunctions',
+    'execute-api': 'apigateway'
+}
+
+# maps path prefixes of REST APIs to service names (all other REST requests are routed to S3)
+PATH_PREFIXES = (
+    ('/2015-03-31/functions', 'lambda'),
+    ('/2015-03-31/event-source-mappings', 'lambda'),
+    ('/2017-03-31/tags', 'lambda'),
+    ('/2015-01-01/', 'es'),
+    ('/2013-04-01/', 'route53'),
+    ('/restapis', 'apigateway')
+)
+
+# regex to extract the service name from the credential scope of the Authorization header
+CREDENTIAL_SCOPE_REGEX = re.compile(r'Credential=[^/]+/[^/]+/[^/]+/([^/]+)/')
+
+# set up logger
+LOG = logging.getLogger(__name__)
+
+
+class EdgeProxy(GenericProxy):
+    """ Proxy serving the APIs of all services on a single port. Requests are dispatched in-process to the
+        listeners and backend of the proxy of the target service, without an additional network hop. """
+
+    def __init__(self, port, **kwargs):
+        kwargs['update_listener'] = kwargs.get('update_listener') or EdgeFallbackListener()
+        kwargs['service_name'] = kwargs.get('service_name') or 'edge'
+        GenericProxy.__init__(self, port, **kwargs)
+
+    def get_target_proxy(self, method, path, headers):
+        service = get_service_name(method, path, headers)
+        return service and get_service_proxy(service) or self
+
+
+class EdgeFallbackListener(ProxyListener):
+    """ Listener of the edge proxy itself, responding to requests that cannot be routed to any service. """
+
+    def forward_request(self, method, path, data, headers):
+        response = Response()
+        response.status_code = 404
+        response.headers['Content-Type'] = 'application/json'
+        response._content = to_bytes(json.dumps({'message': 'Unable to determine target service of request'}))
+        return response
+
+
+def register_service_proxy(service, proxy):
+    SERVICE_PROXIES[service] = proxy
+
+
+def get_service_proxy(service):
+    """ Return the proxy for the given service. Services without a registered proxy (e.g., APIs served
+        directly on their port) are forwarded to by a proxy without listeners, which is never started. """
+    proxy = SERVICE_PROXIES.get(service)
+    if proxy is not None:
+        return proxy
+    port = config.service_port(service)
+    if not port:
+        return None
+    with SERVICE_PROXIES_LOCK:
+        proxy = SERVICE_PROXIES.get(service)
+        if proxy is None:
+            forward_url = '%s://%s:%s' % (get_service_protocol(), LOCALHOST, port)
+            proxy = SERVICE_PROXIES[service] = GenericProxy(port, forward_url=forward_url, service_name=service)
+        return proxy
+
+
+def get_service_name(method, path, headers):
+    """ Determine the name of the service targeted by a request, based on the X-Amz-Target header, the
+        credential scope of the Authorization header, the Host header, or the request path (in this order). """
+    target = headers.get('X-Amz-Target')
+    if target:
+        for prefix, service in TARGET_PREFIXES:
+            if target.startswith(prefix):
+                return service
+
+    match = CREDENTIAL_SCOPE_REGEX.search(headers.get('Authorization', ''))
+    if match:
+        return SIGNING_NAMES.get(match.group(1), match.group(1))
+
+    # host names like "sqs.us-east-1.amazonaws.com", or "<bucket>.s3.amazonaws.com"
+    host_parts = headers.get('Host', '').partition(':')[0].split('.')
+    for part in host_parts[:-1]:
+        if part in config.SERVICE_PORTS:
+            return part
+
+    for prefix, service in PATH_PREFIXES:
+        if path.startswith(prefix):
+            return service
+    if 'Action=' in path:
+        # unsigned Query API requests cannot be attributed to a service
+        return None
+    return 's3'
+
+
+def start_edge(port=None, asynchronous=False):
+    port = port or config.EDGE_PORT
+    print('Starting edge router (%s port %s)...' % (get_service_protocol(), port))
+    proxy = EdgeProxy(port, ssl=config.USE_SSL)
+    proxy.start()
+    if not asynchronous:
+        proxy.join()
+    return proxy
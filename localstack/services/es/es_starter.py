@@ -7,6 +7,7 @@ from localstack.services import install
 from localstack.utils.aws import aws_stack
 from localstack.constants import DEFAULT_PORT_ELASTICSEARCH_BACKEND, LOCALSTACK_ROOT_FOLDER
 from localstack.utils.common import run, is_root, mkdir, chmod_r
+from localstack.utils.server import compression
 from localstack.services.infra import get_service_protocol, start_proxy_for_service, do_run
 from localstack.services.install import ROOT_PATH
 
@@ -33,10 +34,12 @@ def start_elasticsearch(port=None, delete_data=True, asynchronous=False, update_
         es_data_dir = '%s/elasticsearch' % config.DATA_DIR
     # Elasticsearch 5.x cannot be bound to 0.0.0.0 in some Docker environments,
     # hence we use the default bind address 127.0.0.0 and put a proxy in front of it
+    # if compression is enabled, Elasticsearch compresses its responses itself (passed through by the proxy)
+    compress = str(compression.is_enabled('elasticsearch')).lower()
     cmd = (('%s/infra/elasticsearch/bin/elasticsearch ' +
-        '-E http.port=%s -E http.publish_port=%s -E http.compression=false ' +
+        '-E http.port=%s -E http.publish_port=%s -E http.compression=%s ' +
         '-E path.data=%s') %
-        (ROOT_PATH, backend_port, backend_port, es_data_dir))
+        (ROOT_PATH, backend_port, backend_port, compress, es_data_dir))
     if os.path.exists(os.path.join(es_mods_dir, 'x-pack-ml')):
         cmd += ' -E xpack.ml.enabled=false'
     env_vars = {
@@ -1,13 +1,18 @@
 import os
 import sys
 import ssl
-import json
 import socket
+import select
+import json
+import time
 import inspect
 import logging
+import shutil
+import threading
 import traceback
 import click
 import requests
+import six
 from ssl import SSLError
 from flask_cors import CORS
 from requests.structures import CaseInsensitiveDict
@@ -16,14 +21,27 @@ from six import iteritems
 from six.moves.socketserver import ThreadingMixIn
 from six.moves.urllib.parse import urlparse
 from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-from localstack.config import TMP_FOLDER, USE_SSL, EXTRA_CORS_ALLOWED_HEADERS, EXTRA_CORS_EXPOSE_HEADERS
+from localstack import config
+from localstack.config import DATA_DIR, TMP_FOLDER, USE_SSL, EXTRA_CORS_ALLOWED_HEADERS, EXTRA_CORS_EXPOSE_HEADERS
 from localstack.constants import ENV_INTERNAL_TEST_RUN
-from localstack.utils.common import FuncThread, generate_ssl_cert, to_bytes
+from localstack.utils.common import FuncThread, generate_ssl_cert, to_bytes, to_str
+from localstack.utils.aws.action_router import get_request_action
+from localstack.utils.server import connection_pool, metrics, proxy_processes, response_cache, compression
+from localstack.utils.server.worker_pool import BoundedWorkerPool
 
 QUIET = False
 
-# path for test certificate
+# path for test certificate (generated once, and reused across restarts). Custom certificates placed
+# in TMP_FOLDER take precedence, otherwise generated certificates are persisted in DATA_DIR (if configured)
 SERVER_CERT_PEM_FILE = '%s/server.test.pem' % (TMP_FOLDER)
+if DATA_DIR and not os.path.exists(SERVER_CERT_PEM_FILE):
+    SERVER_CERT_PEM_FILE = '%s/server.test.pem' % (DATA_DIR)
+
+# server-side SSL context shared by all proxies (see GenericProxy.get_ssl_context)
+SSL_CONTEXT = {}
+
+# mutex for creating the server certificate and SSL context
+SSL_CONTEXT_LOCK = threading.RLock()
 
 
 CORS_ALLOWED_HEADERS = ('authorization', 'content-type', 'content-md5', 'cache-control',
@@ -38,13 +56,74 @@ CORS_EXPOSE_HEADERS = ('x-amz-version-id',)
 if EXTRA_CORS_EXPOSE_HEADERS:
     CORS_EXPOSE_HEADERS += tuple(EXTRA_CORS_EXPOSE_HEADERS.split(','))
 
+# headers (in lower case) of backend responses which are not passed on to the client. The proxy determines the
+# framing of the response body and the persistence of the client connection itself (hop-by-hop headers)
+EXCLUDED_RESPONSE_HEADERS = frozenset(('transfer-encoding', 'date', 'server', 'connection', 'keep-alive'))
+
+# CORS headers added to all responses, unless already set by the backend or the listeners
+DEFAULT_CORS_HEADERS = (
+    ('access-control-allow-origin', 'Access-Control-Allow-Origin', '*'),
+    ('access-control-allow-methods', 'Access-Control-Allow-Methods', ','.join(CORS_ALLOWED_METHODS)),
+    ('access-control-allow-headers', 'Access-Control-Allow-Headers', ','.join(CORS_ALLOWED_HEADERS)),
+    ('access-control-expose-headers', 'Access-Control-Expose-Headers', ','.join(CORS_EXPOSE_HEADERS))
+)
+
+# encoding used for the start line and headers of an HTTP message
+HEADER_ENCODING = 'iso-8859-1'
+
+# max. size of response bodies which are sent in a single write together with the response head
+MAX_COALESCED_BODY_SIZE = 16 * 1024
+
+# size of the chunks used to stream request/response bodies through the proxy
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# maximum length of the chunk size and trailer lines of a request body with chunked transfer encoding
+MAX_CHUNK_LINE_LENGTH = 64 * 1024
+
+# interval (in secs) in which idle keep-alive connections check whether other connections are waiting for a worker
+IDLE_POLL_INTERVAL = 0.1
+
 # set up logger
 LOG = logging.getLogger(__name__)
 
+# holds the context of the request whose listeners are currently running on this thread (see get_request_state)
+CURRENT_REQUEST = threading.local()
+
+# inspect.getargspec(..) has been removed in recent Python 3 versions
+getargspec = inspect.getargspec if six.PY2 else inspect.getfullargspec
+
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    """Handle each request in a separate thread."""
+    """Handle each request in a separate thread, or in the bounded worker pool of the server (if configured)."""
     daemon_threads = True
+    worker_pool = None
+
+    def process_request(self, request, client_address):
+        if self.worker_pool is None:
+            return ThreadingMixIn.process_request(self, request, client_address)
+        if not self.worker_pool.submit(self.process_request_thread, (request, client_address)):
+            self.reject_request(request, client_address)
+
+    def reject_request(self, request, client_address):
+        """ Shed load by responding with a throttling error, as all workers are busy and the queue is full.
+            Note: this runs in the thread accepting new connections, which is throttled accordingly. """
+        try:
+            ThrottlingRequestHandler(request, client_address, self)
+        except Exception as e:
+            LOG.debug('Unable to send throttling response to %s: %s' % (client_address, e))
+        finally:
+            self.shutdown_request(request)
+
+    def server_bind(self):
+        if proxy_processes.reuse_port():
+            # accept connections on a port shared with the other proxy processes
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        HTTPServer.server_bind(self)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
 
 
 class ProxyListener(object):
@@ -85,6 +164,457 @@ class ProxyListener(object):
         """
         return None
 
+    def stream_request_body(self, method, path, headers):
+        """ Return True if this listener does not need to inspect the body of the given request.
+            If all listeners of a proxy return True, the request body is streamed to the backend
+            service without buffering it in memory, and `data` is passed as None to the listeners.
+        """
+        return False
+
+    def stream_response_body(self, method, path, headers):
+        """ Return True if this listener does not need to inspect the body of the backend response
+            for the given request. If all listeners of a proxy return True, the response body is
+            streamed to the client without buffering it in memory. In this case, `return_response(..)`
+            should not access `response.content` (which would read the entire body into memory).
+        """
+        return False
+
+
+class ProxyRequestContext(object):
+    """ Holds the state of a single request while it passes through the listeners of a proxy.
+        This state is independent of the server engine that accepted the request. """
+
+    def __init__(self, proxy, method, path, data, headers, client_address=None, server_address=None,
+            start_time=None):
+        self.timer = metrics.RequestTimer(proxy.service_name or str(proxy.port),
+            get_request_action(method, path, data, headers), start_time=start_time)
+        self.proxy = proxy
+        self.pipeline = proxy.get_pipeline()
+        self.method = method
+        self.data = data
+        self.data_to_send = data
+        self.forward_headers = headers
+        # response returned directly by a listener (without invoking the backend)
+        self.response = None
+        # status code with empty response body returned directly by a listener
+        self.status_code = None
+        # whether to stream the backend response to the client (see ProxyListener.stream_response_body)
+        self.stream_response = False
+        # state of this request in the response cache (see response_cache.start_request)
+        self.cache_request = None
+        # state kept by listeners between forward_request(..) and return_response(..) (see get_request_state)
+        self.listener_state = {}
+
+        self.path = get_proxy_path(path)
+        forward_url = proxy.forward_url
+        for listener in self.pipeline.forward_url_listeners:
+            forward_url = listener.get_forward_url(method, self.path, data, headers) or forward_url
+        self.forward_url = forward_url
+
+        self.request_url = '%s%s' % (forward_url, self.path)
+        target_url = path
+        if '://' not in target_url:
+            target_url = '%s%s' % (forward_url, target_url)
+
+        # update original "Host" header (moto s3 relies on this behavior)
+        if not headers.get('Host'):
+            headers['host'] = urlparse(target_url).netloc
+        if 'localhost.atlassian.io' in headers.get('Host'):
+            headers['host'] = 'localhost'
+        if client_address:
+            headers['X-Forwarded-For'] = build_x_forwarded_for(headers, client_address, server_address)
+
+
+class RequestBodyStream(object):
+    """ File-like object that streams a request body of known length from the client connection. """
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.length = length
+        self.remaining = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, amt=-1):
+        if amt is None or amt < 0 or amt > self.remaining:
+            amt = self.remaining
+        data = self.rfile.read(amt) if amt else b''
+        self.remaining -= len(data)
+        return data
+
+    def is_consumed(self):
+        return self.remaining <= 0
+
+
+class ChunkedRequestBodyStream(object):
+    """ Iterable that decodes a request body sent with chunked transfer encoding (RFC 7230, section 4.1)
+        from the client connection, yielding the body data as soon as it is received. """
+
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.done = False
+
+    def __iter__(self):
+        while not self.done:
+            size = self._read_chunk_size()
+            if size == 0:
+                # skip (optional) trailer headers, up to the final empty line
+                while self._read_line().strip():
+                    pass
+                self.done = True
+                break
+            while size > 0:
+                data = self.rfile.read(min(size, STREAM_CHUNK_SIZE))
+                if not data:
+                    raise ValueError('Unexpected end of chunked request body')
+                size -= len(data)
+                yield data
+            # skip the CRLF terminating the chunk data
+            self._read_line()
+
+    def read_all(self):
+        return b''.join(self)
+
+    def is_consumed(self):
+        return self.done
+
+    def _read_chunk_size(self):
+        line = self._read_line()
+        try:
+            return int(line.split(b';')[0].strip(), 16)
+        except ValueError:
+            raise ValueError('Invalid chunk size line in chunked request body: %s' % line)
+
+    def _read_line(self):
+        line = self.rfile.readline(MAX_CHUNK_LINE_LENGTH + 1)
+        if not line:
+            raise ValueError('Unexpected end of chunked request body')
+        if len(line) > MAX_CHUNK_LINE_LENGTH:
+            raise ValueError('Maximum line length exceeded in chunked request body')
+        return line
+
+
+class ListenerPipeline(object):
+    """ Pre-compiled chain of the listeners of a proxy. Listeners which do not override a ProxyListener
+        method are skipped in the respective stage, and call signatures are resolved once up front. """
+
+    def __init__(self, default_listeners, update_listener):
+        self.num_default_listeners = len(default_listeners)
+        self.listeners = [listener for listener in default_listeners + [update_listener] if listener]
+        self.forward_url_listeners = self.get_implementing_listeners('get_forward_url')
+        self.forward_listeners = self.get_implementing_listeners('forward_request')
+        # only the update listener of a proxy gets invoked with the backend response
+        self.return_listener = None
+        self.return_listener_takes_handler = False
+        if update_listener and implements_listener_method(update_listener, 'return_response'):
+            self.return_listener = update_listener
+            # some listeners (e.g., sqs_listener.py) require additional details like the original
+            # request port, hence we pass in a reference to the request handler as well.
+            self.return_listener_takes_handler = 'request_handler' in getargspec(update_listener.return_response)[0]
+        # maps 'stream_request_body'/'stream_response_body' to the listeners to ask whether bodies can be
+        # streamed, or to None if any listener does not implement the method (i.e., never allows streaming)
+        self.streaming_listeners = dict((method_name, self.get_streaming_listeners(method_name))
+            for method_name in ('stream_request_body', 'stream_response_body'))
+
+    def get_implementing_listeners(self, method_name):
+        return [listener for listener in self.listeners if implements_listener_method(listener, method_name)]
+
+    def get_streaming_listeners(self, method_name):
+        if len(self.get_implementing_listeners(method_name)) < len(self.listeners):
+            return None
+        return self.listeners
+
+
+def implements_listener_method(listener, method_name):
+    """ Return True if the given listener overrides the default implementation of the given ProxyListener method. """
+    if method_name in getattr(listener, '__dict__', {}):
+        return True
+    method = getattr(type(listener), method_name, None)
+    if method is None:
+        return hasattr(listener, method_name)
+    default_method = getattr(ProxyListener, method_name)
+    return getattr(method, '__func__', method) is not getattr(default_method, '__func__', default_method)
+
+
+def get_proxy_path(path):
+    """ Return the path of the given request URL (requests sent to a proxy may contain absolute URLs) """
+    if '://' in path:
+        path = '/' + path.split('://', 1)[1].split('/', 1)[1]
+    return path
+
+
+def should_stream_body(proxy, listener_method, method, path, headers):
+    """ Return True if all listeners of the given proxy allow streaming, as determined by the given
+        listener method ('stream_request_body' or 'stream_response_body'). """
+    listeners = proxy.get_pipeline().streaming_listeners[listener_method]
+    if listeners is None:
+        return False
+    for listener in listeners:
+        if not getattr(listener, listener_method)(method, path, headers):
+            return False
+    return True
+
+
+def is_streaming_response(response):
+    """ Return True if the body of the given response has not been read from the backend yet. """
+    return response._content is False and response.raw is not None
+
+
+def build_x_forwarded_for(headers, client_address, server_address):
+    x_forwarded_for = headers.get('X-Forwarded-For')
+
+    client_address = client_address[0]
+    server_address = ':'.join(map(str, server_address))
+
+    if x_forwarded_for:
+        x_forwarded_for_list = (x_forwarded_for, client_address, server_address)
+    else:
+        x_forwarded_for_list = (client_address, server_address)
+
+    return ', '.join(x_forwarded_for_list)
+
+
+def keep_connection_alive(request_version, headers):
+    """ Return True if the client connection should be kept open after responding to the given request.
+        HTTP/1.1 connections are persistent unless closed by the client (RFC 7230, section 6.3), unless
+        disabled via PROXY_KEEP_ALIVE_TIMEOUT=0. HTTP/1.0 connections only if keep-alive is requested. """
+    connection = headers.get('Connection', '').lower()
+    if 'close' in connection:
+        return False
+    if 'keep-alive' in connection:
+        return True
+    return request_version == 'HTTP/1.1' and config.PROXY_KEEP_ALIVE_TIMEOUT > 0
+
+
+def get_cached_response(context):
+    """ Return the cached response for the given request, if any. Otherwise, the request is registered with
+        the response cache, to store its response or to invalidate stale responses (see finish_cached_request). """
+    data = context.data if context.data_to_send is context.data else None
+    response, context.cache_request = response_cache.start_request(context.proxy.service_name,
+        context.timer.action, context.method, context.path, data, context.forward_headers)
+    if response is not None:
+        context.timer.mark('cache')
+    return response
+
+
+def finish_cached_request(context, response=None):
+    if context.cache_request is not None:
+        response_cache.finish_request(context.cache_request, response)
+        context.cache_request = None
+
+
+def get_request_state():
+    """ Return a dict in which listeners can keep the state of the current request between `forward_request(..)`
+        and `return_response(..)`. Listeners must not use thread-locals for this purpose, as both methods may be
+        called on different threads (e.g., with PROXY_ENGINE=asyncio), with other requests in between. """
+    context = getattr(CURRENT_REQUEST, 'context', None)
+    if context is not None:
+        return context.listener_state
+    # listeners invoked outside of a proxy request (e.g., in tests) keep their state per thread
+    state = getattr(CURRENT_REQUEST, 'state', None)
+    if state is None:
+        state = CURRENT_REQUEST.state = {}
+    return state
+
+
+def run_listeners(context, func, *args, **kwargs):
+    """ Run `func(*args, **kwargs)` with the given request context set as the current request of the thread. """
+    previous = getattr(CURRENT_REQUEST, 'context', None)
+    CURRENT_REQUEST.context = context
+    try:
+        return func(*args, **kwargs)
+    finally:
+        CURRENT_REQUEST.context = previous
+
+
+def invoke_forward_listeners(context):
+    """ Call `forward_request(..)` of the proxy listeners, and update the request context accordingly. """
+    run_listeners(context, _invoke_forward_listeners, context)
+
+
+def _invoke_forward_listeners(context):
+    for listener in context.pipeline.forward_listeners:
+        listener_result = listener.forward_request(method=context.method,
+            path=context.path, data=context.data, headers=context.forward_headers)
+        if isinstance(listener_result, Response):
+            context.response = listener_result
+            break
+        if isinstance(listener_result, dict):
+            response = Response()
+            response._content = json.dumps(listener_result)
+            response.status_code = 200
+            context.response = response
+            break
+        elif isinstance(listener_result, Request):
+            modified_request = listener_result
+            context.data = context.data_to_send = modified_request.data
+            context.forward_headers = modified_request.headers
+            if modified_request.url:
+                context.request_url = '%s%s' % (context.forward_url, modified_request.url)
+            break
+        elif listener_result is not True:
+            # get status code from response, or use Bad Gateway status code
+            context.status_code = listener_result if isinstance(listener_result, int) else 503
+            break
+    context.timer.mark('forward_request')
+
+
+def invoke_backend(context):
+    """ Forward the request to the backend service, reusing pooled keep-alive connections if enabled. """
+    headers = context.forward_headers
+    if config.PROXY_POOL_SIZE > 0:
+        headers['Connection'] = 'keep-alive'
+        session = connection_pool.get_session(context.forward_url)
+        response = session.request(context.method, context.request_url, data=context.data_to_send,
+            headers=headers, stream=True, verify=False)
+    else:
+        headers['Connection'] = headers.get('Connection') or 'close'
+        response = requests.request(context.method, context.request_url, data=context.data_to_send,
+            headers=headers, stream=True, verify=False)
+
+    # prevent requests from processing response body
+    if not response._content_consumed and response.raw and not context.stream_response:
+        response._content = response.raw.read()
+        # return the connection to the pool
+        response.raw.release_conn()
+    context.timer.mark('backend')
+    return response
+
+
+def invoke_return_listener(context, response, request_handler=None):
+    """ Call `return_response(..)` of the update listener, and return the (potentially updated) response. """
+    pipeline = context.pipeline
+    if pipeline.return_listener:
+        kwargs = {
+            'method': context.method,
+            'path': context.path,
+            'data': context.data,
+            'headers': context.forward_headers,
+            'response': response
+        }
+        if pipeline.return_listener_takes_handler:
+            kwargs['request_handler'] = request_handler
+        updated_response = run_listeners(context, pipeline.return_listener.return_response, **kwargs)
+        if isinstance(updated_response, Response) and updated_response is not response:
+            if updated_response.raw is not response.raw:
+                # release the (pooled) backend connection of the replaced response
+                close_response(response)
+            response = updated_response
+    context.timer.mark('return_response')
+    return response
+
+
+def close_response(response):
+    """ Close the given response, returning its backend connection to the pool. The connection is closed
+        (rather than reused) if the body of a streaming response has not been fully read. """
+    if response is None:
+        return
+    try:
+        response.close()
+    except Exception as e:
+        LOG.debug('Unable to close response: %s' % e)
+
+
+def is_file_response(response):
+    """ Return True if the body of the given streaming response is backed by a file (e.g., a file opened
+        by a listener), which can be sent to the client without copying it via user space (sendfile). """
+    return not hasattr(response.raw, 'stream') and hasattr(response.raw, 'fileno')
+
+
+def get_file_size(fileobj):
+    """ Return the number of bytes remaining to be read from the given file, or None if unknown. """
+    try:
+        return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+    except Exception:
+        return None
+
+
+def get_response_body(response):
+    """ Return the body of the given (non-streaming) response as bytes, encoding it at most once. """
+    content = response.content
+    if not content:
+        return b''
+    if isinstance(content, (bytes, bytearray)):
+        return content
+    return to_bytes(content)
+
+
+def get_response_headers(response, body=None, method=None):
+    """ Return the list of (key, value) headers to send to the client for the given response. The body
+        can be passed in to avoid accessing (and potentially encoding) the response content again. """
+    result = []
+    present = set()
+    headers = response.headers
+    streaming = is_streaming_response(response)
+    # the length of buffered bodies is determined by the proxy, as listeners may have modified the body
+    # (responses to HEAD requests retain the length of the resource they refer to)
+    frame_body = not streaming and method != 'HEAD'
+    if isinstance(headers, CaseInsensitiveDict):
+        # the dict already holds the lower case keys, no need to convert them for each response
+        items = iteritems(headers._store)
+    else:
+        items = ((key.lower(), (key, value)) for key, value in iteritems(headers))
+    for key_lower, header in items:
+        # filter out certain headers that we don't want to transmit
+        if key_lower in EXCLUDED_RESPONSE_HEADERS or (frame_body and key_lower == 'content-length'):
+            continue
+        result.append(header)
+        present.add(key_lower)
+    if 'content-length' not in present:
+        content_length = None
+        if not streaming:
+            content_length = len(get_response_body(response) if body is None else body)
+        elif is_file_response(response):
+            content_length = get_file_size(response.raw)
+        if content_length is not None:
+            result.append(('Content-Length', str(content_length)))
+
+    # allow pre-flight CORS headers by default
+    for key_lower, key, value in DEFAULT_CORS_HEADERS:
+        if key_lower not in present:
+            result.append((key, value))
+    return result
+
+
+def encode_http_head(start_line, headers):
+    """ Encode the start line and headers of an HTTP message into a single bytes block. """
+    lines = [start_line] + ['%s: %s' % (key, to_str(value)) for key, value in headers]
+    return ('%s\r\n\r\n' % '\r\n'.join(lines)).encode(HEADER_ENCODING)
+
+
+def get_throttling_response(headers):
+    """ Return an AWS-style throttling error response, used to shed load if a proxy is overloaded. """
+    response = Response()
+    if headers.get('X-Amz-Target'):
+        # JSON based APIs (e.g., DynamoDB, Kinesis)
+        response.status_code = 400
+        response.headers['Content-Type'] = 'application/x-amz-json-1.1'
+        response._content = to_bytes(json.dumps({'__type': 'ThrottlingException', 'message': 'Rate exceeded'}))
+    else:
+        response.status_code = 503
+        response.headers['Content-Type'] = 'application/xml'
+        response._content = to_bytes('<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>SlowDown</Code>' +
+            '<Message>Please reduce your request rate.</Message></Error>')
+    return response
+
+
+def log_forward_error(proxy, e):
+    trace = str(traceback.format_exc())
+    conn_errors = ('ConnectionRefusedError', 'NewConnectionError',
+                   'Connection aborted', 'Unexpected EOF', 'Connection reset by peer')
+    conn_error = any(e in trace for e in conn_errors)
+    error_msg = 'Error forwarding request: %s %s' % (e, trace)
+    if 'Broken pipe' in trace:
+        LOG.warn('Connection prematurely closed by client (broken pipe).')
+    elif not proxy.quiet or not conn_error:
+        LOG.error(error_msg)
+        if os.environ.get(ENV_INTERNAL_TEST_RUN):
+            # During a test run, we also want to print error messages, because
+            # log messages are delayed until the entire test run is over, and
+            # hence we are missing messages if the test hangs for some reason.
+            print('ERROR: %s' % error_msg)
+
 
 class GenericProxyHandler(BaseHTTPRequestHandler):
 
@@ -97,16 +627,95 @@ class GenericProxyHandler(BaseHTTPRequestHandler):
         self.server = server
         self.proxy = server.my_object
         self.data_bytes = None
+        self.body_stream = None
         self.protocol_version = self.proxy.protocol_version
+        self.secure = isinstance(request, ssl.SSLSocket)
+        self.handshake_failed = False
+        # idle keep-alive connections (and TLS handshakes, or requests sent too slowly) time out
+        self.timeout = config.PROXY_KEEP_ALIVE_TIMEOUT or None
         try:
             BaseHTTPRequestHandler.__init__(self, request, client_address, server)
         except SSLError as e:
             LOG.warning('SSL error when handling request: %s' % e)
 
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        metrics.record_client_connection(self.server_name, 'opened')
+        if self.secure:
+            self.do_tls_handshake()
+
+    @property
+    def server_name(self):
+        proxy = self.server.my_object
+        return proxy.service_name or str(proxy.port)
+
+    def do_tls_handshake(self):
+        """ Perform the TLS handshake in the request thread (rather than when accepting the connection in the
+            server thread), and record its duration, distinguishing full handshakes from resumed sessions. """
+        start = time.time()
+        try:
+            self.connection.do_handshake()
+        except (SSLError, socket.error) as e:
+            LOG.debug('TLS handshake with client %s failed: %s' % (self.client_address, e))
+            self.handshake_failed = True
+            return
+        phase = 'resumed' if self.connection.session_reused else 'full'
+        metrics.observe(self.proxy.service_name or str(self.proxy.port), 'TLSHandshake', phase, time.time() - start)
+
+    def handle(self):
+        if self.handshake_failed:
+            return
+        if self.server.worker_pool is None:
+            return BaseHTTPRequestHandler.handle(self)
+        # serve the requests of the connection, but hand over the worker while the connection is idle
+        self.close_connection = 1
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self.wait_for_request():
+                return
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """ Wait for the next request on a kept-alive connection, and return whether it has arrived. Returns False
+            (to close the idle connection and free its worker) if connections are waiting for a worker of the
+            bounded worker pool, or if the connection has been idle for PROXY_KEEP_ALIVE_TIMEOUT. """
+        if self.has_buffered_data():
+            return True
+        deadline = time.time() + self.timeout if self.timeout else None
+        while self.server.worker_pool.stats.get('queue_depth') <= 0:
+            wait_time = IDLE_POLL_INTERVAL
+            if deadline is not None:
+                wait_time = min(wait_time, deadline - time.time())
+                if wait_time <= 0:
+                    metrics.record_client_connection(self.server_name, 'timeouts')
+                    return False
+            if select.select([self.connection], [], [], wait_time)[0]:
+                return True
+        return False
+
+    def has_buffered_data(self):
+        """ Return whether data of the next request has already been read from the socket (e.g., pipelined
+            requests), which is not indicated by `select(..)`. """
+        if self.secure and self.connection.pending():
+            return True
+        buffer = getattr(self.rfile, '_rbuf', None)
+        if buffer is not None:
+            # socket file object under Python 2
+            return buffer.tell() > 0
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except (SSLError, socket.error):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def parse_request(self):
         result = BaseHTTPRequestHandler.parse_request(self)
         if not result:
             return result
+        # determine the proxy serving this request (e.g., the proxy of the target service, for the edge proxy)
+        self.proxy = self.server.my_object.get_target_proxy(self.command, self.path, self.headers)
         if sys.version_info[0] >= 3:
             return result
         # Required fix for Python 2 (otherwise S3 uploads are hanging), based on the Python 3 code:
@@ -122,229 +731,250 @@ class GenericProxyHandler(BaseHTTPRequestHandler):
         return result
 
     def do_GET(self):
-        self.method = requests.get
         self.read_content()
         self.forward('GET')
 
     def do_PUT(self):
-        self.method = requests.put
         self.read_content()
         self.forward('PUT')
 
     def do_POST(self):
-        self.method = requests.post
         self.read_content()
         self.forward('POST')
 
     def do_DELETE(self):
-        self.data_bytes = None
-        self.method = requests.delete
+        self.read_content()
         self.forward('DELETE')
 
     def do_HEAD(self):
-        self.data_bytes = None
-        self.method = requests.head
+        self.read_content()
         self.forward('HEAD')
 
     def do_PATCH(self):
-        self.method = requests.patch
         self.read_content()
         self.forward('PATCH')
 
     def do_OPTIONS(self):
-        self.data_bytes = None
-        self.method = requests.options
+        self.read_content()
         self.forward('OPTIONS')
 
     def read_content(self):
+        self.body_stream = None
+        self.data_bytes = None
         content_length = self.headers.get('Content-Length')
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            body_stream = ChunkedRequestBodyStream(self.rfile)
+            if self._should_stream_request():
+                self.body_stream = body_stream
+                return
+            self.data_bytes = body_stream.read_all()
+            # the body is forwarded to the backend in decoded form
+            del self.headers['Transfer-Encoding']
+            del self.headers['Content-Length']
+            self.headers['Content-Length'] = str(len(self.data_bytes))
+            return
         if content_length:
-            self.data_bytes = self.rfile.read(int(content_length))
+            content_length = int(content_length)
+            if content_length > 0 and self._should_stream_request():
+                self.body_stream = RequestBodyStream(self.rfile, content_length)
+                return
+            self.data_bytes = self.rfile.read(content_length)
             return
 
-        self.data_bytes = None
-        if self.method in (requests.post, requests.put):
-            LOG.warning('Expected Content-Length header not found in POST/PUT request')
-
-            # If the Content-Length header is missing, try to read
-            # content from the socket using a socket timeout.
-            socket_timeout_secs = 0.5
-            self.request.settimeout(socket_timeout_secs)
-            block_length = 1
-            while True:
-                try:
-                    # TODO find a more efficient way to do this!
-                    tmp = self.rfile.read(block_length)
-                    if self.data_bytes is None:
-                        self.data_bytes = tmp
-                    else:
-                        self.data_bytes += tmp
-                except socket.timeout:
-                    break
-
-    def build_x_forwarded_for(self, headers):
-        x_forwarded_for = headers.get('X-Forwarded-For')
+        # Without Content-Length and Transfer-Encoding headers, the request has no body (RFC 7230, section 3.3.3)
+        if self.command in ('POST', 'PUT'):
+            LOG.debug('Neither Content-Length nor Transfer-Encoding header found in %s request' % self.command)
 
-        client_address = self.client_address[0]
-        server_address = ':'.join(map(str, self.server.server_address))
+    def _should_stream_request(self):
+        if self.proxy.get_pipeline().streaming_listeners['stream_request_body'] is None:
+            return False
+        return should_stream_body(self.proxy, 'stream_request_body', self.command,
+            get_proxy_path(self.path), CaseInsensitiveDict(self.headers))
 
-        if x_forwarded_for:
-            x_forwarded_for_list = (x_forwarded_for, client_address, server_address)
-        else:
-            x_forwarded_for_list = (client_address, server_address)
-
-        return ', '.join(x_forwarded_for_list)
+    def build_x_forwarded_for(self, headers):
+        return build_x_forwarded_for(headers, self.client_address, self.server.server_address)
 
     def forward(self, method):
         data = self.data_bytes
         forward_headers = CaseInsensitiveDict(self.headers)
 
-        # force close connection
-        if forward_headers.get('Connection', '').lower() != 'keep-alive':
+        metrics.record_client_connection(self.server_name, 'requests')
+        if not keep_connection_alive(self.request_version, forward_headers):
+            self.close_connection = 1
+        elif self.server.worker_pool is not None and self.server.worker_pool.stats.get('queue_depth') > 0:
+            # hand over the worker of this (otherwise idle) connection to the connections waiting in the queue
             self.close_connection = 1
 
-        path = self.path
-        if '://' in path:
-            path = '/' + path.split('://', 1)[1].split('/', 1)[1]
-        forward_url = self.proxy.forward_url
-        for listener in self._listeners():
-            if listener:
-                forward_url = listener.get_forward_url(method, path, data, forward_headers) or forward_url
-
-        proxy_url = '%s%s' % (forward_url, path)
-        target_url = self.path
-        if '://' not in target_url:
-            target_url = '%s%s' % (forward_url, target_url)
-
-        # update original "Host" header (moto s3 relies on this behavior)
-        if not forward_headers.get('Host'):
-            forward_headers['host'] = urlparse(target_url).netloc
-        if 'localhost.atlassian.io' in forward_headers.get('Host'):
-            forward_headers['host'] = 'localhost'
-        forward_headers['X-Forwarded-For'] = self.build_x_forwarded_for(forward_headers)
-
+        body_stream = self.body_stream
+        self.body_stream = None
+        response_started = False
+        context = None
+        response = None
         try:
-            response = None
-            modified_request = None
+            context = ProxyRequestContext(self.proxy, method, self.path, data, forward_headers,
+                client_address=self.client_address, server_address=self.server.server_address)
+            if body_stream is not None:
+                context.data_to_send = body_stream
+            context.stream_response = should_stream_body(self.proxy, 'stream_response_body',
+                method, context.path, forward_headers)
+            cached_response = get_cached_response(context)
+            if cached_response is not None:
+                response_started = True
+                self.write_response(cached_response)
+                context.timer.mark('write')
+                return
             # update listener (pre-invocation)
-            for listener in self._listeners():
-                if not listener:
-                    continue
-                listener_result = listener.forward_request(method=method,
-                    path=path, data=data, headers=forward_headers)
-                if isinstance(listener_result, Response):
-                    response = listener_result
-                    break
-                if isinstance(listener_result, dict):
-                    response = Response()
-                    response._content = json.dumps(listener_result)
-                    response.status_code = 200
-                    break
-                elif isinstance(listener_result, Request):
-                    modified_request = listener_result
-                    data = modified_request.data
-                    forward_headers = modified_request.headers
-                    break
-                elif listener_result is not True:
-                    # get status code from response, or use Bad Gateway status code
-                    code = listener_result if isinstance(listener_result, int) else 503
-                    self.send_response(code)
-                    self.send_header('Content-Length', '0')
-                    self.end_headers()
-                    return
+            invoke_forward_listeners(context)
+            if context.status_code:
+                self.write_response_head(context.status_code, [('Content-Length', '0')])
+                context.timer.mark('write')
+                return
             # perform the actual invocation of the backend service
+            response = context.response
             if response is None:
-                forward_headers['Connection'] = forward_headers.get('Connection') or 'close'
-                data_to_send = self.data_bytes
-                request_url = proxy_url
-                if modified_request:
-                    if modified_request.url:
-                        request_url = '%s%s' % (forward_url, modified_request.url)
-                    data_to_send = modified_request.data
-
-                response = self.method(request_url, data=data_to_send,
-                    headers=forward_headers, stream=True)
-
-                # prevent requests from processing response body
-                if not response._content_consumed and response.raw:
-                    response._content = response.raw.read()
+                response = invoke_backend(context)
             # update listener (post-invocation)
-            if self.proxy.update_listener:
-                kwargs = {
-                    'method': method,
-                    'path': path,
-                    'data': data,
-                    'headers': forward_headers,
-                    'response': response
-                }
-                if 'request_handler' in inspect.getargspec(self.proxy.update_listener.return_response)[0]:
-                    # some listeners (e.g., sqs_listener.py) require additional details like the original
-                    # request port, hence we pass in a reference to this request handler as well.
-                    kwargs['request_handler'] = self
-                updated_response = self.proxy.update_listener.return_response(**kwargs)
-                if isinstance(updated_response, Response):
-                    response = updated_response
-
-            # copy headers and return response
-            self.send_response(response.status_code)
-
-            content_length_sent = False
-            for header_key, header_value in iteritems(response.headers):
-                # filter out certain headers that we don't want to transmit
-                if header_key.lower() not in ('transfer-encoding', 'date', 'server'):
-                    self.send_header(header_key, header_value)
-                    content_length_sent = content_length_sent or header_key.lower() == 'content-length'
-            if not content_length_sent:
-                self.send_header('Content-Length', '%s' % len(response.content) if response.content else 0)
-
-            # allow pre-flight CORS headers by default
-            if 'Access-Control-Allow-Origin' not in response.headers:
-                self.send_header('Access-Control-Allow-Origin', '*')
-            if 'Access-Control-Allow-Methods' not in response.headers:
-                self.send_header('Access-Control-Allow-Methods', ','.join(CORS_ALLOWED_METHODS))
-            if 'Access-Control-Allow-Headers' not in response.headers:
-                self.send_header('Access-Control-Allow-Headers', ','.join(CORS_ALLOWED_HEADERS))
-            if 'Access-Control-Expose-Headers' not in response.headers:
-                self.send_header('Access-Control-Expose-Headers', ','.join(CORS_EXPOSE_HEADERS))
-
-            self.end_headers()
-            if response.content and len(response.content):
-                self.wfile.write(to_bytes(response.content))
+            response = invoke_return_listener(context, response, request_handler=self)
+            finish_cached_request(context, response)
+
+            response_started = True
+            self.write_response(response)
+            context.timer.mark('write')
         except Exception as e:
-            trace = str(traceback.format_exc())
-            conn_errors = ('ConnectionRefusedError', 'NewConnectionError',
-                           'Connection aborted', 'Unexpected EOF', 'Connection reset by peer')
-            conn_error = any(e in trace for e in conn_errors)
-            error_msg = 'Error forwarding request: %s %s' % (e, trace)
-            if 'Broken pipe' in trace:
-                LOG.warn('Connection prematurely closed by client (broken pipe).')
-            elif not self.proxy.quiet or not conn_error:
-                LOG.error(error_msg)
-                if os.environ.get(ENV_INTERNAL_TEST_RUN):
-                    # During a test run, we also want to print error messages, because
-                    # log messages are delayed until the entire test run is over, and
-                    # hence we are missing messages if the test hangs for some reason.
-                    print('ERROR: %s' % error_msg)
-            self.send_response(502)  # bad gateway
-            self.end_headers()
-            # force close connection
-            self.close_connection = 1
+            log_forward_error(self.proxy, e)
+            if response_started:
+                # the response may have been sent partially - cannot reuse this connection
+                self.close_connection = 1
+            else:
+                self.write_response_head(502, [('Content-Length', '0')])  # bad gateway
         finally:
+            if body_stream is not None and not body_stream.is_consumed():
+                # request body has not been (fully) consumed - cannot reuse this connection
+                self.close_connection = 1
             try:
                 self.wfile.flush()
             except Exception as e:
                 LOG.warning('Unable to flush write file: %s' % e)
+            # release the backend connection of streaming responses not (fully) written to the client
+            close_response(response)
+            if context is not None:
+                finish_cached_request(context)
+                context.timer.finish()
 
-    def _listeners(self):
-        return self.DEFAULT_LISTENERS + [self.proxy.update_listener]
+    def write_response(self, response):
+        """ Write the given response to the client. The head is encoded in a single pass, and small bodies
+            are sent in the same write. Larger bodies are written without copying them (memoryview), and
+            file-backed bodies are sent via sendfile (where supported). Buffered bodies are compressed if
+            enabled for the service (see PROXY_COMPRESSION). """
+        if not is_streaming_response(response):
+            body = get_response_body(response)
+            headers = get_response_headers(response, body, method=self.command)
+            headers, body = compression.compress_response(self.proxy.service_name, self.command, self.headers,
+                response.status_code, headers, body)
+            if len(body) <= MAX_COALESCED_BODY_SIZE:
+                return self.write_response_head(response.status_code, headers, body)
+            self.write_response_head(response.status_code, headers)
+            self.wfile.write(memoryview(body))
+            return
+
+        headers = get_response_headers(response, method=self.command)
+        no_body = self.command == 'HEAD' or response.status_code in (204, 304)
+        chunked = False
+        if not no_body and not any(key.lower() == 'content-length' for key, value in headers):
+            if self.request_version == 'HTTP/1.1' and self.protocol_version >= 'HTTP/1.1':
+                # frame the body with chunked transfer encoding, to keep the connection alive
+                chunked = True
+                headers.append(('Transfer-Encoding', 'chunked'))
+            else:
+                # the end of the body is indicated by closing the connection
+                self.close_connection = 1
+        self.write_response_head(response.status_code, headers)
+        if is_file_response(response):
+            try:
+                if chunked:
+                    self.write_chunks(iter(lambda: response.raw.read(STREAM_CHUNK_SIZE), b''))
+                elif hasattr(self.connection, 'sendfile'):
+                    self.wfile.flush()
+                    self.connection.sendfile(response.raw)
+                else:
+                    shutil.copyfileobj(response.raw, self.wfile, STREAM_CHUNK_SIZE)
+            finally:
+                response.raw.close()
+            return
+        chunks = response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+        if chunked:
+            self.write_chunks(chunks)
+        else:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        response.raw.release_conn()
+
+    def write_chunks(self, chunks):
+        """ Write the given body chunks to the client, with chunked transfer encoding. """
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(to_bytes('%x\r\n' % len(chunk)))
+                self.wfile.write(chunk)
+                self.wfile.write(b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_response_head(self, status_code, headers, body=b''):
+        """ Write the status line and headers (followed by the given body) to the client, in a single write. """
+        reason = self.responses.get(status_code, ('',))[0]
+        start_line = '%s %d %s' % (self.protocol_version, status_code, reason)
+        headers = [('Server', self.version_string()), ('Date', self.date_time_string())] + headers
+        if self.close_connection:
+            headers.append(('Connection', 'close'))
+        elif self.request_version != 'HTTP/1.1':
+            headers.append(('Connection', 'keep-alive'))
+        head = encode_http_head(start_line, headers)
+        self.wfile.write(head + body if body else head)
+
+    def log_error(self, format, *args):
+        if format.startswith('Request timed out'):
+            metrics.record_client_connection(self.server_name, 'timeouts')
+
+    def log_message(self, format, *args):
+        return
+
+
+class ThrottlingRequestHandler(BaseHTTPRequestHandler):
+    """ Handler that responds to a single request with a throttling error, without invoking any listeners. """
+
+    # socket timeout (in secs), to avoid blocking on slow clients
+    timeout = 2
+    # max. size of request bodies consumed before responding (larger bodies are discarded by closing the socket)
+    max_body_size = 1024 * 1024
+
+    def __getattr__(self, name):
+        if name.startswith('do_'):
+            return self.send_throttling_response
+        raise AttributeError(name)
+
+    def send_throttling_response(self):
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if 0 < content_length <= self.max_body_size:
+            self.rfile.read(content_length)
+        response = get_throttling_response(self.headers)
+        self.send_response(response.status_code)
+        for header_key, header_value in iteritems(response.headers):
+            self.send_header(header_key, header_value)
+        self.send_header('Content-Length', str(len(response.content)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(response.content)
+        self.close_connection = True
 
     def log_message(self, format, *args):
         return
 
 
 class GenericProxy(FuncThread):
-    def __init__(self, port, forward_url=None, ssl=False, host=None, update_listener=None, quiet=False, params={}):
+    def __init__(self, port, forward_url=None, ssl=False, host=None, update_listener=None, quiet=False, params={},
+            service_name=None):
         FuncThread.__init__(self, self.run_cmd, params, quiet=quiet)
+        # name of the service used to label request metrics (defaults to the port)
+        self.service_name = service_name
         self.httpd = None
         self.port = port
         self.ssl = ssl
@@ -354,20 +984,51 @@ class GenericProxy(FuncThread):
                 forward_url = 'http://%s' % forward_url
             forward_url = forward_url.rstrip('/')
         self.forward_url = forward_url
+        # setting the update listener also compiles the listener pipeline (see ListenerPipeline)
         self.update_listener = update_listener
         self.server_stopped = False
         # Required to enable 'Connection: keep-alive' for S3 uploads
         self.protocol_version = params.get('protocol_version') or 'HTTP/1.1'
         self.listen_host = host or ''
 
+    @property
+    def update_listener(self):
+        return self._update_listener
+
+    @update_listener.setter
+    def update_listener(self, update_listener):
+        self._update_listener = update_listener
+        self._pipeline = ListenerPipeline(GenericProxyHandler.DEFAULT_LISTENERS, update_listener)
+
+    def get_pipeline(self):
+        """ Return the compiled listener pipeline, which is rebuilt if the default listeners have changed. """
+        pipeline = self._pipeline
+        if pipeline.num_default_listeners != len(GenericProxyHandler.DEFAULT_LISTENERS):
+            pipeline = self._pipeline = ListenerPipeline(GenericProxyHandler.DEFAULT_LISTENERS, self._update_listener)
+        return pipeline
+
+    def get_target_proxy(self, method, path, headers):
+        """ Return the proxy whose listeners and backend serve the given request (see edge.EdgeProxy). """
+        return self
+
     def run_cmd(self, params):
         try:
+            if config.PROXY_ENGINE == 'asyncio' and six.PY3:
+                # Note: import here, as the asyncio engine is not available in Python 2
+                from localstack.utils.server.async_proxy import AsyncioHTTPServer
+                self.httpd = AsyncioHTTPServer((self.listen_host, self.port), self)
+                self.httpd.serve_forever()
+                return
+            if config.PROXY_ENGINE != 'threaded':
+                LOG.warning('Proxy engine "%s" not available, falling back to "threaded"' % config.PROXY_ENGINE)
             self.httpd = ThreadedHTTPServer((self.listen_host, self.port), GenericProxyHandler)
+            if config.PROXY_MAX_WORKERS > 0:
+                self.httpd.worker_pool = BoundedWorkerPool(str(self.port),
+                    config.PROXY_MAX_WORKERS, config.PROXY_MAX_QUEUE_SIZE)
             if self.ssl:
-                # make sure we have a cert generated
-                combined_file, cert_file_name, key_file_name = GenericProxy.create_ssl_cert()
-                self.httpd.socket = ssl.wrap_socket(self.httpd.socket,
-                    server_side=True, certfile=combined_file)
+                # handshakes are performed in the request threads (see GenericProxyHandler.do_tls_handshake)
+                self.httpd.socket = self.get_ssl_context().wrap_socket(self.httpd.socket,
+                    server_side=True, do_handshake_on_connect=False)
             self.httpd.my_object = self
             self.httpd.serve_forever()
         except Exception as e:
@@ -381,8 +1042,35 @@ class GenericProxy(FuncThread):
             self.server_stopped = True
 
     @classmethod
-    def create_ssl_cert(cls, random=True):
-        return generate_ssl_cert(SERVER_CERT_PEM_FILE, random=random)
+    def create_ssl_cert(cls, random=False, overwrite=False):
+        """ Return the (combined_file, cert_file, key_file) of the server certificate, which is generated
+            once and persisted, unless a random temporary certificate is requested. """
+        with SSL_CONTEXT_LOCK:
+            return generate_ssl_cert(SERVER_CERT_PEM_FILE, random=random, persistent=not random,
+                overwrite=overwrite)
+
+    @classmethod
+    def get_ssl_context(cls):
+        """ Return the server-side SSL context shared by all proxies. Using a single context (and hence a single
+            session cache and set of ticket keys) allows clients to resume their TLS sessions on all ports. """
+        context = SSL_CONTEXT.get('server')
+        if context is not None:
+            return context
+        with SSL_CONTEXT_LOCK:
+            context = SSL_CONTEXT.get('server')
+            if context is None:
+                start = time.time()
+                context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+                context.options &= ~getattr(ssl, 'OP_NO_TICKET', 0)
+                try:
+                    context.load_cert_chain(cls.create_ssl_cert()[0])
+                except SSLError as e:
+                    # e.g., a certificate persisted by a previous version, which uses a key that is too weak
+                    LOG.info('Unable to load persisted certificate, generating a new one: %s' % e)
+                    context.load_cert_chain(cls.create_ssl_cert(overwrite=True)[0])
+                metrics.observe('tls', 'Startup', 'load_certificate', time.time() - start)
+                SSL_CONTEXT['server'] = context
+        return context
 
     @classmethod
     def get_flask_ssl_context(cls):
@@ -16,12 +16,13 @@ from localstack.constants import (
     DEFAULT_PORT_APIGATEWAY_BACKEND, DEFAULT_PORT_SNS_BACKEND,
     DEFAULT_PORT_IAM_BACKEND, DEFAULT_PORT_EC2_BACKEND, DEFAULT_SERVICE_PORTS)
 from localstack.utils import common, persistence
-from localstack.utils.common import (TMP_THREADS, run, get_free_tcp_port,
+from localstack.utils.common import (TMP_THREADS, TMP_PROCESSES, run, get_free_tcp_port,
     FuncThread, ShellCommandThread, get_service_protocol, in_docker, is_port_open)
-from localstack.utils.server import multiserver
+from localstack.utils.server import (
+    multiserver, connection_pool, worker_pool, metrics, proxy_processes, response_cache)
 from localstack.utils.bootstrap import setup_logging, is_debug, canonicalize_api_names, load_plugins
 from localstack.utils.analytics import event_publisher
-from localstack.services import generic_proxy, install
+from localstack.services import generic_proxy, install, edge
 from localstack.services.es import es_api
 from localstack.services.firehose import firehose_api
 from localstack.services.awslambda import lambda_api
@@ -107,8 +108,64 @@ class ConfigUpdateProxyListener(ProxyListener):
         response._content = json.dumps(result)
         return response
 
+    def stream_request_body(self, method, path, headers):
+        return path != constants.CONFIG_UPDATE_PATH
+
+    def stream_response_body(self, method, path, headers):
+        return True
+
+
+class PoolStatsProxyListener(ProxyListener):
+    """ Default proxy listener that returns the statistics of the backend connection pools and worker pools. """
+
+    def forward_request(self, method, path, data, headers):
+        if path != constants.POOL_STATS_PATH or method != 'GET':
+            return True
+        response = Response()
+        stats = {
+            'connections': connection_pool.get_pool_stats(),
+            'workers': worker_pool.get_worker_pool_stats(),
+            'clients': metrics.get_client_connection_stats(),
+            'cache': response_cache.get_cache_stats()
+        }
+        stats.update((name, value) for name, (label, value) in metrics.get_registered_stats().items())
+        response._content = json.dumps(stats)
+        response.status_code = 200
+        return response
+
+    def stream_request_body(self, method, path, headers):
+        return True
+
+    def stream_response_body(self, method, path, headers):
+        return True
+
+
+class MetricsProxyListener(ProxyListener):
+    """ Default proxy listener that returns the request metrics of the service proxies. """
+
+    def forward_request(self, method, path, data, headers):
+        if method != 'GET' or path.split('?')[0] != constants.METRICS_PATH:
+            return True
+        response = Response()
+        if 'format=json' in path:
+            response._content = json.dumps(metrics.get_metrics())
+            response.headers['Content-Type'] = 'application/json'
+        else:
+            response._content = metrics.get_prometheus_metrics()
+            response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+        response.status_code = 200
+        return response
+
+    def stream_request_body(self, method, path, headers):
+        return True
+
+    def stream_response_body(self, method, path, headers):
+        return True
+
 
 GenericProxyHandler.DEFAULT_LISTENERS.append(ConfigUpdateProxyListener())
+GenericProxyHandler.DEFAULT_LISTENERS.append(PoolStatsProxyListener())
+GenericProxyHandler.DEFAULT_LISTENERS.append(MetricsProxyListener())
 
 
 # -----------------
@@ -290,14 +347,18 @@ def start_proxy_for_service(service_name, port, default_backend_port, update_lis
     # check if we have a custom backend configured
     custom_backend_url = os.environ.get('%s_BACKEND' % service_name.upper())
     backend_url = custom_backend_url or ('http://%s:%s' % (DEFAULT_BACKEND_HOST, default_backend_port))
-    return start_proxy(port, backend_url=backend_url, update_listener=update_listener, quiet=quiet, params=params)
+    return start_proxy(port, backend_url=backend_url, update_listener=update_listener, quiet=quiet, params=params,
+        service_name=service_name)
 
 
-def start_proxy(port, backend_url, update_listener, quiet=False, params={}):
-    proxy_thread = GenericProxy(port=port, forward_url=backend_url,
-        ssl=USE_SSL, update_listener=update_listener, quiet=quiet, params=params)
+def start_proxy(port, backend_url, update_listener, quiet=False, params={}, service_name=None):
+    proxy_thread = GenericProxy(port=port, forward_url=backend_url, ssl=USE_SSL, update_listener=update_listener,
+        quiet=quiet, params=params, service_name=service_name)
     proxy_thread.start()
     TMP_THREADS.append(proxy_thread)
+    if service_name:
+        edge.register_service_proxy(service_name, proxy_thread)
+    proxy_processes.register_proxy(proxy_thread)
     return proxy_thread
 
 
@@ -343,6 +404,7 @@ def stop_infra():
     generic_proxy.QUIET = True
     common.cleanup(files=True, quiet=True)
     common.cleanup_resources()
+    connection_pool.close_sessions()
     lambda_api.cleanup()
     time.sleep(2)
     # TODO: optimize this (takes too long currently)
@@ -434,11 +496,19 @@ def start_infra(asynchronous=False, apis=None):
                 t1 = plugin.start(asynchronous=True)
                 thread = thread or t1
 
+        # start the edge router, which serves all APIs on a single port
+        if config.EDGE_PORT:
+            edge_proxy = edge.start_edge(config.EDGE_PORT, asynchronous=True)
+            TMP_THREADS.append(edge_proxy)
+            proxy_processes.register_proxy(edge_proxy)
+
         time.sleep(sleep_time)
         # ensure that all infra components are up and running
         check_infra(apis=apis)
         # restore persisted data
         restore_persisted_data(apis=apis)
+        # fork additional processes serving the proxies (see PROXY_PROCESSES)
+        TMP_PROCESSES.extend(proxy_processes.start_proxy_workers())
         print('Ready.')
         sys.stdout.flush()
         if not asynchronous and thread:
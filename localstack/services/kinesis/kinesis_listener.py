@@ -3,6 +3,7 @@ import random
 from requests.models import Response
 from localstack import config
 from localstack.utils.common import to_str
+from localstack.utils.aws.action_router import ActionRouter
 from localstack.utils.analytics import event_publisher
 from localstack.services.awslambda import lambda_api
 from localstack.services.generic_proxy import ProxyListener
@@ -16,108 +17,131 @@ ACTION_DELETE_STREAM = '%s.DeleteStream' % ACTION_PREFIX
 ACTION_UPDATE_SHARD_COUNT = '%s.UpdateShardCount' % ACTION_PREFIX
 
 
+def parse_request_data(method, path, data):
+    return json.loads(to_str(data))
+
+
 class ProxyListenerKinesis(ProxyListener):
+    router = ActionRouter(parse_request_data)
 
     def forward_request(self, method, path, data, headers):
-        data = json.loads(to_str(data))
-        action = headers.get('X-Amz-Target')
-
-        if action == '%s.DescribeStreamSummary' % ACTION_PREFIX:
-            stream_arn = data.get('StreamARN') or data['StreamName']
-            # TODO fix values below
-            result = {
-                'StreamDescriptionSummary': {
-                    'ConsumerCount': 0,
-                    'EnhancedMonitoring': [],
-                    'KeyId': 'string',
-                    'OpenShardCount': 0,
-                    'RetentionPeriodHours': 1,
-                    'StreamARN': stream_arn,
-                    # 'StreamCreationTimestamp': number,
-                    'StreamName': data['StreamName'],
-                    'StreamStatus': 'ACTIVE'
-                }
+        return self.router.forward_request(self, method, path, data, headers)
+
+    @router.forward('DescribeStreamSummary')
+    def forward_describe_stream_summary(self, request):
+        data = request.payload
+        stream_arn = data.get('StreamARN') or data['StreamName']
+        # TODO fix values below
+        result = {
+            'StreamDescriptionSummary': {
+                'ConsumerCount': 0,
+                'EnhancedMonitoring': [],
+                'KeyId': 'string',
+                'OpenShardCount': 0,
+                'RetentionPeriodHours': 1,
+                'StreamARN': stream_arn,
+                # 'StreamCreationTimestamp': number,
+                'StreamName': data['StreamName'],
+                'StreamStatus': 'ACTIVE'
             }
-            return result
-        if action == '%s.DescribeStreamConsumer' % ACTION_PREFIX:
-            consumer_arn = data.get('ConsumerARN') or data['ConsumerName']
-            consumer_name = data.get('ConsumerName') or data['ConsumerARN']
-            result = {
-                'ConsumerDescription': {
-                    'ConsumerARN': consumer_arn,
-                    # 'ConsumerCreationTimestamp': number,
-                    'ConsumerName': consumer_name,
-                    'ConsumerStatus': 'ACTIVE',
-                    'StreamARN': data.get('StreamARN')
-                }
+        }
+        return result
+
+    @router.forward('DescribeStreamConsumer')
+    def forward_describe_stream_consumer(self, request):
+        data = request.payload
+        consumer_arn = data.get('ConsumerARN') or data['ConsumerName']
+        consumer_name = data.get('ConsumerName') or data['ConsumerARN']
+        result = {
+            'ConsumerDescription': {
+                'ConsumerARN': consumer_arn,
+                # 'ConsumerCreationTimestamp': number,
+                'ConsumerName': consumer_name,
+                'ConsumerStatus': 'ACTIVE',
+                'StreamARN': data.get('StreamARN')
             }
-            return result
+        }
+        return result
 
+    @router.forward('PutRecord', 'PutRecords')
+    def forward_put_records(self, request):
         if random.random() < config.KINESIS_ERROR_PROBABILITY:
-            action = headers.get('X-Amz-Target')
-            if action in [ACTION_PUT_RECORD, ACTION_PUT_RECORDS]:
-                return kinesis_error_response(data, action)
+            return kinesis_error_response(request.payload, request.headers.get('X-Amz-Target'))
         return True
 
     def return_response(self, method, path, data, headers, response):
-        action = headers.get('X-Amz-Target')
-        data = json.loads(to_str(data))
-
-        records = []
-        if action in (ACTION_CREATE_STREAM, ACTION_DELETE_STREAM):
-            event_type = (event_publisher.EVENT_KINESIS_CREATE_STREAM if action == ACTION_CREATE_STREAM
-                          else event_publisher.EVENT_KINESIS_DELETE_STREAM)
-            payload = {'n': event_publisher.get_hash(data.get('StreamName'))}
-            if action == ACTION_CREATE_STREAM:
-                payload['s'] = data.get('ShardCount')
-            event_publisher.fire_event(event_type, payload=payload)
-        elif action == ACTION_PUT_RECORD:
-            response_body = json.loads(to_str(response.content))
-            event_record = {
-                'data': data['Data'],
-                'partitionKey': data['PartitionKey'],
-                'sequenceNumber': response_body.get('SequenceNumber')
-            }
-            event_records = [event_record]
+        return self.router.return_response(self, method, path, data, headers, response)
+
+    @router.returns('CreateStream', 'DeleteStream')
+    def return_create_or_delete_stream(self, request, response):
+        data = request.payload
+        event_type = (event_publisher.EVENT_KINESIS_CREATE_STREAM if request.action == 'CreateStream'
+                      else event_publisher.EVENT_KINESIS_DELETE_STREAM)
+        payload = {'n': event_publisher.get_hash(data.get('StreamName'))}
+        if request.action == 'CreateStream':
+            payload['s'] = data.get('ShardCount')
+        event_publisher.fire_event(event_type, payload=payload)
+
+    @router.returns('PutRecord')
+    def return_put_record(self, request, response):
+        data = request.payload
+        response_body = json.loads(to_str(response.content))
+        event_record = {
+            'data': data['Data'],
+            'partitionKey': data['PartitionKey'],
+            'sequenceNumber': response_body.get('SequenceNumber'),
+            'shardId': response_body.get('ShardId')
+        }
+        event_records = [event_record]
+        stream_name = data['StreamName']
+        lambda_api.process_kinesis_records(event_records, stream_name)
+
+    @router.returns('PutRecords')
+    def return_put_records(self, request, response):
+        data = request.payload
+        event_records = []
+        response_body = json.loads(to_str(response.content))
+        if 'Records' in response_body:
+            response_records = response_body['Records']
+            records = data['Records']
+            for index in range(0, len(records)):
+                record = records[index]
+                event_record = {
+                    'data': record['Data'],
+                    'partitionKey': record['PartitionKey'],
+                    'sequenceNumber': response_records[index].get('SequenceNumber'),
+                    'shardId': response_records[index].get('ShardId')
+                }
+                if not event_record['sequenceNumber']:
+                    # the record has failed (e.g., due to throttling), and has not been added to the stream
+                    continue
+                event_records.append(event_record)
             stream_name = data['StreamName']
             lambda_api.process_kinesis_records(event_records, stream_name)
-        elif action == ACTION_PUT_RECORDS:
-            event_records = []
-            response_body = json.loads(to_str(response.content))
-            if 'Records' in response_body:
-                response_records = response_body['Records']
-                records = data['Records']
-                for index in range(0, len(records)):
-                    record = records[index]
-                    event_record = {
-                        'data': record['Data'],
-                        'partitionKey': record['PartitionKey'],
-                        'sequenceNumber': response_records[index].get('SequenceNumber')
-                    }
-                    event_records.append(event_record)
-                stream_name = data['StreamName']
-                lambda_api.process_kinesis_records(event_records, stream_name)
-        elif action == ACTION_UPDATE_SHARD_COUNT:
-            # Currently kinesalite, which backs the Kinesis implementation for localstack, does
-            # not support UpdateShardCount:
-            # https://github.com/mhart/kinesalite/issues/61
-            #
-            # [Terraform](https://www.terraform.io) makes the call to UpdateShardCount when it
-            # applies Kinesis resources. A Terraform run fails when this is not present.
-            #
-            # The code that follows just returns a successful response, bypassing the 400
-            # response that kinesalite returns.
-            #
-            response = Response()
-            response.status_code = 200
-            content = {
-                'CurrentShardCount': 1,
-                'StreamName': data['StreamName'],
-                'TargetShardCount': data['TargetShardCount']
-            }
-            response.encoding = 'UTF-8'
-            response._content = json.dumps(content)
-            return response
+
+    @router.returns('UpdateShardCount')
+    def return_update_shard_count(self, request, response):
+        # Currently kinesalite, which backs the Kinesis implementation for localstack, does
+        # not support UpdateShardCount:
+        # https://github.com/mhart/kinesalite/issues/61
+        #
+        # [Terraform](https://www.terraform.io) makes the call to UpdateShardCount when it
+        # applies Kinesis resources. A Terraform run fails when this is not present.
+        #
+        # The code that follows just returns a successful response, bypassing the 400
+        # response that kinesalite returns.
+        #
+        data = request.payload
+        response = Response()
+        response.status_code = 200
+        content = {
+            'CurrentShardCount': 1,
+            'StreamName': data['StreamName'],
+            'TargetShardCount': data['TargetShardCount']
+        }
+        response.encoding = 'UTF-8'
+        response._content = json.dumps(content)
+        return response
 
 
 # instantiate listener
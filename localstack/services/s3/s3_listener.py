@@ -22,17 +22,18 @@ from localstack.utils.common import (
     short_uid, timestamp, TIMESTAMP_FORMAT_MILLIS, to_str, to_bytes, clone, md5, get_service_protocol)
 from localstack.utils.analytics import event_publisher
 from localstack.utils.aws.aws_responses import requests_response
+from localstack.utils.server.proxy_processes import SharedDict
 from localstack.services.s3 import multipart_content
 from localstack.services.generic_proxy import ProxyListener
 
 # mappings for S3 bucket notifications
-S3_NOTIFICATIONS = {}
+S3_NOTIFICATIONS = SharedDict('s3.notifications')
 
 # mappings for bucket CORS settings
-BUCKET_CORS = {}
+BUCKET_CORS = SharedDict('s3.cors')
 
 # mappings for bucket lifecycle settings
-BUCKET_LIFECYCLE = {}
+BUCKET_LIFECYCLE = SharedDict('s3.lifecycle')
 
 # set up logger
 LOGGER = logging.getLogger(__name__)
@@ -394,6 +395,12 @@ def expand_redirect_url(starting_url, key, bucket):
     return redirect_url
 
 
+def is_object_path(path):
+    """ Return True if the given path-style request path refers to an object, i.e., /<bucket>/<key> """
+    parts = urlparse.urlparse(path).path.split('/', 2)
+    return len(parts) > 2 and bool(parts[1]) and bool(parts[2])
+
+
 def get_bucket_name(path, headers):
     parsed = urlparse.urlparse(path)
 
@@ -690,6 +697,24 @@ class ProxyListenerS3(ProxyListener):
             r'<Location>%s://%s/%s/\2</Location>' % (get_service_protocol(), host, bucket_name),
             content, flags=re.MULTILINE)
 
+    def stream_request_body(self, method, path, headers):
+        # stream the payload of object uploads (PutObject/UploadPart) that don't require any inspection
+        if method != 'PUT' or not is_object_path(path) or config.DATA_DIR:
+            return False
+        if 'Content-MD5' in headers or self.is_s3_copy_request(headers, path):
+            return False
+        if headers.get('x-amz-content-sha256') == 'STREAMING-AWS4-HMAC-SHA256-PAYLOAD':
+            return False
+        query_map = urlparse.parse_qs(urlparse.urlparse(path).query, keep_blank_values=True)
+        return set(query_map.keys()) <= set(['partNumber', 'uploadId'])
+
+    def stream_response_body(self, method, path, headers):
+        # stream the payload of object downloads (GetObject)
+        if method != 'GET' or not is_object_path(path):
+            return False
+        query_map = urlparse.parse_qs(urlparse.urlparse(path).query, keep_blank_values=True)
+        return all(key == 'versionId' or key.startswith('response-') for key in query_map.keys())
+
     @staticmethod
     def is_query_allowable(method, query):
         # Generally if there is a query (some/path/with?query) we don't want to send notifications
@@ -9,22 +9,35 @@ from requests.models import Response, Request
 from six.moves.urllib import parse as urlparse
 from localstack.constants import TEST_AWS_ACCOUNT_ID, MOTO_ACCOUNT_ID
 from localstack.utils.aws import aws_stack
+from localstack.utils.aws.action_router import ActionRouter
+from localstack.utils.server.proxy_processes import SharedDict, run_in_primary
 from localstack.utils.common import short_uid, to_str
 from localstack.utils.analytics import event_publisher
 from localstack.services.awslambda import lambda_api
 from localstack.services.generic_proxy import ProxyListener
 
 # mappings for SNS topic subscriptions
-SNS_SUBSCRIPTIONS = {}
+SNS_SUBSCRIPTIONS = SharedDict('sns.subscriptions')
 
 # mappings for SNS tags
-SNS_TAGS = {}
+SNS_TAGS = SharedDict('sns.tags')
 
 # set up logger
 LOGGER = logging.getLogger(__name__)
 
 
+def parse_request_data(method, path, data):
+    return urlparse.parse_qs(to_str(data))
+
+
+def get_topic_arn(req_data):
+    topic_arn = req_data.get('TargetArn') or req_data.get('TopicArn')
+    if topic_arn:
+        return aws_stack.fix_account_id_in_arns(topic_arn[0])
+
+
 class ProxyListenerSNS(ProxyListener):
+    router = ActionRouter(parse_request_data)
 
     def forward_request(self, method, path, data, headers):
 
@@ -35,86 +48,102 @@ class ProxyListenerSNS(ProxyListener):
             return make_error(message=str(e), code=400)
 
         if method == 'POST' and path == '/':
-
-            # parse payload and extract fields
-            req_data = urlparse.parse_qs(to_str(data))
-            req_action = req_data['Action'][0]
-            topic_arn = req_data.get('TargetArn') or req_data.get('TopicArn')
-
-            if topic_arn:
-                topic_arn = topic_arn[0]
-                topic_arn = aws_stack.fix_account_id_in_arns(topic_arn)
-
-            if req_action == 'SetSubscriptionAttributes':
-                sub = get_subscription_by_arn(req_data['SubscriptionArn'][0])
-                if not sub:
-                    return make_error(message='Unable to find subscription for given ARN', code=400)
-                attr_name = req_data['AttributeName'][0]
-                attr_value = req_data['AttributeValue'][0]
-                sub[attr_name] = attr_value
-                return make_response(req_action)
-            elif req_action == 'GetSubscriptionAttributes':
-                sub = get_subscription_by_arn(req_data['SubscriptionArn'][0])
-                if not sub:
-                    return make_error(message='Unable to find subscription for given ARN', code=400)
-                content = '<Attributes>'
-                for key, value in sub.items():
-                    content += '<entry><key>%s</key><value>%s</value></entry>\n' % (key, value)
-                content += '</Attributes>'
-                return make_response(req_action, content=content)
-            elif req_action == 'Subscribe':
-                if 'Endpoint' not in req_data:
-                    return make_error(message='Endpoint not specified in subscription', code=400)
-            elif req_action == 'Unsubscribe':
-                if 'SubscriptionArn' not in req_data:
-                    return make_error(message='SubscriptionArn not specified in unsubscribe request', code=400)
-                do_unsubscribe(req_data.get('SubscriptionArn')[0])
-            elif req_action == 'DeleteTopic':
-                do_delete_topic(topic_arn)
-            elif req_action == 'Publish':
-                # No need to create a topic to send SMS with SNS
-                # but we can't mock a sending so we only return that it went well
-                if 'PhoneNumber' not in req_data:
-                    if topic_arn not in SNS_SUBSCRIPTIONS.keys():
-                        return make_error(code=404, code_string='NotFound', message='Topic does not exist')
-                    publish_message(topic_arn, req_data)
-                # return response here because we do not want the request to be forwarded to SNS backend
-                return make_response(req_action)
-            elif req_action == 'ListTagsForResource':
-                tags = do_list_tags_for_resource(topic_arn)
-                content = '<Tags/>'
-                if len(tags) > 0:
-                    content = '<Tags>'
-                    for tag in tags:
-                        content += '<member>'
-                        content += '<Key>%s</Key>' % tag['Key']
-                        content += '<Value>%s</Value>' % tag['Value']
-                        content += '</member>'
-                    content += '</Tags>'
-                return make_response(req_action, content=content)
-            elif req_action == 'TagResource':
-                tags = []
-                req_tags = {k: v for k, v in req_data.items() if k.startswith('Tags.member.')}
-                for i in range(int(len(req_tags.keys()) / 2)):
-                    key = req_tags['Tags.member.' + str(i + 1) + '.Key'][0]
-                    value = req_tags['Tags.member.' + str(i + 1) + '.Value'][0]
-                    tags.append({'Key': key, 'Value': value})
-                do_tag_resource(topic_arn, tags)
-                return make_response(req_action)
-            elif req_action == 'UntagResource':
-                tags_to_remove = []
-                req_tags = {k: v for k, v in req_data.items() if k.startswith('TagKeys.member.')}
-                req_tags = req_tags.values()
-                for tag in req_tags:
-                    tags_to_remove.append(tag[0])
-                do_untag_resource(topic_arn, tags_to_remove)
-                return make_response(req_action)
+            result = self.router.forward_request(self, method, path, data, headers)
+            if result is not True:
+                return result
 
             data = self._reset_account_id(data)
             return Request(data=data, headers=headers, method=method)
 
         return True
 
+    @router.forward('SetSubscriptionAttributes')
+    def forward_set_subscription_attributes(self, request):
+        req_data = request.payload
+        if not do_set_subscription_attribute(req_data['SubscriptionArn'][0],
+                req_data['AttributeName'][0], req_data['AttributeValue'][0]):
+            return make_error(message='Unable to find subscription for given ARN', code=400)
+        return make_response(request.action)
+
+    @router.forward('GetSubscriptionAttributes')
+    def forward_get_subscription_attributes(self, request):
+        sub = get_subscription_by_arn(request.payload['SubscriptionArn'][0])
+        if not sub:
+            return make_error(message='Unable to find subscription for given ARN', code=400)
+        content = '<Attributes>'
+        for key, value in sub.items():
+            content += '<entry><key>%s</key><value>%s</value></entry>\n' % (key, value)
+        content += '</Attributes>'
+        return make_response(request.action, content=content)
+
+    @router.forward('Subscribe')
+    def forward_subscribe(self, request):
+        if 'Endpoint' not in request.payload:
+            return make_error(message='Endpoint not specified in subscription', code=400)
+        return True
+
+    @router.forward('Unsubscribe')
+    def forward_unsubscribe(self, request):
+        if 'SubscriptionArn' not in request.payload:
+            return make_error(message='SubscriptionArn not specified in unsubscribe request', code=400)
+        do_unsubscribe(request.payload.get('SubscriptionArn')[0])
+        return True
+
+    @router.forward('DeleteTopic')
+    def forward_delete_topic(self, request):
+        do_delete_topic(get_topic_arn(request.payload))
+        return True
+
+    @router.forward('Publish')
+    def forward_publish(self, request):
+        req_data = request.payload
+        # No need to create a topic to send SMS with SNS
+        # but we can't mock a sending so we only return that it went well
+        if 'PhoneNumber' not in req_data:
+            topic_arn = get_topic_arn(req_data)
+            if topic_arn not in SNS_SUBSCRIPTIONS.keys():
+                return make_error(code=404, code_string='NotFound', message='Topic does not exist')
+            publish_message(topic_arn, req_data)
+        # return response here because we do not want the request to be forwarded to SNS backend
+        return make_response(request.action)
+
+    @router.forward('ListTagsForResource')
+    def forward_list_tags_for_resource(self, request):
+        tags = do_list_tags_for_resource(get_topic_arn(request.payload))
+        content = '<Tags/>'
+        if len(tags) > 0:
+            content = '<Tags>'
+            for tag in tags:
+                content += '<member>'
+                content += '<Key>%s</Key>' % tag['Key']
+                content += '<Value>%s</Value>' % tag['Value']
+                content += '</member>'
+            content += '</Tags>'
+        return make_response(request.action, content=content)
+
+    @router.forward('TagResource')
+    def forward_tag_resource(self, request):
+        req_data = request.payload
+        tags = []
+        req_tags = {k: v for k, v in req_data.items() if k.startswith('Tags.member.')}
+        for i in range(int(len(req_tags.keys()) / 2)):
+            key = req_tags['Tags.member.' + str(i + 1) + '.Key'][0]
+            value = req_tags['Tags.member.' + str(i + 1) + '.Value'][0]
+            tags.append({'Key': key, 'Value': value})
+        do_tag_resource(get_topic_arn(req_data), tags)
+        return make_response(request.action)
+
+    @router.forward('UntagResource')
+    def forward_untag_resource(self, request):
+        req_data = request.payload
+        tags_to_remove = []
+        req_tags = {k: v for k, v in req_data.items() if k.startswith('TagKeys.member.')}
+        req_tags = req_tags.values()
+        for tag in req_tags:
+            tags_to_remove.append(tag[0])
+        do_untag_resource(get_topic_arn(req_data), tags_to_remove)
+        return make_response(request.action)
+
     def _reset_account_id(self, data):
         """ Fix account ID in request payload. All external-facing responses contain our
             predefined account ID (defaults to 000000000000), whereas the backend endpoint
@@ -129,33 +158,40 @@ class ProxyListenerSNS(ProxyListener):
             data = aws_stack.fix_account_id_in_arns(data, colon_delimiter='%3A')
             aws_stack.fix_account_id_in_arns(response)
 
-            # parse request and extract data
-            req_data = urlparse.parse_qs(to_str(data))
-            req_action = req_data['Action'][0]
-            if req_action == 'Subscribe' and response.status_code < 400:
-                response_data = xmltodict.parse(response.content)
-                topic_arn = (req_data.get('TargetArn') or req_data.get('TopicArn'))[0]
-                attributes = get_subscribe_attributes(req_data)
-                sub_arn = response_data['SubscribeResponse']['SubscribeResult']['SubscriptionArn']
-                do_subscribe(
-                    topic_arn,
-                    req_data['Endpoint'][0],
-                    req_data['Protocol'][0],
-                    sub_arn,
-                    attributes
-                )
-            if req_action == 'CreateTopic' and response.status_code < 400:
-                response_data = xmltodict.parse(response.content)
-                topic_arn = response_data['CreateTopicResponse']['CreateTopicResult']['TopicArn']
-                do_create_topic(topic_arn)
-                # publish event
-                event_publisher.fire_event(event_publisher.EVENT_SNS_CREATE_TOPIC,
-                    payload={'t': event_publisher.get_hash(topic_arn)})
-            if req_action == 'DeleteTopic' and response.status_code < 400:
-                # publish event
-                topic_arn = (req_data.get('TargetArn') or req_data.get('TopicArn'))[0]
-                event_publisher.fire_event(event_publisher.EVENT_SNS_DELETE_TOPIC,
-                    payload={'t': event_publisher.get_hash(topic_arn)})
+            if response.status_code < 400:
+                self.router.return_response(self, method, path, data, headers, response)
+
+    @router.returns('Subscribe')
+    def return_subscribe(self, request, response):
+        req_data = request.payload
+        response_data = xmltodict.parse(response.content)
+        topic_arn = (req_data.get('TargetArn') or req_data.get('TopicArn'))[0]
+        attributes = get_subscribe_attributes(req_data)
+        sub_arn = response_data['SubscribeResponse']['SubscribeResult']['SubscriptionArn']
+        do_subscribe(
+            topic_arn,
+            req_data['Endpoint'][0],
+            req_data['Protocol'][0],
+            sub_arn,
+            attributes
+        )
+
+    @router.returns('CreateTopic')
+    def return_create_topic(self, request, response):
+        response_data = xmltodict.parse(response.content)
+        topic_arn = response_data['CreateTopicResponse']['CreateTopicResult']['TopicArn']
+        do_create_topic(topic_arn)
+        # publish event
+        event_publisher.fire_event(event_publisher.EVENT_SNS_CREATE_TOPIC,
+            payload={'t': event_publisher.get_hash(topic_arn)})
+
+    @router.returns('DeleteTopic')
+    def return_delete_topic(self, request, response):
+        # publish event
+        req_data = request.payload
+        topic_arn = (req_data.get('TargetArn') or req_data.get('TopicArn'))[0]
+        event_publisher.fire_event(event_publisher.EVENT_SNS_DELETE_TOPIC,
+            payload={'t': event_publisher.get_hash(topic_arn)})
 
 
 # instantiate listener
@@ -223,6 +259,7 @@ def do_delete_topic(topic_arn):
     SNS_SUBSCRIPTIONS.pop(topic_arn, None)
 
 
+@run_in_primary
 def do_subscribe(topic_arn, endpoint, protocol, subscription_arn, attributes):
     subscription = {
         # http://docs.aws.amazon.com/cli/latest/reference/sns/get-subscription-attributes.html
@@ -232,9 +269,23 @@ def do_subscribe(topic_arn, endpoint, protocol, subscription_arn, attributes):
         'SubscriptionArn': subscription_arn,
     }
     subscription.update(attributes)
-    SNS_SUBSCRIPTIONS[topic_arn].append(subscription)
+    subscriptions = SNS_SUBSCRIPTIONS[topic_arn]
+    subscriptions.append(subscription)
+    SNS_SUBSCRIPTIONS[topic_arn] = subscriptions
+
+
+@run_in_primary
+def do_set_subscription_attribute(subscription_arn, attr_name, attr_value):
+    for topic_arn, subscriptions in SNS_SUBSCRIPTIONS.items():
+        for sub in subscriptions:
+            if sub['SubscriptionArn'] == subscription_arn:
+                sub[attr_name] = attr_value
+                SNS_SUBSCRIPTIONS[topic_arn] = subscriptions
+                return True
+    return False
 
 
+@run_in_primary
 def do_unsubscribe(subscription_arn):
     for topic_arn in SNS_SUBSCRIPTIONS:
         SNS_SUBSCRIPTIONS[topic_arn] = [
@@ -253,10 +304,12 @@ def do_list_tags_for_resource(topic_arn):
     return _get_tags(topic_arn)
 
 
+@run_in_primary
 def do_tag_resource(topic_arn, tags):
-    _get_tags(topic_arn).extend(tags)
+    SNS_TAGS[topic_arn] = _get_tags(topic_arn) + tags
 
 
+@run_in_primary
 def do_untag_resource(topic_arn, tag_keys):
     SNS_TAGS[topic_arn] = [t for t in _get_tags(topic_arn) if t['Key'] not in tag_keys]
 
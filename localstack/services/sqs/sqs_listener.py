@@ -6,71 +6,58 @@ from six.moves.urllib.parse import urlencode
 from requests.models import Request, Response
 from localstack import config
 from localstack.config import HOSTNAME_EXTERNAL, SQS_PORT_EXTERNAL
-from localstack.utils.common import to_str, md5
+from localstack.utils.common import to_str
 from localstack.utils.analytics import event_publisher
-from localstack.services.awslambda import lambda_api
 from localstack.utils.aws.aws_stack import extract_region_from_auth_header
+from localstack.utils.aws.action_router import ActionRouter
+from localstack.utils.server.proxy_processes import SharedDict
 from localstack.services.generic_proxy import ProxyListener
 
 
 XMLNS_SQS = 'http://queue.amazonaws.com/doc/2012-11-05/'
 
-SUCCESSFUL_SEND_MESSAGE_XML_TEMPLATE = """
-    <?xml version="1.0"?>
-    <SendMessageResponse xmlns="%s">
-        <SendMessageResult>
-            <MD5OfMessageAttributes>{message_attr_hash}</MD5OfMessageAttributes>
-            <MD5OfMessageBody>{message_body_hash}</MD5OfMessageBody>
-            <MessageId>{message_id}</MessageId>
-        </SendMessageResult>
-        <ResponseMetadata>
-            <RequestId>00000000-0000-0000-0000-000000000000</RequestId>
-        </ResponseMetadata>
-    </SendMessageResponse>
-""".strip() % XMLNS_SQS
-
 # list of valid attribute names, and names not supported by the backend (elasticmq)
 VALID_ATTRIBUTE_NAMES = ['DelaySeconds', 'MaximumMessageSize', 'MessageRetentionPeriod',
     'Policy', 'ReceiveMessageWaitTimeSeconds', 'RedrivePolicy', 'VisibilityTimeout']
 UNSUPPORTED_ATTRIBUTE_NAMES = ['MaximumMessageSize', 'MessageRetentionPeriod', 'Policy', 'RedrivePolicy']
 
 # maps queue URLs to attributes set via the API
-QUEUE_ATTRIBUTES = {}
+QUEUE_ATTRIBUTES = SharedDict('sqs.queue_attributes')
 
 
-class ProxyListenerSQS(ProxyListener):
+def parse_request_data(method, path, data):
+    """ Extract request data either from query string (for GET) or request body (for POST). """
+    if method == 'POST':
+        return urlparse.parse_qs(to_str(data))
+    elif method == 'GET':
+        parsed_path = urlparse.urlparse(path)
+        return urlparse.parse_qs(parsed_path.query)
+    return {}
 
-    def forward_request(self, method, path, data, headers):
-        req_data = self.parse_request_data(method, path, data)
 
-        if req_data:
-            action = req_data.get('Action', [None])[0]
-            if action == 'SendMessage':
-                new_response = self._send_message(path, data, req_data, headers)
-                if new_response:
-                    return new_response
-            elif action == 'SetQueueAttributes':
-                self._set_queue_attributes(req_data)
+class ProxyListenerSQS(ProxyListener):
+    router = ActionRouter(parse_request_data)
 
-            if 'QueueName' in req_data:
-                encoded_data = urlencode(req_data, doseq=True) if method == 'POST' else ''
-                modified_url = None
-                if method == 'GET':
-                    base_path = path.partition('?')[0]
-                    modified_url = '%s?%s' % (base_path, urlencode(req_data, doseq=True))
-                request = Request(data=encoded_data, url=modified_url, headers=headers, method=method)
-                return request
+    def forward_request(self, method, path, data, headers):
+        return self.router.forward_request(self, method, path, data, headers)
 
+    @router.forward('SetQueueAttributes')
+    def forward_set_queue_attributes(self, request):
+        self._set_queue_attributes(request.payload)
         return True
 
-    def parse_request_data(self, method, path, data):
-        """ Extract request data either from query string (for GET) or request body (for POST). """
-        if method == 'POST':
-            return urlparse.parse_qs(to_str(data))
-        elif method == 'GET':
-            parsed_path = urlparse.urlparse(path)
-            return urlparse.parse_qs(parsed_path.query)
-        return {}
+    @router.forward('CreateQueue', 'GetQueueUrl')
+    def forward_queue_name(self, request):
+        req_data = request.payload
+        if 'QueueName' not in req_data:
+            return True
+        method = request.method
+        encoded_data = urlencode(req_data, doseq=True) if method == 'POST' else ''
+        modified_url = None
+        if method == 'GET':
+            base_path = request.path.partition('?')[0]
+            modified_url = '%s?%s' % (base_path, urlencode(req_data, doseq=True))
+        return Request(data=encoded_data, url=modified_url, headers=request.headers, method=method)
 
     def return_response(self, method, path, data, headers, response, request_handler):
         if method == 'OPTIONS' and path == '/':
@@ -78,131 +65,76 @@ class ProxyListenerSQS(ProxyListener):
             return 200
 
         if method == 'POST' and path == '/':
-            region_name = extract_region_from_auth_header(headers)
-            req_data = urlparse.parse_qs(to_str(data))
-            action = req_data.get('Action', [None])[0]
-            content_str = content_str_original = to_str(response.content)
-
-            self._fire_event(req_data, response)
-
-            # patch the response and add missing attributes
-            if action == 'GetQueueAttributes':
-                content_str = self._add_queue_attributes(req_data, content_str)
-
-            # patch the response and return the correct endpoint URLs / ARNs
-            if action in ('CreateQueue', 'GetQueueUrl', 'ListQueues', 'GetQueueAttributes'):
-                if config.USE_SSL and '<QueueUrl>http://' in content_str:
-                    # return https://... if we're supposed to use SSL
-                    content_str = re.sub(r'<QueueUrl>\s*http://', r'<QueueUrl>https://', content_str)
-                # expose external hostname:port
-                external_port = SQS_PORT_EXTERNAL or get_external_port(headers, request_handler)
-                content_str = re.sub(r'<QueueUrl>\s*([a-z]+)://[^<]*:([0-9]+)/([^<]*)\s*</QueueUrl>',
-                    r'<QueueUrl>\1://%s:%s/\3</QueueUrl>' % (HOSTNAME_EXTERNAL, external_port), content_str)
-                # fix queue ARN
-                content_str = re.sub(r'<([a-zA-Z0-9]+)>\s*arn:aws:sqs:elasticmq:([^<]+)</([a-zA-Z0-9]+)>',
-                    r'<\1>arn:aws:sqs:%s:\2</\3>' % (region_name), content_str)
-
-            if content_str_original != content_str:
-                # if changes have been made, return patched response
-                new_response = Response()
-                new_response.status_code = response.status_code
-                new_response.headers = response.headers
-                new_response._content = content_str
-                new_response.headers['content-length'] = len(new_response._content)
-                return new_response
-
-            # Since the following 2 API calls are not implemented in ElasticMQ, we're mocking them
-            # and letting them to return an empty response
-            if action == 'TagQueue':
-                new_response = Response()
-                new_response.status_code = 200
-                new_response._content = ("""
-                    <?xml version="1.0"?>
-                    <TagQueueResponse>
-                        <ResponseMetadata>
-                            <RequestId>{}</RequestId>
-                        </ResponseMetadata>
-                    </TagQueueResponse>
-                """).strip().format(uuid.uuid4())
-                return new_response
-            elif action == 'ListQueueTags':
-                new_response = Response()
-                new_response.status_code = 200
-                new_response._content = ("""
-                    <?xml version="1.0"?>
-                    <ListQueueTagsResponse xmlns="{}">
-                        <ListQueueTagsResult/>
-                        <ResponseMetadata>
-                            <RequestId>{}</RequestId>
-                        </ResponseMetadata>
-                    </ListQueueTagsResponse>
-                """).strip().format(XMLNS_SQS, uuid.uuid4())
-                return new_response
-
-    # Format of the message Name attribute is MessageAttribute.<int id>.<field>
-    # Format of the Value attributes is MessageAttribute.<int id>.Value.DataType
-    # and MessageAttribute.<int id>.Value.<Type>Value
-    #
-    # The data schema changes on transfer between SQS and Lambda (at least)
-    # JS functions in real AWS!
-    # It is unknown at this time whether this data structure change affects different
-    # languages in different ways.
-    #
-    # The MessageAttributes specified in the SQS payload (in JavaScript):
-    # var params = {
-    #   MessageBody: "body string",
-    #   MessageAttributes: {
-    #       "attr_1": {
-    #           DataType: "String",
-    #           StringValue: "attr_1_value"
-    #       },
-    #       "attr_2": {
-    #           DataType: "String",
-    #           StringValue: "attr_2_value"
-    #       }
-    #   }
-    # }
-    #
-    # The MessageAttributes specified above are massaged into the following structure:
-    # {
-    #    attr_1: {
-    #      stringValue: 'attr_1_value',
-    #      stringListValues: [],
-    #      binaryListValues: [],
-    #      dataType: 'String'
-    #    },
-    #    attr_2: {
-    #      stringValue: 'attr_2_value',
-    #      stringListValues: [],
-    #      binaryListValues: [],
-    #      dataType: 'String'
-    #    }
-    # }
-    def format_message_attributes(self, data):
-        prefix = 'MessageAttribute'
-        names = []
-        for (k, name) in [(k, data[k]) for k in data if k.startswith(prefix) and k.endswith('.Name')]:
-            attr_name = name[0]
-            k_id = k.split('.')[1]
-            names.append((attr_name, k_id))
-
-        msg_attrs = {}
-        for (key_name, key_id) in names:
-            msg_attrs[key_name] = {}
-            # Find vals for each key_id
-            attrs = [(k, data[k]) for k in data
-                if k.startswith('{}.{}.'.format(prefix, key_id)) and not k.endswith('.Name')]
-            for (attr_k, attr_v) in attrs:
-                attr_name = attr_k.split('.')[3]
-                msg_attrs[key_name][attr_name[0].lower() + attr_name[1:]] = attr_v[0]
-
-            # These fields are set in the payload sent to Lambda.
-            # It is extremely likely additional work will
-            # be required to support these fields
-            msg_attrs[key_name]['stringListValues'] = []
-            msg_attrs[key_name]['binaryListValues'] = []
+            return self.router.return_response(self, method, path, data, headers, response,
+                request_handler=request_handler)
+
+    @router.returns('DeleteQueue')
+    def return_delete_queue(self, request, response):
+        self._fire_event(request.payload, response)
+
+    @router.returns('CreateQueue', 'GetQueueUrl', 'ListQueues', 'GetQueueAttributes')
+    def return_queue_urls(self, request, response):
+        content_str = content_str_original = to_str(response.content)
+
+        if request.action == 'CreateQueue':
+            self._fire_event(request.payload, response)
+
+        # patch the response and add missing attributes
+        if request.action == 'GetQueueAttributes':
+            content_str = self._add_queue_attributes(request.payload, content_str)
+
+        # patch the response and return the correct endpoint URLs / ARNs
+        if config.USE_SSL and '<QueueUrl>http://' in content_str:
+            # return https://... if we're supposed to use SSL
+            content_str = re.sub(r'<QueueUrl>\s*http://', r'<QueueUrl>https://', content_str)
+        # expose external hostname:port
+        external_port = SQS_PORT_EXTERNAL or get_external_port(request.headers, request.request_handler)
+        content_str = re.sub(r'<QueueUrl>\s*([a-z]+)://[^<]*:([0-9]+)/([^<]*)\s*</QueueUrl>',
+            r'<QueueUrl>\1://%s:%s/\3</QueueUrl>' % (HOSTNAME_EXTERNAL, external_port), content_str)
+        # fix queue ARN
+        region_name = extract_region_from_auth_header(request.headers)
+        content_str = re.sub(r'<([a-zA-Z0-9]+)>\s*arn:aws:sqs:elasticmq:([^<]+)</([a-zA-Z0-9]+)>',
+            r'<\1>arn:aws:sqs:%s:\2</\3>' % (region_name), content_str)
+
+        if content_str_original != content_str:
+            # if changes have been made, return patched response
+            new_response = Response()
+            new_response.status_code = response.status_code
+            new_response.headers = response.headers
+            new_response._content = content_str
+            new_response.headers['content-length'] = len(new_response._content)
+            return new_response
 
-        return msg_attrs
+    # Since the following 2 API calls are not implemented in ElasticMQ, we're mocking them
+    # and letting them to return an empty response
+    @router.returns('TagQueue')
+    def return_tag_queue(self, request, response):
+        new_response = Response()
+        new_response.status_code = 200
+        new_response._content = ("""
+            <?xml version="1.0"?>
+            <TagQueueResponse>
+                <ResponseMetadata>
+                    <RequestId>{}</RequestId>
+                </ResponseMetadata>
+            </TagQueueResponse>
+        """).strip().format(uuid.uuid4())
+        return new_response
+
+    @router.returns('ListQueueTags')
+    def return_list_queue_tags(self, request, response):
+        new_response = Response()
+        new_response.status_code = 200
+        new_response._content = ("""
+            <?xml version="1.0"?>
+            <ListQueueTagsResponse xmlns="{}">
+                <ListQueueTagsResult/>
+                <ResponseMetadata>
+                    <RequestId>{}</RequestId>
+                </ResponseMetadata>
+            </ListQueueTagsResponse>
+        """).strip().format(XMLNS_SQS, uuid.uuid4())
+        return new_response
 
     # Format attributes as dict. Example input:
     #  {
@@ -221,33 +153,14 @@ class ProxyListenerSQS(ProxyListener):
             result[key_name] = key_value
         return result
 
-    def _send_message(self, path, data, req_data, headers):
-        queue_url = req_data.get('QueueUrl', [path.partition('?')[0]])[0]
-        queue_name = queue_url[queue_url.rindex('/') + 1:]
-        message_body = req_data.get('MessageBody', [None])[0]
-        message_attributes = self.format_message_attributes(req_data)
-        region_name = extract_region_from_auth_header(headers)
-
-        process_result = lambda_api.process_sqs_message(message_body,
-            message_attributes, queue_name, region_name=region_name)
-        if process_result:
-            # If a Lambda was listening, do not add the message to the queue
-            new_response = Response()
-            new_response._content = SUCCESSFUL_SEND_MESSAGE_XML_TEMPLATE.format(
-                message_attr_hash=md5(data),
-                message_body_hash=md5(message_body),
-                message_id=str(uuid.uuid4())
-            )
-            new_response.status_code = 200
-            return new_response
-
     def _set_queue_attributes(self, req_data):
         queue_url = req_data['QueueUrl'][0]
         attrs = self._format_attributes(req_data)
         # select only the attributes in UNSUPPORTED_ATTRIBUTE_NAMES
         attrs = dict([(k, v) for k, v in attrs.items() if k in UNSUPPORTED_ATTRIBUTE_NAMES])
-        QUEUE_ATTRIBUTES[queue_url] = QUEUE_ATTRIBUTES.get(queue_url) or {}
-        QUEUE_ATTRIBUTES[queue_url].update(attrs)
+        queue_attrs = QUEUE_ATTRIBUTES.get(queue_url) or {}
+        queue_attrs.update(attrs)
+        QUEUE_ATTRIBUTES[queue_url] = queue_attrs
 
     def _add_queue_attributes(self, req_data, content_str):
         flags = re.MULTILINE | re.DOTALL
@@ -0,0 +1,109 @@
+import re
+import six
+from localstack.utils.common import to_bytes
+
+# regex to extract the "Action" parameter of Query API requests (e.g., SQS, SNS)
+ACTION_REGEX = re.compile(br'(?:^|&)Action=([A-Za-z0-9]+)')
+
+# number of bytes at the beginning of the request body to scan for the "Action" parameter
+MAX_ACTION_SCAN_BYTES = 4096
+
+
+class ActionRequest(object):
+    """ Request passed to the handlers of an `ActionRouter`. The payload is parsed lazily on first access. """
+
+    def __init__(self, action, method, path, data, headers, parse_data, request_handler=None):
+        self.action = action
+        self.method = method
+        self.path = path
+        self.data = data
+        self.headers = headers
+        self.request_handler = request_handler
+        self._parse_data = parse_data
+        self._payload = None
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = self._parse_data(self.method, self.path, self.data)
+        return self._payload
+
+
+class ActionRouter(object):
+    """ Routes the requests of a proxy listener to the handler methods registered for their API action.
+        Actions are extracted from the X-Amz-Target header or the "Action" parameter, without parsing
+        the request, and requests for actions without a registered handler are not parsed at all.
+
+        Handlers are registered in the body of the listener class:
+
+            class ProxyListenerFoo(ProxyListener):
+                router = ActionRouter(parse_json_data)
+
+                @router.forward('CreateFoo')
+                def forward_create_foo(self, request):
+                    ...
+                    return True
+
+                def forward_request(self, method, path, data, headers):
+                    return self.router.forward_request(self, method, path, data, headers)
+    """
+
+    def __init__(self, parse_data):
+        # function (method, path, data) -> payload, used to parse the request data for the handlers
+        self.parse_data = parse_data
+        self.forward_handlers = {}
+        self.return_handlers = {}
+
+    def forward(self, *actions):
+        """ Decorator registering a handler `func(listener, request)` for `forward_request(..)` calls. """
+        return self._register(self.forward_handlers, actions)
+
+    def returns(self, *actions):
+        """ Decorator registering a handler `func(listener, request, response)` for `return_response(..)` calls. """
+        return self._register(self.return_handlers, actions)
+
+    def forward_request(self, listener, method, path, data, headers, default=True):
+        """ Invoke the forward handler for the action of the given request, or return `default` if none exists. """
+        action = get_request_action(method, path, data, headers)
+        handler = self.forward_handlers.get(action)
+        if handler is None:
+            return default
+        return handler(listener, ActionRequest(action, method, path, data, headers, self.parse_data))
+
+    def return_response(self, listener, method, path, data, headers, response, request_handler=None):
+        """ Invoke the return handler for the action of the given request, or return None if none exists. """
+        action = get_request_action(method, path, data, headers)
+        handler = self.return_handlers.get(action)
+        if handler is None:
+            return None
+        request = ActionRequest(action, method, path, data, headers, self.parse_data, request_handler=request_handler)
+        return handler(listener, request, response)
+
+    def _register(self, handlers, actions):
+        def register(func):
+            for action in actions:
+                handlers[action] = func
+            return func
+        return register
+
+
+def get_request_action(method, path, data, headers):
+    """ Determine the API action of a request, based on the X-Amz-Target header or "Action" parameter.
+        Returns the HTTP method for requests without an explicit action (e.g., S3 REST requests). """
+    target = headers.get('X-Amz-Target')
+    if target:
+        return target.rpartition('.')[2]
+    match = None
+    if '?' in path:
+        match = ACTION_REGEX.search(to_bytes(path.partition('?')[2]))
+    if not match and data and method == 'POST':
+        if isinstance(data, six.text_type):
+            data = to_bytes(data)
+        if isinstance(data, six.binary_type):
+            # clients usually send the "Action" as first parameter, hence we scan the beginning of the body first
+            match = ACTION_REGEX.search(data[:MAX_ACTION_SCAN_BYTES])
+            if not match and len(data) > MAX_ACTION_SCAN_BYTES:
+                match = ACTION_REGEX.search(data)
+    if match:
+        return match.group(1).decode('ascii')
+    return method
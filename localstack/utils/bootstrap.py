@@ -295,6 +295,8 @@ def start_infra_in_docker():
         for port in set(service_ports.values()):
             if not is_mapped(port):
                 port_mappings += ' -p {port}:{port}'.format(port=port)
+    if config.EDGE_PORT and not is_mapped(config.EDGE_PORT):
+        port_mappings += ' -p {port}:{port}'.format(port=config.EDGE_PORT)
 
     env_str = ''
     for env_var in config.CONFIG_ENV_VARS:
@@ -755,12 +755,15 @@ def cleanup_resources():
     cleanup_threads_and_processes()
 
 
-def generate_ssl_cert(target_file=None, overwrite=False, random=False):
+def generate_ssl_cert(target_file=None, overwrite=False, random=False, persistent=False):
+    """ Generate a self-signed certificate, and store it (combined with its key) in the given target file.
+        Temporary certificates are removed on shutdown, whereas persistent certificates are reused if they
+        exist. Returns a tuple (combined_file, cert_file, key_file) for random or persistent certificates. """
     # Note: Do NOT import "OpenSSL" at the root scope
     # (Our test Lambdas are importing this file but don't have the module installed)
     from OpenSSL import crypto
 
-    if os.path.exists(target_file):
+    if target_file and not overwrite and os.path.exists(target_file):
         key_file_name = '%s.key' % target_file
         cert_file_name = '%s.crt' % target_file
         return target_file, cert_file_name, key_file_name
@@ -774,7 +777,7 @@ def generate_ssl_cert(target_file=None, overwrite=False, random=False):
 
     # create a key pair
     k = crypto.PKey()
-    k.generate_key(crypto.TYPE_RSA, 1024)
+    k.generate_key(crypto.TYPE_RSA, 2048)
 
     # create a self-signed cert
     cert = crypto.X509()
@@ -790,7 +793,7 @@ def generate_ssl_cert(target_file=None, overwrite=False, random=False):
     cert.gmtime_adj_notAfter(10 * 365 * 24 * 60 * 60)
     cert.set_issuer(cert.get_subject())
     cert.set_pubkey(k)
-    cert.sign(k, 'sha1')
+    cert.sign(k, 'sha256')
 
     cert_file = StringIO()
     key_file = StringIO()
@@ -805,10 +808,11 @@ def generate_ssl_cert(target_file=None, overwrite=False, random=False):
         cert_file_name = '%s.crt' % target_file
         save_file(key_file_name, key_file_content)
         save_file(cert_file_name, cert_file_content)
-        TMP_FILES.append(target_file)
-        TMP_FILES.append(key_file_name)
-        TMP_FILES.append(cert_file_name)
-        if random:
+        if not persistent:
+            TMP_FILES.append(target_file)
+            TMP_FILES.append(key_file_name)
+            TMP_FILES.append(cert_file_name)
+        if random or persistent:
             return target_file, cert_file_name, key_file_name
         return file_content
     return file_content
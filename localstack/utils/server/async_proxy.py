@@ -0,0 +1,561 @@
+import ssl
+import time
+import asyncio
+import logging
+from email.utils import formatdate
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from six.moves.urllib.parse import urlparse
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from localstack import config
+from localstack.services import generic_proxy
+from localstack.utils.common import to_bytes
+from localstack.utils.server import metrics, proxy_processes, compression
+from localstack.utils.server.worker_pool import BoundedWorkerPool
+
+# Note: This module implements the engine for PROXY_ENGINE=asyncio, and requires Python 3.
+# Coroutines are chained via callbacks (rather than async/await), to keep the syntax
+# compatible with Python 2 linters and the rest of the code base.
+
+# max. size of the start line and headers of an HTTP message
+MAX_HEAD_BYTES = 64 * 1024
+
+# encoding used for the start line and headers of an HTTP message
+HEADER_ENCODING = generic_proxy.HEADER_ENCODING
+
+SERVER_VERSION = '%s %s' % (BaseHTTPRequestHandler.server_version, BaseHTTPRequestHandler.sys_version)
+
+# set up logger
+LOG = logging.getLogger(__name__)
+
+
+class HttpHead(object):
+    """ Start line and headers of an HTTP request or response. """
+
+    def __init__(self, start_line, headers):
+        self.start_line = start_line
+        self.headers = headers
+
+
+class BodyReader(object):
+    """ Reads the body of an HTTP message from a receive buffer, based on the framing headers. """
+
+    def __init__(self, headers, no_body=False):
+        self.chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+        self.length = None
+        self.until_close = False
+        if no_body:
+            self.length = 0
+        elif not self.chunked:
+            content_length = headers.get('Content-Length')
+            if content_length is not None:
+                self.length = int(content_length)
+
+    def has_body(self):
+        return self.chunked or self.length is not None
+
+    def read(self, buffer):
+        """ Return the complete body (removing it from the buffer), or None if more data is required. """
+        if self.until_close:
+            return None
+        if self.chunked:
+            result = read_chunked(buffer)
+            if result is None:
+                return None
+            body, consumed = result
+            del buffer[:consumed]
+            return body
+        length = self.length or 0
+        if len(buffer) < length:
+            return None
+        body = bytes(buffer[:length])
+        del buffer[:length]
+        return body
+
+
+def read_chunked(buffer):
+    """ Parse a complete body with chunked transfer encoding from the given buffer. Returns a tuple
+        (body, number_of_bytes_consumed), or None if the terminating chunk has not been received yet. """
+    pos = 0
+    chunks = []
+    while True:
+        eol = buffer.find(b'\r\n', pos)
+        if eol < 0:
+            return None
+        size = int(bytes(buffer[pos:eol]).split(b';')[0].strip(), 16)
+        pos = eol + 2
+        if size == 0:
+            # skip (optional) trailer headers, up to the final empty line
+            while True:
+                eol = buffer.find(b'\r\n', pos)
+                if eol < 0:
+                    return None
+                if eol == pos:
+                    return b''.join(chunks), eol + 2
+                pos = eol + 2
+        if len(buffer) < pos + size + 2:
+            return None
+        chunks.append(bytes(buffer[pos:pos + size]))
+        pos += size + 2
+
+
+def parse_head(buffer):
+    """ Parse the start line and headers from the given buffer (removing them from the buffer).
+        Returns None if the head of the message has not been fully received yet. """
+    # ignore empty lines preceding the start line
+    while buffer.startswith(b'\r\n'):
+        del buffer[:2]
+    index = buffer.find(b'\r\n\r\n')
+    if index < 0:
+        if len(buffer) > MAX_HEAD_BYTES:
+            raise ValueError('Maximum size of HTTP message head exceeded')
+        return None
+    lines = bytes(buffer[:index]).decode(HEADER_ENCODING).split('\r\n')
+    del buffer[:index + 4]
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        key, _, value = line.partition(':')
+        key = key.strip()
+        value = value.strip()
+        headers[key] = '%s, %s' % (headers[key], value) if key in headers else value
+    return HttpHead(lines[0], headers)
+
+
+class BackendProtocol(asyncio.Protocol):
+    """ Connection to a backend service, which sends one request at a time and resolves a future with the
+        response. Kept-alive connections are returned to the pool of the `BackendClient` for reuse. """
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+        self.transport = None
+        self.method = None
+        self.url = None
+        self.future = None
+        self.buffer = bytearray()
+        self.head = None
+        self.reader = None
+        self.keep_alive = False
+        self.idle_since = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def send(self, method, url, request_bytes, future):
+        self.method = method
+        self.url = url
+        self.future = future
+        self.head = None
+        self.reader = None
+        self.keep_alive = False
+        self.idle_since = None
+        self.transport.write(request_bytes)
+
+    def is_reusable(self, now):
+        if self.transport is None or self.transport.is_closing():
+            return False
+        return not config.PROXY_POOL_IDLE_TIMEOUT or now - self.idle_since <= config.PROXY_POOL_IDLE_TIMEOUT
+
+    def data_received(self, data):
+        if self.future is None or self.future.done():
+            # unexpected data on an idle connection - cannot be reused
+            return self.close()
+        self.buffer.extend(data)
+        try:
+            while self.head is None:
+                head = parse_head(self.buffer)
+                if head is None:
+                    return
+                status = int(head.start_line.split(' ', 2)[1])
+                if status == 100:
+                    # skip interim "100 Continue" responses
+                    continue
+                self.head = head
+                no_body = self.method == 'HEAD' or status in (204, 304)
+                self.reader = BodyReader(head.headers, no_body=no_body)
+                # without framing headers, the body is delimited by closing the connection
+                self.reader.until_close = not self.reader.has_body()
+            body = self.reader.read(self.buffer)
+            if body is not None:
+                self.finish(body)
+        except Exception as e:
+            self.fail(e)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.client.discard(self)
+        if self.future is None or self.future.done():
+            return
+        if self.reader and self.reader.until_close:
+            return self.finish(bytes(self.buffer))
+        self.fail(exc or ConnectionResetError('Connection reset by peer before response was complete'))
+
+    def finish(self, body):
+        parts = self.head.start_line.split(' ', 2)
+        response = Response()
+        response.status_code = int(parts[1])
+        response.reason = parts[2] if len(parts) > 2 else ''
+        response.headers = self.head.headers
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = self.url
+        response._content = body
+        self.keep_alive = (not self.reader.until_close and not self.buffer and
+            parts[0] == 'HTTP/1.1' and 'close' not in self.head.headers.get('Connection', '').lower())
+        if not self.future.done():
+            self.future.set_result(response)
+        self.client.release(self)
+
+    def fail(self, exception):
+        if not self.future.done():
+            self.future.set_exception(exception)
+        self.close()
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+
+class BackendClient(object):
+    """ Non-blocking HTTP/1.1 client used to forward requests to the backend services. Up to PROXY_POOL_SIZE
+        idle keep-alive connections per backend are kept for reuse (additional connections opened for
+        concurrent requests are closed after use), and idle connections expire after PROXY_POOL_IDLE_TIMEOUT.
+        All methods must be called on the event loop. """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.ssl_context = ssl.create_default_context()
+        # maps (scheme, host, port) tuples to the idle connections to the backend (most recently used last)
+        self.idle_connections = {}
+
+    def request(self, method, url, data, headers):
+        """ Send a request to the given URL, and return a future that resolves to a `Response`. """
+        future = self.loop.create_future()
+        parsed = urlparse(url)
+        secure = parsed.scheme == 'https'
+        port = parsed.port or (443 if secure else 80)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+
+        data = to_bytes(data or b'')
+        request_headers = [(k, v) for k, v in headers.items()
+            if k.lower() not in ('content-length', 'transfer-encoding', 'connection')]
+        if data or method in ('POST', 'PUT', 'PATCH'):
+            request_headers.append(('Content-Length', str(len(data))))
+        request_headers.append(('Connection', 'keep-alive' if config.PROXY_POOL_SIZE > 0 else 'close'))
+        request_bytes = generic_proxy.encode_http_head('%s %s HTTP/1.1' % (method, path), request_headers) + data
+
+        key = (parsed.scheme, parsed.hostname, port)
+        connection = self.acquire(key)
+        if connection is not None:
+            connection.send(method, url, request_bytes, future)
+            return future
+
+        def on_connected(task):
+            if task.cancelled():
+                return
+            if task.exception():
+                if not future.done():
+                    future.set_exception(task.exception())
+                return
+            transport, connection = task.result()
+            connection.send(method, url, request_bytes, future)
+
+        connect = self.loop.create_connection(lambda: BackendProtocol(self, key), parsed.hostname, port,
+            ssl=self.ssl_context if secure else None)
+        self.loop.create_task(connect).add_done_callback(on_connected)
+        return future
+
+    def acquire(self, key):
+        """ Return an idle connection for the given backend, or None if none is available. """
+        connections = self.idle_connections.get(key)
+        now = time.time()
+        while connections:
+            connection = connections.pop()
+            if config.PROXY_POOL_SIZE > 0 and connection.is_reusable(now):
+                return connection
+            connection.close()
+        return None
+
+    def release(self, connection):
+        """ Return the given connection to the pool after its response has been received, or close it. """
+        connections = self.idle_connections.setdefault(connection.key, [])
+        if not connection.keep_alive or connection.transport is None or len(connections) >= config.PROXY_POOL_SIZE:
+            return connection.close()
+        connection.idle_since = time.time()
+        connections.append(connection)
+
+    def discard(self, connection):
+        connections = self.idle_connections.get(connection.key)
+        if connections and connection in connections:
+            connections.remove(connection)
+
+    def close(self):
+        for connections in list(self.idle_connections.values()):
+            for connection in list(connections):
+                connection.close()
+        self.idle_connections.clear()
+
+
+class ProxyProtocol(asyncio.Protocol):
+    """ Serves the HTTP connection of a single client. Requests are parsed on the event loop, the
+        (synchronous) proxy listeners are run in the thread pool of the server, and the backend is
+        invoked via the non-blocking `BackendClient`. """
+
+    def __init__(self, server):
+        self.server = server
+        # listeners may access `request_handler.proxy` (e.g., sqs_listener.py), hence we expose it here
+        self.proxy = server.proxy
+        self.transport = None
+        self.client_address = None
+        self.server_address = None
+        self.buffer = bytearray()
+        self.head = None
+        self.reader = None
+        self.busy = False
+        self.close_connection = True
+        self.request_method = None
+        self.request_version = None
+        self.request_headers = {}
+        self.idle_timer = None
+        self.server_name = server.proxy.service_name or str(server.proxy.port)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client_address = transport.get_extra_info('peername')
+        self.server_address = transport.get_extra_info('sockname')
+        metrics.record_client_connection(self.server_name, 'opened')
+        self.schedule_idle_timeout()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.cancel_idle_timeout()
+
+    def data_received(self, data):
+        self.cancel_idle_timeout()
+        self.buffer.extend(data)
+        self.process_buffer()
+
+    def schedule_idle_timeout(self):
+        self.cancel_idle_timeout()
+        if config.PROXY_KEEP_ALIVE_TIMEOUT > 0 and self.transport:
+            self.idle_timer = self.server.loop.call_later(config.PROXY_KEEP_ALIVE_TIMEOUT, self.close_idle_connection)
+
+    def cancel_idle_timeout(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def close_idle_connection(self):
+        self.idle_timer = None
+        if self.busy or not self.transport:
+            return
+        metrics.record_client_connection(self.server_name, 'timeouts')
+        self.transport.close()
+        self.transport = None
+
+    def process_buffer(self):
+        # requests on a persistent connection are processed one after the other
+        while not self.busy and self.transport:
+            try:
+                if self.head is None:
+                    self.head = parse_head(self.buffer)
+                    if self.head is None:
+                        return
+                    self.reader = BodyReader(self.head.headers)
+                    if self.head.headers.get('Expect', '').lower() == '100-continue':
+                        self.transport.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                body = self.reader.read(self.buffer)
+            except Exception as e:
+                LOG.info('Unable to parse HTTP request: %s' % e)
+                return self.send_status(400, close=True)
+            if body is None:
+                return
+            head, self.head = self.head, None
+            if not self.reader.has_body():
+                body = None
+            self.busy = True
+            self.handle_request(head, body)
+
+    def handle_request(self, head, data):
+        method, path, version = (head.start_line.split(' ', 2) + ['HTTP/0.9'])[:3]
+        self.request_method, self.request_version, self.request_headers = method, version, head.headers
+        metrics.record_client_connection(self.server_name, 'requests')
+        self.close_connection = not generic_proxy.keep_connection_alive(version, head.headers)
+
+        start_time = time.time()
+        proxy = self.proxy = self.server.proxy.get_target_proxy(method, path, head.headers)
+
+        def prepare():
+            context = generic_proxy.ProxyRequestContext(proxy, method, path, data,
+                CaseInsensitiveDict(head.headers), client_address=self.client_address,
+                server_address=self.server_address, start_time=start_time)
+            context.timer.mark('queue')
+            cached_response = generic_proxy.get_cached_response(context)
+            if cached_response is None:
+                generic_proxy.invoke_forward_listeners(context)
+            return context, cached_response
+
+        def on_prepared(result):
+            context, cached_response = result
+            if cached_response is not None:
+                return finish(context, cached_response)
+            if context.status_code:
+                self.send_status(context.status_code)
+                return finish(context)
+            if context.response is not None:
+                return on_response(context, context.response)
+            request = self.server.client.request(context.method, context.request_url,
+                context.data_to_send, context.forward_headers)
+            self.then(request, lambda response: on_response(context, response))
+
+        def on_response(context, response):
+            if context.response is None:
+                context.timer.mark('backend')
+            updated = self.server.run_in_executor(generic_proxy.invoke_return_listener, context, response, self)
+            self.then(updated, lambda response: finish(context, response))
+
+        def finish(context, response=None):
+            generic_proxy.finish_cached_request(context, response)
+            if response is not None:
+                self.send_response(response)
+            context.timer.mark('write')
+            context.timer.finish()
+
+        prepared = self.server.run_in_executor(prepare, admit=True)
+        if prepared is None:
+            # shed load, as all workers are busy and the queue is full
+            return self.send_response(generic_proxy.get_throttling_response(head.headers))
+        self.then(prepared, on_prepared)
+
+    def then(self, future, callback):
+        """ Invoke `callback(result)` once `future` is done, or send an error response if it failed. """
+        def done(future):
+            try:
+                callback(future.result())
+            except Exception as e:
+                generic_proxy.log_forward_error(self.proxy, e)
+                self.send_status(502, close=True)
+        future.add_done_callback(done)
+
+    def send_response(self, response):
+        body = generic_proxy.get_response_body(response)
+        headers = generic_proxy.get_response_headers(response, body, method=self.request_method)
+        headers, body = compression.compress_response(self.proxy.service_name, self.request_method,
+            self.request_headers, response.status_code, headers, body)
+        headers = self.default_headers() + headers
+        head = generic_proxy.encode_http_head(self.status_line(response.status_code), headers)
+        if len(body) <= generic_proxy.MAX_COALESCED_BODY_SIZE:
+            return self.write(head + body)
+        # avoid copying large bodies, the transport buffers them until they have been sent
+        self.write(head, memoryview(body))
+
+    def send_status(self, status_code, close=False):
+        """ Send a response with the given status code and an empty body. """
+        self.close_connection = self.close_connection or close
+        headers = self.default_headers() + [('Content-Length', '0')]
+        self.write(generic_proxy.encode_http_head(self.status_line(status_code), headers))
+
+    def write(self, *buffers):
+        self.busy = False
+        if not self.transport:
+            return
+        for data in buffers:
+            self.transport.write(data)
+        if self.close_connection:
+            self.transport.close()
+            self.transport = None
+            return
+        self.process_buffer()
+        if not self.busy:
+            self.schedule_idle_timeout()
+
+    def status_line(self, status_code):
+        reason = BaseHTTPRequestHandler.responses.get(status_code, ('',))[0]
+        return '%s %s %s' % (self.proxy.protocol_version, status_code, reason)
+
+    def default_headers(self):
+        headers = [('Server', SERVER_VERSION), ('Date', formatdate(usegmt=True))]
+        if self.close_connection:
+            headers.append(('Connection', 'close'))
+        elif self.request_version != 'HTTP/1.1':
+            headers.append(('Connection', 'keep-alive'))
+        return headers
+
+
+def set_future_result(future, result, exception=False):
+    if future.done():
+        return
+    if exception:
+        return future.set_exception(result)
+    future.set_result(result)
+
+
+class AsyncioHTTPServer(object):
+    """ Server that serves the connections of a `GenericProxy` on an asyncio event loop. This
+        engine is enabled via PROXY_ENGINE=asyncio, and avoids spawning one thread per connection. """
+
+    def __init__(self, server_address, proxy):
+        self.server_address = server_address
+        self.proxy = proxy
+        self.loop = asyncio.new_event_loop()
+        self.worker_pool = BoundedWorkerPool(str(proxy.port), config.PROXY_ASYNCIO_WORKERS,
+            config.PROXY_MAX_QUEUE_SIZE)
+        self.client = BackendClient(self.loop)
+        self.server = None
+        self.stopped = False
+
+    def serve_forever(self):
+        asyncio.set_event_loop(self.loop)
+        ssl_context = self.proxy.get_ssl_context() if self.proxy.ssl else None
+        host, port = self.server_address
+        try:
+            self.server = self.loop.run_until_complete(self.loop.create_server(lambda: ProxyProtocol(self),
+                host=host, port=port, ssl=ssl_context, reuse_address=True, reuse_port=proxy_processes.reuse_port()))
+            if not self.stopped:
+                self.loop.run_forever()
+        finally:
+            if self.server:
+                self.server.close()
+            self.client.close()
+            self.cancel_pending_tasks()
+            self.loop.close()
+            self.worker_pool.shutdown()
+
+    def cancel_pending_tasks(self):
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        tasks = [task for task in all_tasks(self.loop) if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+    def run_in_executor(self, func, *args, **kwargs):
+        """ Run `func(*args)` in the worker pool, and return a future with the result. If `admit=True` is
+            passed, the call is subject to admission control, and None is returned if it got rejected. """
+        future = self.loop.create_future()
+
+        def run():
+            try:
+                result = func(*args)
+            except Exception as e:
+                return self.call_soon_threadsafe(set_future_result, future, e, True)
+            self.call_soon_threadsafe(set_future_result, future, result)
+
+        if not self.worker_pool.submit(run, force=not kwargs.get('admit')):
+            return None
+        return future
+
+    def call_soon_threadsafe(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # event loop has been closed in the meantime
+            pass
+
+    def server_close(self):
+        self.stopped = True
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,114 @@
+import re
+import zlib
+from localstack import config
+
+# supported content codings, in order of preference (gzip is understood by all common HTTP clients)
+ENCODINGS = ('gzip', 'deflate')
+
+# zlib window bits for the supported content codings (gzip adds a header and trailer to the raw stream)
+WINDOW_BITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+# compression level, favoring speed (higher levels hardly reduce the size of typical API responses)
+COMPRESSION_LEVEL = 5
+
+# prefixes of content types which are already compressed, or do not compress well
+INCOMPRESSIBLE_TYPE_PREFIXES = ('image/', 'video/', 'audio/', 'font/woff')
+
+# content types which are already compressed
+INCOMPRESSIBLE_TYPES = frozenset((
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/zstd',
+    'application/java-archive', 'application/octet-stream'))
+
+# status codes of responses whose bodies are not compressed
+UNCOMPRESSED_STATUS_CODES = frozenset((204, 206, 304))
+
+# regex to parse the entries of an Accept-Encoding header, e.g., "gzip;q=1.0, deflate;q=0.5"
+ACCEPT_ENCODING_REGEX = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+# caches the parsed list of services of PROXY_COMPRESSION
+SERVICES = {}
+
+
+def get_services():
+    services = SERVICES.get(config.PROXY_COMPRESSION)
+    if services is None:
+        services = frozenset(s.strip() for s in config.PROXY_COMPRESSION.split(',') if s.strip())
+        SERVICES.clear()
+        SERVICES[config.PROXY_COMPRESSION] = services
+    return services
+
+
+def is_enabled(service):
+    services = get_services()
+    return bool(services) and ('*' in services or service in services)
+
+
+def get_accepted_encoding(accept_encoding):
+    """ Return the preferred supported content coding accepted by the client, or None. """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for match in ACCEPT_ENCODING_REGEX.finditer(accept_encoding.lower()):
+        encoding, quality = match.groups()
+        try:
+            accepted[encoding] = float(quality) if quality else 1.0
+        except ValueError:
+            accepted[encoding] = 0
+    result = None
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > 0 and (result is None or quality > accepted.get(result, accepted.get('*', 0))):
+            result = encoding
+    return result
+
+
+def is_compressible(content_type):
+    content_type = (content_type or '').partition(';')[0].strip().lower()
+    if not content_type:
+        # bodies without content type (e.g., AWS Query API errors) are usually text
+        return True
+    return content_type not in INCOMPRESSIBLE_TYPES and not content_type.startswith(INCOMPRESSIBLE_TYPE_PREFIXES)
+
+
+def compress(body, encoding):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, WINDOW_BITS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_response(service, method, request_headers, status_code, headers, body):
+    """ Return a tuple (headers, body) with the body of a buffered response compressed according to the
+        Accept-Encoding header of the request, if enabled for the service, and if the body is compressible
+        and not smaller than PROXY_COMPRESSION_MIN_SIZE. Otherwise, the given headers and body are returned. """
+    if (len(body) < config.PROXY_COMPRESSION_MIN_SIZE or method == 'HEAD' or
+            status_code in UNCOMPRESSED_STATUS_CODES or not is_enabled(service)):
+        return headers, body
+    encoding = get_accepted_encoding(request_headers.get('Accept-Encoding'))
+    if not encoding:
+        return headers, body
+    content_type = None
+    for key, value in headers:
+        key_lower = key.lower()
+        if key_lower == 'content-encoding':
+            return headers, body
+        if key_lower == 'content-type':
+            content_type = value
+    if not is_compressible(content_type):
+        return headers, body
+
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body):
+        return headers, body
+    result = []
+    vary = None
+    for key, value in headers:
+        key_lower = key.lower()
+        if key_lower == 'content-length':
+            value = str(len(compressed))
+        elif key_lower == 'vary':
+            vary = value = '%s, Accept-Encoding' % value
+        result.append((key, value))
+    result.append(('Content-Encoding', encoding))
+    if vary is None:
+        result.append(('Vary', 'Accept-Encoding'))
+    return result, compressed
@@ -0,0 +1,162 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.poolmanager import PoolManager
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from six.moves.http_cookiejar import DefaultCookiePolicy
+from localstack import config
+
+# maps backend base URLs to `requests` sessions with pooled keep-alive connections
+BACKEND_SESSIONS = {}
+
+# mutex for creating new sessions
+SESSIONS_LOCK = threading.RLock()
+
+
+class ConnectionPoolStats(object):
+    """ Usage statistics of the connection pool of a single backend. """
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.counters = {
+            # requests served with a pooled (kept-alive) connection
+            'hits': 0,
+            # new TCP connections opened to the backend
+            'new_connections': 0,
+            # idle connections closed because they exceeded the idle timeout
+            'evictions': 0,
+            # requests that had to wait for a free connection (pool exhausted)
+            'waits': 0,
+            'wait_time_secs': 0
+        }
+
+    def increment(self, key, value=1):
+        with self.mutex:
+            self.counters[key] += value
+
+    def to_dict(self):
+        with self.mutex:
+            return dict(self.counters)
+
+
+class StatsConnectionPoolMixin(object):
+    """ Mixin for urllib3 connection pools which records usage statistics and evicts idle connections. """
+
+    stats = None
+    idle_timeout = 0
+    # max. time (in secs) to wait for a free connection if the pool is exhausted (None = wait indefinitely)
+    pool_timeout = None
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = self.pool_timeout
+        start = None
+        if self.block and self.pool is not None and self.pool.empty():
+            start = time.time()
+        conn = super(StatsConnectionPoolMixin, self)._get_conn(timeout=timeout)
+        if start is not None:
+            self.stats.increment('waits')
+            self.stats.increment('wait_time_secs', time.time() - start)
+        last_used = getattr(conn, '_ls_last_used', None)
+        if last_used is None:
+            # newly created connection (counted in _new_conn)
+            return conn
+        conn._ls_last_used = None
+        if self.idle_timeout and time.time() - last_used > self.idle_timeout:
+            self.stats.increment('evictions')
+            conn.close()
+        if getattr(conn, 'sock', None) is None:
+            # connection has been closed (dropped by the backend, or evicted), and will reconnect
+            self.stats.increment('new_connections')
+            return conn
+        self.stats.increment('hits')
+        return conn
+
+    def _new_conn(self):
+        self.stats.increment('new_connections')
+        return super(StatsConnectionPoolMixin, self)._new_conn()
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn._ls_last_used = time.time()
+        return super(StatsConnectionPoolMixin, self)._put_conn(conn)
+
+
+class StatsHTTPConnectionPool(StatsConnectionPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class StatsHTTPSConnectionPool(StatsConnectionPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class BackendPoolManager(PoolManager):
+
+    def __init__(self, stats, idle_timeout, pool_timeout=None, **kwargs):
+        PoolManager.__init__(self, **kwargs)
+        self.stats = stats
+        self.idle_timeout = idle_timeout
+        self.pool_timeout = pool_timeout
+        self.pool_classes_by_scheme = {
+            'http': StatsHTTPConnectionPool,
+            'https': StatsHTTPSConnectionPool
+        }
+
+    def _new_pool(self, *args, **kwargs):
+        pool = PoolManager._new_pool(self, *args, **kwargs)
+        pool.stats = self.stats
+        pool.idle_timeout = self.idle_timeout
+        pool.pool_timeout = self.pool_timeout
+        return pool
+
+
+class BackendHTTPAdapter(HTTPAdapter):
+    """ HTTP adapter with a bounded pool of keep-alive connections per backend host. Requests
+        block if all connections of the pool are in use, until a connection becomes available (or
+        until the pool timeout has passed, in which case the request fails with an `EmptyPoolError`). """
+
+    def __init__(self, stats, pool_size, idle_timeout, pool_timeout=None):
+        self.stats = stats
+        self.idle_timeout = idle_timeout
+        self.pool_timeout = pool_timeout
+        HTTPAdapter.__init__(self, pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = BackendPoolManager(self.stats, self.idle_timeout, self.pool_timeout,
+            num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+
+def get_session(backend_url):
+    """ Return the session with pooled connections for the given backend base URL. """
+    session = BACKEND_SESSIONS.get(backend_url)
+    if session is not None:
+        return session
+    with SESSIONS_LOCK:
+        session = BACKEND_SESSIONS.get(backend_url)
+        if session is None:
+            session = requests.Session()
+            # never store cookies returned by a backend, as the session is shared across all clients
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.stats = ConnectionPoolStats()
+            adapter = BackendHTTPAdapter(session.stats, config.PROXY_POOL_SIZE, config.PROXY_POOL_IDLE_TIMEOUT,
+                config.PROXY_POOL_TIMEOUT or None)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            BACKEND_SESSIONS[backend_url] = session
+    return session
+
+
+def get_pool_stats():
+    """ Return the connection pool statistics, keyed by backend base URL. """
+    return dict((url, session.stats.to_dict()) for url, session in list(BACKEND_SESSIONS.items()))
+
+
+def close_sessions():
+    with SESSIONS_LOCK:
+        for session in BACKEND_SESSIONS.values():
+            session.close()
+        BACKEND_SESSIONS.clear()
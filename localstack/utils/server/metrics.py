@@ -0,0 +1,193 @@
+import time
+import bisect
+import threading
+from localstack.utils.server import connection_pool, worker_pool, response_cache
+
+# upper bounds (in secs) of the buckets of the request phase histograms
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# max. number of distinct actions tracked per service (protects against unbounded label values)
+MAX_ACTIONS_PER_SERVICE = 500
+
+# action label used for requests exceeding MAX_ACTIONS_PER_SERVICE
+OTHER_ACTION = 'other'
+
+# maps (service, action, phase) to histograms of the time spent in the given phase
+HISTOGRAMS = {}
+
+# maps service names to the set of actions being tracked
+SERVICE_ACTIONS = {}
+
+# mutex for creating new histograms
+HISTOGRAMS_LOCK = threading.RLock()
+
+# maps proxy names to counters of the client connections served by the proxy (see record_client_connection)
+CLIENT_CONNECTION_STATS = {}
+
+# mutex for updating the client connection counters
+CLIENT_CONNECTION_LOCK = threading.Lock()
+
+# statistics of other components (e.g., queues), as (name, label, function) tuples (see register_stats)
+REGISTERED_STATS = []
+
+PROMETHEUS_METRIC = 'localstack_request_phase_seconds'
+
+
+class Histogram(object):
+    """ Cumulative histogram of observed durations, using the fixed HISTOGRAM_BUCKETS. """
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        # the last bucket counts observations larger than the largest upper bound (le="+Inf")
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(HISTOGRAM_BUCKETS, value)
+        with self.mutex:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """ Return a tuple (cumulative bucket counts, sum, count). """
+        with self.mutex:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class RequestTimer(object):
+    """ Records the time spent in the consecutive phases of processing a single request in a proxy. """
+
+    def __init__(self, service, action, start_time=None):
+        self.service = service
+        self.action = action
+        self.start = self.last = start_time or time.time()
+        self.finished = False
+
+    def mark(self, phase):
+        """ Record the time elapsed since the previous mark as the duration of the given phase. """
+        now = time.time()
+        observe(self.service, self.action, phase, now - self.last)
+        self.last = now
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        observe(self.service, self.action, 'total', time.time() - self.start)
+
+
+def observe(service, action, phase, duration):
+    key = (service, action, phase)
+    histogram = HISTOGRAMS.get(key)
+    if histogram is None:
+        with HISTOGRAMS_LOCK:
+            actions = SERVICE_ACTIONS.setdefault(service, set())
+            if action not in actions:
+                if len(actions) >= MAX_ACTIONS_PER_SERVICE:
+                    action = OTHER_ACTION
+                actions.add(action)
+            key = (service, action, phase)
+            histogram = HISTOGRAMS.get(key)
+            if histogram is None:
+                histogram = HISTOGRAMS[key] = Histogram()
+    histogram.observe(duration)
+
+
+def record_client_connection(proxy_name, counter, value=1):
+    """ Increment a counter of the client connections of the given proxy. Comparing 'opened' connections with
+        the number of 'requests' served indicates the connection churn (i.e., the reuse of keep-alive connections),
+        and 'timeouts' counts connections closed after being idle for PROXY_KEEP_ALIVE_TIMEOUT. """
+    with CLIENT_CONNECTION_LOCK:
+        counters = CLIENT_CONNECTION_STATS.get(proxy_name)
+        if counters is None:
+            counters = CLIENT_CONNECTION_STATS[proxy_name] = {'opened': 0, 'requests': 0, 'timeouts': 0}
+        counters[counter] += value
+
+
+def get_client_connection_stats():
+    with CLIENT_CONNECTION_LOCK:
+        return dict((name, dict(counters)) for name, counters in CLIENT_CONNECTION_STATS.items())
+
+
+def estimate_percentile(cumulative, count, percent):
+    """ Return the upper bound of the bucket containing the given percentile (None if above all buckets). """
+    rank = count * percent / 100.0
+    for index, value in enumerate(cumulative[:-1]):
+        if value >= rank:
+            return HISTOGRAM_BUCKETS[index]
+    return None
+
+
+def get_metrics():
+    """ Return the request phase metrics as a dict, keyed by service, action, and phase. """
+    result = {}
+    for (service, action, phase), histogram in sorted(list(HISTOGRAMS.items())):
+        cumulative, total, count = histogram.snapshot()
+        if not count:
+            continue
+        p50, p99 = [estimate_percentile(cumulative, count, p) for p in (50, 99)]
+        result.setdefault(service, {}).setdefault(action, {})[phase] = {
+            'count': count,
+            'avg_ms': total * 1000.0 / count,
+            'p50_ms': None if p50 is None else p50 * 1000,
+            'p99_ms': None if p99 is None else p99 * 1000
+        }
+    return result
+
+
+def get_prometheus_metrics():
+    """ Return the metrics in the Prometheus text exposition format. """
+    lines = [
+        '# HELP %s Time spent in each phase of processing requests in the service proxies.' % PROMETHEUS_METRIC,
+        '# TYPE %s histogram' % PROMETHEUS_METRIC
+    ]
+    bounds = [str(bound) for bound in HISTOGRAM_BUCKETS] + ['+Inf']
+    for (service, action, phase), histogram in sorted(list(HISTOGRAMS.items())):
+        cumulative, total, count = histogram.snapshot()
+        labels = 'service="%s",action="%s",phase="%s"' % tuple(escape_label(v) for v in (service, action, phase))
+        for bound, value in zip(bounds, cumulative):
+            lines.append('%s_bucket{%s,le="%s"} %s' % (PROMETHEUS_METRIC, labels, bound, value))
+        lines.append('%s_sum{%s} %s' % (PROMETHEUS_METRIC, labels, total))
+        lines.append('%s_count{%s} %s' % (PROMETHEUS_METRIC, labels, count))
+
+    pools = (('localstack_worker_pool', 'proxy', worker_pool.get_worker_pool_stats()),
+        ('localstack_backend_pool', 'backend', connection_pool.get_pool_stats()),
+        ('localstack_client_connections', 'proxy', get_client_connection_stats()),
+        ('localstack_response_cache', 'service', response_cache.get_cache_stats()))
+    pools += tuple(('localstack_%s' % name, label, stats) for name, (label, stats) in get_registered_stats().items())
+    for prefix, label, stats in pools:
+        for name, counters in sorted(stats.items()):
+            for counter, value in sorted(counters.items()):
+                lines.append('%s_%s{%s="%s"} %s' % (prefix, counter, label, escape_label(name), value))
+    return '\n'.join(lines) + '\n'
+
+
+def register_stats(name, label, stats_function):
+    """ Register a function returning the statistics of a component as a dict of counters keyed by a label
+        value (e.g., the function ARN), to be exported under the given name. """
+    REGISTERED_STATS.append((name, label, stats_function))
+
+
+def get_registered_stats():
+    """ Return a dict mapping the names of the registered statistics to (label, stats) tuples. """
+    return dict((name, (label, stats_function())) for name, label, stats_function in REGISTERED_STATS)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def reset():
+    with HISTOGRAMS_LOCK:
+        HISTOGRAMS.clear()
+        SERVICE_ACTIONS.clear()
+    with CLIENT_CONNECTION_LOCK:
+        CLIENT_CONNECTION_STATS.clear()
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import pickle
+import signal
+import socket
+import logging
+import functools
+import importlib
+import threading
+import multiprocessing
+from multiprocessing.managers import BaseManager, DictProxy
+from localstack import config
+from localstack.utils.server import connection_pool, worker_pool, metrics
+
+# maps names to the dicts holding state shared by all proxy processes
+SHARED_DICTS = {}
+
+# proxies to be served by the worker processes (see register_proxy)
+PROXIES = []
+
+# index of the current process (0 for the primary process, which owns the shared state)
+PROCESS_INDEX = {'index': 0}
+
+# client of the state server of the primary process, used in worker processes
+PRIMARY = {}
+
+# set up logger
+LOG = logging.getLogger(__name__)
+
+
+class SharedDict(object):
+    """ Dict holding state that is shared by all proxy processes (see PROXY_PROCESSES). The entries live in
+        the primary process, and are accessed remotely by worker processes. Values returned in worker
+        processes are copies, hence changes to (nested) values need to be stored again via `d[key] = value`,
+        or applied in the primary process by a function decorated with `run_in_primary`. """
+
+    def __init__(self, name):
+        self.name = name
+        self.backend = {}
+        SHARED_DICTS[name] = self
+
+    def connect(self, manager):
+        self.backend = manager.get_dict(self.name)
+
+    def _snapshot(self):
+        return self.backend if isinstance(self.backend, dict) else self.backend.copy()
+
+    def __getitem__(self, key):
+        return self.backend[key]
+
+    def __setitem__(self, key, value):
+        self.backend[key] = value
+
+    def __delitem__(self, key):
+        del self.backend[key]
+
+    def __contains__(self, key):
+        return key in self.backend
+
+    def __len__(self):
+        return len(self.backend)
+
+    def __iter__(self):
+        return iter(list(self._snapshot()))
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def pop(self, key, *args):
+        return self.backend.pop(key, *args)
+
+    def setdefault(self, key, default=None):
+        return self.backend.setdefault(key, default)
+
+    def keys(self):
+        return list(self._snapshot().keys())
+
+    def values(self):
+        return list(self._snapshot().values())
+
+    def items(self):
+        return list(self._snapshot().items())
+
+    def clear(self):
+        self.backend.clear()
+
+
+class PrimaryProcess(object):
+    """ Object served by the state server of the primary process, to run functions on behalf of workers. """
+
+    def call(self, module_name, func_name, args, kwargs):
+        func = getattr(importlib.import_module(module_name), func_name)
+        result = func(*args, **kwargs)
+        try:
+            pickle.dumps(result)
+        except Exception:
+            LOG.debug('Unable to return result of %s.%s(..) to worker process' % (module_name, func_name))
+            return None
+        return result
+
+
+class StateManager(BaseManager):
+    pass
+
+
+StateManager.register('get_dict', callable=lambda name: SHARED_DICTS[name].backend, proxytype=DictProxy)
+StateManager.register('get_primary', callable=PrimaryProcess)
+
+
+class WorkerProcess(object):
+    """ Handle of a forked proxy worker process, terminated in `cleanup_threads_and_processes()`. """
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def terminate(self):
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+            os.waitpid(self.pid, 0)
+        except OSError:
+            pass
+
+
+def run_in_primary(func):
+    """ Decorator for functions which update state owned by the primary process (e.g., the registry
+        of Lambda functions). Calls in worker processes are forwarded to the primary process. """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_worker_process():
+            return func(*args, **kwargs)
+        return PRIMARY['primary'].call(func.__module__, func.__name__, args, kwargs)
+
+    return wrapper
+
+
+def is_worker_process():
+    return PROCESS_INDEX['index'] > 0
+
+
+def register_proxy(proxy):
+    """ Register a proxy to be served by the worker processes as well. """
+    PROXIES.append(proxy)
+
+
+def reuse_port():
+    """ Whether the proxies should accept connections on ports shared with other processes (SO_REUSEPORT). """
+    return config.PROXY_PROCESSES > 1 and hasattr(socket, 'SO_REUSEPORT')
+
+
+def start_state_server():
+    manager = StateManager(address=('127.0.0.1', 0), authkey=multiprocessing.current_process().authkey)
+    server = manager.get_server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server.address
+
+
+def start_proxy_workers(num_workers=None):
+    """ Fork worker processes which serve the registered proxies on the same ports as this process. """
+    num_workers = config.PROXY_PROCESSES - 1 if num_workers is None else num_workers
+    if num_workers <= 0 or not PROXIES:
+        return []
+    if not reuse_port():
+        LOG.warning('SO_REUSEPORT is not supported on this platform, serving all proxies in a single process')
+        return []
+    address = start_state_server()
+    processes = []
+    for index in range(1, num_workers + 1):
+        # flush buffered output, to avoid printing it again in the child process
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, address)
+        processes.append(WorkerProcess(pid))
+    return processes
+
+
+def run_worker(index, address):
+    """ Entry point of a forked worker process. Only the forking thread survives the fork, hence we
+        start new threads serving the proxies, reset process-local state, and connect to the primary. """
+    primary_pid = os.getppid()
+    try:
+        PROCESS_INDEX['index'] = index
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # pooled backend connections and statistics are owned by the primary process
+        connection_pool.BACKEND_SESSIONS.clear()
+        worker_pool.WORKER_POOL_STATS.clear()
+        metrics.reset()
+
+        manager = StateManager(address=address, authkey=multiprocessing.current_process().authkey)
+        manager.connect()
+        PRIMARY['primary'] = manager.get_primary()
+        for shared_dict in list(SHARED_DICTS.values()):
+            shared_dict.connect(manager)
+
+        for proxy in PROXIES:
+            clone_proxy(proxy).start()
+        # terminate once the primary process has exited
+        while os.getppid() == primary_pid:
+            time.sleep(1)
+    except Exception as e:
+        LOG.error('Error running proxy worker process %s: %s' % (index, e))
+    finally:
+        os._exit(0)
+
+
+def clone_proxy(proxy):
+    return proxy.__class__(proxy.port, forward_url=proxy.forward_url, ssl=proxy.ssl, host=proxy.listen_host,
+        update_listener=proxy.update_listener, quiet=proxy.quiet, params=proxy.params,
+        service_name=proxy.service_name)
@@ -0,0 +1,303 @@
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from six.moves.urllib.parse import parse_qsl
+from localstack import config
+from localstack.utils.common import to_str
+
+# read-only actions whose responses are cached per service (only services served by a proxy, as changes
+# that bypass the proxy would not invalidate the cache)
+CACHEABLE_ACTIONS = {
+    'dynamodb': frozenset(('DescribeTable', 'ListTables', 'DescribeTimeToLive')),
+    'kinesis': frozenset(('DescribeStream', 'DescribeStreamSummary', 'ListStreams')),
+    'sqs': frozenset(('ListQueues', 'GetQueueUrl')),
+    'cloudformation': frozenset(('DescribeStacks', 'ListStacks'))
+}
+
+# prefixes of actions which do not modify any resources (all other actions invalidate cached responses)
+READ_ONLY_ACTION_PREFIXES = ('Describe', 'List', 'Get', 'BatchGet', 'Query', 'Scan')
+
+# actions of requests without an API action (see get_request_action), which do not modify any resources
+READ_ONLY_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+# actions which modify data, but not the resources described by the cached responses (e.g., queue URLs)
+DATA_PLANE_ACTIONS = {
+    'sqs': frozenset(('SendMessage', 'SendMessageBatch', 'ReceiveMessage', 'DeleteMessage', 'DeleteMessageBatch',
+        'ChangeMessageVisibility', 'ChangeMessageVisibilityBatch')),
+    'kinesis': frozenset(('PutRecord', 'PutRecords'))
+}
+
+# request parameters identifying the resource targeted by an action
+RESOURCE_PARAMS = ('TableName', 'StreamName', 'StreamARN', 'QueueUrl', 'QueueName', 'StackName')
+
+# resources in transitional states change without any further requests, hence their responses are not cached
+TRANSITIONAL_STATES = (b'CREATING', b'UPDATING', b'DELETING', b'IN_PROGRESS')
+
+# regex to extract the access key and region from the credential scope of the Authorization header
+CREDENTIAL_REGEX = re.compile(r'Credential=([^/]+)/[^/]+/([^/]+)/')
+
+# set up logger
+LOG = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+
+    def __init__(self, service, resources, status_code, headers, body, expiry):
+        self.service = service
+        self.resources = resources
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.expiry = expiry
+
+    def to_response(self):
+        """ Return a new response for this entry, as listeners and writers may modify the response. """
+        response = Response()
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        return response
+
+
+class CacheRequest(object):
+    """ Cache state of a single request, created in `start_request(..)` and passed to `finish_request(..)`. """
+
+    def __init__(self, service, key, resources, generation, mutating):
+        self.service = service
+        self.key = key
+        self.resources = resources
+        self.generation = generation
+        self.mutating = mutating
+
+
+class ResponseCache(object):
+    """ Bounded LRU cache of responses to read-only API calls, with a TTL. Entries are invalidated by any
+        mutating action for the same resource, or for the entire service if the resource is unknown.
+
+        Each service has a generation counter, which is incremented before and after each mutating
+        request. Responses are only stored if the generation is unchanged since their request started,
+        i.e., if no mutation has been in progress concurrently (which may have made them stale). """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.mutex = threading.RLock()
+        self.entries = OrderedDict()
+        # maps service names to the keys of their entries
+        self.service_keys = {}
+        # maps (service, resource name) tuples to the keys of the entries describing the resource
+        self.resource_keys = {}
+        # maps service names to the keys of their entries not bound to a single resource (e.g., list actions)
+        self.global_keys = {}
+        self.generations = {}
+        self.stats = {}
+
+    def get(self, service, key):
+        now = time.time()
+        with self.mutex:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expiry < now:
+                self._remove(key)
+                self._increment(service, 'expirations')
+                entry = None
+            if entry is None:
+                self._increment(service, 'misses')
+                return None
+            # move the entry to the end of the LRU order
+            self.entries[key] = self.entries.pop(key)
+            self._increment(service, 'hits')
+            return entry
+
+    def put(self, key, entry, generation):
+        with self.mutex:
+            if self.generations.get(entry.service, 0) != generation:
+                return False
+            if key in self.entries:
+                self._remove(key)
+            while len(self.entries) >= self.max_size:
+                self._remove(next(iter(self.entries)))
+                self._increment(entry.service, 'evictions')
+            self.entries[key] = entry
+            self.service_keys.setdefault(entry.service, set()).add(key)
+            if entry.resources:
+                for name in entry.resources:
+                    self.resource_keys.setdefault((entry.service, name), set()).add(key)
+            else:
+                self.global_keys.setdefault(entry.service, set()).add(key)
+            self._increment(entry.service, 'stores')
+            return True
+
+    def invalidate(self, service, resources=None):
+        """ Remove the entries describing the given resources (and all entries of the service which are not
+            bound to a single resource), or all entries of the service if no resources are given. """
+        with self.mutex:
+            self.generations[service] = self.generations.get(service, 0) + 1
+            if resources:
+                keys = set(self.global_keys.get(service, ()))
+                for name in resources:
+                    keys.update(self.resource_keys.get((service, name), ()))
+            else:
+                keys = set(self.service_keys.get(service, ()))
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self._increment(service, 'invalidations', len(keys))
+
+    def generation(self, service):
+        with self.mutex:
+            return self.generations.get(service, 0)
+
+    def has_entries(self, service):
+        return bool(self.service_keys.get(service))
+
+    def clear(self):
+        with self.mutex:
+            for service in list(self.service_keys):
+                self.invalidate(service)
+
+    def get_stats(self):
+        with self.mutex:
+            result = dict((service, dict(counters)) for service, counters in self.stats.items())
+            for service, keys in self.service_keys.items():
+                result.setdefault(service, self._new_counters())['size'] = len(keys)
+        return result
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.service_keys[entry.service].discard(key)
+        if entry.resources:
+            for name in entry.resources:
+                keys = self.resource_keys.get((entry.service, name))
+                keys.discard(key)
+                if not keys:
+                    del self.resource_keys[(entry.service, name)]
+        else:
+            self.global_keys[entry.service].discard(key)
+
+    def _increment(self, service, counter, value=1):
+        counters = self.stats.get(service)
+        if counters is None:
+            counters = self.stats[service] = self._new_counters()
+        counters[counter] += value
+
+    def _new_counters(self):
+        return {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'evictions': 0, 'expirations': 0,
+            'size': 0}
+
+
+# the response cache shared by all proxies of this process (created lazily, see get_cache)
+CACHE = {}
+
+# mutex for creating the response cache
+CACHE_LOCK = threading.Lock()
+
+
+def is_enabled():
+    # the cache is local to each process, hence it cannot be used if proxies are served by multiple processes
+    return config.PROXY_CACHE_TTL > 0 and config.PROXY_PROCESSES <= 1
+
+
+def get_cache():
+    cache = CACHE.get('cache')
+    if cache is None:
+        with CACHE_LOCK:
+            cache = CACHE.get('cache')
+            if cache is None:
+                cache = CACHE['cache'] = ResponseCache(config.PROXY_CACHE_SIZE, config.PROXY_CACHE_TTL)
+    return cache
+
+
+def is_read_only(service, action):
+    return (action.startswith(READ_ONLY_ACTION_PREFIXES) or action in READ_ONLY_METHODS or
+        action in DATA_PLANE_ACTIONS.get(service, ()))
+
+
+def start_request(service, action, method, path, data, headers):
+    """ Return a tuple (cached_response, cache_request) for the given request. The response is None if the
+        request cannot be served from the cache, and the cache request is None if the request is neither
+        cacheable nor mutating. Mutating requests invalidate the cached responses of the affected resources. """
+    cacheable_actions = CACHEABLE_ACTIONS.get(service)
+    if not cacheable_actions or not is_enabled():
+        return None, None
+    cache = get_cache()
+    if action in cacheable_actions:
+        if method != 'POST':
+            return None, None
+        generation = cache.generation(service)
+        params = parse_params(data, headers)
+        if params is None:
+            return None, None
+        resources = get_resource_names(params)
+        key = (service, action, path, headers.get('Host'), get_credential_scope(headers),
+            json.dumps(params, sort_keys=True))
+        entry = cache.get(service, key)
+        if entry is not None:
+            return entry.to_response(), None
+        return None, CacheRequest(service, key, resources, generation, False)
+    if is_read_only(service, action):
+        return None, None
+    # only parse the request if required to determine the affected resources
+    resources = None
+    if method == 'POST' and cache.has_entries(service):
+        resources = get_resource_names(parse_params(data, headers) or {})
+    cache.invalidate(service, resources)
+    return None, CacheRequest(service, None, resources, None, True)
+
+
+def finish_request(cache_request, response=None):
+    """ Store the response of a cacheable request, or invalidate the cache again after a mutating request
+        (which may have run concurrently with requests for the previous state of the resource). """
+    if cache_request is None:
+        return
+    cache = get_cache()
+    if cache_request.mutating:
+        return cache.invalidate(cache_request.service, cache_request.resources)
+    if response is None or response.status_code != 200 or response._content is False:
+        return
+    body = response._content
+    if not isinstance(body, bytes) or any(state in body for state in TRANSITIONAL_STATES):
+        return
+    entry = CacheEntry(cache_request.service, cache_request.resources, response.status_code,
+        list(response.headers.items()), body, time.time() + cache.ttl)
+    cache.put(cache_request.key, entry, cache_request.generation)
+
+
+def parse_params(data, headers):
+    """ Parse the parameters of a JSON or Query API request, or return None if they cannot be parsed. """
+    if data is None and (headers.get('Transfer-Encoding') or int(headers.get('Content-Length') or 0) > 0):
+        # the request body is streamed to the backend, and not available here
+        return None
+    try:
+        data = to_str(data or '')
+        if headers.get('X-Amz-Target'):
+            return json.loads(data or '{}')
+        return sorted(parse_qsl(data, keep_blank_values=True))
+    except Exception:
+        return None
+
+
+def get_resource_names(params):
+    """ Return the set of names identifying the resource targeted by a request. Names are split into the
+        segments of URLs and ARNs, such that a queue URL matches its queue name, for instance. """
+    if isinstance(params, list):
+        params = dict(params)
+    for param in RESOURCE_PARAMS:
+        value = params.get(param)
+        if value:
+            return frozenset(name for name in re.split(r'[/:]', to_str(value)) if name)
+    return None
+
+
+def get_credential_scope(headers):
+    match = CREDENTIAL_REGEX.search(headers.get('Authorization', ''))
+    return match.groups() if match else None
+
+
+def get_cache_stats():
+    cache = CACHE.get('cache')
+    return cache.get_stats() if cache else {}
@@ -0,0 +1,142 @@
+import time
+import logging
+import threading
+from six.moves import queue
+
+# maps proxy names (e.g., "port 4576") to the statistics of their worker pools
+WORKER_POOL_STATS = {}
+
+# set up logger
+LOG = logging.getLogger(__name__)
+
+
+class WorkerPoolStats(object):
+    """ Usage statistics of the worker pool of a single proxy. """
+
+    def __init__(self, max_workers, max_queue_size):
+        self.mutex = threading.Lock()
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.counters = {
+            # requests currently waiting for a free worker
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+            # workers currently processing a request
+            'active_workers': 0,
+            # tasks accepted by the pool
+            'accepted': 0,
+            # requests rejected with a throttling error, as the queue was full
+            'rejected': 0,
+            # total and max. time (in secs) that requests have been waiting in the queue
+            'wait_time_secs': 0,
+            'max_wait_time_secs': 0
+        }
+
+    def increment(self, key, value=1):
+        with self.mutex:
+            self.counters[key] += value
+
+    def get(self, key):
+        with self.mutex:
+            return self.counters[key]
+
+    def record_wait(self, wait_time):
+        with self.mutex:
+            self.counters['wait_time_secs'] += wait_time
+            self.counters['max_wait_time_secs'] = max(self.counters['max_wait_time_secs'], wait_time)
+
+    def try_enqueue(self, capacity=None):
+        """ Add a request to the queue, unless the queue already holds `capacity` (or more) requests. """
+        with self.mutex:
+            if capacity is not None and self.max_queue_size > 0 and self.counters['queue_depth'] >= capacity:
+                self.counters['rejected'] += 1
+                return False
+            self.counters['accepted'] += 1
+            self.counters['queue_depth'] += 1
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self.counters['queue_depth'])
+            return True
+
+    def to_dict(self):
+        with self.mutex:
+            result = dict(self.counters)
+        result['max_workers'] = self.max_workers
+        result['max_queue_size'] = self.max_queue_size
+        return result
+
+
+class BoundedWorkerPool(object):
+    """ Pool of (lazily started) worker threads with a bounded queue. Tasks submitted while all workers
+        are busy and the queue is full are rejected, allowing the caller to shed load. """
+
+    def __init__(self, name, max_workers, max_queue_size=0):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue = queue.Queue()
+        self.mutex = threading.Lock()
+        self.workers = []
+        self.idle_workers = 0
+        self.stats = register_stats(name, WorkerPoolStats(max_workers, max_queue_size))
+        self.stopped = False
+
+    def submit(self, func, args=(), force=False):
+        """ Schedule `func(*args)` to be run by a worker thread. Returns False if the task got rejected, as
+            the queue is full. Tasks submitted with `force=True` (e.g., the remaining processing steps of
+            requests that have already been admitted) are never rejected. """
+        with self.mutex:
+            if self.stopped:
+                return False
+            # idle (and not yet started) workers pick up queued tasks immediately, hence they add to the capacity
+            spare_workers = self.idle_workers + self.max_workers - len(self.workers)
+            capacity = None if force else self.stats.max_queue_size + spare_workers
+            if not self.stats.try_enqueue(capacity):
+                return False
+            if self.stats.get('queue_depth') > self.idle_workers and len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._run_worker)
+                worker.daemon = True
+                self.workers.append(worker)
+                self.idle_workers += 1
+                worker.start()
+            self.queue.put((time.time(), func, args))
+        return True
+
+    def shutdown(self):
+        with self.mutex:
+            self.stopped = True
+            for worker in self.workers:
+                self.queue.put(None)
+        unregister_stats(self.name, self.stats)
+
+    def _run_worker(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            submitted, func, args = task
+            with self.mutex:
+                self.idle_workers -= 1
+                self.stats.increment('queue_depth', -1)
+            self.stats.increment('active_workers')
+            self.stats.record_wait(time.time() - submitted)
+            try:
+                func(*args)
+            except Exception as e:
+                LOG.warning('Error running task in worker pool "%s": %s' % (self.name, e))
+            finally:
+                self.stats.increment('active_workers', -1)
+                with self.mutex:
+                    self.idle_workers += 1
+
+
+def register_stats(name, stats):
+    WORKER_POOL_STATS[name] = stats
+    return stats
+
+
+def unregister_stats(name, stats):
+    if WORKER_POOL_STATS.get(name) is stats:
+        WORKER_POOL_STATS.pop(name, None)
+
+
+def get_worker_pool_stats():
+    """ Return the worker pool statistics, keyed by proxy name. """
+    return dict((name, stats.to_dict()) for name, stats in list(WORKER_POOL_STATS.items()))
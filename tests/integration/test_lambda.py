@@ -10,7 +10,7 @@ from localstack.constants import LOCALSTACK_ROOT_FOLDER, LOCALSTACK_MAVEN_VERSIO
 from localstack.utils import testutil
 from localstack.utils.aws import aws_stack
 from localstack.utils.common import (
-    short_uid, load_file, to_str, mkdir, download, run_safe, get_free_tcp_port, get_service_protocol)
+    short_uid, load_file, to_str, mkdir, download, run_safe, get_free_tcp_port, get_service_protocol, retry)
 from localstack.services.infra import start_proxy
 from localstack.services.awslambda import lambda_api, lambda_executors
 from localstack.services.generic_proxy import ProxyListener
@@ -54,17 +54,22 @@ class LambdaTestBase(unittest.TestCase):
     def check_lambda_logs(self, func_name, expected_lines=[]):
         logs_client = aws_stack.connect_to_service('logs')
         log_group_name = '/aws/lambda/%s' % func_name
-        streams = logs_client.describe_log_streams(logGroupName=log_group_name)['logStreams']
-        streams = sorted(streams, key=lambda x: x['creationTime'], reverse=True)
-        log_events = logs_client.get_log_events(
-            logGroupName=log_group_name, logStreamName=streams[0]['logStreamName'])['events']
-        log_messages = [e['message'] for e in log_events]
-        for line in expected_lines:
-            if '.*' in line:
-                found = [re.match(line, m) for m in log_messages]
-                if any(found):
-                    continue
-            self.assertIn(line, log_messages)
+
+        def check_logs():
+            streams = logs_client.describe_log_streams(logGroupName=log_group_name)['logStreams']
+            streams = sorted(streams, key=lambda x: x['creationTime'], reverse=True)
+            log_events = logs_client.get_log_events(
+                logGroupName=log_group_name, logStreamName=streams[0]['logStreamName'])['events']
+            log_messages = [e['message'] for e in log_events]
+            for line in expected_lines:
+                if '.*' in line:
+                    found = [re.match(line, m) for m in log_messages]
+                    if any(found):
+                        continue
+                self.assertIn(line, log_messages)
+
+        # the logs are shipped to CloudWatch Logs asynchronously
+        retry(check_logs, retries=10, sleep=0.5)
 
 
 class TestLambdaBaseFeatures(unittest.TestCase):
@@ -0,0 +1,96 @@
+""" Throughput benchmarks for dispatching the records of a multi-shard Kinesis stream to Lambda functions,
+    using a simulated function with a fixed invocation latency (excluding any network I/O). These are not
+    enabled in CI, and are used for manual testing:
+
+    python -m tests.performance.kinesis_dispatch_benchmarks
+"""
+import time
+import threading
+from localstack.services.awslambda import lambda_pollers
+
+STREAM_ARN = 'arn:aws:kinesis:us-east-1:000000000000:stream/benchmark'
+
+FUNCTION_ARN = 'arn:aws:lambda:us-east-1:000000000000:function:benchmark'
+
+# number of records put into the stream, in PutRecords requests of PUT_BATCH_SIZE records
+NUM_RECORDS = 2000
+PUT_BATCH_SIZE = 100
+
+# simulated latency (in secs) of each invocation of the function
+INVOCATION_LATENCY = 0.01
+
+
+class SimulatedFunction(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.done = threading.Event()
+
+    def invoke(self, func_arn, event):
+        time.sleep(INVOCATION_LATENCY)
+        with self.lock:
+            self.processed += len(event['Records'])
+            if self.processed >= NUM_RECORDS:
+                self.done.set()
+        return True
+
+
+def get_put_requests(num_shards):
+    """ Return the records of the PutRecords requests, spread across the shards by partition key. """
+    requests = []
+    for start in range(0, NUM_RECORDS, PUT_BATCH_SIZE):
+        requests.append([{'data': 'ZGF0YQ==', 'partitionKey': 'p%s' % i, 'sequenceNumber': str(1000 + i),
+            'shardId': 'shardId-%012d' % (i % num_shards)} for i in range(start, start + PUT_BATCH_SIZE)])
+    return requests
+
+
+def run_synchronous(num_shards, batch_size):
+    """ Invoke the function for each request before returning to the producer (as done previously). """
+    function = SimulatedFunction()
+    start = time.time()
+    for records in get_put_requests(num_shards):
+        function.invoke(FUNCTION_ARN, {'Records': records})
+    duration = time.time() - start
+    return duration, duration
+
+
+def run_dispatcher(num_shards, batch_size):
+    """ Return a tuple (producer secs, total secs) for dispatching the records to the shard processors. """
+    function = SimulatedFunction()
+    mapping = {'UUID': 'benchmark-%s-%s' % (num_shards, batch_size), 'FunctionArn': FUNCTION_ARN,
+        'EventSourceArn': STREAM_ARN, 'BatchSize': batch_size, 'State': 'Enabled', 'StartingPosition': 'LATEST'}
+    orig_invoke = lambda_pollers.invoke_function
+    lambda_pollers.invoke_function = function.invoke
+    try:
+        start = time.time()
+        for records in get_put_requests(num_shards):
+            lambda_pollers.dispatch_kinesis_records(STREAM_ARN, records, [mapping])
+        producer_duration = time.time() - start
+        function.done.wait()
+        return producer_duration, time.time() - start
+    finally:
+        lambda_pollers.update_pollers([])
+        lambda_pollers.invoke_function = orig_invoke
+
+
+def main():
+    scenarios = (
+        ('synchronous', run_synchronous, 1, PUT_BATCH_SIZE),
+        ('synchronous', run_synchronous, 8, PUT_BATCH_SIZE),
+        ('dispatcher', run_dispatcher, 1, 100),
+        ('dispatcher', run_dispatcher, 4, 100),
+        ('dispatcher', run_dispatcher, 8, 100),
+        ('dispatcher', run_dispatcher, 8, 10)
+    )
+    print('%d records, %s secs per invocation' % (NUM_RECORDS, INVOCATION_LATENCY))
+    print('%-15s %8s %12s %14s %12s %14s' % ('mode', 'shards', 'batch size', 'producer secs',
+        'total secs', 'records/sec'))
+    for name, func, num_shards, batch_size in scenarios:
+        producer_duration, duration = func(num_shards, batch_size)
+        print('%-15s %8s %12s %14.3f %12.3f %14.0f' % (name, num_shards, batch_size, producer_duration,
+            duration, NUM_RECORDS / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+""" Benchmarks for the proxy layer. These are not enabled in CI, and are used for manual testing:
+
+    python -m tests.performance.proxy_benchmarks
+"""
+import time
+import threading
+import requests
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from localstack import config
+from localstack.services.generic_proxy import GenericProxy
+from localstack.utils.common import get_free_tcp_port, wait_for_port_open, parallelize
+from localstack.utils.server import metrics
+
+# small response payload returned by the dummy backend (similar to an SQS SendMessage response)
+BACKEND_RESPONSE = b'<SendMessageResponse><MessageId>1</MessageId></SendMessageResponse>'
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BACKEND_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(BACKEND_RESPONSE)
+
+    def log_message(self, format, *args):
+        return
+
+
+class BackendServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_backend():
+    port = get_free_tcp_port()
+    server = BackendServer(('', port), BackendHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, port
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(len(values) * percent / 100.0)))
+    return values[index]
+
+
+def run_requests(url, num_clients, requests_per_client, payload=b'Action=SendMessage'):
+    """ Fire requests from `num_clients` concurrent clients, and return the list of latencies (in secs). """
+    latencies = []
+
+    def client(index):
+        session = requests.Session()
+        # like botocore, do not request keep-alive explicitly (the default for HTTP/1.1)
+        session.headers.pop('Connection', None)
+        for i in range(requests_per_client):
+            start = time.time()
+            # payload can be a generator function, to send the body with chunked transfer encoding
+            data = payload() if callable(payload) else payload
+            response = session.post(url, data=data)
+            latencies.append(time.time() - start)
+            assert response.status_code == 200, response.status_code
+
+    parallelize(client, list(range(num_clients)))
+    return latencies
+
+
+def run_engine_benchmark(engine, num_clients=100, requests_per_client=50):
+    """ Measure requests per second and p99 latency of a proxy served by the given engine. """
+    backend, backend_port = start_backend()
+    orig_engine = config.PROXY_ENGINE
+    config.PROXY_ENGINE = engine
+    port = get_free_tcp_port()
+    proxy = GenericProxy(port, forward_url='http://localhost:%s' % backend_port)
+    proxy.start()
+    try:
+        wait_for_port_open(port)
+        url = 'http://localhost:%s/' % port
+        # warm up
+        run_requests(url, 5, 5)
+        opened = metrics.get_client_connection_stats()[str(port)]['opened']
+        start = time.time()
+        latencies = run_requests(url, num_clients, requests_per_client)
+        duration = time.time() - start
+        return {
+            'engine': engine,
+            # number of client connections opened (i.e., the connection churn)
+            'connections': metrics.get_client_connection_stats()[str(port)]['opened'] - opened,
+            'requests': len(latencies),
+            'rps': len(latencies) / duration,
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'threads': threading.active_count()
+        }
+    finally:
+        config.PROXY_ENGINE = orig_engine
+        proxy.stop(quiet=True)
+        backend.shutdown()
+        backend.server_close()
+
+
+# chunk sizes used by SDK clients for uploads with chunked transfer encoding: the Java SDK (Apache
+# HttpClient's ChunkedOutputStream) emits 2KB chunks, the Go SDK (net/http) flushes its 4KB write buffer
+SDK_CHUNK_SIZES = {
+    'java-sdk': 2048,
+    'go-sdk': 4096
+}
+
+
+def run_chunked_upload_benchmark(client, payload_size=256 * 1024, num_clients=10, requests_per_client=20):
+    """ Measure uploads with chunked transfer encoding, using the chunk framing of the given SDK client. """
+    backend, backend_port = start_backend()
+    port = get_free_tcp_port()
+    proxy = GenericProxy(port, forward_url='http://localhost:%s' % backend_port)
+    proxy.start()
+    chunk_size = SDK_CHUNK_SIZES[client]
+    payload = b'x' * payload_size
+
+    def chunks():
+        for i in range(0, len(payload), chunk_size):
+            yield payload[i:i + chunk_size]
+
+    try:
+        wait_for_port_open(port)
+        url = 'http://localhost:%s/' % port
+        start = time.time()
+        latencies = []
+        for i in range(requests_per_client):
+            latencies.extend(run_requests(url, num_clients, 1, payload=chunks))
+        duration = time.time() - start
+        return {
+            'engine': client,
+            'requests': len(latencies),
+            'rps': len(latencies) / duration,
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000
+        }
+    finally:
+        proxy.stop(quiet=True)
+        backend.shutdown()
+        backend.server_close()
+
+
+def print_results(results):
+    print('%-10s %10s %12s %10s %10s %10s' % ('engine', 'requests', 'connections', 'req/sec', 'p50 (ms)', 'p99 (ms)'))
+    for r in results:
+        print('%-10s %10s %12s %10.1f %10.2f %10.2f' % (r['engine'], r['requests'], r.get('connections', '-'),
+            r['rps'], r['p50'], r['p99']))
+
+
+def main():
+    print_results([run_engine_benchmark(engine) for engine in ('threaded', 'asyncio')])
+    print_results([run_chunked_upload_benchmark(client) for client in sorted(SDK_CHUNK_SIZES)])
+
+
+if __name__ == '__main__':
+    main()
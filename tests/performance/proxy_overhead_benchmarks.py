@@ -0,0 +1,107 @@
+""" Micro-benchmarks for the per-request overhead of the proxy stack (listener dispatch, metrics,
+    response headers), excluding any network I/O. These are not enabled in CI, and are used for
+    manual testing:
+
+    python -m tests.performance.proxy_overhead_benchmarks
+"""
+import time
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from localstack.constants import CONFIG_UPDATE_PATH, POOL_STATS_PATH, METRICS_PATH
+from localstack.services import generic_proxy
+from localstack.services.generic_proxy import GenericProxy, GenericProxyHandler, ProxyListener, ProxyRequestContext
+
+REQUEST_HEADERS = {
+    'Host': 'localhost:4576',
+    'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8',
+    'Authorization': 'AWS4-HMAC-SHA256 Credential=test/20190101/us-east-1/sqs/aws4_request, ...',
+    'X-Amz-Date': '20190101T000000Z',
+    'Content-Length': '120'
+}
+
+REQUEST_BODY = b'Action=SendMessage&QueueUrl=http%3A%2F%2Flocalhost%3A4576%2Fqueue%2Ftest&MessageBody=test'
+
+
+class PathListener(ProxyListener):
+    """ Similar to the default listeners in infra.py, which only handle requests to a specific path. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def forward_request(self, method, path, data, headers):
+        if path != self.path:
+            return True
+        return 200
+
+
+class ServiceListener(ProxyListener):
+    """ Typical service listener, which inspects requests and updates some of the responses. """
+
+    def forward_request(self, method, path, data, headers):
+        return True
+
+    def return_response(self, method, path, data, headers, response):
+        if method == 'DELETE':
+            response.headers['X-Updated'] = 'true'
+
+
+class RequestHandlerListener(ServiceListener):
+    """ Listener which receives a reference to the request handler, like sqs_listener.py """
+
+    def return_response(self, method, path, data, headers, response, request_handler):
+        return None
+
+
+def get_backend_response():
+    response = Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'text/xml'
+    response.headers['Content-Length'] = '72'
+    response._content = b'<SendMessageResponse><MessageId>1</MessageId></SendMessageResponse>'
+    return response
+
+
+def run_stages(proxy, backend_response):
+    context = ProxyRequestContext(proxy, 'POST', '/', REQUEST_BODY, CaseInsensitiveDict(REQUEST_HEADERS),
+        client_address=('127.0.0.1', 51234), server_address=('', proxy.port))
+    generic_proxy.invoke_forward_listeners(context)
+    response = generic_proxy.invoke_return_listener(context, backend_response)
+    body = generic_proxy.get_response_body(response)
+    headers = generic_proxy.get_response_headers(response, body)
+    generic_proxy.encode_http_head('HTTP/1.1 200 OK', headers) + body
+    context.timer.finish()
+
+
+def run_overhead_benchmark(update_listener, iterations=20000):
+    """ Measure the average time (in microseconds) spent in the proxy stack per request. """
+    orig_listeners = list(GenericProxyHandler.DEFAULT_LISTENERS)
+    GenericProxyHandler.DEFAULT_LISTENERS[:] = [PathListener(path) for path in
+        (CONFIG_UPDATE_PATH, POOL_STATS_PATH, METRICS_PATH)]
+    try:
+        proxy = GenericProxy(4576, forward_url='http://localhost:4577', update_listener=update_listener,
+            service_name='benchmark')
+        backend_response = get_backend_response()
+        # warm up
+        for i in range(100):
+            run_stages(proxy, backend_response)
+        start = time.time()
+        for i in range(iterations):
+            run_stages(proxy, backend_response)
+        return (time.time() - start) * 1000000.0 / iterations
+    finally:
+        GenericProxyHandler.DEFAULT_LISTENERS[:] = orig_listeners
+
+
+def main():
+    listeners = (
+        ('no listener', None),
+        ('service listener', ServiceListener()),
+        ('request handler listener', RequestHandlerListener())
+    )
+    print('%-30s %15s' % ('update listener', 'usecs/request'))
+    for name, listener in listeners:
+        print('%-30s %15.2f' % (name, run_overhead_benchmark(listener)))
+
+
+if __name__ == '__main__':
+    main()
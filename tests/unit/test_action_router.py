@@ -0,0 +1,52 @@
+import json
+import unittest
+from localstack.utils.common import to_str
+from localstack.utils.aws.action_router import ActionRouter, get_request_action
+
+
+class ActionRouterTest(unittest.TestCase):
+
+    def test_get_request_action(self):
+        headers = {'X-Amz-Target': 'DynamoDB_20120810.PutItem'}
+        self.assertEqual(get_request_action('POST', '/', b'{}', headers), 'PutItem')
+        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'}
+        data = b'QueueUrl=test&Action=SendMessage&MessageBody=Action%3DFoo'
+        self.assertEqual(get_request_action('POST', '/', data, headers), 'SendMessage')
+        self.assertEqual(get_request_action('GET', '/?Action=ListQueues&Version=1', None, {}), 'ListQueues')
+        self.assertEqual(get_request_action('PUT', '/bucket/key?acl', b'data', {}), 'PUT')
+        # action parameter located after the first bytes of a large body
+        data = 'MessageBody=%s&Action=SendMessage' % ('x' * 10000)
+        self.assertEqual(get_request_action('POST', '/', data, headers), 'SendMessage')
+
+    def test_route_requests(self):
+        parsed = []
+
+        def parse_data(method, path, data):
+            parsed.append(data)
+            return json.loads(to_str(data))
+
+        class Listener(object):
+            router = ActionRouter(parse_data)
+
+            @router.forward('PutItem', 'DeleteItem')
+            def forward_item(self, request):
+                return (request.action, request.payload['TableName'])
+
+            @router.returns('PutItem')
+            def return_put_item(self, request, response):
+                return (response, request.payload['TableName'])
+
+        listener = Listener()
+        headers = {'X-Amz-Target': 'DynamoDB_20120810.DeleteItem'}
+        result = listener.router.forward_request(listener, 'POST', '/', '{"TableName": "t1"}', headers)
+        self.assertEqual(result, ('DeleteItem', 't1'))
+
+        # requests for unhandled actions are not parsed
+        headers = {'X-Amz-Target': 'DynamoDB_20120810.GetItem'}
+        self.assertTrue(listener.router.forward_request(listener, 'POST', '/', 'invalid', headers))
+        self.assertIsNone(listener.router.return_response(listener, 'POST', '/', 'invalid', headers, 'r1'))
+        self.assertEqual(len(parsed), 1)
+
+        headers = {'X-Amz-Target': 'DynamoDB_20120810.PutItem'}
+        result = listener.router.return_response(listener, 'POST', '/', '{"TableName": "t2"}', headers, 'r2')
+        self.assertEqual(result, ('r2', 't2'))
@@ -0,0 +1,67 @@
+import json
+import time
+import unittest
+import requests
+from localstack import config
+from localstack.services.dynamodb import dynamodb_listener
+from localstack.utils.common import get_free_tcp_port, FuncThread
+from .test_generic_proxy import EchoListener, start_proxy
+
+HEADERS = {'X-Amz-Target': 'DynamoDB_20120810.PutItem', 'Content-Type': 'application/x-amz-json-1.0'}
+
+
+class DynamoDBStreamRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.orig = (config.PROXY_ENGINE, config.PROXY_ASYNCIO_WORKERS, dynamodb_listener.find_existing_item,
+            dynamodb_listener.forward_to_lambda, dynamodb_listener.forward_to_ddb_stream)
+        self.records = []
+        dynamodb_listener.TABLE_DEFINITIONS['t1'] = {'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}]}
+        dynamodb_listener.find_existing_item = self.find_existing_item
+        dynamodb_listener.forward_to_lambda = self.records.extend
+        dynamodb_listener.forward_to_ddb_stream = lambda records: None
+
+    def tearDown(self):
+        (config.PROXY_ENGINE, config.PROXY_ASYNCIO_WORKERS, dynamodb_listener.find_existing_item,
+            dynamodb_listener.forward_to_lambda, dynamodb_listener.forward_to_ddb_stream) = self.orig
+        dynamodb_listener.TABLE_DEFINITIONS.pop('t1', None)
+
+    def find_existing_item(self, put_item, table_name=None):
+        # slow down the forwarding of requests, such that requests are processed concurrently
+        time.sleep(0.02)
+        item_id = put_item['Item']['id']['S']
+        if item_id.startswith('existing'):
+            return {'id': {'S': item_id}, 'old': {'S': 'old %s' % item_id}}
+
+    def test_stream_records_with_asyncio_engine(self):
+        # forward_request(..) and return_response(..) of a request may run on different worker threads
+        config.PROXY_ENGINE = 'asyncio'
+        config.PROXY_ASYNCIO_WORKERS = 3
+        backend = start_proxy(get_free_tcp_port(), update_listener=EchoListener())
+        proxy = start_proxy(get_free_tcp_port(), forward_url='http://localhost:%s' % backend.port,
+            update_listener=dynamodb_listener.ProxyListenerDynamoDB())
+        try:
+            def put_item(item_id):
+                data = json.dumps({'TableName': 't1', 'Item': {'id': {'S': item_id}}})
+                response = requests.post('http://localhost:%s/' % proxy.port, data=data, headers=HEADERS)
+                self.assertEqual(response.status_code, 200)
+
+            item_ids = ['%s%s' % ('existing' if i % 2 else 'new', i) for i in range(20)]
+            threads = [FuncThread(lambda params, item_id=item_id: put_item(item_id)) for item_id in item_ids]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            proxy.stop(quiet=True)
+            backend.stop(quiet=True)
+
+        self.assertEqual(len(self.records), len(item_ids))
+        for record in self.records:
+            item_id = record['dynamodb']['Keys']['id']['S']
+            if item_id.startswith('existing'):
+                self.assertEqual(record['eventName'], 'MODIFY')
+                self.assertEqual(record['dynamodb']['OldImage']['old']['S'], 'old %s' % item_id)
+            else:
+                self.assertEqual(record['eventName'], 'INSERT')
+                self.assertNotIn('OldImage', record['dynamodb'])
@@ -0,0 +1,66 @@
+import unittest
+import requests
+from localstack import config
+from localstack.services import edge
+from localstack.services.generic_proxy import GenericProxy
+from localstack.utils.common import get_free_tcp_port, wait_for_port_open
+from localstack.utils.server import connection_pool
+from .test_generic_proxy import EchoListener, UpdateListener, start_proxy
+
+
+class EdgeRouterTest(unittest.TestCase):
+
+    def test_get_service_name(self):
+        def service(path='/', **headers):
+            headers = dict((k.replace('_', '-'), v) for k, v in headers.items())
+            return edge.get_service_name('POST', path, headers)
+
+        self.assertEqual(service(**{'X_Amz_Target': 'DynamoDB_20120810.PutItem'}), 'dynamodb')
+        self.assertEqual(service(**{'X_Amz_Target': 'DynamoDBStreams_20120810.GetRecords'}), 'dynamodbstreams')
+        # prefixes are matched in order, hence no prefix must be shadowed by a preceding (shorter) prefix
+        for i, (prefix, _) in enumerate(edge.TARGET_PREFIXES):
+            for other, _ in edge.TARGET_PREFIXES[:i]:
+                self.assertFalse(prefix.startswith(other), '%s is shadowed by %s' % (prefix, other))
+        auth = 'AWS4-HMAC-SHA256 Credential=test/20190101/us-east-1/%s/aws4_request, SignedHeaders=host'
+        self.assertEqual(service(Authorization=auth % 'sqs'), 'sqs')
+        self.assertEqual(service(Authorization=auth % 'monitoring'), 'cloudwatch')
+        self.assertEqual(service(Host='sns.us-east-1.amazonaws.com'), 'sns')
+        self.assertEqual(service(Host='my-bucket.s3.amazonaws.com:4567'), 's3')
+        self.assertEqual(service('/2015-03-31/functions/foo/invocations', Host='localhost:4567'), 'lambda')
+        self.assertEqual(service('/my-bucket/my-key', Host='localhost:4567'), 's3')
+
+    def test_dispatch_requests(self):
+        orig_ports, orig_proxies = config.SERVICE_PORTS, dict(edge.SERVICE_PROXIES)
+        backends = []
+        try:
+            for i in range(2):
+                backends.append(start_proxy(get_free_tcp_port(), update_listener=EchoListener()))
+            # registered service proxies are invoked in-process, and do not need to be started
+            sqs_proxy = GenericProxy(get_free_tcp_port(), forward_url='http://localhost:%s' % backends[0].port,
+                update_listener=UpdateListener(), service_name='sqs')
+            edge.register_service_proxy('sqs', sqs_proxy)
+            config.SERVICE_PORTS = {'sqs': sqs_proxy.port, 'lambda': backends[1].port}
+
+            port = get_free_tcp_port()
+            backends.append(edge.start_edge(port, asynchronous=True))
+            wait_for_port_open(port, sleep_time=0.1)
+            url = 'http://localhost:%s' % port
+
+            response = requests.post(url, data='Action=ListQueues', headers={'Host': 'sqs.localhost.localstack.cloud'})
+            self.assertEqual(response.json()['data'], 'Action=ListQueues')
+            self.assertEqual(response.headers['X-Updated'], 'true')
+
+            # services without a registered proxy are forwarded to directly
+            response = requests.get('%s/2015-03-31/functions/' % url)
+            self.assertEqual(response.json()['path'], '/2015-03-31/functions/')
+            self.assertNotIn('X-Updated', response.headers)
+
+            response = requests.get('%s/my-bucket' % url)
+            self.assertEqual(response.status_code, 404)
+        finally:
+            for proxy in backends:
+                proxy.stop(quiet=True)
+            config.SERVICE_PORTS = orig_ports
+            edge.SERVICE_PROXIES.clear()
+            edge.SERVICE_PROXIES.update(orig_proxies)
+            connection_pool.close_sessions()
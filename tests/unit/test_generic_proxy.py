@@ -0,0 +1,577 @@
+import io
+import gzip
+import ssl
+import json
+import zlib
+import socket
+import tempfile
+import threading
+import unittest
+import requests
+from requests.models import Response
+from localstack import config
+from localstack.services.generic_proxy import (
+    GenericProxy, GenericProxyHandler, ProxyListener, ChunkedRequestBodyStream, CORS_ALLOWED_METHODS,
+    implements_listener_method, get_response_headers, encode_http_head)
+from localstack.utils.common import (
+    get_free_tcp_port, wait_for_port_open, to_str, to_bytes, retry, FuncThread)
+from localstack.utils.server import connection_pool, worker_pool, metrics, compression
+
+
+class EchoListener(ProxyListener):
+    """ Listener that acts as a backend service, echoing the details of each request. """
+
+    def forward_request(self, method, path, data, headers):
+        response = Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps({'method': method, 'path': path, 'data': to_str(data or '')})
+        return response
+
+
+class UpdateListener(ProxyListener):
+
+    def forward_request(self, method, path, data, headers):
+        if path == '/teapot':
+            return 418
+        if path == '/stale-length':
+            response = Response()
+            response.status_code = 200
+            response.headers['Content-Length'] = '1000'
+            response._content = 'short'
+            return response
+        return True
+
+    def return_response(self, method, path, data, headers, response):
+        response.headers['X-Updated'] = 'true'
+
+
+class StreamingListener(UpdateListener):
+
+    def __init__(self):
+        self.requests = []
+
+    def forward_request(self, method, path, data, headers):
+        self.requests.append((path, data))
+        return True
+
+    def return_response(self, method, path, data, headers, response):
+        self.requests.append((path, response._content))
+
+    def stream_request_body(self, method, path, headers):
+        return path.startswith('/stream')
+
+    def stream_response_body(self, method, path, headers):
+        return path.startswith('/stream')
+
+
+class FileListener(UpdateListener):
+    """ Listener returning responses backed by a (temporary) file. """
+
+    def __init__(self, content):
+        self.content = content
+
+    def forward_request(self, method, path, data, headers):
+        if path != '/file':
+            return True
+        fileobj = tempfile.TemporaryFile()
+        fileobj.write(self.content)
+        fileobj.seek(0)
+        response = Response()
+        response.status_code = 200
+        response.raw = fileobj
+        return response
+
+
+class ReplacingListener(StreamingListener):
+    """ Listener replacing streamed backend responses (or failing, for paths starting with /fail). """
+
+    def return_response(self, method, path, data, headers, response):
+        if path.startswith('/stream/fail'):
+            raise Exception('test error')
+        replaced = Response()
+        replaced.status_code = 200
+        replaced._content = b'replaced'
+        return replaced
+
+
+class BlockingListener(UpdateListener):
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def forward_request(self, method, path, data, headers):
+        if path == '/block':
+            self.event.wait()
+        return True
+
+
+def start_proxy(port, **kwargs):
+    proxy = GenericProxy(port, **kwargs)
+    proxy.start()
+    wait_for_port_open(port, sleep_time=0.1)
+    return proxy
+
+
+class GenericProxyTest(unittest.TestCase):
+
+    engine = 'threaded'
+
+    def setUp(self):
+        self.orig_engine = config.PROXY_ENGINE
+        config.PROXY_ENGINE = self.engine
+        backend_port = get_free_tcp_port()
+        self.backend = start_proxy(backend_port, update_listener=EchoListener())
+        self.port = get_free_tcp_port()
+        self.proxy = start_proxy(self.port, forward_url='http://localhost:%s' % backend_port,
+            update_listener=UpdateListener())
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        self.proxy.stop(quiet=True)
+        self.backend.stop(quiet=True)
+        connection_pool.close_sessions()
+        config.PROXY_ENGINE = self.orig_engine
+
+    def test_forward_request(self):
+        response = requests.post('%s/foo?bar=1' % self.url, data='test data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Updated'], 'true')
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], '*')
+        self.assertEqual(response.json(), {'method': 'POST', 'path': '/foo?bar=1', 'data': 'test data'})
+
+    def test_status_code_from_listener(self):
+        response = requests.get('%s/teapot' % self.url)
+        self.assertEqual(response.status_code, 418)
+        self.assertEqual(response.content, b'')
+
+    def test_multiple_requests_on_session(self):
+        session = requests.Session()
+        for i in range(5):
+            response = session.put('%s/item/%s' % (self.url, i), data='value %s' % i)
+            self.assertEqual(response.json()['data'], 'value %s' % i)
+
+    def test_chunked_request(self):
+        def chunks():
+            yield b'chunk1 '
+            yield b'chunk2'
+
+        response = requests.post('%s/chunked' % self.url, data=chunks())
+        self.assertEqual(response.json()['data'], 'chunk1 chunk2')
+
+        # the end of the body is determined by the last chunk, without waiting for the client to close the connection
+        connection = socket.create_connection(('localhost', self.port))
+        connection.settimeout(10)
+        try:
+            connection.sendall(b'POST /chunked HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n'
+                b'7\r\nchunk1 \r\n6\r\nchunk2\r\n0\r\n\r\n')
+            received = b''
+            while b'chunk2"}' not in received:
+                chunk = connection.recv(4096)
+                self.assertTrue(chunk, 'connection closed, received: %s' % received)
+                received += chunk
+            self.assertIn(b'"data": "chunk1 chunk2"', received)
+        finally:
+            connection.close()
+
+    def test_streaming_chunked_request(self):
+        if self.engine != 'threaded':
+            return
+        listener = self.proxy.update_listener = StreamingListener()
+        chunks = [b'x' * 100000, b'y' * 10, b'z' * 70000]
+        response = requests.post('%s/stream' % self.url, data=iter(chunks))
+        self.assertEqual(response.json()['data'], to_str(b''.join(chunks)))
+        self.assertEqual(listener.requests[0], ('/stream', None))
+
+    def test_request_metrics(self):
+        self.proxy.service_name = 'test-%s' % self.engine
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        requests.post(self.url, data='Action=SendMessage', headers=headers)
+        requests.get('%s/teapot' % self.url)
+
+        def check_metrics():
+            result = metrics.get_metrics()[self.proxy.service_name]
+            self.assertEqual(result['SendMessage']['total']['count'], 1)
+            for phase in ('forward_request', 'backend', 'return_response', 'write'):
+                self.assertIn(phase, result['SendMessage'])
+            # request answered by a listener without invoking the backend
+            self.assertNotIn('backend', result['GET'])
+            self.assertEqual(result['GET']['total']['count'], 1)
+
+        retry(check_metrics, retries=20, sleep=0.1)
+
+    def test_backend_connection_pool(self):
+        if self.engine != 'threaded':
+            return
+        for i in range(5):
+            requests.get('%s/item/%s' % (self.url, i))
+        stats = connection_pool.get_pool_stats()[self.proxy.forward_url]
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['hits'], 4)
+
+    def test_replaced_streaming_responses(self):
+        if self.engine != 'threaded':
+            return
+        orig = (config.PROXY_POOL_SIZE, config.PROXY_POOL_TIMEOUT)
+        config.PROXY_POOL_SIZE, config.PROXY_POOL_TIMEOUT = 2, 2
+        try:
+            self.proxy.update_listener = ReplacingListener()
+            # the backend connections of replaced (or failed) streaming responses are returned to the pool
+            for i in range(config.PROXY_POOL_SIZE * 3):
+                response = requests.get('%s/stream/%s' % (self.url, i))
+                self.assertEqual((response.status_code, response.content), (200, b'replaced'))
+                response = requests.get('%s/stream/fail/%s' % (self.url, i))
+                self.assertEqual(response.status_code, 502)
+        finally:
+            config.PROXY_POOL_SIZE, config.PROXY_POOL_TIMEOUT = orig
+
+    def test_streaming_request_and_response(self):
+        if self.engine != 'threaded':
+            return
+        listener = self.proxy.update_listener = StreamingListener()
+        payload = 'x' * 1024 * 1024
+        for path in ('/stream', '/buffer'):
+            response = requests.put('%s%s' % (self.url, path), data=payload)
+            self.assertEqual(response.json()['data'], payload)
+            self.assertEqual(int(response.headers['Content-Length']), len(response.content))
+        # assert that bodies are not passed to the listener in streaming mode
+        self.assertEqual(listener.requests[0], ('/stream', None))
+        self.assertEqual(listener.requests[1], ('/stream', False))
+        self.assertEqual(listener.requests[2], ('/buffer', to_bytes(payload)))
+        self.assertIn(to_bytes(payload), listener.requests[3][1])
+
+    def test_large_and_file_responses(self):
+        payload = b'x' * 100 * 1024
+        self.proxy.update_listener = FileListener(payload)
+        response = requests.get('%s/file' % self.url)
+        self.assertEqual(response.content, payload)
+        self.assertEqual(int(response.headers['Content-Length']), len(payload))
+        self.assertEqual(response.headers['X-Updated'], 'true')
+
+        response = requests.post(self.url, data=payload)
+        self.assertEqual(to_bytes(response.json()['data']), payload)
+        self.assertEqual(int(response.headers['Content-Length']), len(response.content))
+
+    def test_response_compression(self):
+        payload = 'x' * 10 * 1024
+        orig_config = config.PROXY_COMPRESSION
+        try:
+            for setting, expected in (('', None), ('*', 'gzip')):
+                config.PROXY_COMPRESSION = setting
+                response = requests.post(self.url, data=payload, stream=True)
+                raw = response.raw.read(decode_content=False)
+                self.assertEqual(response.headers.get('Content-Encoding'), expected)
+                self.assertEqual(int(response.headers['Content-Length']), len(raw))
+                self.assertEqual(response.raw.headers.get('Vary'), expected and 'Accept-Encoding')
+                body = gzip.GzipFile(fileobj=io.BytesIO(raw)).read() if expected else raw
+                self.assertEqual(json.loads(to_str(body))['data'], payload)
+            # small responses are not compressed
+            response = requests.post(self.url, data='test')
+            self.assertNotIn('Content-Encoding', response.headers)
+        finally:
+            config.PROXY_COMPRESSION = orig_config
+
+    def test_tls_keep_alive_and_session_resumption(self):
+        port = get_free_tcp_port()
+        proxy = start_proxy(port, ssl=True, update_listener=EchoListener(), service_name='tls-test')
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        session = None
+        try:
+            for i in range(2):
+                connection = context.wrap_socket(socket.create_connection(('localhost', port)), session=session)
+                # secure connections are kept alive by default
+                for j in range(2):
+                    connection.sendall(b'GET /test HTTP/1.1\r\nHost: localhost\r\n\r\n')
+                    self.assertIn(b'"path": "/test"', connection.recv(4096))
+                self.assertEqual(connection.session_reused, i > 0)
+                session = connection.session
+                connection.close()
+        finally:
+            proxy.stop(quiet=True)
+        self.assertEqual(GenericProxy.create_ssl_cert(), GenericProxy.create_ssl_cert())
+        if self.engine == 'threaded':
+            handshakes = retry(lambda: metrics.get_metrics()['tls-test']['TLSHandshake'], sleep=0.1)
+            self.assertEqual(handshakes['full']['count'], 1)
+            self.assertEqual(handshakes['resumed']['count'], 1)
+
+    def test_keep_alive_connections(self):
+        # note: connections opened by wait_for_port_open(..) are not used to send requests
+        opened = retry(lambda: metrics.get_client_connection_stats()[str(self.port)]['opened'], sleep=0.1)
+        session = requests.Session()
+        for path in ('/foo', '/teapot', '/stale-length', '/bar'):
+            response = session.get('%s%s' % (self.url, path))
+            self.assertNotIn('Connection', response.headers)
+        self.assertEqual(response.json()['path'], '/bar')
+        response = session.get('%s/stale-length' % self.url)
+        self.assertEqual(response.content, b'short')
+        stats = metrics.get_client_connection_stats()[str(self.port)]
+        self.assertEqual((stats['opened'] - opened, stats['requests']), (1, 5))
+
+        response = session.get(self.url, headers={'Connection': 'close'})
+        self.assertEqual(response.headers['Connection'], 'close')
+
+    def test_keep_alive_request_bodies(self):
+        connection = socket.create_connection(('localhost', self.port))
+        connection.settimeout(5)
+        try:
+            # the body of a DELETE request must be consumed before reading the next request on the connection
+            connection.sendall(b'DELETE /first HTTP/1.1\r\nHost: localhost\r\nContent-Length: 4\r\n\r\nbody'
+                b'GET /second HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            received = b''
+            while b'"path": "/second"' not in received:
+                chunk = connection.recv(4096)
+                self.assertTrue(chunk, 'connection closed, received: %s' % received)
+                received += chunk
+            self.assertEqual(received.count(b'HTTP/1.1 200'), 2)
+            self.assertIn(b'{"method": "DELETE", "path": "/first", "data": "body"}', received)
+        finally:
+            connection.close()
+
+    def test_idle_timeout(self):
+        orig_timeout = config.PROXY_KEEP_ALIVE_TIMEOUT
+        config.PROXY_KEEP_ALIVE_TIMEOUT = 0.5
+        try:
+            connection = socket.create_connection(('localhost', self.port))
+            connection.sendall(b'GET /test HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            self.assertIn(b'"path": "/test"', connection.recv(4096))
+            connection.settimeout(5)
+            # the connection is closed by the proxy after being idle for PROXY_KEEP_ALIVE_TIMEOUT
+            self.assertEqual(connection.recv(4096), b'')
+            connection.close()
+            self.assertEqual(metrics.get_client_connection_stats()[str(self.port)]['timeouts'], 1)
+        finally:
+            config.PROXY_KEEP_ALIVE_TIMEOUT = orig_timeout
+
+    def test_load_shedding(self):
+        orig_config = config.PROXY_MAX_WORKERS, config.PROXY_ASYNCIO_WORKERS, config.PROXY_MAX_QUEUE_SIZE
+        config.PROXY_MAX_WORKERS = config.PROXY_ASYNCIO_WORKERS = config.PROXY_MAX_QUEUE_SIZE = 1
+        listener = BlockingListener()
+        port = get_free_tcp_port()
+        proxy = start_proxy(port, forward_url=self.proxy.forward_url, update_listener=listener)
+        url = 'http://localhost:%s' % port
+        results = []
+        try:
+            def send_request(*args):
+                results.append(requests.get('%s/block' % url).status_code)
+
+            def check_idle():
+                stats = worker_pool.get_worker_pool_stats()[str(port)]
+                self.assertEqual((stats['active_workers'], stats['queue_depth']), (0, 0))
+                if self.engine == 'threaded':
+                    # wait until the connection opened by wait_for_port_open(..) has been served
+                    self.assertEqual(stats['accepted'], 1)
+
+            retry(check_idle, retries=30, sleep=0.1)
+            # occupy the single worker, and fill up the queue
+            for i in range(2):
+                FuncThread(send_request).start()
+
+            def check_queue_full():
+                stats = worker_pool.get_worker_pool_stats()[str(port)]
+                self.assertEqual((stats['active_workers'], stats['queue_depth']), (1, 1))
+
+            retry(check_queue_full, retries=30, sleep=0.1)
+            response = requests.get('%s/foo' % url)
+            self.assertEqual(response.status_code, 503)
+            self.assertIn(b'<Code>SlowDown</Code>', response.content)
+            response = requests.post(url, data='{}', headers={'X-Amz-Target': 'DynamoDB_20120810.ListTables'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['__type'], 'ThrottlingException')
+            self.assertEqual(worker_pool.get_worker_pool_stats()[str(port)]['rejected'], 2)
+
+            # release the blocked requests
+            listener.event.set()
+
+            def check_results():
+                self.assertEqual(results, [200, 200])
+
+            retry(check_results, retries=30, sleep=0.1)
+        finally:
+            listener.event.set()
+            proxy.stop(quiet=True)
+            config.PROXY_MAX_WORKERS, config.PROXY_ASYNCIO_WORKERS, config.PROXY_MAX_QUEUE_SIZE = orig_config
+
+    def test_idle_connection_frees_worker(self):
+        if self.engine != 'threaded':
+            return
+        orig_config = config.PROXY_MAX_WORKERS, config.PROXY_MAX_QUEUE_SIZE
+        config.PROXY_MAX_WORKERS, config.PROXY_MAX_QUEUE_SIZE = 1, 5
+        port = get_free_tcp_port()
+        proxy = start_proxy(port, forward_url=self.proxy.forward_url, update_listener=UpdateListener())
+        connection = socket.create_connection(('localhost', port))
+        connection.settimeout(5)
+        try:
+            # occupy the single worker with an idle keep-alive connection, after serving a (pipelined) request
+            connection.sendall(b'GET /first HTTP/1.1\r\nHost: localhost\r\n\r\n'
+                b'GET /second HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            received = b''
+            while b'"path": "/second"' not in received:
+                received += connection.recv(4096)
+            # the worker is handed over to the next connection, without waiting for PROXY_KEEP_ALIVE_TIMEOUT
+            response = requests.get('http://localhost:%s/other' % port, timeout=5)
+            self.assertEqual(response.json()['path'], '/other')
+            self.assertEqual(connection.recv(4096), b'')
+        finally:
+            connection.close()
+            proxy.stop(quiet=True)
+            config.PROXY_MAX_WORKERS, config.PROXY_MAX_QUEUE_SIZE = orig_config
+
+
+class AsyncioProxyTest(GenericProxyTest):
+
+    engine = 'asyncio'
+
+    def test_backend_unavailable(self):
+        self.backend.stop(quiet=True)
+        self.proxy.quiet = True
+        response = requests.get('%s/foo' % self.url, headers={'Connection': 'close'})
+        self.assertEqual(response.status_code, 502)
+
+    def test_backend_keep_alive_connections(self):
+        def count_backend_connections():
+            stats = metrics.get_client_connection_stats()[str(self.backend.port)]
+            return stats['opened'], stats['requests']
+
+        orig_pool_size = config.PROXY_POOL_SIZE
+        requests.get('%s/warmup' % self.url, headers={'Connection': 'close'})
+        opened, served = count_backend_connections()
+        try:
+            # without connection pooling, a new connection is opened for each request
+            config.PROXY_POOL_SIZE = 0
+            for i in range(3):
+                self.assertEqual(requests.get('%s/item/%s' % (self.url, i)).status_code, 200)
+            self.assertEqual(count_backend_connections(), (opened + 3, served + 3))
+
+            # otherwise, requests are sent via a single kept-alive backend connection
+            config.PROXY_POOL_SIZE = orig_pool_size
+            for i in range(5):
+                response = requests.post('%s/item/%s' % (self.url, i), data='value %s' % i)
+                self.assertEqual(response.json()['data'], 'value %s' % i)
+            self.assertEqual(count_backend_connections(), (opened + 4, served + 8))
+        finally:
+            config.PROXY_POOL_SIZE = orig_pool_size
+
+
+class ChunkedRequestBodyStreamTest(unittest.TestCase):
+
+    def test_decode_chunks(self):
+        body = b'7;ext=1\r\nchunk1 \r\n6\r\nchunk2\r\n0\r\nX-Trailer: 1\r\n\r\nnext request'
+        rfile = io.BytesIO(body)
+        stream = ChunkedRequestBodyStream(rfile)
+        self.assertFalse(stream.is_consumed())
+        self.assertEqual(stream.read_all(), b'chunk1 chunk2')
+        self.assertTrue(stream.is_consumed())
+        self.assertEqual(rfile.read(), b'next request')
+
+    def test_incomplete_body(self):
+        stream = ChunkedRequestBodyStream(io.BytesIO(b'a\r\nshort'))
+        self.assertRaises(ValueError, stream.read_all)
+        stream = ChunkedRequestBodyStream(io.BytesIO(b'invalid\r\n'))
+        self.assertRaises(ValueError, stream.read_all)
+
+
+class RequestHandlerListener(ProxyListener):
+
+    def return_response(self, method, path, data, headers, response, request_handler):
+        return None
+
+
+class ResponseHeadersTest(unittest.TestCase):
+
+    def test_get_response_headers(self):
+        response = Response()
+        response.status_code = 200
+        response._content = b'test'
+        response.headers['Transfer-Encoding'] = 'chunked'
+        response.headers['Server'] = 'backend'
+        response.headers['access-control-allow-origin'] = 'http://example.com'
+        response.headers['X-Custom'] = 'value'
+        headers = get_response_headers(response)
+        self.assertEqual(headers[:2], [('access-control-allow-origin', 'http://example.com'), ('X-Custom', 'value')])
+        self.assertIn(('Content-Length', '4'), headers)
+        self.assertEqual([key for key, value in headers if key.lower() == 'access-control-allow-origin'],
+            ['access-control-allow-origin'])
+        self.assertIn(('Access-Control-Allow-Methods', ','.join(CORS_ALLOWED_METHODS)), headers)
+
+        head = encode_http_head('HTTP/1.1 200 OK', [('Content-Length', '4'), ('X-Bytes', b'value')])
+        self.assertEqual(head, b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\nX-Bytes: value\r\n\r\n')
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.orig_config = (config.PROXY_COMPRESSION, config.PROXY_COMPRESSION_MIN_SIZE)
+        config.PROXY_COMPRESSION = 's3,dynamodb'
+        config.PROXY_COMPRESSION_MIN_SIZE = 10
+
+    def tearDown(self):
+        config.PROXY_COMPRESSION, config.PROXY_COMPRESSION_MIN_SIZE = self.orig_config
+
+    def test_get_accepted_encoding(self):
+        self.assertEqual(compression.get_accepted_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(compression.get_accepted_encoding('deflate, gzip;q=0.5'), 'deflate')
+        self.assertEqual(compression.get_accepted_encoding('gzip;q=0, *'), 'deflate')
+        self.assertEqual(compression.get_accepted_encoding('br, *;q=0.1'), 'gzip')
+        self.assertIsNone(compression.get_accepted_encoding('identity'))
+        self.assertIsNone(compression.get_accepted_encoding(''))
+
+    def test_compress_response(self):
+        body = b'{"Items": [%s]}' % b', '.join([b'{"id": {"S": "1"}}'] * 100)
+        headers = [('Content-Type', 'application/x-amz-json-1.0'), ('Content-Length', str(len(body)))]
+        request_headers = {'Accept-Encoding': 'deflate'}
+
+        result_headers, result = compression.compress_response('dynamodb', 'POST', request_headers, 200,
+            headers, body)
+        self.assertEqual(zlib.decompress(result), body)
+        self.assertEqual(result_headers, [('Content-Type', 'application/x-amz-json-1.0'),
+            ('Content-Length', str(len(result))), ('Content-Encoding', 'deflate'), ('Vary', 'Accept-Encoding')])
+
+        # responses which are not compressed
+        for args in (('sqs', 'POST', request_headers, 200, headers, body),
+                ('dynamodb', 'POST', {}, 200, headers, body),
+                ('dynamodb', 'HEAD', request_headers, 200, headers, body),
+                ('dynamodb', 'POST', request_headers, 200, headers, b'{}'),
+                ('s3', 'GET', request_headers, 206, headers, body),
+                ('s3', 'GET', request_headers, 200, [('Content-Type', 'image/png')], body),
+                ('s3', 'GET', request_headers, 200, [('Content-Encoding', 'gzip')], body)):
+            self.assertEqual(compression.compress_response(*args), (args[4], args[5]))
+
+
+class ListenerPipelineTest(unittest.TestCase):
+
+    def test_implements_listener_method(self):
+        listener = UpdateListener()
+        self.assertTrue(implements_listener_method(listener, 'forward_request'))
+        self.assertTrue(implements_listener_method(listener, 'return_response'))
+        self.assertFalse(implements_listener_method(listener, 'get_forward_url'))
+        self.assertFalse(implements_listener_method(listener, 'stream_request_body'))
+        self.assertFalse(implements_listener_method(ProxyListener(), 'forward_request'))
+        listener.get_forward_url = lambda *args: None
+        self.assertTrue(implements_listener_method(listener, 'get_forward_url'))
+
+    def test_compile_pipeline(self):
+        proxy = GenericProxy(get_free_tcp_port(), update_listener=UpdateListener())
+        pipeline = proxy.get_pipeline()
+        self.assertEqual(len(pipeline.forward_listeners), len(pipeline.listeners))
+        self.assertEqual(pipeline.forward_url_listeners, [])
+        self.assertIs(pipeline.return_listener, proxy.update_listener)
+        self.assertFalse(pipeline.return_listener_takes_handler)
+        self.assertIsNone(pipeline.streaming_listeners['stream_request_body'])
+        self.assertIs(proxy.get_pipeline(), pipeline)
+
+        # pipeline is rebuilt when the update listener changes
+        proxy.update_listener = RequestHandlerListener()
+        pipeline = proxy.get_pipeline()
+        self.assertNotIn(proxy.update_listener, pipeline.forward_listeners)
+        self.assertTrue(pipeline.return_listener_takes_handler)
+
+        # pipeline is rebuilt when the default listeners change
+        listener = UpdateListener()
+        GenericProxyHandler.DEFAULT_LISTENERS.append(listener)
+        try:
+            self.assertIn(listener, proxy.get_pipeline().forward_listeners)
+        finally:
+            GenericProxyHandler.DEFAULT_LISTENERS.remove(listener)
+        self.assertNotIn(listener, proxy.get_pipeline().forward_listeners)
@@ -1,7 +1,20 @@
-import unittest
+import os
+import sys
 import json
+import base64
+import zipfile
+import unittest
+import threading
+from io import BytesIO
+from requests.models import Response
+from localstack import config
 from localstack.services.awslambda import lambda_api, lambda_executors
+from localstack.services.generic_proxy import ProxyListener
+from localstack.utils.common import (
+    retry, to_str, get_free_tcp_port, new_tmp_dir, save_file, rm_rf, short_uid, FuncThread)
+from localstack.utils.server import metrics
 from localstack.utils.aws.aws_models import LambdaFunction
+from .test_generic_proxy import start_proxy
 
 
 class TestLambdaAPI(unittest.TestCase):
@@ -44,13 +57,13 @@ class TestLambdaAPI(unittest.TestCase):
 
     def test_get_event_source_mapping(self):
         with self.app.test_request_context():
-            lambda_api.event_source_mappings.append({'UUID': self.TEST_UUID})
+            lambda_api.event_source_mappings.add({'UUID': self.TEST_UUID})
             result = lambda_api.get_event_source_mapping(self.TEST_UUID)
             self.assertEqual(json.loads(result.get_data()).get('UUID'), self.TEST_UUID)
 
     def test_delete_event_source_mapping(self):
         with self.app.test_request_context():
-            lambda_api.event_source_mappings.append({'UUID': self.TEST_UUID})
+            lambda_api.event_source_mappings.add({'UUID': self.TEST_UUID})
             result = lambda_api.delete_event_source_mapping(self.TEST_UUID)
             self.assertEqual(json.loads(result.get_data()).get('UUID'), self.TEST_UUID)
             self.assertEqual(0, len(lambda_api.event_source_mappings))
@@ -322,6 +335,429 @@ class TestLambdaAPI(unittest.TestCase):
         name = executor.get_container_name('arn:aws:lambda:us-east-1:00000000:function:my_function_name')
         self.assertEqual(name, 'localstack_lambda_arn_aws_lambda_us-east-1_00000000_function_my_function_name')
 
+    def test_multiple_containers_per_function(self):
+        executor = lambda_executors.LambdaExecutorReuseContainers()
+        func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f1')
+        arn = func_details.arn()
+        orig_max_containers = config.LAMBDA_MAX_CONTAINERS
+        config.LAMBDA_MAX_CONTAINERS = 3
+        try:
+            # concurrent invocations scale up to the max. number of containers, then share the least busy one
+            indexes = [executor.acquire_container(arn, func_details) for i in range(4)]
+            self.assertEqual(indexes, [0, 1, 2, 0])
+            executor.release_container(arn, 1)
+            executor.release_container(arn, 2)
+            executor.container_release_times[(arn, 1)] -= 1000
+            self.assertEqual(executor.acquire_container(arn, func_details), 2)
+            self.assertEqual(executor.acquire_container(arn, func_details), 1)
+
+            # the reserved concurrency limits the number of containers
+            func_details.concurrency = {'ReservedConcurrentExecutions': 1}
+            self.assertEqual(executor.get_max_containers(func_details), 1)
+            func_details.concurrency = None
+
+            # idle containers are removed
+            for index in (0, 0, 1, 2):
+                executor.release_container(arn, index)
+            destroyed = []
+            executor.destroy_docker_container = lambda func_arn, index=0: destroyed.append((func_arn, index))
+            executor.container_release_times[(arn, 0)] -= 1000
+            executor.container_release_times[(arn, 1)] -= lambda_executors.MAX_CONTAINER_IDLE_TIME_MS
+            executor.idle_container_destroyer()
+            self.assertEqual(destroyed, [(arn, 1)])
+            self.assertEqual(sorted(executor.function_containers[arn]), [0, 2])
+            self.assertEqual(executor.acquire_container(arn, func_details), 2)
+            self.assertEqual(executor.acquire_container(arn, func_details), 0)
+            self.assertEqual(executor.acquire_container(arn, func_details), 1)
+        finally:
+            config.LAMBDA_MAX_CONTAINERS = orig_max_containers
+
+    def test_container_status_by_exact_name(self):
+        executor = lambda_executors.LambdaExecutorReuseContainers()
+        arn = 'arn:aws:lambda:us-east-1:000000000000:function:f1'
+        name = executor.get_container_name(arn)
+        self.assertEqual(executor.get_container_name(arn, 2), '%s.2' % name)
+        orig_run = lambda_executors.run
+        lambda_executors.run = lambda cmd, **kwargs: 'Up 2 minutes - %s.1\nExited (0) - %s\n' % (name, name)
+        try:
+            self.assertEqual(executor.get_docker_container_status(arn), -1)
+            self.assertEqual(executor.get_docker_container_status(arn, 1), 1)
+            self.assertEqual(executor.get_docker_container_status(arn, 2), 0)
+        finally:
+            lambda_executors.run = orig_run
+
+    def test_stay_open_containers(self):
+        commands = []
+        invocations = []
+
+        class LambdaAPIListener(ProxyListener):
+            def forward_request(self, method, path, data, headers):
+                invocations.append((path, json.loads(to_str(data))))
+                response = Response()
+                response.status_code = 200
+                response.headers['X-Amz-Log-Result'] = to_str(base64.b64encode(b'log line'))
+                response._content = json.dumps({'invocation': len(invocations)})
+                return response
+
+        def run(cmd, **kwargs):
+            commands.append(cmd)
+            return '127.0.0.1 \n' if '.IPAddress' in cmd else ''
+
+        port = get_free_tcp_port()
+        server = start_proxy(port, update_listener=LambdaAPIListener())
+        executor = lambda_executors.LambdaExecutorReuseContainers()
+        func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f1')
+        func_details.runtime, func_details.handler, func_details.cwd = 'python3.6', 'handler.handler', '/tmp/code'
+        func_details.envvars = {'VAR': '1'}
+        orig = (lambda_executors.run, lambda_executors.LAMBDA_API_PORT_STAY_OPEN, config.LAMBDA_STAY_OPEN_MODE)
+        lambda_executors.run, lambda_executors.LAMBDA_API_PORT_STAY_OPEN = run, port
+        config.LAMBDA_STAY_OPEN_MODE = True
+        try:
+            for i in range(2):
+                result, log_output = executor._execute(func_details.arn(), func_details, {'i': i})
+                self.assertEqual(json.loads(result), {'invocation': i + 1})
+                self.assertEqual(log_output, 'log line')
+            self.assertEqual(invocations[1], ('/2015-03-31/functions/function/invocations', {'i': 1}))
+            # the container is started once, with the environment and handler of the function
+            create_commands = [c for c in commands if ' create ' in c]
+            self.assertEqual(len(create_commands), 1)
+            self.assertIn('-e DOCKER_LAMBDA_STAY_OPEN=1', create_commands[0])
+            self.assertIn('-e VAR=1', create_commands[0])
+            self.assertTrue(create_commands[0].endswith('lambci/lambda:python3.6 handler.handler'))
+            self.assertFalse([c for c in commands if ' exec ' in c])
+
+            # the container is restarted if the environment of the function changes
+            func_details.envvars = {'VAR': '2'}
+            executor._execute(func_details.arn(), func_details, {})
+            create_commands = [c for c in commands if ' create ' in c]
+            self.assertEqual(len(create_commands), 2)
+            self.assertIn('-e VAR=2', create_commands[1])
+        finally:
+            lambda_executors.run, lambda_executors.LAMBDA_API_PORT_STAY_OPEN, config.LAMBDA_STAY_OPEN_MODE = orig
+            server.stop(quiet=True)
+            metrics.reset()
+
+    def test_warm_container_pool(self):
+        commands = []
+        started = []
+
+        def run(cmd, **kwargs):
+            commands.append(cmd)
+            if 'image inspect' in cmd:
+                return '[/var/runtime/init]\n'
+            if ' start ' in cmd:
+                started.append(cmd.split()[-1])
+            if ' ps -a ' in cmd:
+                return ''.join('Up 1 second - %s\n' % name for name in started)
+            return ''
+
+        executor = lambda_executors.LambdaExecutorReuseContainers()
+        orig_run, orig_warm_containers = lambda_executors.run, config.LAMBDA_WARM_CONTAINERS
+        lambda_executors.run = run
+        config.LAMBDA_WARM_CONTAINERS = 2
+        try:
+            executor.prepare_function(LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f1'))
+            self.assertEqual(commands, [])
+            func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f1')
+            func_details.runtime = 'python3.6'
+            executor.prepare_function(func_details)
+            retry(lambda: self.assertEqual(len(executor.warm_containers['python3.6']), 2), sleep=0.1)
+            warm_containers = list(executor.warm_containers['python3.6'])
+            self.assertEqual(len([c for c in commands if ' create ' in c]), 2)
+
+            # the first invocation claims a warm container, which is replaced in the background
+            del commands[:]
+            container_name = executor.get_container_name(func_details.arn())
+            info = executor.prime_docker_container('python3.6', func_details.arn(), {}.items(), '/tmp/code')
+            self.assertEqual(info.name, container_name)
+            self.assertEqual(info.entry_point, '/var/runtime/init')
+            self.assertIn('docker rename %s %s' % (warm_containers[0], container_name), commands)
+            self.assertIn('docker cp "/tmp/code/." "%s:/var/task"' % container_name, commands)
+            retry(lambda: self.assertEqual(len(executor.warm_containers['python3.6']), 2), sleep=0.1)
+            self.assertEqual(executor.warm_containers['python3.6'][0], warm_containers[1])
+            self.assertNotIn(container_name, ' '.join(c for c in commands if ' create ' in c))
+
+            # runtimes without warm containers are started cold
+            executor.warm_containers.clear()
+            config.LAMBDA_WARM_CONTAINERS = 0
+            del commands[:]
+            executor.prime_docker_container('python3.6', func_details.arn(), {'A': 'b'}.items(), '/tmp/code')
+            self.assertIn('"%s"' % container_name, [c for c in commands if ' create ' in c][0])
+            phases = metrics.get_metrics()['lambda']['ContainerStart']
+            self.assertEqual((phases['warm']['count'], phases['cold']['count']), (1, 1))
+        finally:
+            lambda_executors.run = orig_run
+            config.LAMBDA_WARM_CONTAINERS = orig_warm_containers
+            metrics.reset()
+
+    def test_concurrent_cold_starts(self):
+        commands = []
+        started = []
+        all_created = threading.Event()
+
+        def run(cmd, **kwargs):
+            commands.append(cmd)
+            if 'image inspect' in cmd:
+                return '[/var/runtime/init]\n'
+            if ' create ' in cmd and len([c for c in commands if ' create ' in c]) == 2:
+                all_created.set()
+            if ' cp ' in cmd:
+                # block until both containers have been created
+                all_created.wait(5)
+            if ' start ' in cmd:
+                started.append(cmd.split()[-1])
+            if ' ps -a ' in cmd:
+                return ''.join('Up 1 second - %s\n' % name for name in started)
+            return ''
+
+        executor = lambda_executors.LambdaExecutorReuseContainers()
+        arns = ['arn:aws:lambda:us-east-1:000000000000:function:f%s' % i for i in range(2)]
+        orig_run, orig_warm_containers = lambda_executors.run, config.LAMBDA_WARM_CONTAINERS
+        lambda_executors.run = run
+        config.LAMBDA_WARM_CONTAINERS = 0
+        results = []
+        try:
+            for arn in arns:
+                FuncThread(lambda arn: results.append(
+                    executor.prime_docker_container('python3.6', arn, {}.items(), '/tmp/code')), arn).start()
+            retry(lambda: self.assertEqual(len(results), 2), retries=50, sleep=0.1)
+            # the containers of different functions are created concurrently
+            self.assertTrue(all_created.is_set())
+            names = [executor.get_container_name(arn) for arn in arns]
+            self.assertEqual(sorted(info.name for info in results), sorted(names))
+            # the status of the started containers is checked instead of waiting for a fixed time
+            for name in names:
+                start = commands.index('docker start %s' % name)
+                self.assertTrue([c for c in commands[start:] if ' ps -a ' in c and name in c])
+        finally:
+            lambda_executors.run = orig_run
+            config.LAMBDA_WARM_CONTAINERS = orig_warm_containers
+            metrics.reset()
+
+    def test_local_worker_pool(self):
+        lambda_cwd = new_tmp_dir()
+        save_file(os.path.join(lambda_cwd, 'handler.py'), '\n'.join([
+            'import os, time',
+            'invocations = []',
+            'def handler(event, context):',
+            '    invocations.append(event)',
+            '    print("env: %s" % os.environ.get("TEST_VAR"))',
+            '    time.sleep(event.get("sleep", 0))',
+            '    return {"pid": os.getpid(), "cwd": os.getcwd(), "count": len(invocations),',
+            '        "function": context.function_name}'
+        ]))
+        func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f1')
+        func_details.runtime = 'python3.6'
+        func_details.handler = 'handler.handler'
+        func_details.cwd = lambda_cwd
+        func_details.envvars = {'TEST_VAR': 'test123'}
+        func_details.versions = {'$LATEST': {'CodeSha256': self.CODE_SHA_256}}
+        context = lambda_api.LambdaContext(func_details)
+
+        executor = lambda_executors.LambdaExecutorLocal()
+        orig_workers = config.LAMBDA_LOCAL_WORKERS
+        config.LAMBDA_LOCAL_WORKERS = 2
+        try:
+            executor.startup()
+            self.assertEqual(len(executor.worker_pool.workers), 2)
+
+            # the handler module stays loaded in the worker, and cwd/env are only changed in the worker
+            for i in range(3):
+                result, log_output = executor._execute(func_details.arn(), func_details, {}, context)
+                self.assertEqual(result['count'], i + 1)
+                self.assertEqual(result['function'], 'f1')
+                self.assertEqual(os.path.realpath(result['cwd']), os.path.realpath(lambda_cwd))
+                self.assertEqual(log_output.strip(), 'env: test123')
+            self.assertNotEqual(os.getcwd(), result['cwd'])
+            self.assertNotIn('TEST_VAR', os.environ)
+            phases = metrics.get_metrics()['lambda']['HandlerLoad']
+            self.assertEqual((phases['cold']['count'], phases['hot']['count']), (1, 2))
+
+            # concurrent invocations run in parallel in different workers
+            results = []
+
+            def invoke(*args):
+                results.append(executor._execute(func_details.arn(), func_details, {'sleep': 0.5}, context)[0])
+
+            threads = [FuncThread(invoke) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(r['pid'] for r in results)), 2)
+
+            # new code is loaded based on the code hash, and errors are raised with the log output
+            save_file(os.path.join(lambda_cwd, 'handler.py'), 'def handler(event, ctx):\n    raise Exception("f")\n')
+            func_details.versions['$LATEST']['CodeSha256'] = 'sha2'
+            with self.assertRaises(Exception) as ctx:
+                executor._execute(func_details.arn(), func_details, {}, context)
+            self.assertIn('Exception: f', str(ctx.exception))
+        finally:
+            config.LAMBDA_LOCAL_WORKERS = orig_workers
+            executor.cleanup()
+            rm_rf(lambda_cwd)
+            metrics.reset()
+        self.assertIsNone(executor.worker_pool)
+
+    def test_exec_lambda_code(self):
+        lambda_cwd = new_tmp_dir()
+        save_file(os.path.join(lambda_cwd, 'util_%s.py' % short_uid()), 'VALUE = 42\n')
+        module_name = [f for f in os.listdir(lambda_cwd) if f.startswith('util_')][0][:-3]
+        script = 'import os\nimport %s\ncount = [0]\ndef handler(event, context):\n' % module_name + \
+            '    count[0] += 1\n    return %s.VALUE, count[0]\n' % module_name
+        main_file = os.path.join(lambda_cwd, 'handler.py')
+        cwd = os.getcwd()
+        try:
+            handlers = []
+            threads = [FuncThread(lambda *args: handlers.append(lambda_api.exec_lambda_code(
+                script, lambda_cwd=lambda_cwd, lambda_file=main_file))) for i in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(handlers), 3)
+            self.assertEqual(os.getcwd(), cwd)
+            self.assertNotIn(lambda_cwd, sys.path)
+
+            # the compiled code is shared, but each function has its own module state
+            self.assertEqual(len(set(h.__code__ for h in handlers)), 1)
+            self.assertEqual(handlers[0].__code__.co_filename, main_file)
+            self.assertEqual(handlers[0](None, None), (42, 1))
+            self.assertEqual(handlers[0](None, None), (42, 2))
+            self.assertEqual(handlers[1](None, None), (42, 1))
+        finally:
+            rm_rf(lambda_cwd)
+
+    def test_exec_lambda_code_sibling_modules(self):
+        # two functions with equally named modules in their working directories, loaded concurrently
+        module_name = 'utils_%s' % short_uid()
+        lambda_cwds = [new_tmp_dir() for i in range(2)]
+        for i, lambda_cwd in enumerate(lambda_cwds):
+            save_file(os.path.join(lambda_cwd, '%s.py' % module_name),
+                'import time\ntime.sleep(0.05)\nVALUE = %s\n' % i)
+        script = 'import %s\ndef handler(event, context):\n    return %s.VALUE\n' % (module_name, module_name)
+        try:
+            handlers = {}
+
+            def load(lambda_cwd, i):
+                handlers[i] = lambda_api.exec_lambda_code(script, lambda_cwd=lambda_cwd,
+                    lambda_file=os.path.join(lambda_cwd, 'handler.py'))
+
+            threads = [FuncThread(lambda params, i=i: load(lambda_cwds[i % 2], i)) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(dict((i, handler(None, None)) for i, handler in handlers.items()),
+                dict((i, i % 2) for i in range(6)))
+            self.assertNotIn(module_name, sys.modules)
+            for lambda_cwd in lambda_cwds:
+                self.assertNotIn(lambda_cwd, sys.path)
+        finally:
+            for lambda_cwd in lambda_cwds:
+                rm_rf(lambda_cwd)
+
+    def test_exec_lambda_code_concurrent_loads(self):
+        # handler modules of functions without equally named modules are loaded concurrently: each module waits
+        # (at module level) for the other one to start loading
+        flag_dir = new_tmp_dir()
+        script = '\n'.join([
+            'import os, time',
+            'open(os.path.join(%r, "%%s"), "w").close()' % flag_dir,
+            'deadline = time.time() + 5',
+            'while not os.path.exists(os.path.join(%r, "%%s")) and time.time() < deadline:' % flag_dir,
+            '    time.sleep(0.01)',
+            'CONCURRENT = time.time() < deadline',
+            'def handler(event, context):',
+            '    return CONCURRENT'
+        ])
+        lambda_cwds = [new_tmp_dir() for i in range(2)]
+        try:
+            handlers = []
+            for i, lambda_cwd in enumerate(lambda_cwds):
+                save_file(os.path.join(lambda_cwd, 'module%s.py' % i), 'VALUE = %s\n' % i)
+            threads = [FuncThread(lambda params, i=i: handlers.append(lambda_api.exec_lambda_code(
+                script % (i, 1 - i), lambda_cwd=lambda_cwds[i], lambda_file=os.path.join(lambda_cwds[i], 'h.py'))))
+                for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([handler(None, None) for handler in handlers], [True, True])
+        finally:
+            for lambda_cwd in lambda_cwds + [flag_dir]:
+                rm_rf(lambda_cwd)
+
+    def test_module_level_environment(self):
+        # module-level code of the handler runs in the environment and working directory of the function
+        script = '\n'.join([
+            'import os',
+            'VALUE = os.environ["TEST_VAR"]',
+            'with open("data.txt") as f:',
+            '    DATA = f.read()',
+            'def handler(event, context):',
+            '    return {"value": VALUE, "data": DATA}'
+        ])
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('handler.py', script)
+            zip_file.writestr('data.txt', 'file data')
+        cwd, environ, orig_use_docker = os.getcwd(), dict(os.environ), lambda_api.DO_USE_DOCKER
+        lambda_api.DO_USE_DOCKER = False
+        try:
+            self._create_function(self.FUNCTION_NAME)
+            func_details = lambda_api.arn_to_lambda[lambda_api.func_arn(self.FUNCTION_NAME)]
+            func_details.runtime = 'python3.6'
+            func_details.handler = 'handler.handler'
+            func_details.envvars = {'TEST_VAR': 'test123'}
+            lambda_api.set_function_code({'ZipFile': base64.b64encode(archive.getvalue())}, self.FUNCTION_NAME)
+
+            executor = lambda_executors.LambdaExecutorLocal()
+            result, log_output = executor._execute(func_details.arn(), func_details, {},
+                lambda_api.LambdaContext(func_details))
+            self.assertEqual(result, {'value': 'test123', 'data': 'file data'})
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+            lambda_api.DO_USE_DOCKER = orig_use_docker
+
+    def test_local_worker_sibling_modules(self):
+        # two functions with equally named modules in their working directories, run by the same worker
+        lambda_cwds = [new_tmp_dir() for i in range(2)]
+        executor = lambda_executors.LambdaExecutorLocal()
+        orig_workers = config.LAMBDA_LOCAL_WORKERS
+        config.LAMBDA_LOCAL_WORKERS = 1
+        try:
+            functions = []
+            for i, lambda_cwd in enumerate(lambda_cwds):
+                save_file(os.path.join(lambda_cwd, 'utils.py'), 'X = "f%s"\n' % i)
+                save_file(os.path.join(lambda_cwd, 'handler.py'),
+                    'import utils\ndef handler(event, context):\n    return utils.X\n')
+                func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:f%s' % i)
+                func_details.runtime = 'python3.6'
+                func_details.handler = 'handler.handler'
+                func_details.cwd = lambda_cwd
+                func_details.envvars = {}
+                func_details.versions = {'$LATEST': {'CodeSha256': 'sha%s' % i}}
+                functions.append(func_details)
+
+            def invoke(func_details):
+                return executor._execute(func_details.arn(), func_details, {})[0]
+
+            self.assertEqual([invoke(f) for f in functions + functions], ['f0', 'f1', 'f0', 'f1'])
+
+            # updated code of sibling modules is loaded with the new code of the function
+            save_file(os.path.join(lambda_cwds[0], 'utils.py'), 'X = "f0 updated"\n')
+            functions[0].versions['$LATEST']['CodeSha256'] = 'sha-updated'
+            self.assertEqual(invoke(functions[0]), 'f0 updated')
+            self.assertEqual(invoke(functions[1]), 'f1')
+        finally:
+            config.LAMBDA_LOCAL_WORKERS = orig_workers
+            executor.cleanup()
+            for lambda_cwd in lambda_cwds:
+                rm_rf(lambda_cwd)
+
     def test_put_concurrency(self):
         with self.app.test_request_context():
             self._create_function(self.FUNCTION_NAME)
@@ -0,0 +1,116 @@
+import time
+import threading
+import unittest
+from localstack.services.awslambda import lambda_async
+from localstack.utils.aws.aws_models import LambdaFunction
+from localstack.utils.common import retry
+from localstack.utils.server import metrics
+
+
+def new_function(name, reserved_concurrency=None):
+    func_details = LambdaFunction('arn:aws:lambda:us-east-1:000000000000:function:%s' % name)
+    if reserved_concurrency is not None:
+        func_details.concurrency = {'ReservedConcurrentExecutions': reserved_concurrency}
+    return func_details
+
+
+class AsyncInvocationQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = lambda_async.AsyncInvocationQueue(max_workers=4, max_queue_size=3, max_retries=2,
+            retry_delay=0.05)
+        lambda_async.QUEUE['queue'] = self.queue
+
+    def tearDown(self):
+        lambda_async.QUEUE.pop('queue', None)
+        self.queue.shutdown()
+        metrics.reset()
+
+    def submit(self, func_details, execute, event=None):
+        self.queue.submit(lambda_async.AsyncInvocation(func_details.arn(), func_details, event or {}, execute))
+
+    def test_concurrency_and_queue_limits(self):
+        func1 = new_function('f1', reserved_concurrency=1)
+        func2 = new_function('f2')
+        lock = threading.Lock()
+        running = {'f1': 0, 'max_f1': 0}
+        release = threading.Event()
+        invoked = []
+
+        def execute_f1():
+            with lock:
+                running['f1'] += 1
+                running['max_f1'] = max(running['max_f1'], running['f1'])
+            release.wait(5)
+            with lock:
+                running['f1'] -= 1
+                invoked.append('f1')
+
+        self.submit(func1, execute_f1)
+        retry(lambda: self.assertEqual(running['f1'], 1), retries=100, sleep=0.05)
+        # one invocation is running, hence three are queued, and the queue is full
+        for i in range(3):
+            self.submit(func1, execute_f1)
+        with self.assertRaises(lambda_async.InvocationQueueFullError):
+            self.submit(func1, execute_f1)
+
+        # other functions are not blocked by the reserved concurrency of f1
+        self.submit(func2, lambda: invoked.append('f2'))
+        retry(lambda: self.assertIn('f2', invoked), retries=100, sleep=0.05)
+        stats = self.queue.get_stats()
+        self.assertEqual((stats[func1.arn()]['queue_depth'], stats[func1.arn()]['rejected']), (3, 1))
+        self.assertGreater(stats[func1.arn()]['oldest_age_secs'], 0)
+
+        release.set()
+        retry(lambda: self.assertEqual(invoked.count('f1'), 4), retries=100, sleep=0.05)
+        self.assertEqual(running['max_f1'], 1)
+        stats = self.queue.get_stats()[func1.arn()]
+        self.assertEqual((stats['accepted'], stats['succeeded'], stats['queue_depth']), (4, 4, 0))
+        self.assertEqual(metrics.get_metrics()['lambda']['AsyncInvoke']['queued']['count'], 5)
+        self.assertIn('localstack_lambda_async_invocations_succeeded{function="%s"} 4' % func1.arn(),
+            metrics.get_prometheus_metrics())
+
+        # functions with a reserved concurrency of 0 are throttled
+        with self.assertRaises(lambda_async.InvocationQueueFullError):
+            self.submit(new_function('f3', reserved_concurrency=0), lambda: None)
+
+    def test_retries_and_dead_letter_queue(self):
+        dead_letters = []
+        attempts = []
+
+        def send_to_dead_letter_queue(invocation, error):
+            dead_letters.append((invocation.event, str(error)))
+            return True
+
+        def execute():
+            attempts.append(time.time())
+            raise Exception('failed')
+
+        orig_send = lambda_async.send_to_dead_letter_queue
+        lambda_async.send_to_dead_letter_queue = send_to_dead_letter_queue
+        try:
+            func_details = new_function('f1')
+            self.submit(func_details, execute, event={'foo': 'bar'})
+            retry(lambda: self.assertEqual(len(dead_letters), 1), retries=100, sleep=0.05)
+            self.assertEqual(dead_letters[0], ({'foo': 'bar'}, 'failed'))
+            self.assertEqual(len(attempts), 3)
+            # exponential backoff between the attempts
+            self.assertGreaterEqual(attempts[2] - attempts[1], 0.1)
+            stats = self.queue.get_stats()[func_details.arn()]
+            self.assertEqual((stats['retries'], stats['failed'], stats['dead_lettered']), (2, 1, 1))
+
+            # successful retries are not sent to the dead-letter queue
+            attempts_f2 = []
+
+            def execute_f2():
+                attempts_f2.append(1)
+                if len(attempts_f2) < 2:
+                    raise Exception('failed')
+
+            func2 = new_function('f2')
+            self.submit(func2, execute_f2)
+            retry(lambda: self.assertEqual(self.queue.get_stats()[func2.arn()]['succeeded'], 1),
+                retries=100, sleep=0.05)
+            self.assertEqual(len(dead_letters), 1)
+        finally:
+            lambda_async.send_to_dead_letter_queue = orig_send
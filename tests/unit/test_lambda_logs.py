@@ -0,0 +1,133 @@
+import time
+import threading
+import unittest
+from localstack.services.awslambda import lambda_logs
+from localstack.utils.common import retry, FuncThread
+
+LOG_GROUP = '/aws/lambda/f1'
+
+
+class FakeLogsClient(object):
+    """ In-memory CloudWatch Logs, with the subset of the client API used by the log shipper. """
+
+    class exceptions(object):
+        class ResourceAlreadyExistsException(Exception):
+            pass
+
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self):
+        # if set, calls to put_log_events(..) block until the event is set
+        self.gate = None
+        self.groups = {}
+        self.calls = []
+
+    def create_log_group(self, logGroupName):
+        self.calls.append('create_log_group')
+        if logGroupName in self.groups:
+            raise self.exceptions.ResourceAlreadyExistsException()
+        self.groups[logGroupName] = {}
+
+    def create_log_stream(self, logGroupName, logStreamName):
+        self.calls.append('create_log_stream')
+        if logStreamName in self.groups[logGroupName]:
+            raise self.exceptions.ResourceAlreadyExistsException()
+        self.groups[logGroupName][logStreamName] = []
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents):
+        self.calls.append('put_log_events')
+        if self.gate is not None:
+            self.gate.wait()
+        if logStreamName not in self.groups.get(logGroupName, {}):
+            raise self.exceptions.ResourceNotFoundException()
+        self.groups[logGroupName][logStreamName].extend(logEvents)
+
+    def get_messages(self, log_group_name=LOG_GROUP):
+        return [e['message'] for events in self.groups.get(log_group_name, {}).values() for e in events]
+
+
+def new_events(count, prefix='line', timestamp=None):
+    timestamp = timestamp or int(time.time() * 1000)
+    return [{'timestamp': timestamp + i, 'message': '%s %s' % (prefix, i)} for i in range(count)]
+
+
+class LogShipperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shippers = []
+
+    def tearDown(self):
+        for shipper in self.shippers:
+            shipper.shutdown()
+
+    def new_shipper(self, client, buffer_size=100, flush_interval=0.1, policy=lambda_logs.POLICY_DROP):
+        shipper = lambda_logs.LogShipper(buffer_size, flush_interval, policy)
+        shipper.get_client = lambda: client
+        self.shippers.append(shipper)
+        return shipper
+
+    def test_batched_shipping(self):
+        client = FakeLogsClient()
+        shipper = self.new_shipper(client, flush_interval=0.3)
+        for i in range(3):
+            self.assertTrue(shipper.submit(LOG_GROUP, new_events(2, prefix='inv%s' % i)))
+        self.assertEqual(client.calls, [])
+
+        # the events of all invocations are shipped in a single batch, once the flush interval has passed
+        retry(lambda: self.assertEqual(len(client.get_messages()), 6), retries=100, sleep=0.05)
+        self.assertEqual(client.calls, ['create_log_group', 'create_log_stream', 'put_log_events'])
+        self.assertEqual(sorted(client.get_messages()), ['inv%s %s' % (i, j) for i in range(3) for j in range(2)])
+        stream_name = list(client.groups[LOG_GROUP])[0]
+        self.assertIn('/[$LATEST]', stream_name)
+
+        # known log groups and streams are not created again, unless they have been deleted
+        shipper.submit(LOG_GROUP, new_events(1))
+        self.assertTrue(shipper.flush(timeout=5))
+        self.assertEqual(client.calls[3:], ['put_log_events'])
+        del client.groups[LOG_GROUP]
+        shipper.submit(LOG_GROUP, new_events(1))
+        self.assertTrue(shipper.flush(timeout=5))
+        self.assertEqual(client.calls[4:], ['put_log_events', 'create_log_group', 'create_log_stream',
+            'put_log_events'])
+        self.assertEqual(client.get_messages(), ['line 0'])
+        stats = shipper.get_stats()[LOG_GROUP]
+        self.assertEqual((stats['submitted'], stats['shipped'], stats['batches']), (8, 8, 3))
+
+    def test_batch_limits(self):
+        self.assertEqual([len(b) for b in lambda_logs.get_batches(new_events(25000))], [10000, 10000, 5000])
+        events = [{'timestamp': 1, 'message': 'x' * (300 * 1024)} for i in range(5)]
+        self.assertEqual([len(b) for b in lambda_logs.get_batches(events)], [3, 2])
+
+        events = lambda_logs.get_log_events('l1\n\nl3\n', 1000, 1400)
+        self.assertEqual(events, [{'timestamp': 1000, 'message': 'l1'}, {'timestamp': 1200, 'message': 'l3'}])
+
+    def test_full_buffer(self):
+        client = FakeLogsClient()
+        client.gate = threading.Event()
+        shipper = self.new_shipper(client, buffer_size=5, flush_interval=0)
+        self.assertTrue(shipper.submit(LOG_GROUP, new_events(5)))
+        retry(lambda: self.assertTrue(shipper.shipping), retries=100, sleep=0.01)
+        self.assertTrue(shipper.submit(LOG_GROUP, new_events(4)))
+
+        # events are dropped while the buffer is full, without waiting for the (blocked) logs backend
+        self.assertFalse(shipper.submit(LOG_GROUP, new_events(2)))
+        client.gate.set()
+        self.assertTrue(shipper.flush(timeout=5))
+        self.assertEqual(len(client.get_messages()), 9)
+        self.assertEqual(shipper.get_stats()[LOG_GROUP]['dropped'], 2)
+
+        # with the "block" policy, invocations wait for space in the buffer instead
+        shipper.policy = lambda_logs.POLICY_BLOCK
+        client.gate.clear()
+        shipper.submit(LOG_GROUP, new_events(5))
+        retry(lambda: self.assertTrue(shipper.shipping), retries=100, sleep=0.01)
+        shipper.submit(LOG_GROUP, new_events(4))
+        accepted = threading.Event()
+        FuncThread(lambda *args: shipper.submit(LOG_GROUP, new_events(2)) and accepted.set()).start()
+        self.assertFalse(accepted.wait(0.2))
+        client.gate.set()
+        self.assertTrue(accepted.wait(5))
+        self.assertTrue(shipper.flush(timeout=5))
+        self.assertEqual(len(client.get_messages()), 20)
+        self.assertEqual(shipper.get_stats()[LOG_GROUP]['dropped'], 2)
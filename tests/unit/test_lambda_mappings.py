@@ -0,0 +1,62 @@
+import unittest
+from localstack.services.awslambda import lambda_api
+from localstack.services.awslambda.lambda_mappings import EventSourceMappingRegistry
+
+TABLE_ARN = 'arn:aws:dynamodb:us-east-1:000000000000:table/table1'
+
+STREAM_ARN = 'arn:aws:kinesis:us-east-1:000000000000:stream/stream1'
+
+FUNCTION_ARN = 'arn:aws:lambda:us-east-1:000000000000:function:f%s'
+
+
+def new_mapping(mapping_uuid, source_arn, function_arn):
+    return {'UUID': mapping_uuid, 'EventSourceArn': source_arn, 'FunctionArn': function_arn}
+
+
+class EventSourceMappingRegistryTest(unittest.TestCase):
+
+    def test_lookups(self):
+        registry = EventSourceMappingRegistry()
+        m1 = registry.add(new_mapping('u1', STREAM_ARN, FUNCTION_ARN % 1))
+        m2 = registry.add(new_mapping('u2', STREAM_ARN + '2', FUNCTION_ARN % 1))
+        m3 = registry.add(new_mapping('u3', TABLE_ARN + '/stream/2019-01-01T00:00:00', FUNCTION_ARN % 2))
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(registry.get('u2'), m2)
+
+        # streams are matched exactly, and tables match the ARNs of their streams
+        self.assertEqual(registry.find(source_arn=STREAM_ARN), [m1])
+        self.assertEqual(registry.find(source_arn=TABLE_ARN), [m3])
+        self.assertEqual(registry.find(source_arn=TABLE_ARN + '2'), [])
+        self.assertEqual(registry.find(function_arns=[FUNCTION_ARN % 1]), [m1, m2])
+        self.assertEqual(registry.find(function_arns=[FUNCTION_ARN % 1], source_arn=STREAM_ARN + '2'), [m2])
+        self.assertEqual(registry.find(), [m1, m2, m3])
+
+        # updates of the function or event source re-index the mapping
+        registry.update('u1', FunctionArn=FUNCTION_ARN % 2, State='Disabled')
+        self.assertEqual(m1['State'], 'Disabled')
+        self.assertEqual(registry.find(function_arns=[FUNCTION_ARN % 2]), [m3, m1])
+        self.assertIsNone(registry.update('u4', State='Enabled'))
+
+        self.assertEqual(registry.remove_function(FUNCTION_ARN % 2), [m3, m1])
+        self.assertEqual(registry.find(source_arn=STREAM_ARN), [])
+        self.assertEqual(registry.remove('u2'), m2)
+        self.assertIsNone(registry.remove('u2'))
+        self.assertEqual((len(registry), registry.by_source, registry.by_function), (0, {}, {}))
+
+    def test_event_source_api(self):
+        try:
+            mapping = lambda_api.add_event_source('f1', STREAM_ARN, True)
+            self.assertEqual(lambda_api.get_event_sources(source_arn=STREAM_ARN), [mapping])
+            self.assertEqual(lambda_api.get_event_sources(func_name='f1'), [mapping])
+            self.assertEqual(lambda_api.get_event_sources(func_name=lambda_api.func_arn('f1')), [mapping])
+
+            lambda_api.update_event_source(mapping['UUID'], 'f2', False, 50)
+            self.assertEqual((mapping['State'], mapping['BatchSize']), ('Disabled', 50))
+            self.assertEqual(lambda_api.get_event_sources(func_name='f1'), [])
+            self.assertEqual(lambda_api.get_event_sources(func_name='f2', source_arn=STREAM_ARN), [mapping])
+            self.assertEqual(lambda_api.update_event_source('unknown', 'f2', True, None), {})
+
+            self.assertEqual(lambda_api.delete_event_source(mapping['UUID']), mapping)
+            self.assertEqual(lambda_api.get_event_sources(source_arn=STREAM_ARN), [])
+        finally:
+            lambda_api.cleanup()
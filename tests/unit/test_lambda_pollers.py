@@ -0,0 +1,251 @@
+import time
+import base64
+import threading
+import unittest
+from datetime import datetime
+from localstack import config
+from localstack.services.awslambda import lambda_api, lambda_pollers
+from localstack.utils.common import retry, to_str
+
+QUEUE_ARN = 'arn:aws:sqs:us-east-1:000000000000:queue1'
+
+STREAM_ARN = 'arn:aws:kinesis:us-east-1:000000000000:stream/stream1'
+
+FUNCTION_ARN = 'arn:aws:lambda:us-east-1:000000000000:function:f1'
+
+
+class FakeSQSClient(object):
+    """ In-memory SQS queue, with the subset of the client API used by the pollers. """
+
+    def __init__(self, num_messages):
+        self.lock = threading.Lock()
+        self.messages = dict(('m%s' % i, {'body': 'msg %s' % i, 'visible_at': 0}) for i in range(num_messages))
+        self.receive_sizes = []
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, **kwargs):
+        with self.lock:
+            now = time.time()
+            ids = sorted(i for i, m in self.messages.items() if m['visible_at'] <= now)[:MaxNumberOfMessages]
+            for message_id in ids:
+                self.messages[message_id]['visible_at'] = now + 30
+            if ids:
+                self.receive_sizes.append(len(ids))
+        if not ids:
+            time.sleep(0.05)
+        return {'Messages': [{'MessageId': i, 'ReceiptHandle': 'rh-%s' % i, 'Body': self.messages[i]['body'],
+            'MessageAttributes': {'a1': {'DataType': 'String', 'StringValue': 'v1'}}} for i in ids]}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            for entry in Entries:
+                self.messages.pop(entry['ReceiptHandle'][3:], None)
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self.lock:
+            for entry in Entries:
+                self.messages[entry['ReceiptHandle'][3:]]['visible_at'] = time.time() + entry['VisibilityTimeout']
+
+
+class FakeKinesisClient(object):
+    """ In-memory Kinesis stream, with the subset of the client API used by the shard processors. """
+
+    def __init__(self, shard_ids):
+        self.lock = threading.Lock()
+        self.shards = dict((shard_id, []) for shard_id in shard_ids)
+        self.sequence = 0
+        self.reads = []
+
+    def put_record(self, shard_id, data):
+        """ Add a record to the stream, and return it in the format passed on by the Kinesis API listener. """
+        with self.lock:
+            self.sequence += 1
+            record = {'SequenceNumber': str(1000 + self.sequence), 'Data': data.encode('utf-8'),
+                'PartitionKey': 'p1', 'ApproximateArrivalTimestamp': datetime.now()}
+            self.shards[shard_id].append(record)
+        return {'data': to_str(base64.b64encode(record['Data'])), 'partitionKey': 'p1',
+            'sequenceNumber': record['SequenceNumber'], 'shardId': shard_id}
+
+    def describe_stream(self, StreamName):
+        return {'StreamDescription': {'Shards': [{'ShardId': shard_id} for shard_id in sorted(self.shards)]}}
+
+    def get_shard_iterator(self, StreamName, ShardId, ShardIteratorType, StartingSequenceNumber=None, **kwargs):
+        records = self.shards[ShardId]
+        index = 0
+        if ShardIteratorType == 'AT_SEQUENCE_NUMBER':
+            index = [r['SequenceNumber'] for r in records].index(StartingSequenceNumber)
+        elif ShardIteratorType == 'AFTER_SEQUENCE_NUMBER':
+            index = [r['SequenceNumber'] for r in records].index(StartingSequenceNumber) + 1
+        return {'ShardIterator': '%s:%s' % (ShardId, index)}
+
+    def get_records(self, ShardIterator, Limit):
+        shard_id, index = ShardIterator.split(':')
+        with self.lock:
+            records = self.shards[shard_id][int(index):int(index) + Limit]
+            self.reads.append(len(records))
+        return {'Records': records, 'NextShardIterator': '%s:%s' % (shard_id, int(index) + len(records))}
+
+
+class KinesisShardProcessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.orig = (lambda_pollers.invoke_function, lambda_pollers.get_kinesis_client,
+            lambda_pollers.KINESIS_RETRY_DELAY, lambda_pollers.KINESIS_MAX_BUFFERED_RECORDS)
+        self.client = FakeKinesisClient(['shardId-000000000000', 'shardId-000000000001'])
+        self.events = []
+        self.failures = []
+        # invocations with records of the blocked shard wait until the event is set
+        self.blocked_shard = None
+        self.unblocked = threading.Event()
+        lambda_pollers.invoke_function = self.invoke_function
+        lambda_pollers.get_kinesis_client = lambda region_name: self.client
+        lambda_pollers.KINESIS_RETRY_DELAY = 0.01
+
+    def tearDown(self):
+        self.unblocked.set()
+        lambda_api.cleanup()
+        (lambda_pollers.invoke_function, lambda_pollers.get_kinesis_client,
+            lambda_pollers.KINESIS_RETRY_DELAY, lambda_pollers.KINESIS_MAX_BUFFERED_RECORDS) = self.orig
+
+    def invoke_function(self, func_arn, event):
+        if event['Records'][0]['eventID'].startswith('%s:' % self.blocked_shard):
+            self.unblocked.wait()
+        if self.failures:
+            self.failures.pop()
+            return False
+        self.events.append(event)
+        return True
+
+    def put_records(self, shard_id, count):
+        records = [self.client.put_record(shard_id, 'd%s' % i) for i in range(count)]
+        lambda_api.process_kinesis_records(records, 'stream1')
+        return records
+
+    def get_processed(self, shard_id):
+        records = [r for e in self.events for r in e['Records'] if r['eventID'].startswith('%s:' % shard_id)]
+        return [r['kinesis']['sequenceNumber'] for r in records]
+
+    def test_ordered_batches_per_shard(self):
+        self.blocked_shard = 'shardId-000000000000'
+        mapping = lambda_api.add_event_source(FUNCTION_ARN, STREAM_ARN, True, batch_size=3)
+        self.assertEqual(mapping['StartingPosition'], 'LATEST')
+        blocked = self.put_records('shardId-000000000000', 4)
+        records = self.put_records('shardId-000000000001', 5) + self.put_records('shardId-000000000001', 2)
+
+        # the records of the other shard are processed while the function is blocked for the first shard
+        expected = [r['sequenceNumber'] for r in records]
+        retry(lambda: self.assertEqual(self.get_processed('shardId-000000000001'), expected), retries=100, sleep=0.05)
+        self.assertEqual(self.get_processed('shardId-000000000000'), [])
+        self.assertTrue(all(len(e['Records']) <= 3 for e in self.events))
+        record = self.events[0]['Records'][0]
+        self.assertEqual(record['eventID'], 'shardId-000000000001:%s' % expected[0])
+        self.assertEqual(record['eventSourceARN'], STREAM_ARN)
+        self.assertEqual(record['kinesis']['data'], records[0]['data'])
+
+        # a failed batch is retried before the next batch of the shard
+        self.failures.append(True)
+        self.unblocked.set()
+        expected = [r['sequenceNumber'] for r in blocked]
+        retry(lambda: self.assertEqual(self.get_processed('shardId-000000000000'), expected), retries=100, sleep=0.05)
+        self.assertEqual(mapping['LastProcessingResult'], 'OK')
+
+    def test_read_from_stream(self):
+        existing = [self.client.put_record('shardId-000000000000', 'd%s' % i) for i in range(5)]
+        mapping = lambda_api.add_event_source(FUNCTION_ARN, STREAM_ARN, True, batch_size=2,
+            starting_position='TRIM_HORIZON')
+        records = self.put_records('shardId-000000000000', 3)
+
+        # existing records are read from the stream first, and records are not processed twice
+        expected = [r['sequenceNumber'] for r in existing + records]
+        retry(lambda: self.assertEqual(self.get_processed('shardId-000000000000'), expected), retries=100, sleep=0.05)
+        self.assertTrue(all(len(e['Records']) <= 2 for e in self.events))
+        lambda_api.delete_event_source(mapping['UUID'])
+        self.assertEqual(lambda_pollers.KINESIS_PROCESSORS, {})
+
+        # records are read from the stream after the checkpoint, if the buffer of a shard overflows
+        del self.events[:]
+        lambda_pollers.KINESIS_MAX_BUFFERED_RECORDS = 3
+        self.blocked_shard = 'shardId-000000000001'
+        lambda_api.add_event_source(FUNCTION_ARN, STREAM_ARN, True, batch_size=2)
+        records = []
+        for i in range(4):
+            records.extend(self.put_records('shardId-000000000001', 2))
+        self.unblocked.set()
+        expected = [r['sequenceNumber'] for r in records]
+        retry(lambda: self.assertEqual(self.get_processed('shardId-000000000001'), expected), retries=100, sleep=0.05)
+        self.assertTrue(self.client.reads)
+
+
+class SQSEventSourcePollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.orig = (lambda_pollers.invoke_function, lambda_pollers.SQSEventSourcePoller.get_client,
+            lambda_pollers.SQSEventSourcePoller.get_queue_url, lambda_pollers.SQS_RETRY_VISIBILITY_TIMEOUT,
+            config.LAMBDA_SQS_MAX_POLLERS)
+        self.client = None
+        self.events = []
+        self.failures = []
+        lambda_pollers.SQSEventSourcePoller.get_client = lambda poller: self.client
+        lambda_pollers.SQSEventSourcePoller.get_queue_url = lambda poller: 'http://localhost:4576/queue/queue1'
+        lambda_pollers.SQS_RETRY_VISIBILITY_TIMEOUT = 0
+        lambda_pollers.invoke_function = self.invoke_function
+
+    def tearDown(self):
+        lambda_api.cleanup()
+        (lambda_pollers.invoke_function, lambda_pollers.SQSEventSourcePoller.get_client,
+            lambda_pollers.SQSEventSourcePoller.get_queue_url, lambda_pollers.SQS_RETRY_VISIBILITY_TIMEOUT,
+            config.LAMBDA_SQS_MAX_POLLERS) = self.orig
+
+    def invoke_function(self, func_arn, event):
+        if self.failures:
+            self.failures.pop()
+            return False
+        self.events.append(event)
+        time.sleep(0.05)
+        return True
+
+    def test_batched_polling(self):
+        self.client = FakeSQSClient(25)
+        config.LAMBDA_SQS_MAX_POLLERS = 3
+        mapping = lambda_api.add_event_source(FUNCTION_ARN, QUEUE_ARN, True, batch_size=10)
+        self.assertEqual(mapping['BatchSize'], 10)
+        self.assertIn(mapping['UUID'], lambda_pollers.SQS_POLLERS)
+
+        retry(lambda: self.assertEqual(self.client.messages, {}), retries=100, sleep=0.05)
+        records = [r for event in self.events for r in event['Records']]
+        self.assertEqual(sorted(r['body'] for r in records), sorted('msg %s' % i for i in range(25)))
+        self.assertLessEqual(max(len(e['Records']) for e in self.events), 10)
+        self.assertEqual(self.client.receive_sizes[0], 10)
+        self.assertEqual(records[0]['eventSourceARN'], QUEUE_ARN)
+        self.assertEqual(records[0]['messageAttributes']['a1'],
+            {'dataType': 'String', 'stringValue': 'v1', 'stringListValues': [], 'binaryListValues': []})
+
+        # additional pollers are stopped once the queue is drained
+        poller = lambda_pollers.SQS_POLLERS[mapping['UUID']]
+        retry(lambda: self.assertEqual(poller.threads, 1), retries=100, sleep=0.05)
+
+        # deleting the mapping stops the poller
+        lambda_api.delete_event_source(mapping['UUID'])
+        self.assertTrue(poller.stopped)
+        self.assertEqual(lambda_pollers.SQS_POLLERS, {})
+        retry(lambda: self.assertEqual(poller.threads, 0), retries=100, sleep=0.05)
+
+    def test_failed_invocations(self):
+        self.client = FakeSQSClient(3)
+        self.failures.append(True)
+        mapping = lambda_api.add_event_source(FUNCTION_ARN, QUEUE_ARN, True, batch_size=5)
+        self.assertEqual(mapping['BatchSize'], 5)
+
+        # the messages of the failed invocation are received and processed again
+        retry(lambda: self.assertEqual(self.client.messages, {}), retries=100, sleep=0.05)
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(len(self.events[0]['Records']), 3)
+        self.assertEqual(self.client.receive_sizes[:2], [3, 3])
+        self.assertEqual(mapping['LastProcessingResult'], 'OK')
+
+        # SQS mappings default to batches of 10 messages, and disabled mappings are not polled
+        lambda_api.delete_event_source(mapping['UUID'])
+        mapping = lambda_api.add_event_source(FUNCTION_ARN, QUEUE_ARN, False)
+        self.assertEqual(mapping['BatchSize'], 10)
+        self.client.messages['m9'] = {'body': 'msg 9', 'visible_at': 0}
+        time.sleep(0.3)
+        self.assertIn('m9', self.client.messages)
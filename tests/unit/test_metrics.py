@@ -0,0 +1,33 @@
+import unittest
+from localstack.utils.server import metrics
+
+
+class RequestMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_histograms(self):
+        for duration in (0.0005, 0.003, 0.003, 20):
+            metrics.observe('sqs', 'SendMessage', 'backend', duration)
+        result = metrics.get_metrics()['sqs']['SendMessage']['backend']
+        self.assertEqual(result['count'], 4)
+        self.assertEqual(result['p50_ms'], 5)
+        self.assertIsNone(result['p99_ms'])
+
+        text = metrics.get_prometheus_metrics()
+        labels = 'service="sqs",action="SendMessage",phase="backend"'
+        self.assertIn('localstack_request_phase_seconds_bucket{%s,le="0.001"} 1' % labels, text)
+        self.assertIn('localstack_request_phase_seconds_bucket{%s,le="0.005"} 3' % labels, text)
+        self.assertIn('localstack_request_phase_seconds_bucket{%s,le="+Inf"} 4' % labels, text)
+        self.assertIn('localstack_request_phase_seconds_count{%s} 4' % labels, text)
+
+    def test_limit_number_of_actions(self):
+        for i in range(metrics.MAX_ACTIONS_PER_SERVICE + 10):
+            metrics.observe('sns', 'Action%s' % i, 'total', 0.1)
+        actions = metrics.get_metrics()['sns']
+        self.assertEqual(len(actions), metrics.MAX_ACTIONS_PER_SERVICE + 1)
+        self.assertEqual(actions[metrics.OTHER_ACTION]['total']['count'], 10)
@@ -0,0 +1,83 @@
+import os
+import unittest
+import requests
+from localstack import config
+from localstack.services.generic_proxy import GenericProxy, ProxyListener
+from localstack.utils.common import get_free_tcp_port, wait_for_port_open, retry
+from localstack.utils.server import connection_pool, proxy_processes
+from localstack.utils.server.proxy_processes import SharedDict, run_in_primary
+from .test_generic_proxy import EchoListener, start_proxy
+
+# state of the primary process, updated by the listener of the worker processes
+TEST_STATE = SharedDict('test.state')
+RECORDED_PIDS = []
+
+
+@run_in_primary
+def record_pid(pid):
+    RECORDED_PIDS.append(pid)
+    return os.getpid()
+
+
+class PidListener(ProxyListener):
+
+    def forward_request(self, method, path, data, headers):
+        TEST_STATE[path] = os.getpid()
+        return True
+
+    def return_response(self, method, path, data, headers, response):
+        response.headers['X-Pid'] = str(os.getpid())
+        response.headers['X-Primary-Pid'] = str(record_pid(os.getpid()))
+
+
+class ProxyProcessesTest(unittest.TestCase):
+
+    def test_shared_dict(self):
+        state = SharedDict('test.shared_dict')
+        state['foo'] = {'bar': 1}
+        self.assertIn('foo', state)
+        self.assertEqual(state.items(), [('foo', {'bar': 1})])
+        self.assertEqual(list(state), ['foo'])
+        self.assertEqual(state.pop('foo'), {'bar': 1})
+        self.assertEqual(len(state), 0)
+
+    def test_serve_proxy_in_multiple_processes(self):
+        if not hasattr(os, 'fork'):
+            return
+        orig_processes = config.PROXY_PROCESSES
+        config.PROXY_PROCESSES = 2
+        backend = start_proxy(get_free_tcp_port(), update_listener=EchoListener())
+        port = get_free_tcp_port()
+        proxy = GenericProxy(port, forward_url='http://localhost:%s' % backend.port, update_listener=PidListener())
+        proxy_processes.register_proxy(proxy)
+        proxy.start()
+        wait_for_port_open(port, sleep_time=0.1)
+        processes = []
+        try:
+            processes = proxy_processes.start_proxy_workers()
+            self.assertEqual(len(processes), 1)
+            worker_pid = processes[0].pid
+            primary_pid = os.getpid()
+
+            def request_served_by_worker():
+                # connections are distributed across the processes by the kernel
+                for i in range(20):
+                    response = requests.get('http://localhost:%s/path/%s' % (port, i),
+                        headers={'Connection': 'close'})
+                    self.assertEqual(response.status_code, 200)
+                    if int(response.headers['X-Pid']) == worker_pid:
+                        return '/path/%s' % i, response
+                raise Exception('No request served by worker process')
+
+            path, response = retry(request_served_by_worker, retries=10, sleep=0.5)
+            self.assertEqual(int(response.headers['X-Primary-Pid']), primary_pid)
+            self.assertIn(worker_pid, RECORDED_PIDS)
+            self.assertEqual(TEST_STATE[path], worker_pid)
+        finally:
+            for process in processes:
+                process.terminate()
+            proxy.stop(quiet=True)
+            backend.stop(quiet=True)
+            proxy_processes.PROXIES.remove(proxy)
+            connection_pool.close_sessions()
+            config.PROXY_PROCESSES = orig_processes
@@ -0,0 +1,137 @@
+import unittest
+import requests
+from requests.models import Response
+from localstack import config
+from localstack.utils.common import get_free_tcp_port, to_bytes
+from localstack.utils.server import connection_pool, response_cache
+from .test_generic_proxy import EchoListener, UpdateListener, start_proxy
+
+QUERY_HEADERS = {'Host': 'localhost:4576', 'Content-Type': 'application/x-www-form-urlencoded'}
+
+JSON_HEADERS = {'Host': 'localhost:4569', 'X-Amz-Target': 'DynamoDB_20120810.DescribeTable'}
+
+
+def new_response(content, status_code=200):
+    response = Response()
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'application/json'
+    response._content = to_bytes(content)
+    return response
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.orig_config = (config.PROXY_CACHE_TTL, config.PROXY_CACHE_SIZE, config.PROXY_PROCESSES)
+        config.PROXY_CACHE_TTL = 60
+        config.PROXY_CACHE_SIZE = 100
+        config.PROXY_PROCESSES = 1
+        response_cache.CACHE.clear()
+
+    def tearDown(self):
+        config.PROXY_CACHE_TTL, config.PROXY_CACHE_SIZE, config.PROXY_PROCESSES = self.orig_config
+        response_cache.CACHE.clear()
+
+    def request(self, service, action, data, headers=QUERY_HEADERS, content=None):
+        """ Run a request through the cache, returning the cached response, or None on a miss. """
+        cached, cache_request = response_cache.start_request(service, action, 'POST', '/', data, headers)
+        if cached is None:
+            response_cache.finish_request(cache_request, new_response(content or data))
+        return cached
+
+    def test_cache_and_invalidate_by_resource(self):
+        get_url = 'Action=GetQueueUrl&QueueName=q1'
+        self.assertIsNone(self.request('sqs', 'GetQueueUrl', get_url))
+        self.assertEqual(self.request('sqs', 'GetQueueUrl', get_url).content, to_bytes(get_url))
+        self.assertIsNone(self.request('sqs', 'GetQueueUrl', 'Action=GetQueueUrl&QueueName=q2'))
+        self.assertIsNone(self.request('sqs', 'ListQueues', 'Action=ListQueues'))
+
+        # data plane actions do not invalidate any responses
+        self.request('sqs', 'SendMessage', 'Action=SendMessage&QueueUrl=http://localhost:4576/queue/q1')
+        self.assertIsNotNone(self.request('sqs', 'GetQueueUrl', get_url))
+
+        # deleting queue q1 (identified by its URL) invalidates its own responses and all list responses
+        self.request('sqs', 'DeleteQueue', 'Action=DeleteQueue&QueueUrl=http://localhost:4576/queue/q1')
+        self.assertIsNone(self.request('sqs', 'GetQueueUrl', get_url))
+        self.assertIsNone(self.request('sqs', 'ListQueues', 'Action=ListQueues'))
+        self.assertIsNotNone(self.request('sqs', 'GetQueueUrl', 'Action=GetQueueUrl&QueueName=q2'))
+
+        # JSON requests are cached per parameters, and other services are not affected
+        self.assertIsNone(self.request('dynamodb', 'DescribeTable', '{"TableName": "t1"}', JSON_HEADERS))
+        self.assertIsNotNone(self.request('dynamodb', 'DescribeTable', '{"TableName":"t1"}', JSON_HEADERS))
+        self.request('sqs', 'CreateQueue', 'Action=CreateQueue&QueueName=t1')
+        self.assertIsNotNone(self.request('dynamodb', 'DescribeTable', '{"TableName": "t1"}', JSON_HEADERS))
+
+        stats = response_cache.get_cache_stats()
+        self.assertEqual(stats['sqs']['hits'], 3)
+        self.assertEqual(stats['sqs']['invalidations'], 3)
+        self.assertEqual(stats['dynamodb']['hits'], 2)
+        self.assertEqual(stats['dynamodb']['size'], 1)
+
+    def test_uncacheable_responses(self):
+        data = '{"TableName": "t1"}'
+        for content in ('{"Table": {"TableStatus": "CREATING"}}', '{"Table": {"TableStatus": "ACTIVE"}}'):
+            self.assertIsNone(self.request('dynamodb', 'DescribeTable', data, JSON_HEADERS, content=content))
+        self.assertEqual(self.request('dynamodb', 'DescribeTable', data, JSON_HEADERS).content,
+            b'{"Table": {"TableStatus": "ACTIVE"}}')
+
+        # error responses, and actions or services which are not cacheable
+        cached, cache_request = response_cache.start_request('sqs', 'ListQueues', 'POST', '/', '', QUERY_HEADERS)
+        response_cache.finish_request(cache_request, new_response('error', status_code=400))
+        self.assertIsNone(self.request('sqs', 'ListQueues', ''))
+        self.assertEqual(response_cache.start_request('sqs', 'ReceiveMessage', 'POST', '/', '', {}), (None, None))
+        self.assertEqual(response_cache.start_request('s3', 'GET', 'GET', '/b', None, {}), (None, None))
+
+        # responses are not cached if the cache is disabled
+        config.PROXY_PROCESSES = 2
+        self.assertEqual(response_cache.start_request('sqs', 'ListQueues', 'POST', '/', '', {}), (None, None))
+
+    def test_concurrent_mutation(self):
+        data = 'Action=GetQueueUrl&QueueName=q1'
+        cached, cache_request = response_cache.start_request('sqs', 'GetQueueUrl', 'POST', '/', data, QUERY_HEADERS)
+        # a mutation starting while the read is in progress may have made its response stale
+        self.request('sqs', 'DeleteQueue', 'Action=DeleteQueue&QueueName=q1')
+        response_cache.finish_request(cache_request, new_response(data))
+        self.assertIsNone(self.request('sqs', 'GetQueueUrl', data))
+        self.assertIsNotNone(self.request('sqs', 'GetQueueUrl', data))
+
+    def test_eviction_and_expiry(self):
+        config.PROXY_CACHE_SIZE = 2
+        for name in ('q1', 'q2', 'q3'):
+            self.request('sqs', 'GetQueueUrl', 'Action=GetQueueUrl&QueueName=%s' % name)
+        self.assertIsNotNone(self.request('sqs', 'GetQueueUrl', 'Action=GetQueueUrl&QueueName=q3'))
+        self.assertIsNone(self.request('sqs', 'GetQueueUrl', 'Action=GetQueueUrl&QueueName=q1'))
+        self.assertEqual(response_cache.get_cache_stats()['sqs']['evictions'], 2)
+
+        response_cache.get_cache().ttl = -1
+        self.request('sqs', 'ListQueues', 'Action=ListQueues')
+        self.assertIsNone(self.request('sqs', 'ListQueues', 'Action=ListQueues'))
+        self.assertEqual(response_cache.get_cache_stats()['sqs']['expirations'], 1)
+
+    def test_cached_proxy_responses(self):
+        orig_engine = config.PROXY_ENGINE
+        backend = start_proxy(get_free_tcp_port(), update_listener=EchoListener())
+        proxies = [backend]
+        try:
+            for engine in ('threaded', 'asyncio'):
+                config.PROXY_ENGINE = engine
+                # the listener reads the request bodies (instead of streaming them), to parse the parameters
+                proxy = start_proxy(get_free_tcp_port(), forward_url='http://localhost:%s' % backend.port,
+                    update_listener=UpdateListener(), service_name='sqs')
+                proxies.append(proxy)
+                url = 'http://localhost:%s/' % proxy.port
+                for i in range(3):
+                    response = requests.post(url, data='Action=ListQueues', headers=QUERY_HEADERS)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json()['data'], 'Action=ListQueues')
+                requests.post(url, data='Action=CreateQueue&QueueName=q1', headers=QUERY_HEADERS)
+                response = requests.post(url, data='Action=ListQueues', headers=QUERY_HEADERS)
+                self.assertEqual(response.json()['data'], 'Action=ListQueues')
+                stats = response_cache.get_cache_stats()['sqs']
+                self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (2, 2, 1))
+                response_cache.CACHE.clear()
+        finally:
+            config.PROXY_ENGINE = orig_engine
+            for proxy in proxies:
+                proxy.stop(quiet=True)
+            connection_pool.close_sessions()
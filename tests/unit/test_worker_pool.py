@@ -0,0 +1,47 @@
+import threading
+import unittest
+from localstack.utils.common import retry
+from localstack.utils.server.worker_pool import BoundedWorkerPool, get_worker_pool_stats
+
+
+class BoundedWorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BoundedWorkerPool('test', max_workers=2, max_queue_size=1)
+        self.event = threading.Event()
+        self.results = []
+
+    def tearDown(self):
+        self.event.set()
+        self.pool.shutdown()
+
+    def run_task(self, value):
+        self.event.wait()
+        self.results.append(value)
+
+    def test_reject_tasks_if_queue_full(self):
+        for i in range(3):
+            self.assertTrue(self.pool.submit(self.run_task, (i,)))
+        self.assertFalse(self.pool.submit(self.run_task, (3,)))
+        # tasks submitted with force=True are never rejected
+        self.assertTrue(self.pool.submit(self.run_task, (4,), force=True))
+        self.assertEqual(len(self.pool.workers), 2)
+
+        stats = get_worker_pool_stats()['test']
+        self.assertEqual(stats['accepted'], 4)
+        self.assertEqual(stats['rejected'], 1)
+
+        self.event.set()
+
+        def check_done():
+            self.assertEqual(sorted(self.results), [0, 1, 2, 4])
+            stats = get_worker_pool_stats()['test']
+            self.assertEqual(stats['queue_depth'], 0)
+            self.assertEqual(stats['active_workers'], 0)
+
+        retry(check_done, retries=20, sleep=0.1)
+
+    def test_shutdown(self):
+        self.pool.shutdown()
+        self.assertFalse(self.pool.submit(self.run_task, (1,)))
+        self.assertNotIn('test', get_worker_pool_stats())